@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Report dominated and subsumed rules and emit the execution plan.
+
+Usage:
+    python analyze_rules.py
+    python analyze_rules.py --output rule_plan.json
+
+The plan orders rules so that stronger rules fire first; ``main.py
+--skip-dominated`` builds the same plan at startup and skips rules that can
+no longer change a diagnosis.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.rule_analysis import analyze_rules, redundancy_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', '-o', help='Where to write the execution plan (JSON)')
+    args = parser.parse_args()
+
+    plan = analyze_rules()
+    print(redundancy_report(plan))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(plan.to_dict(), f, indent=2)
+        print(f"\nWrote execution plan to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
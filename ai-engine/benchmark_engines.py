@@ -0,0 +1,99 @@
+"""
+Compare the cost of the forward-chaining backends.
+
+Times engine construction, reset_session, a full answered session and the
+run() calls within it on each backend (see ``ENGINE_BACKENDS`` in
+src/engine.py), with the rule bodies and with the generated rules module
+(src/codegen.py), each without and with explanation tracing
+(src/explain.py). The tracing overhead per answer is checked against
+TRACE_BUDGET_US.
+
+Usage:
+    python benchmark_engines.py [--sessions N] [--answers N] [--seed N]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from src.codegen import load_compiled_rules
+from src.engine import ENGINE_BACKENDS, create_engine
+from src.facts import QUESTION_TEMPLATES
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+# Most run() time per answer that tracing may add, in microseconds (about
+# a tenth of an experta run(), so tracing can stay on in production)
+TRACE_BUDGET_US = 50
+
+
+def make_sessions(count, answers, seed):
+    """Random answer sequences shared by every backend."""
+    rng = random.Random(seed)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    return [
+        [(symptom, rng.choice(CERTAINTY_CHOICES))
+         for symptom in rng.sample(symptoms, min(answers, len(symptoms)))]
+        for _ in range(count)
+    ]
+
+
+def per_call_ms(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def benchmark(backend, sessions, **options):
+    """Return the average construction, reset, session and run() times in ms."""
+    construct = per_call_ms(lambda: create_engine(backend, **options), len(sessions))
+    engine = create_engine(backend, **options)
+    reset = per_call_ms(engine.reset_session, len(sessions))
+
+    run = 0.0
+    start = time.perf_counter()
+    for answers in sessions:
+        engine.reset_session()
+        for symptom, certainty in answers:
+            engine.record_answer(symptom, certainty)
+            engine.add_symptom(symptom, certainty)
+            run_start = time.perf_counter()
+            engine.run()
+            run += time.perf_counter() - run_start
+            engine.get_next_question()
+    session = (time.perf_counter() - start) * 1000 / len(sessions)
+    return construct, reset, session, run * 1000 / len(sessions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the engine backends')
+    parser.add_argument('--sessions', type=int, default=200,
+                        help='Number of sessions per backend (default: 200)')
+    parser.add_argument('--answers', type=int, default=15,
+                        help='Answers per session (default: 15)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args(argv)
+
+    sessions = make_sessions(args.sessions, args.answers, args.seed)
+    print(f"{args.sessions} sessions of {args.answers} answers (ms per call)")
+    compiled_rules = load_compiled_rules()
+    print(f"{'backend':<28}{'construct':>12}{'reset':>12}{'session':>12}{'run()':>12}")
+    overheads = []
+    for backend in ENGINE_BACKENDS:
+        for label, options in ((backend, {}),
+                               (f'{backend} + compiled', {'compiled_rules': compiled_rules})):
+            times = benchmark(backend, sessions, **options)
+            traced = benchmark(backend, sessions, trace=True, **options)
+            print(f"{label:<28}" + ''.join(f"{t:>12.3f}" for t in times))
+            print(f"{label + ' + trace':<28}" + ''.join(f"{t:>12.3f}" for t in traced))
+            overheads.append((label, (traced[3] - times[3]) * 1000 / args.answers))
+    print(f"tracing overhead per answer (budget {TRACE_BUDGET_US} us): " + ', '.join(
+        f"{label} {us:.1f} us" for label, us in overheads))
+    return 0 if all(us <= TRACE_BUDGET_US for _, us in overheads) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
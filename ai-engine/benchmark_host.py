@@ -0,0 +1,169 @@
+"""
+Sustained-load latency of main.py --host under different GC settings.
+
+Keeps a number of sessions open in one host process and answers questions
+in them in random order; finished sessions are ended and replaced, so the
+host sees steady session churn. Reports per-command latency percentiles
+and the host's GC pause metrics for each configuration:
+
+- python:  Python's GC thresholds (700,10,10), no gc.freeze(), no engine pool
+- freeze:  as python, with the shared structures frozen
+- pool:    as freeze, with ended sessions' engines reused
+- tuned:   the host defaults (frozen, pooled, DEFAULT_GC_THRESHOLDS)
+
+With --shadow-kb, compares the host defaults without and with shadow
+evaluation of a candidate knowledge base instead (see src/shadow.py),
+at each --shadow-sample fraction. With --audit, compares them without
+and with the audit log (src/audit.py) at each fsync policy.
+
+Usage:
+    python benchmark_host.py [--commands N] [--concurrent N] [--seed N] [--engine lite]
+    python benchmark_host.py --shadow-kb kb.json [--shadow-sample 0.1 1.0]
+    python benchmark_host.py --audit
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_engines import make_sessions
+from src.audit import FSYNC_POLICIES
+
+
+CONFIGURATIONS = {
+    'python': ['--gc-threshold', '700,10,10', '--no-gc-freeze', '--engine-pool', '0'],
+    'freeze': ['--gc-threshold', '700,10,10', '--engine-pool', '0'],
+    'pool': ['--gc-threshold', '700,10,10'],
+    'tuned': [],
+}
+
+
+def run_load(options, commands, concurrent, answers, seed):
+    """
+    Drive one host process; returns (latencies in ms, add_symptom latencies
+    in ms, final metrics).
+    """
+    process = subprocess.Popen([sys.executable, 'main.py', '--host', *options],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               text=True, bufsize=1)
+
+    def send(command):
+        process.stdin.write(json.dumps(command) + '\n')
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    rng = random.Random(seed)
+    scripts = iter(make_sessions(commands, answers, seed))
+    latencies = []
+    answer_latencies = []
+
+    def timed(command):
+        start = time.perf_counter()
+        response = send(command)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if command['action'] == 'add_symptom':
+            answer_latencies.append(latencies[-1])
+        return response
+
+    def open_session(timing=True):
+        command = {'action': 'start'}
+        session_id = (timed(command) if timing else send(command))['session_id']
+        return [session_id, list(next(scripts))]
+
+    try:
+        # Opening the first sessions builds their engines; not timed
+        open_sessions = [open_session(timing=False) for _ in range(concurrent)]
+        while len(latencies) < commands:
+            session = rng.choice(open_sessions)
+            session_id, remaining = session
+            if remaining:
+                symptom, certainty = remaining.pop()
+                timed({'action': 'add_symptom', 'session_id': session_id,
+                       'symptom': symptom, 'certainty': certainty})
+            else:
+                timed({'action': 'get_diagnosis', 'session_id': session_id})
+                timed({'action': 'end_session', 'session_id': session_id})
+                session[:] = open_session()
+        metrics = send({'action': 'metrics'})['metrics']
+    finally:
+        process.stdin.close()
+        process.wait()
+    return np.asarray(latencies), np.asarray(answer_latencies), metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark GC settings of main.py --host')
+    parser.add_argument('--commands', type=int, default=20000,
+                        help='Commands per configuration (default: 20000)')
+    parser.add_argument('--concurrent', type=int, default=200,
+                        help='Sessions kept open (default: 200)')
+    parser.add_argument('--answers', type=int, default=12,
+                        help='Answers per session (default: 12)')
+    parser.add_argument('--engine', default='experta', help='Engine backend')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--shadow-kb', metavar='PATH',
+                        help='Measure shadow evaluation of this candidate knowledge base')
+    parser.add_argument('--shadow-sample', type=float, nargs='+', default=[0.1, 1.0],
+                        metavar='F', help='Shadowed fractions of sessions (default: 0.1 1.0)')
+    parser.add_argument('--audit', action='store_true',
+                        help='Measure the audit log at each fsync policy')
+    args = parser.parse_args(argv)
+
+    configurations = CONFIGURATIONS
+    log_directory = tempfile.TemporaryDirectory()
+    if args.shadow_kb:
+        configurations = {'tuned': []}
+        for sample in args.shadow_sample:
+            configurations[f'shadow {sample:g}'] = [
+                '--shadow-kb', args.shadow_kb, '--shadow-sample', str(sample),
+                '--shadow-log', os.path.join(log_directory.name, f'shadow-{sample:g}.jsonl')]
+    elif args.audit:
+        configurations = {'tuned': []}
+        for policy in FSYNC_POLICIES:
+            configurations[f'audit {policy}'] = [
+                '--audit', os.path.join(log_directory.name, policy), '--audit-fsync', policy]
+
+    print(f"{args.commands} commands, {args.concurrent} open sessions, "
+          f"{args.answers} answers each ({args.engine})")
+    print(f"{'':<16}{'all commands (ms)':^32}{'add_symptom (ms)':^16}   {'collections':^18}")
+    print(f"{'config':<16}{'p50':>8}{'p99':>8}{'p99.9':>8}{'max':>8}{'p50':>8}{'p99':>8}   "
+          f"{'gen0':>6}{'gen1':>6}{'gen2':>6}{'gc ms':>8}{'gc max':>8}")
+    shadow_reports = {}
+    audit_reports = {}
+    for name, options in configurations.items():
+        latencies, answers, metrics = run_load(options + ['--engine', args.engine], args.commands,
+                                               args.concurrent, args.answers, args.seed)
+        p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+        answer_p50, answer_p99 = np.percentile(answers, [50, 99])
+        generations = metrics['gc']['generations']
+        print(f"{name:<16}{p50:>8.2f}{p99:>8.2f}{p999:>8.2f}{latencies.max():>8.2f}"
+              f"{answer_p50:>8.2f}{answer_p99:>8.2f}   "
+              + ''.join(f"{g['collections']:>6}" for g in generations)
+              + f"{sum(g['total_ms'] for g in generations):>8.1f}"
+              + f"{max(g['max_ms'] for g in generations):>8.2f}")
+        if 'shadow' in metrics:
+            shadow_reports[name] = metrics['shadow']
+        if 'audit' in metrics:
+            audit_reports[name] = metrics['audit']
+    for name, report in shadow_reports.items():
+        print(f"{name}: {report['submitted']} evaluations queued, {report['dropped']} dropped, "
+              f"{report['diverged']} diverged ({report['top_changed']} top changed); "
+              f"{report['primary_us_per_answer']} us per answer on the request loop, "
+              f"{report['worker_ms']:.0f} ms on the worker")
+    for name, report in audit_reports.items():
+        print(f"{name}: {report['events']} events in {report['batches']} batches, "
+              f"{report['bytes_written'] / 1024:.0f} KiB written, {report['stalls']} stalls; "
+              f"{report['flush_ms']:.0f} ms on the flush thread")
+    log_directory.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Report on (or remove) a shared diagnosis cache.
+
+Usage:
+    python cache_stats.py NAME
+    python cache_stats.py NAME --json
+    python cache_stats.py NAME --unlink
+
+NAME is the segment name given to main.py --shared-cache. Reports slot
+occupancy, hit rate, inserts and evictions, as counted by all engine
+processes using the cache. --unlink removes the segment; processes still
+attached keep using their mapping, new ones create a fresh cache.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.shared_cache import SharedResultCache, shared_cache_exists
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('name', help='Shared cache name (main.py --shared-cache)')
+    parser.add_argument('--json', action='store_true', help='Print the statistics as JSON')
+    parser.add_argument('--unlink', action='store_true', help='Remove the shared cache')
+    args = parser.parse_args(argv)
+
+    # Opening a missing cache would create it
+    if not shared_cache_exists(args.name):
+        print(f"No shared cache named {args.name}", file=sys.stderr)
+        return 1
+
+    cache = SharedResultCache(args.name)
+    stats = cache.stats()
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print(f"Shared cache {stats['name']}: {stats['occupied']} of {stats['slots']} slots "
+              f"used ({stats['occupancy']:.1%})")
+        print(f"  hits {stats['hits']}, misses {stats['misses']} "
+              f"(hit rate {stats['hit_rate']:.1%})")
+        print(f"  inserts {stats['inserts']}, evictions {stats['evictions']}, "
+              f"skipped {stats['skipped']}")
+    if args.unlink:
+        cache.unlink()
+        print(f"Removed {args.name}", file=sys.stderr)
+    cache.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
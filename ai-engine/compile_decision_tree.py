@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Compile the question flow into a decision tree for ``main.py --decision-tree``.
+
+Usage:
+    python compile_decision_tree.py --output flow_tree.json
+    python compile_decision_tree.py --levels 0 0.25 0.5 0.75 1 --max-depth 10 \\
+        --output flow_tree.json --sessions sessions.jsonl
+
+The sessions file holds one recorded session per line:
+    {"answers": [{"symptom": "fever", "certainty": 1.0}, ...]}
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.decision_tree import DEFAULT_LEVELS, compile_question_flow
+
+
+def load_sessions(path):
+    """Load recorded answer sequences from a JSONL file."""
+    sessions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            sessions.append([
+                (answer['symptom'], answer.get('certainty', 1.0))
+                for answer in record.get('answers', [])
+            ])
+    return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', '-o', required=True, help='Where to write the tree (JSON)')
+    parser.add_argument('--levels', type=float, nargs='+', default=list(DEFAULT_LEVELS),
+                        help='Certainty levels an answer can take (default: %(default)s)')
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help='Maximum number of answers to expand (default: no limit)')
+    parser.add_argument('--sessions', help='JSONL file of real sessions to measure coverage against')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tree = compile_question_flow(levels=args.levels, max_depth=args.max_depth)
+    elapsed = time.perf_counter() - start
+    tree.save(args.output)
+
+    size = tree.size()
+    print(f"Compiled question flow in {elapsed:.2f}s")
+    print(f"  Levels:         {', '.join(str(level) for level in tree.levels)}")
+    print(f"  Nodes:          {size['nodes']}")
+    print(f"  Edges:          {size['edges']}")
+    print(f"  Frontier nodes: {size['frontier']}")
+    print(f"  Merged states:  {tree.stats['merged_states']}")
+    print(f"  File size:      {os.path.getsize(args.output) / 1024:.1f} KiB ({args.output})")
+
+    if args.sessions:
+        report = tree.coverage(load_sessions(args.sessions))
+        print(f"Coverage of {report['sessions']} recorded sessions:")
+        print(f"  Sessions fully served: {report['covered_sessions']} "
+              f"({report['session_coverage']:.1%})")
+        print(f"  Answers served:        {report['served_answers']}/{report['answers']} "
+              f"({report['answer_coverage']:.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Export, check or re-stamp a knowledge base artifact.
+
+Usage:
+    python export_knowledge_base.py kb.json
+    python export_knowledge_base.py --check kb.json
+    python export_knowledge_base.py --stamp kb.json
+
+Without an option, writes the built-in knowledge base (the rules, question
+templates, disease info and symptom priorities) to the given path. Edit
+the artifact and load it into a running engine with the reload_kb action,
+or start one on it with main.py --kb. --check validates an artifact and
+prints its version; --stamp validates an edited artifact and rewrites it
+with the version of its new content.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='Knowledge base artifact (JSON)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--check', action='store_true', help='Validate the artifact at path')
+    mode.add_argument('--stamp', action='store_true',
+                      help='Validate the artifact at path and rewrite it with its new version')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.check:
+            knowledge_base = KnowledgeBase.load(args.path)
+        elif args.stamp:
+            with open(args.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                data.pop('version', None)
+            knowledge_base = KnowledgeBase.from_dict(data)
+            knowledge_base.save(args.path)
+        else:
+            knowledge_base = builtin_knowledge_base()
+            knowledge_base.save(args.path)
+    except (OSError, ValueError) as e:
+        print(f"Invalid knowledge base {args.path}: {e}", file=sys.stderr)
+        return 1
+
+    summary = knowledge_base.summary()
+    print(f"{args.path}: version {summary['version']}, {summary['rules']} rules, "
+          f"{summary['diseases']} diseases, {summary['questions']} questions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
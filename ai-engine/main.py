@@ -5,18 +5,497 @@ Provides a stdin/stdout interface for communication with the Node.js backend.
 
 import sys
 import json
-from src.engine import MedicalDiagnosisEngine
+import argparse
+import threading
+import tracemalloc
+import uuid
+from src.engine import ENGINE_BACKENDS, create_engine
+from src.question_engine import format_question
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+from src.patient_context import parse_patient
+from src.rules.specs import RULE_SPECS
+from src.sensitivity import DEFAULT_GRID, analyze_sensitivity
+from src.uncertainty import MAX_SAMPLES, NOISE_MODELS, analyze_uncertainty
+from src.diagnostics import MAX_PROFILE_SECONDS, SamplingProfiler, memory_report
+from src.shared_cache import DEFAULT_MAX_DISEASES, DEFAULT_SLOTS, SharedResultCache
+from src.host import (DEFAULT_GC_THRESHOLDS, DEFAULT_POOL_SIZE, DEFAULT_SESSION_TTL, EngineHost,
+                      parse_gc_thresholds, parse_session_ttls)
+from src.session_snapshots import SessionSnapshots, snapshot_record
+from src.speculation import DEFAULT_CERTAINTIES, Speculator, parse_certainties
+from src.shadow import DEFAULT_MAX_CPU, DEFAULT_SAMPLE, ShadowEvaluator
+from src.audit import DEFAULT_FSYNC, DEFAULT_MAX_FILE_BYTES, FSYNC_POLICIES, AuditLog
+from src.admission import (DEFAULT_MAX_IN_FLIGHT, DEFAULT_MAX_SESSION_QUEUE, DEFAULT_MAX_SESSIONS,
+                           AdmissionControl, Request)
+from src.oneshot import (DEFAULT_CACHE_SIZE, DiagnosisCache, diagnose_answers, diagnosis_key,
+                         quantize_answers)
 
 
-def main():
+# Actions that act on a session; with --host they need a session_id
+SESSION_ACTIONS = {'add_symptom', 'edit_answer', 'undo', 'get_diagnosis', 'sensitivity',
+                   'explain'}
+
+# Actions after which a session has a new pending question (--speculate)
+SPECULATED_ACTIONS = {'start', 'add_symptom', 'edit_answer', 'undo'}
+
+# Actions whose questions and rankings go to the audit log
+AUDITED_ACTIONS = {'start', 'add_symptom', 'edit_answer', 'undo', 'get_diagnosis'}
+
+
+def parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description='Medical diagnosis engine (stdin/stdout JSON)')
+    parser.add_argument(
+        '--decision-tree', metavar='PATH',
+        help='Serve answers from a decision tree compiled by compile_decision_tree.py; '
+             'answers outside the tree fall back to live inference'
+    )
+    parser.add_argument(
+        '--top-k', type=int, metavar='K',
+        help='Only rank the K most likely diagnoses and skip rules that cannot change them'
+    )
+    parser.add_argument(
+        '--skip-dominated', action='store_true',
+        help='Fire stronger rules first and skip dominated or subsumed rules '
+             'that can no longer change a diagnosis (see analyze_rules.py)'
+    )
+    parser.add_argument(
+        '--engine', choices=sorted(ENGINE_BACKENDS), default='experta',
+        help='Forward-chaining engine to run the rules on: experta (Rete) or lite '
+             '(indexed by symptom name, faster to create and reset)'
+    )
+    parser.add_argument(
+        '--compiled-rules', action='store_true',
+        help='Evaluate the rules with code generated from the rule base '
+             '(cached in .rule_cache/ by rule base hash, see src/codegen.py)'
+    )
+    parser.add_argument(
+        '--record', metavar='PATH',
+        help='Append every command and response, with timestamps, to PATH '
+             '(JSON Lines; replay with replay_traffic.py)'
+    )
+    parser.add_argument(
+        '--oneshot', action='store_true',
+        help='Read one diagnose request (the whole of stdin), answer it and exit'
+    )
+    parser.add_argument(
+        '--diagnose-cache', type=int, metavar='N', default=DEFAULT_CACHE_SIZE,
+        help='Keep the results of the last N diagnose requests by input hash '
+             f'(default: {DEFAULT_CACHE_SIZE}; 0 disables the cache)'
+    )
+    parser.add_argument(
+        '--shared-cache', metavar='NAME',
+        help='Share diagnose results with every engine process on this host using '
+             'the same NAME (a shared memory segment, see src/shared_cache.py)'
+    )
+    parser.add_argument(
+        '--shared-cache-slots', type=int, metavar='N', default=DEFAULT_SLOTS,
+        help=f'Slots of the shared cache when this process creates it (default: {DEFAULT_SLOTS})'
+    )
+    parser.add_argument(
+        '--shared-cache-diseases', type=int, metavar='N', default=DEFAULT_MAX_DISEASES,
+        help='Diseases a shared cache slot holds when this process creates it; results '
+             f'with more are not shared (default: {DEFAULT_MAX_DISEASES})'
+    )
+    parser.add_argument(
+        '--host', action='store_true',
+        help='Host many concurrent sessions, addressed by the session_id returned '
+             'by start, with GC tuned for a long-running process (see src/host.py)'
+    )
+    parser.add_argument(
+        '--gc-threshold', metavar='G0,G1,G2', type=parse_gc_thresholds,
+        help='GC thresholds for --host (default: '
+             f'{",".join(map(str, DEFAULT_GC_THRESHOLDS))}; 700,10,10 is Python\'s)'
+    )
+    parser.add_argument(
+        '--no-gc-freeze', action='store_true',
+        help='With --host, do not gc.freeze() the shared structures built at start-up'
+    )
+    parser.add_argument(
+        '--engine-pool', type=int, metavar='N', default=DEFAULT_POOL_SIZE,
+        help='With --host, keep up to N engines of ended sessions for reuse '
+             f'(default: {DEFAULT_POOL_SIZE}; 0 builds a new engine per session)'
+    )
+    parser.add_argument(
+        '--max-sessions', type=int, metavar='N', default=DEFAULT_MAX_SESSIONS,
+        help='With --host, reject start with OVERLOADED while N sessions are open '
+             f'(default: {DEFAULT_MAX_SESSIONS}; 0 for no limit, see src/admission.py)'
+    )
+    parser.add_argument(
+        '--max-session-queue', type=int, metavar='N', default=DEFAULT_MAX_SESSION_QUEUE,
+        help='With --host, shed a request with OVERLOADED when N requests of its session '
+             f'are already waiting (default: {DEFAULT_MAX_SESSION_QUEUE}; 0 for no limit)'
+    )
+    parser.add_argument(
+        '--max-in-flight', type=int, metavar='N', default=DEFAULT_MAX_IN_FLIGHT,
+        help='With --host, shed new requests with OVERLOADED while N are waiting or '
+             f'being served (default: {DEFAULT_MAX_IN_FLIGHT}; 0 for no limit)'
+    )
+    parser.add_argument(
+        '--session-ttl', metavar='SECONDS[,ACTION=SECONDS...]',
+        type=lambda value: parse_session_ttls(value, SESSION_ACTIONS | {'start'}),
+        default={'default': DEFAULT_SESSION_TTL},
+        help='With --host, end a session once it has been idle this long after its last '
+             f'request, per action (default: {DEFAULT_SESSION_TTL:g}; e.g. 600,start=60; '
+             '0 never expires)'
+    )
+    parser.add_argument(
+        '--session-snapshots', metavar='DIR',
+        help='With --host, write expiring sessions to DIR and bring them back on their next '
+             'request (see src/session_snapshots.py)'
+    )
+    parser.add_argument(
+        '--speculate', metavar='CERTAINTIES', nargs='?', const=DEFAULT_CERTAINTIES,
+        type=parse_certainties,
+        help='With --host, work out the responses to these answers to each pending question '
+             'while idle, and answer a matching add_symptom from them (default: '
+             f'{",".join(f"{c:g}" for c in DEFAULT_CERTAINTIES)}; see src/speculation.py)'
+    )
+    parser.add_argument(
+        '--no-trace', action='store_true',
+        help='Do not keep the explanation of each diagnosis that the explain action '
+             'returns (see src/explain.py)'
+    )
+    parser.add_argument(
+        '--kb', metavar='PATH',
+        help='Run the knowledge base artifact at PATH instead of the built-in rules and '
+             'question tables (see export_knowledge_base.py); reload_kb swaps it at run time'
+    )
+    parser.add_argument(
+        '--shadow-kb', metavar='PATH',
+        help='With --host, also diagnose the answers of sampled sessions with the candidate '
+             'knowledge base at PATH, on a worker thread, and log where it disagrees '
+             '(see src/shadow.py)'
+    )
+    parser.add_argument(
+        '--shadow-log', metavar='PATH', default='shadow-divergence.jsonl',
+        help='Divergence log of --shadow-kb (JSON Lines; default: shadow-divergence.jsonl)'
+    )
+    parser.add_argument(
+        '--shadow-sample', type=float, metavar='F', default=DEFAULT_SAMPLE,
+        help=f'Fraction of sessions shadowed (default: {DEFAULT_SAMPLE})'
+    )
+    parser.add_argument(
+        '--shadow-max-cpu', type=float, metavar='F', default=DEFAULT_MAX_CPU,
+        help=f'Largest share of the time the shadow worker runs (default: {DEFAULT_MAX_CPU})'
+    )
+    parser.add_argument(
+        '--audit', metavar='DIR',
+        help='Record every session event (questions, answers, rule firings, rankings) in '
+             'compressed append-only files in DIR (read with read_audit.py, see src/audit.py)'
+    )
+    parser.add_argument(
+        '--audit-fsync', choices=FSYNC_POLICIES, default=DEFAULT_FSYNC,
+        help='When audit files are synced to disk: every batch, at most once a second '
+             f'(interval) or never (default: {DEFAULT_FSYNC})'
+    )
+    parser.add_argument(
+        '--audit-max-mb', type=float, metavar='N', default=DEFAULT_MAX_FILE_BYTES / 2 ** 20,
+        help='Start a new audit file once the current one reaches N MiB '
+             f'(default: {DEFAULT_MAX_FILE_BYTES // 2 ** 20})'
+    )
+    args = parser.parse_args(argv)
+    if args.shadow_kb and (not args.host or args.decision_tree or args.top_k):
+        parser.error('--shadow-kb needs --host, and cannot be used with --decision-tree or '
+                     '--top-k (whose diagnoses outside the top k are not exact)')
+    if min(args.max_sessions, args.max_session_queue, args.max_in_flight) < 0:
+        parser.error('--max-sessions, --max-session-queue and --max-in-flight must not be negative')
+    if args.session_snapshots and not args.host:
+        parser.error('--session-snapshots needs --host')
+    if args.speculate and (not args.host or args.decision_tree):
+        parser.error('--speculate needs --host, and cannot be used with --decision-tree '
+                     '(whose sessions answer from the tree already)')
+    if args.kb and args.decision_tree:
+        parser.error('--kb cannot be used with --decision-tree, which is compiled from '
+                     'the built-in knowledge base')
+    return args
+
+
+def format_diagnosis(results):
+    """Convert (disease, certainty) tuples into the response format."""
+    return [
+        {'disease': disease, 'certainty': certainty}
+        for disease, certainty in results
+    ]
+
+
+def validate_answer(data):
+    """
+    Validate the symptom and certainty of an answer request.
+    
+    Returns:
+        dict: An error response, or None if the answer is valid
+    """
+    symptom = data.get('symptom')
+    certainty = data.get('certainty', 1.0)
+    if not symptom:
+        return {
+            'status': 'error',
+            'message': 'Symptom name is required',
+            'error_code': 'MISSING_SYMPTOM'
+        }
+    if not isinstance(certainty, (int, float)):
+        return {
+            'status': 'error',
+            'message': f'Certainty must be a number, got {type(certainty).__name__}',
+            'error_code': 'INVALID_CERTAINTY_TYPE'
+        }
+    if certainty < 0.0 or certainty > 1.0:
+        return {
+            'status': 'error',
+            'message': f'Certainty must be between 0.0 and 1.0, got {certainty}',
+            'error_code': 'CERTAINTY_OUT_OF_RANGE'
+        }
+    return None
+
+
+def question_for(engine, symptom):
+    """The question about a symptom, in the wording of the session's knowledge base."""
+    knowledge_base = engine.knowledge_base
+    return format_question(symptom, knowledge_base.question_templates
+                           if knowledge_base is not None else None)
+
+
+def rule_specs_of(engine):
+    """The rules a session runs (those of its patient context, if it has one)."""
+    specs = getattr(engine, 'rule_specs', None)
+    if specs is not None:
+        return specs
+    knowledge_base = engine.knowledge_base
+    return knowledge_base.specs if knowledge_base is not None else RULE_SPECS
+
+
+def load_knowledge_base(path):
+    """
+    Load a knowledge base artifact and compile its rules. An artifact that
+    cannot be read, is invalid or whose rules do not compile is an
+    INVALID_KNOWLEDGE_BASE error, whether at startup (--kb) or in reload_kb.
+    
+    Returns:
+        tuple: (KnowledgeBase, None), or (None, an error response)
+    """
+    if not isinstance(path, str) or not path:
+        return None, {
+            'status': 'error',
+            'message': 'A path to a knowledge base artifact is required',
+            'error_code': 'INVALID_KNOWLEDGE_BASE'
+        }
+    try:
+        knowledge_base = KnowledgeBase.load(path)
+        knowledge_base.compiled_rules  # Generate the code now, not in a session
+    except (OSError, ValueError) as e:
+        return None, {
+            'status': 'error',
+            'message': f'Cannot load knowledge base {path}: {e}',
+            'error_code': 'INVALID_KNOWLEDGE_BASE'
+        }
+    return knowledge_base, None
+
+
+def parse_start_patient(data, decision_tree=None):
+    """
+    Validate the patient context of a start request.
+    
+    Returns:
+        (patient or None, None) or (None, error response)
+    """
+    if data.get('patient') is None:
+        return None, None
+    if decision_tree:
+        message = 'Patient context is not supported with --decision-tree'
+    else:
+        try:
+            return parse_patient(data['patient']), None
+        except ValueError as e:
+            message = str(e)
+    return None, {
+        'status': 'error',
+        'message': message,
+        'error_code': 'INVALID_PATIENT'
+    }
+
+
+def progress_response(engine, message):
+    """Build the response after an answer: the next question, or the diagnosis."""
+    if engine.should_continue_asking():
+        next_question = engine.get_next_question()
+        if next_question:
+            return {
+                'status': 'success',
+                'message': message,
+                'next_question': next_question
+            }
+    # No more questions, provide diagnosis
+    return {
+        'status': 'success',
+        'diagnosis': format_diagnosis(engine.get_diagnosis_results())
+    }
+
+
+def parse_symptom_map(symptoms):
+    """
+    Validate the answers of a diagnose request.
+    
+    Returns:
+        tuple: (answers as (symptom, certainty) pairs, None), or (None, an
+        error response)
+    """
+    if not isinstance(symptoms, dict):
+        return None, {
+            'status': 'error',
+            'message': 'Symptoms must be an object mapping symptom names to certainties',
+            'error_code': 'INVALID_SYMPTOMS'
+        }
+    for symptom, certainty in symptoms.items():
+        error = validate_answer({'symptom': symptom, 'certainty': certainty})
+        if error is not None:
+            error['message'] += f' (symptom {symptom})'
+            return None, error
+    return list(symptoms.items()), None
+
+
+def diagnose_response(data, get_engine, cache=None, shared_cache=None, variant=''):
+    """
+    Answer a diagnose request: the ranked diagnosis of a complete answer set.
+    
+    Results are looked up in (and added to) the process's ``cache``, then
+    the ``shared_cache`` of all workers, by input hash, which is also
+    returned so that callers can cache them. ``get_engine`` is only called
+    on a miss.
+    """
+    answers, error = parse_symptom_map(data.get('symptoms'))
+    if error is not None:
+        return error
+    answers = quantize_answers(answers)
+    key = diagnosis_key(answers, variant)
+    results = cache.get(key) if cache is not None else None
+    if results is None and shared_cache is not None:
+        results = shared_cache.get(key)
+        if results is not None and cache is not None:
+            cache.put(key, results)
+    if results is None:
+        results = diagnose_answers(get_engine(), answers)
+        if cache is not None:
+            cache.put(key, results)
+        if shared_cache is not None:
+            shared_cache.put(key, results)
+    return {
+        'status': 'success',
+        'diagnosis': format_diagnosis(results),
+        'input_hash': key
+    }
+
+
+def oneshot_response(text, get_engine, shared_cache=None, variant=''):
+    """Answer the single request of --oneshot mode (action defaults to diagnose)."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return {
+            'status': 'error',
+            'message': f'Invalid JSON input: {str(e)}',
+            'error_code': 'INVALID_JSON'
+        }
+    if not isinstance(data, dict) or data.get('action', 'diagnose') != 'diagnose':
+        return {
+            'status': 'error',
+            'message': 'Only the diagnose action is served with --oneshot',
+            'error_code': 'INVALID_ACTION'
+        }
+    return diagnose_response(data, get_engine, shared_cache=shared_cache, variant=variant)
+
+
+def parse_grid(grid):
+    """
+    Validate the certainty grid of a sensitivity request.
+    
+    Returns:
+        list: The grid, or None if it is not a non-empty list of numbers in [0, 1]
+    """
+    if not isinstance(grid, list) or not grid:
+        return None
+    for value in grid:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        if value < 0.0 or value > 1.0:
+            return None
+    return [float(value) for value in grid]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_uncertainty(options):
+    """
+    Validate the uncertainty options of a get_diagnosis request.
+    
+    ``true`` selects the defaults; an object may set samples (1 to
+    MAX_SAMPLES), noise (a model in NOISE_MODELS), scale (0.0 to 1.0),
+    percentiles (numbers from 0 to 100) and seed (an integer).
+    
+    Returns:
+        dict: Keyword arguments for analyze_uncertainty, or None if invalid
+    """
+    if options is True:
+        return {}
+    if not isinstance(options, dict):
+        return None
+    checks = {
+        'samples': lambda v: isinstance(v, int) and not isinstance(v, bool)
+                             and 1 <= v <= MAX_SAMPLES,
+        'noise': lambda v: v in NOISE_MODELS,
+        'scale': lambda v: _is_number(v) and 0.0 <= v <= 1.0,
+        'percentiles': lambda v: isinstance(v, list) and bool(v)
+                                 and all(_is_number(p) and 0 <= p <= 100 for p in v),
+        'seed': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    }
+    for key, value in options.items():
+        if key not in checks or not checks[key](value):
+            return None
+    return dict(options)
+
+
+def parse_profile_options(data):
+    """
+    Validate the options of a profile request that starts profiling.
+    
+    Returns:
+        tuple: (seconds, interval in seconds, output path), or None if invalid
+    """
+    seconds = data.get('seconds', 10)
+    interval_ms = data.get('interval_ms', 5)
+    output = data.get('output')
+    if not _is_number(seconds) or not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return None
+    if not _is_number(interval_ms) or not 1 <= interval_ms <= 1000:
+        return None
+    if output is not None and not isinstance(output, str):
+        return None
+    return float(seconds), interval_ms / 1000, output
+
+
+def main(argv=None):
     """
     Main function that handles stdin/stdout communication.
     
     Expected input format (JSON):
     {
-        "action": "start" | "add_symptom" | "get_diagnosis",
-        "symptom": "symptom_name",  // for add_symptom action
-        "certainty": 0.8  // for add_symptom action (0.0 to 1.0)
+        "action": "start" | "add_symptom" | "edit_answer" | "undo" | "get_diagnosis" |
+                  "sensitivity" | "diagnose" | "profile" | "memory" | "end_session" |
+                  "metrics" | "reload_kb",
+        "session_id": "...",  // with --host, for session actions and end_session
+        "patient": {"age": 35, "gender": "male", "existing_conditions": ["asthma"]},
+                        // optional, for start action
+        "symptom": "symptom_name",  // for add_symptom / edit_answer actions
+        "certainty": 0.8,  // for add_symptom / edit_answer actions (0.0 to 1.0)
+        "steps": 1,  // optional, for undo action
+        "grid": [0.0, 0.5, 1.0],  // optional, for sensitivity action
+        "symptoms": {"fever": 0.9, "cough": 0.6},  // for diagnose action
+        "uncertainty": {"samples": 2000},  // optional, for get_diagnosis action
+        "seconds": 10,  // optional, for profile action (also interval_ms, output,
+                        // collect, stop)
+        "top": 10,  // optional, for memory action (also trace)
+        "path": "kb.json"  // for reload_kb action
     }
     
     Output format (JSON):
@@ -33,19 +512,266 @@ def main():
         "message": "Error message"  // if error
     }
     """
+    args = parse_args(argv)
+    
+    plan = None
+    if args.skip_dominated:
+        from src.rule_analysis import analyze_rules
+        plan = analyze_rules()
+    compiled_rules = None
+    if args.compiled_rules:
+        from src.codegen import load_compiled_rules
+        compiled_rules = load_compiled_rules()
+    
+    # The knowledge base new sessions run (None = built-in); reload_kb
+    # replaces it, sessions already started keep theirs
+    knowledge_base = None
+    if args.kb:
+        knowledge_base, error = load_knowledge_base(args.kb)
+        if error is not None:
+            print(error['message'], file=sys.stderr)
+            sys.exit(2)
+    
+    def knowledge_base_version():
+        return (knowledge_base or builtin_knowledge_base()).version
+    
+    def make_inference_engine(trace=not args.no_trace):
+        return create_engine(args.engine, top_k=args.top_k or None, plan=plan,
+                             compiled_rules=compiled_rules, knowledge_base=knowledge_base,
+                             trace=trace)
     
-    engine = MedicalDiagnosisEngine()
+    if args.decision_tree:
+        from src.decision_tree import DecisionTree, DecisionTreeSession
+        tree = DecisionTree.load(args.decision_tree)
+        
+        def make_engine():
+            return DecisionTreeSession(tree, engine_factory=lambda: create_engine(args.engine))
+    else:
+        make_engine = make_inference_engine
+    
+    # diagnose requests run on their own engine, built on the first cache
+    # miss, so they never touch a session; options that change results
+    # (and a loaded knowledge base's version) are part of the cache key
+    oneshot_engine = None
+    
+    def cache_variant():
+        options = [f'top_k={args.top_k}'] if args.top_k else []
+        if knowledge_base is not None:
+            options.append(f'kb={knowledge_base.version}')
+        return ','.join(options)
+    
+    oneshot_variant = cache_variant()
+    diagnosis_cache = DiagnosisCache(args.diagnose_cache)
+    shared_cache = None
+    if args.shared_cache:
+        shared_cache = SharedResultCache(args.shared_cache, args.shared_cache_slots,
+                                         args.shared_cache_diseases, knowledge_base)
+    
+    def get_oneshot_engine():
+        nonlocal oneshot_engine
+        if oneshot_engine is None:
+            oneshot_engine = make_inference_engine(trace=False)
+        return oneshot_engine
+    
+    # One engine, or (with --host) one per session, with the requests
+    # queued and shed over the limits
+    host = None
+    engine = None
+    admission = None
+    if args.host:
+        thresholds = args.gc_threshold if args.gc_threshold is not None else DEFAULT_GC_THRESHOLDS
+        host = EngineHost(make_engine, gc_thresholds=thresholds, freeze=not args.no_gc_freeze,
+                          pool_size=max(args.engine_pool, 0), version=knowledge_base_version(),
+                          session_ttls=args.session_ttl)
+        host.prepare()
+        admission = AdmissionControl(args.max_sessions, args.max_session_queue,
+                                     args.max_in_flight)
+        if host.wheel is not None:
+            admission.wake_interval = host.wheel.tick  # Expire sessions while idle too
+    elif not args.oneshot:
+        engine = make_engine()
+    
+    # Expired sessions, kept to be brought back (--session-snapshots)
+    snapshots = SessionSnapshots(args.session_snapshots) if args.session_snapshots else None
+    
+    # Responses to the likely answers of pending questions (--speculate)
+    speculation = None
+    if args.speculate:
+        def speculate(engine, symptom, certainty):
+            """The response to an answer, worked out and then undone."""
+            engine.answer(symptom, certainty)
+            try:
+                return progress_response(engine, 'Symptom recorded')
+            finally:
+                engine.undo()
+        
+        speculation = Speculator(speculate, args.speculate)
+    
+    # Candidate knowledge base evaluated alongside the sessions (--shadow-kb)
+    shadow = None
+    if args.shadow_kb:
+        candidate, error = load_knowledge_base(args.shadow_kb)
+        if error is not None:
+            print(error['message'], file=sys.stderr)
+            sys.exit(2)
+        try:
+            shadow = ShadowEvaluator(candidate, args.shadow_log, sample=args.shadow_sample,
+                                     max_cpu=args.shadow_max_cpu)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+        shadow.start()
+    
+    def shadow_answer(engine, session_id):
+        """Queue the session's new state for the shadow worker, if it is sampled."""
+        if shadow is not None:
+            shadow.submit(session_id, engine, host.session_versions.get(session_id))
+    
+    # Session events, written out by a background thread (--audit)
+    audit = None
+    audit_session = None  # Without --host, the id the audit log gives the session
+    if args.audit:
+        audit = AuditLog(args.audit, fsync=args.audit_fsync,
+                         max_file_bytes=int(args.audit_max_mb * 2 ** 20))
+        audit.start()
+    
+    def audited_session(data):
+        return data.get('session_id') if host is not None else audit_session
+    
+    def engine_version(engine):
+        return (engine.knowledge_base or builtin_knowledge_base()).version
+    
+    def audit_response(session_id, response):
+        """Record the question asked or the ranking given in a response."""
+        question = response.get('next_question')
+        if question:
+            audit.record(session_id, 'question', symptom=question['symptom'],
+                         text=question['text'])
+        if 'diagnosis' in response:
+            audit.record(session_id, 'diagnosis', diagnosis=[
+                [entry['disease'], entry['certainty']] for entry in response['diagnosis']])
+    
+    def expire_session(session_id, engine):
+        """Snapshot (and audit) a session whose TTL has passed."""
+        admission.session_ended()
+        if snapshots is not None:
+            snapshots.save(snapshot_record(
+                session_id, engine, host.session_versions[session_id],
+                host.clock() - host.session_opened[session_id]))
+        if speculation is not None:
+            speculation.cancel(session_id)
+        if audit is not None:
+            audit.record(session_id, 'end', expired=True)
+    
+    def restore_session(session_id):
+        """
+        Bring an expired session back from its snapshot, on the current
+        knowledge base. Returns (engine, None), (None, OVERLOADED response),
+        or (None, None) if it has no snapshot.
+        """
+        record = snapshots.load(session_id) if snapshots is not None else None
+        if record is None:
+            return None, None
+        overloaded = admission.admit_session(len(host.sessions))
+        if overloaded is not None:
+            return None, overloaded
+        session_id, engine = host.open_session(session_id)
+        engine.reset_session()
+        if record['patient'] is not None:
+            engine.set_patient(parse_patient(record['patient']))
+        for symptom, certainty in record['answers']:
+            engine.answer(symptom, certainty)
+        snapshots.discard(session_id, restored=True)
+        if audit is not None:
+            audit.record(session_id, 'start', knowledge_base=engine_version(engine),
+                         restored=len(record['answers']))
+        return engine, None
+    
+    recorder = None
+    if args.record:
+        from src.traffic import TrafficRecorder
+        recorder = TrafficRecorder(args.record)
+    
+    # Live diagnostics: the profiler samples this thread, which serves requests
+    main_thread = threading.get_ident()
+    profiler = None
+    sessions_started = 0
+    
+    def respond(response):
+        """Write a response to stdout (and to the recording)."""
+        output = json.dumps(response)
+        if recorder is not None:
+            recorder.outbound(output)
+        print(output, flush=True)
     
     try:
-        # Read from stdin
-        for line in sys.stdin:
+        if args.oneshot:
+            text = sys.stdin.read()
+            if recorder is not None:
+                recorder.inbound(text)
+            respond(oneshot_response(text, get_oneshot_engine, shared_cache, oneshot_variant))
+            return
+        
+        # Read from stdin (with --host, through the admission queue)
+        if admission is not None:
+            admission.start(sys.stdin)
+            requests = admission
+        else:
+            requests = (Request(line, None, 0.0, None) for line in sys.stdin)
+        for request in requests:
+            if host is not None:
+                host.expire(expire_session)
+            if request is None:
+                continue  # Woken up to expire sessions
+            line = request.line
+            if request.shed is not None:
+                # Consecutive shed requests share an entry (and its first line)
+                for _ in range(request.count):
+                    if recorder is not None:
+                        recorder.inbound(line)
+                    respond(admission.overloaded(request.shed))
+                continue
+            if recorder is not None:
+                recorder.inbound(line)
+            responded = False  # Whether a speculated response went out already
             try:
                 data = json.loads(line.strip())
                 action = data.get('action')
                 
+                if host is not None and action in SESSION_ACTIONS:
+                    engine = host.get(data.get('session_id'))
+                    if engine is None:
+                        engine, overloaded = restore_session(data.get('session_id'))
+                        if overloaded is not None:
+                            respond(overloaded)
+                            continue
+                    if engine is None:
+                        respond({
+                            'status': 'error',
+                            'message': f"Unknown session: {data.get('session_id')}",
+                            'error_code': 'UNKNOWN_SESSION'
+                        })
+                        continue
+                    if speculation is not None and action in ('edit_answer', 'undo'):
+                        speculation.cancel(data['session_id'])
+                
                 if action == 'start':
-                    # Start a new diagnosis session
+                    # Start a new diagnosis session, optionally for a patient
+                    patient, error = parse_start_patient(data, args.decision_tree)
+                    if error is not None:
+                        respond(error)
+                        continue
+                    if host is not None:
+                        overloaded = admission.admit_session(len(host.sessions))
+                        if overloaded is not None:
+                            respond(overloaded)
+                            continue
+                        session_id, engine = host.open_session()
+                    elif engine.knowledge_base is not knowledge_base:
+                        engine = make_engine()  # A knowledge base was loaded since
                     engine.reset_session()
+                    context = engine.set_patient(patient) if patient is not None else None
+                    sessions_started += 1
                     
                     # Get the initial question
                     initial_question = engine.get_initial_question()
@@ -55,100 +781,369 @@ def main():
                         'message': 'Diagnosis session started',
                         'next_question': initial_question
                     }
+                    if host is not None:
+                        response['session_id'] = session_id
+                    if context is not None:
+                        response['context'] = context.describe()
+                    if audit is not None:
+                        if host is None:
+                            audit_session = uuid.uuid4().hex
+                        details = {'context': context.describe()['bucket']} if context else {}
+                        audit.record(response.get('session_id', audit_session), 'start',
+                                     knowledge_base=engine_version(engine), **details)
                 
                 elif action == 'add_symptom':
                     # Add a symptom to the knowledge base
                     symptom = data.get('symptom')
                     certainty = data.get('certainty', 1.0)
                     
-                    # Validate symptom parameter
-                    if not symptom:
+                    response = validate_answer(data)
+                    if response is None:
+                        speculated = None
+                        if speculation is not None:
+                            speculated = speculation.take(data['session_id'], symptom, certainty)
+                            if speculated is not None:
+                                # Worked out while idle: answer now, and bring
+                                # the engine up to date after
+                                respond(speculated)
+                                responded = True
+                        # Record the answer, add it to the knowledge base and
+                        # run the inference engine (checkpointed for undo)
+                        engine.answer(symptom, certainty)
+                        shadow_answer(engine, data.get('session_id'))
+                        if audit is not None:
+                            audit.answer(audited_session(data), symptom, certainty,
+                                         engine.get_answers(), rule_specs_of(engine))
+                        response = speculated or progress_response(engine, 'Symptom recorded')
+                
+                elif action == 'edit_answer':
+                    # Change an earlier answer
+                    symptom = data.get('symptom')
+                    certainty = data.get('certainty', 1.0)
+                    response = validate_answer(data)
+                    if response is None:
+                        if symptom not in dict(engine.get_answers()):
+                            response = {
+                                'status': 'error',
+                                'message': f'Symptom has not been answered: {symptom}',
+                                'error_code': 'NOT_ANSWERED'
+                            }
+                        else:
+                            engine.edit_answer(symptom, certainty)
+                            shadow_answer(engine, data.get('session_id'))
+                            if audit is not None:
+                                audit.answer(audited_session(data), symptom,
+                                             certainty, engine.get_answers(),
+                                             rule_specs_of(engine), edit=True)
+                            response = progress_response(engine, 'Answer updated')
+                
+                elif action == 'undo':
+                    # Revert the last answers (or edits)
+                    steps = data.get('steps', 1)
+                    if isinstance(steps, bool) or not isinstance(steps, int) or steps < 1:
                         response = {
                             'status': 'error',
-                            'message': 'Symptom name is required',
-                            'error_code': 'MISSING_SYMPTOM'
+                            'message': f'Steps must be a positive integer, got {steps}',
+                            'error_code': 'INVALID_STEPS'
                         }
-                    # Validate certainty parameter
-                    elif not isinstance(certainty, (int, float)):
+                    else:
+                        undone = []
+                        for _ in range(steps):
+                            checkpoint = engine.undo()
+                            if checkpoint is None:
+                                break
+                            undone.append(checkpoint)
+                            if audit is not None:
+                                audit.record(audited_session(data), 'undo',
+                                             symptom=checkpoint.symptom,
+                                             certainty=checkpoint.certainty,
+                                             restored=checkpoint.previous)
+                        
+                        if not undone:
+                            response = {
+                                'status': 'error',
+                                'message': 'Nothing to undo',
+                                'error_code': 'NOTHING_TO_UNDO'
+                            }
+                        elif undone[-1].previous is None:
+                            # Ask the question whose answer was taken back
+                            response = {
+                                'status': 'success',
+                                'message': 'Answer undone',
+                                'next_question': question_for(engine, undone[-1].symptom)
+                            }
+                        else:
+                            response = progress_response(engine, 'Answer undone')
+                        if undone:
+                            response['undone'] = [
+                                {'symptom': c.symptom, 'certainty': c.certainty}
+                                for c in undone
+                            ]
+                
+                elif action == 'get_diagnosis':
+                    # Get the final diagnosis
+                    engine.run()  # Ensure all rules are fired
+                    results = engine.get_diagnosis_results()
+                    
+                    response = {
+                        'status': 'success',
+                        'diagnosis': format_diagnosis(results)
+                    }
+                    
+                    # Optionally, confidence bands under noise in the answers
+                    uncertainty = data.get('uncertainty')
+                    if uncertainty is not None and uncertainty is not False:
+                        options = parse_uncertainty(uncertainty)
+                        if options is None:
+                            response = {
+                                'status': 'error',
+                                'message': 'Uncertainty must be true or an object with samples '
+                                           f'(1 to {MAX_SAMPLES}), noise '
+                                           f'({", ".join(NOISE_MODELS)}), scale (0.0 to 1.0), '
+                                           'percentiles (0 to 100) and seed',
+                                'error_code': 'INVALID_UNCERTAINTY'
+                            }
+                        else:
+                            response['uncertainty'] = analyze_uncertainty(
+                                engine.get_answers(), specs=rule_specs_of(engine), **options
+                            )
+                
+                elif action == 'sensitivity':
+                    # What-if analysis: re-rank with each answer swept over a grid
+                    grid = data.get('grid', list(DEFAULT_GRID))
+                    parsed_grid = parse_grid(grid)
+                    symptoms = data.get('symptoms')
+                    
+                    if parsed_grid is None:
                         response = {
                             'status': 'error',
-                            'message': f'Certainty must be a number, got {type(certainty).__name__}',
-                            'error_code': 'INVALID_CERTAINTY_TYPE'
+                            'message': 'Grid must be a non-empty list of certainties between 0.0 and 1.0',
+                            'error_code': 'INVALID_GRID'
                         }
-                    elif certainty < 0.0 or certainty > 1.0:
+                    elif symptoms is not None and not isinstance(symptoms, list):
                         response = {
                             'status': 'error',
-                            'message': f'Certainty must be between 0.0 and 1.0, got {certainty}',
-                            'error_code': 'CERTAINTY_OUT_OF_RANGE'
+                            'message': 'Symptoms must be a list of symptom names',
+                            'error_code': 'INVALID_SYMPTOMS'
                         }
                     else:
-                        # Record the answer
-                        engine.record_answer(symptom, certainty)
-                        
-                        # Add symptom to knowledge base
-                        engine.add_symptom(symptom, certainty)
-                        
-                        # Run the inference engine
-                        engine.run()
-                        
-                        # Check if we should continue asking or provide diagnosis
-                        if engine.should_continue_asking():
-                            # Get next question
-                            next_question = engine.get_next_question()
-                            
-                            if next_question:
-                                response = {
-                                    'status': 'success',
-                                    'message': 'Symptom recorded',
-                                    'next_question': next_question
-                                }
-                            else:
-                                # No more questions, provide diagnosis
-                                results = engine.get_diagnosis_results()
-                                diagnosis_list = [
-                                    {'disease': disease, 'certainty': certainty}
-                                    for disease, certainty in results
-                                ]
-                                response = {
-                                    'status': 'success',
-                                    'diagnosis': diagnosis_list
+                        analysis = analyze_sensitivity(
+                            engine.get_answers(), parsed_grid, symptoms, rule_specs_of(engine)
+                        )
+                        response = {
+                            'status': 'success',
+                            'diagnosis': format_diagnosis(analysis['baseline']),
+                            'grid': analysis['grid'],
+                            'sensitivity': [
+                                {
+                                    'symptom': entry['symptom'],
+                                    'answered': entry['answered'],
+                                    'top_changes': entry['top_changes'],
+                                    'variations': [
+                                        {
+                                            'certainty': variation['certainty'],
+                                            'top': variation['top'],
+                                            'diagnosis': format_diagnosis(variation['diagnosis'])
+                                        }
+                                        for variation in entry['variations']
+                                    ]
                                 }
-                        else:
-                            # Ready to provide diagnosis
-                            results = engine.get_diagnosis_results()
-                            diagnosis_list = [
-                                {'disease': disease, 'certainty': certainty}
-                                for disease, certainty in results
+                                for entry in analysis['symptoms']
                             ]
+                        }
+                
+                elif action == 'profile':
+                    # Sample this process's stacks for a while, or collect the samples
+                    if data.get('collect') or data.get('stop'):
+                        if profiler is None:
+                            response = {
+                                'status': 'error',
+                                'message': 'No profile has been started',
+                                'error_code': 'NO_PROFILE'
+                            }
+                        else:
+                            if data.get('stop'):
+                                profiler.stop()
+                            response = {
+                                'status': 'success',
+                                'profile': profiler.summary(),
+                                'stacks': profiler.collapsed()
+                            }
+                    elif profiler is not None and profiler.running:
+                        response = {
+                            'status': 'error',
+                            'message': 'A profile is already running',
+                            'error_code': 'PROFILER_BUSY'
+                        }
+                    else:
+                        options = parse_profile_options(data)
+                        if options is None:
+                            response = {
+                                'status': 'error',
+                                'message': f'Profile seconds must be between 0 and {MAX_PROFILE_SECONDS}, '
+                                           'interval_ms between 1 and 1000 and output a path',
+                                'error_code': 'INVALID_PROFILE_OPTIONS'
+                            }
+                        else:
+                            seconds, interval, output = options
+                            profiler = SamplingProfiler(
+                                main_thread, seconds, interval, output,
+                                idle_functions={'main.py:main', 'threading.py:wait'}
+                            )
+                            profiler.start()
                             response = {
                                 'status': 'success',
-                                'diagnosis': diagnosis_list
+                                'message': 'Profiling started',
+                                'profile': profiler.summary()
                             }
                 
-                elif action == 'get_diagnosis':
-                    # Get the final diagnosis
-                    engine.run()  # Ensure all rules are fired
-                    results = engine.get_diagnosis_results()
-                    
-                    diagnosis_list = [
-                        {'disease': disease, 'certainty': certainty}
-                        for disease, certainty in results
-                    ]
-                    
+                elif action == 'explain':
+                    # Why each diagnosis has its certainty
+                    disease = data.get('disease')
+                    diseases = {spec.disease for spec in rule_specs_of(engine)}
+                    if getattr(engine, 'trace', None) is None:
+                        response = {
+                            'status': 'error',
+                            'message': 'Explanations are off (--no-trace or --decision-tree)',
+                            'error_code': 'EXPLAIN_UNAVAILABLE'
+                        }
+                    elif disease is not None and disease not in diseases:
+                        response = {
+                            'status': 'error',
+                            'message': f'Unknown disease: {disease}',
+                            'error_code': 'UNKNOWN_DISEASE'
+                        }
+                    else:
+                        response = {'status': 'success', 'explanation': engine.explain(disease)}
+                
+                elif action == 'diagnose':
+                    # Stateless: a complete answer set in, the ranked diagnosis out
+                    response = diagnose_response(data, get_oneshot_engine, diagnosis_cache,
+                                                 shared_cache, oneshot_variant)
+                    if audit is not None and response['status'] == 'success':
+                        audit.record(None, 'diagnose', input_hash=response['input_hash'],
+                                     symptoms=data['symptoms'], diagnosis=[
+                                         [entry['disease'], entry['certainty']]
+                                         for entry in response['diagnosis']])
+                
+                elif action == 'reload_kb':
+                    # Swap the knowledge base for new sessions, without a restart
+                    if args.decision_tree:
+                        response = {
+                            'status': 'error',
+                            'message': 'The knowledge base cannot be reloaded with --decision-tree',
+                            'error_code': 'INVALID_KNOWLEDGE_BASE'
+                        }
+                    else:
+                        loaded, response = load_knowledge_base(data.get('path'))
+                    if response is None:
+                        previous = knowledge_base_version()
+                        changed = loaded.version != previous
+                        if changed:
+                            knowledge_base = loaded
+                            oneshot_engine = None
+                            oneshot_variant = cache_variant()
+                            if shared_cache is not None:
+                                shared_cache.use(loaded)
+                            if host is not None:
+                                host.swap(make_engine, loaded.version)
+                        response = {
+                            'status': 'success',
+                            'message': ('Knowledge base loaded' if changed
+                                        else 'Knowledge base unchanged'),
+                            'knowledge_base': dict(loaded.summary(), previous=previous)
+                        }
+                
+                elif action in ('end_session', 'metrics') and host is None:
                     response = {
-                        'status': 'success',
-                        'diagnosis': diagnosis_list
+                        'status': 'error',
+                        'message': f'The {action} action needs --host',
+                        'error_code': 'HOST_MODE_ONLY'
                     }
                 
+                elif action == 'end_session':
+                    # Release a session's engine
+                    if speculation is not None:
+                        speculation.cancel(data.get('session_id'))
+                    if host.close_session(data.get('session_id')):
+                        admission.session_ended()
+                        response = {'status': 'success', 'message': 'Session ended'}
+                        if audit is not None:
+                            audit.record(data['session_id'], 'end')
+                    elif snapshots is not None and snapshots.discard(data.get('session_id')):
+                        response = {'status': 'success', 'message': 'Session ended'}
+                    else:
+                        response = {
+                            'status': 'error',
+                            'message': f"Unknown session: {data.get('session_id')}",
+                            'error_code': 'UNKNOWN_SESSION'
+                        }
+                
+                elif action == 'metrics':
+                    # Session counts, load and garbage collector pauses
+                    response = {'status': 'success', 'metrics': host.metrics()}
+                    response['metrics']['admission'] = admission.stats()
+                    if snapshots is not None:
+                        response['metrics']['session_snapshots'] = snapshots.stats()
+                    if speculation is not None:
+                        response['metrics']['speculation'] = speculation.stats()
+                    response['metrics']['diagnose_cache'] = diagnosis_cache.stats()
+                    if shared_cache is not None:
+                        response['metrics']['shared_cache'] = shared_cache.stats()
+                    if shadow is not None:
+                        response['metrics']['shadow'] = shadow.stats()
+                    if audit is not None:
+                        response['metrics']['audit'] = audit.stats()
+                    response['metrics']['patient_contexts'] = (
+                        knowledge_base or builtin_knowledge_base()).contexts.stats()
+                
+                elif action == 'memory':
+                    # What the engine holds, and where memory goes once tracing
+                    trace = data.get('trace')
+                    top = data.get('top', 10)
+                    if not isinstance(top, int) or isinstance(top, bool) or top < 0:
+                        response = {
+                            'status': 'error',
+                            'message': f'Top must be a non-negative integer, got {top}',
+                            'error_code': 'INVALID_TOP'
+                        }
+                    else:
+                        if trace is True and not tracemalloc.is_tracing():
+                            tracemalloc.start()
+                        elif trace is False and tracemalloc.is_tracing():
+                            tracemalloc.stop()
+                        if host is not None:
+                            # The counts are for the given session, if any
+                            report = memory_report(host.get(data.get('session_id')), top)
+                            report['counts']['sessions_active'] = len(host.sessions)
+                        else:
+                            report = memory_report(engine, top)
+                        report['counts']['sessions_started'] = sessions_started
+                        response = {'status': 'success', 'memory': report}
+                
                 else:
                     response = {
                         'status': 'error',
-                        'message': f'Unknown action: {action}. Valid actions are: start, add_symptom, get_diagnosis',
+                        'message': f'Unknown action: {action}. Valid actions are: start, add_symptom, edit_answer, undo, get_diagnosis, sensitivity, explain, diagnose, profile, memory, end_session, metrics, reload_kb',
                         'error_code': 'INVALID_ACTION'
                     }
                 
+                if host is not None and action in SESSION_ACTIONS:
+                    host.touch(data['session_id'], action)
+                
+                if (speculation is not None and action in SPECULATED_ACTIONS
+                        and response['status'] == 'success'):
+                    question = response.get('next_question')
+                    speculation.expect(response.get('session_id') or data['session_id'],
+                                       question['symptom'] if question else None)
+                
+                if (audit is not None and action in AUDITED_ACTIONS
+                        and response['status'] == 'success'):
+                    audit_response(response.get('session_id') or audited_session(data), response)
+                
                 # Write response to stdout
-                print(json.dumps(response), flush=True)
+                if not responded:
+                    respond(response)
                 
             except json.JSONDecodeError as e:
                 error_response = {
@@ -156,7 +1151,7 @@ def main():
                     'message': f'Invalid JSON input: {str(e)}',
                     'error_code': 'INVALID_JSON'
                 }
-                print(json.dumps(error_response), flush=True)
+                respond(error_response)
             
             except Exception as e:
                 error_response = {
@@ -164,11 +1159,31 @@ def main():
                     'message': f'Internal error: {str(e)}',
                     'error_code': 'INTERNAL_ERROR'
                 }
-                print(json.dumps(error_response), flush=True)
+                if responded:
+                    print(error_response['message'], file=sys.stderr)
+                else:
+                    respond(error_response)
+            
+            finally:
+                if admission is not None:
+                    admission.done(request)
+                if speculation is not None:
+                    # Until the next request comes
+                    speculation.run(host.get, admission.pending)
     
     except KeyboardInterrupt:
         # Graceful shutdown
         pass
+    
+    finally:
+        if shadow is not None:
+            shadow.stop()
+        if audit is not None:
+            audit.close()
+        if recorder is not None:
+            recorder.close()
+        if shared_cache is not None:
+            shared_cache.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Read the audit log written by main.py --audit.
+
+Usage:
+    python read_audit.py audit/
+    python read_audit.py audit/ --session 3f2a... --event answer rule diagnosis
+    python read_audit.py audit/ --check
+
+Prints the events of the audit files (directories are searched for
+audit-*.jsonl.gz, oldest first) as JSON lines, optionally only those of
+one session or of some event kinds. --check instead reports how many
+events and sessions there are and whether any events are missing: each
+process numbers its events without gaps, so a gap means lost records.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.audit import audit_files, read_audit
+
+
+def check(files):
+    """Count events and sessions, and find gaps in each process's numbering."""
+    events, sessions, gaps = 0, set(), []
+    last_seq = {}
+    for path in files:
+        # audit-<time>-<pid>-<n>.jsonl.gz: the files of one process share a prefix
+        process = re.sub(r'-\d+\.jsonl\.gz$', '', os.path.basename(path))
+        last = last_seq.get(process, 0)
+        for event in read_audit([path]):
+            if event['event'] == 'rule':
+                continue
+            events += 1
+            sessions.add(event['session'])
+            if event['seq'] != last + 1:
+                gaps.append((path, last, event['seq']))
+            last = event['seq']
+        last_seq[process] = last
+    return events, len(sessions - {None}), gaps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='Audit files or directories')
+    parser.add_argument('--session', help='Only the events of this session')
+    parser.add_argument('--event', nargs='+', metavar='KIND',
+                        help='Only events of these kinds (start, question, answer, rule, '
+                             'undo, diagnosis, diagnose, end)')
+    parser.add_argument('--check', action='store_true',
+                        help='Count the events and report missing ones instead of printing them')
+    args = parser.parse_args(argv)
+
+    files = audit_files(args.paths)
+    if not files:
+        print(f"No audit files in {', '.join(args.paths)}", file=sys.stderr)
+        return 1
+
+    if args.check:
+        events, sessions, gaps = check(files)
+        print(f"{len(files)} files, {events} events, {sessions} sessions")
+        for path, last, seq in gaps:
+            print(f"  {path}: events {last + 1} to {seq - 1} missing")
+        return 1 if gaps else 0
+
+    kinds = set(args.event) if args.event else None
+    try:
+        for event in read_audit(files):
+            if args.session is not None and event['session'] != args.session:
+                continue
+            if kinds is not None and event['event'] not in kinds:
+                continue
+            print(json.dumps(event))
+    except BrokenPipeError:
+        pass  # Piped into head
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
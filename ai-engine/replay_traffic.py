@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Replay traffic recorded with main.py --record against an engine build.
+
+Usage:
+    python replay_traffic.py traffic.jsonl
+    python replay_traffic.py traffic.jsonl --timing accelerated --speed 20
+    python replay_traffic.py traffic.jsonl --command "python main.py --engine lite"
+
+Each recording is replayed in a fresh engine process. Responses are
+compared with the recorded ones and the latency distribution is reported
+overall and per action. Exits with status 1 if any response differs.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.traffic import TIMING_MODES, latency_report, load_recordings, replay_recording
+
+
+def _format_row(label, distribution):
+    return (f"  {label:<16}{distribution['count']:>7}{distribution['mean']:>9.2f}"
+            f"{distribution['p50']:>9.2f}{distribution['p90']:>9.2f}"
+            f"{distribution['p99']:>9.2f}{distribution['max']:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('traffic', help='Traffic file written by main.py --record')
+    parser.add_argument('--command', default=f'{shlex.quote(sys.executable)} main.py',
+                        help='Engine command to replay against (default: this main.py)')
+    parser.add_argument('--timing', choices=TIMING_MODES, default='max',
+                        help='Keep the recorded gaps between commands (original), '
+                             'divide them by --speed (accelerated) or send commands '
+                             'back to back (max, the default)')
+    parser.add_argument('--speed', type=float, default=10.0,
+                        help='Speed-up factor for --timing accelerated (default: 10)')
+    parser.add_argument('--recording', action='append',
+                        help='Only replay this recording id (repeatable)')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    recordings = load_recordings(args.traffic)
+    if args.recording:
+        recordings = {r: recordings[r] for r in args.recording if r in recordings}
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = shlex.split(args.command)
+
+    results = []
+    mismatches = []
+    for recording, exchanges in recordings.items():
+        replayed = replay_recording(exchanges, command, args.timing, args.speed, cwd=here)
+        results.extend(replayed)
+        for exchange, result in zip(exchanges, replayed):
+            if not result['match']:
+                mismatches.append((recording, exchange, result['response']))
+
+    report = latency_report(results)
+    report['recordings'] = len(recordings)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Replayed {report['exchanges']} commands from {len(recordings)} recordings "
+              f"({args.timing} timing): {report['mismatches']} mismatched responses")
+        for recording, exchange, response in mismatches[:10]:
+            print(f"\n  {recording} #{exchange.seq}: {exchange.request}")
+            print(f"    recorded: {exchange.response}")
+            print(f"    replayed: {response}")
+        print(f"\nLatency (ms)    {'count':>7}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+        if report['overall']:
+            print(_format_row('all', report['overall']))
+            for action, distribution in report['by_action'].items():
+                print(_format_row(action, distribution))
+        if report['startup']:
+            print(_format_row('(first command)', report['startup']))
+        if report['recorded']:
+            print(_format_row('(as recorded)', report['recorded']))
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Admission control for the engine host.
+
+Under a traffic spike, a host that takes every request grows its backlog
+(and its memory) without bound, and every request waits behind all the
+others. ``main.py --host`` therefore bounds its work and sheds what is
+over the limits with an ``OVERLOADED`` error instead:
+
+- concurrent sessions (``max_sessions``): a ``start`` beyond it is
+  rejected until a session ends
+- requests waiting per session (``max_session_queue``): a client that
+  sends one session's requests faster than they are served gets the
+  excess rejected, and cannot fill the queue on its own
+- requests in flight in the process (``max_in_flight``, waiting or being
+  served): with it reached, new requests are rejected, so a request never
+  waits behind more than that many others
+
+A reader thread takes the requests off stdin as they arrive and decides
+at once whether each one is admitted, so the backlog is known while the
+request loop is still busy. Responses keep the order of the requests
+(clients match them up by order), so a shed request is answered in turn,
+at no cost but the response; consecutive shed requests share one queue
+entry (``Request.count``) and only the first one's line is kept. The
+queue thus holds at most a few entries per request in flight, however
+many are shed, and a shed request waits behind at most ``max_in_flight``
+others. ``end_session`` and ``metrics`` are never shed, since they free
+capacity and show the load.
+
+An ``OVERLOADED`` response carries ``retry_after_ms``: for a shed
+request, the time the backlog ahead of it takes to drain at the recent
+service time; for a rejected ``start``, the recent interval between
+session ends. ``stats()`` (in the host's ``metrics``) reports the queue
+depth, in-flight work, shed counts by limit and queue waits.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+
+DEFAULT_MAX_SESSIONS = 2000
+DEFAULT_MAX_SESSION_QUEUE = 8
+DEFAULT_MAX_IN_FLIGHT = 256
+
+# Actions admitted whatever the load
+ALWAYS_ADMITTED = {'end_session', 'metrics'}
+
+# Bounds of the retry-after hint (ms), and the hint for a rejected start
+# before any session has ended
+MIN_RETRY_AFTER_MS = 10
+MAX_RETRY_AFTER_MS = 30000
+DEFAULT_SESSION_RETRY_MS = 1000
+
+# Weight of the newest sample in the moving averages
+EWMA_WEIGHT = 0.1
+
+# Recent queue waits kept for the percentiles
+WAIT_WINDOW = 4096
+
+LIMITS = ('sessions', 'session_queue', 'in_flight')
+
+
+class Request(NamedTuple):
+    """
+    A request line as read, and the limit it was shed by (None if admitted).
+    A shed entry stands for ``count`` consecutive requests shed by the same
+    limit, of which ``line`` is the first.
+    """
+    line: str
+    session_id: Optional[str]
+    arrived: float
+    shed: Optional[str]
+    count: int = 1
+
+
+def _peek(line: str):
+    """The session id and action of a request line (None for what cannot be read)."""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+    session_id = data.get('session_id')
+    return (session_id if isinstance(session_id, str) else None), data.get('action')
+
+
+class AdmissionControl:
+    """
+    Queues the host's requests and sheds those over the limits.
+
+    Args:
+        max_sessions: Concurrent sessions (0 for no limit)
+        max_session_queue: Requests of one session waiting to be served
+            (0 for no limit)
+        max_in_flight: Requests waiting or being served (0 for no limit)
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 max_session_queue: int = DEFAULT_MAX_SESSION_QUEUE,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        for name, value in (('Max sessions', max_sessions),
+                            ('Max session queue', max_session_queue),
+                            ('Max in flight', max_in_flight)):
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f'{name} must be a non-negative integer, got {value}')
+        self.max_sessions = max_sessions
+        self.max_session_queue = max_session_queue
+        self.max_in_flight = max_in_flight
+        self._ready = threading.Condition()
+        self._queue: deque = deque()
+        self._depth = 0  # Requests queued (shed entries count as many)
+        self._session_queued: Dict[str, int] = {}
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.in_flight = 0
+        self.max_depth = 0
+        self.admitted = 0
+        self.shed = dict.fromkeys(LIMITS, 0)
+        self.service_seconds: Optional[float] = None  # Moving average per request
+        self.session_interval: Optional[float] = None  # Between session ends
+        self._last_session_end: Optional[float] = None
+        self._serving: Optional[float] = None
+        self.waits = deque(maxlen=WAIT_WINDOW)
+        self.wake_interval: Optional[float] = None
+
+    def start(self, stream: Iterable[str]):
+        """Read requests from ``stream`` (stdin) on a reader thread."""
+        self._thread = threading.Thread(target=self._read, args=(stream,),
+                                        name='admission-reader', daemon=True)
+        self._thread.start()
+
+    def _read(self, stream: Iterable[str]):
+        try:
+            for line in stream:
+                self.offer(line)
+        finally:
+            with self._ready:
+                self._closed = True
+                self._ready.notify()
+
+    def offer(self, line: str) -> Request:
+        """
+        Queue a request line, admitted or to be answered as shed. Returns
+        its queue entry (for a shed request, maybe one it joined).
+        """
+        session_id, action = _peek(line)
+        with self._ready:
+            shed = None
+            if action not in ALWAYS_ADMITTED:
+                if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                    shed = 'in_flight'
+                elif (self.max_session_queue and session_id is not None and
+                      self._session_queued.get(session_id, 0) >= self.max_session_queue):
+                    shed = 'session_queue'
+            if shed is None:
+                self.admitted += 1
+                self.in_flight += 1
+                if session_id is not None:
+                    self._session_queued[session_id] = self._session_queued.get(session_id, 0) + 1
+            else:
+                self.shed[shed] += 1
+            last = self._queue[-1] if self._queue else None
+            if shed is not None and last is not None and last.shed == shed:
+                request = self._queue[-1] = last._replace(count=last.count + 1)
+            else:
+                request = Request(line, session_id, time.perf_counter(), shed)
+                self._queue.append(request)
+            self._depth += 1
+            self.max_depth = max(self.max_depth, self._depth)
+            self._ready.notify()
+        return request
+
+    def __iter__(self):
+        """
+        The queued requests in order, until the stream ends; call done()
+        after each, and answer a shed entry ``count`` times. With ``wake_interval`` set, None comes after that many
+        seconds without a request, so the loop can do timed work.
+        """
+        while True:
+            request = None
+            with self._ready:
+                while not self._queue and not self._closed:
+                    if not self._ready.wait(self.wake_interval):
+                        break  # Timed out
+                if self._queue:
+                    request = self._queue.popleft()
+                    self._depth -= request.count
+                    if request.shed is None:
+                        self._serving = time.perf_counter()
+                        self.waits.append(self._serving - request.arrived)
+                elif self._closed:
+                    return
+            yield request
+
+    def pending(self) -> bool:
+        """Whether a request is waiting to be served."""
+        return bool(self._queue)
+
+    def done(self, request: Request):
+        """A request has been answered: it no longer counts as in flight."""
+        if request.shed is not None:
+            return
+        with self._ready:
+            self.in_flight -= 1
+            if request.session_id is not None:
+                queued = self._session_queued[request.session_id] - 1
+                if queued:
+                    self._session_queued[request.session_id] = queued
+                else:
+                    del self._session_queued[request.session_id]
+            if self._serving is not None:
+                self.service_seconds = _ewma(self.service_seconds,
+                                             time.perf_counter() - self._serving)
+                self._serving = None
+
+    def admit_session(self, active: int) -> Optional[Dict]:
+        """None if a session can start with ``active`` open, or the OVERLOADED response."""
+        if not self.max_sessions or active < self.max_sessions:
+            return None
+        with self._ready:
+            self.shed['sessions'] += 1
+        return self.overloaded('sessions')
+
+    def session_ended(self):
+        now = time.perf_counter()
+        if self._last_session_end is not None:
+            self.session_interval = _ewma(self.session_interval, now - self._last_session_end)
+        self._last_session_end = now
+
+    def retry_after_ms(self, limit: str) -> int:
+        """How long a client should wait before retrying what ``limit`` shed."""
+        if limit == 'sessions':
+            seconds = (self.session_interval if self.session_interval is not None
+                       else DEFAULT_SESSION_RETRY_MS / 1000)
+        else:
+            seconds = self.in_flight * (self.service_seconds or 0.0)
+        return int(min(max(seconds * 1000, MIN_RETRY_AFTER_MS), MAX_RETRY_AFTER_MS))
+
+    def overloaded(self, limit: str) -> Dict:
+        """The error response for a request shed by ``limit``."""
+        messages = {
+            'sessions': f'Too many sessions ({self.max_sessions} open)',
+            'session_queue': f'Too many requests queued for this session ({self.max_session_queue})',
+            'in_flight': f'Too many requests in flight ({self.max_in_flight})',
+        }
+        return {
+            'status': 'error',
+            'message': f'Overloaded: {messages[limit]}',
+            'error_code': 'OVERLOADED',
+            'limit': limit,
+            'retry_after_ms': self.retry_after_ms(limit),
+        }
+
+    def stats(self) -> Dict:
+        with self._ready:
+            depth = self._depth
+            waits = np.asarray(self.waits, dtype=float) * 1000
+        p50, p99 = np.percentile(waits, [50, 99]) if len(waits) else (0.0, 0.0)
+        return {
+            'limits': {'sessions': self.max_sessions, 'session_queue': self.max_session_queue,
+                       'in_flight': self.max_in_flight},
+            'queue_depth': depth,
+            'max_queue_depth': self.max_depth,
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'service_ms': round((self.service_seconds or 0.0) * 1000, 3),
+            'wait_p50_ms': round(float(p50), 3),
+            'wait_p99_ms': round(float(p99), 3),
+        }
+
+
+def _ewma(average: Optional[float], sample: float) -> float:
+    return sample if average is None else average + EWMA_WEIGHT * (sample - average)
@@ -0,0 +1,328 @@
+"""
+Append-only audit log of diagnosis sessions.
+
+``main.py --audit DIR`` records every session event: its start, each
+answer (and edit or undo) with the rules it fired and their CF
+contribution, every ranking given as a diagnosis, and its end. Events are
+JSON records, one per line:
+
+    {"seq": 12, "time": 1760000000.123, "session": "...", "event": "answer",
+     "symptom": "fever", "certainty": 0.9, "edit": false}
+    {"seq": 12, "time": 1760000000.123, "session": "...", "event": "rule",
+     "rule": "influenza_classic", "disease": "influenza", "cf": 0.51}
+    {"seq": 13, "time": 1760000000.456, "session": "...", "event": "diagnosis",
+     "diagnosis": [["influenza", 0.51]]}
+
+``seq`` numbers the events of a process without gaps (rule records share
+their answer's), so a reader can tell that nothing is missing.
+
+Writing to disk on the request loop would add its latency to every
+answer, so ``AuditLog`` only appends the event to an in-memory ring
+buffer. A flush thread drains the buffer every ``flush_interval`` seconds
+(sooner when it is half full), works out the rule firings from the
+answers (diagnoses depend only on the current answers, so they are
+recomputed from the rule specs, off the request loop) and appends the
+batch to the current file as one gzip member. A file that was being
+written when the process died is therefore readable up to its last
+complete batch. Files are only ever appended to, and a new one is started
+once the current one reaches ``max_file_bytes``:
+
+    DIR/audit-20261019-101500-4242-0001.jsonl.gz
+
+``fsync`` sets durability: 'always' syncs every batch, 'interval' at
+most once per ``FSYNC_INTERVAL`` seconds (and on rotation and close),
+'never' leaves it to the operating system. If the flush thread falls
+behind and the buffer fills up, recording waits for it (counted as
+``stalls``) rather than lose events.
+
+``read_audit`` (and ``read_audit.py``) streams the events back.
+"""
+
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .rules.specs import RuleSpec, evaluate_rule, pattern_complete
+
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+DEFAULT_FSYNC = 'interval'
+
+# Seconds between syncs with the 'interval' policy
+FSYNC_INTERVAL = 1.0
+
+# Events the ring buffer holds
+DEFAULT_CAPACITY = 65536
+
+# Seconds between flushes
+DEFAULT_FLUSH_INTERVAL = 0.2
+
+# Size at which a new file is started
+DEFAULT_MAX_FILE_BYTES = 64 * 1024 * 1024
+
+# Events the flush thread formats before giving up the interpreter, so
+# that the request loop waits on it for well under a millisecond
+YIELD_EVERY = 16
+
+FILE_PATTERN = 'audit-*.jsonl.gz'
+
+
+class _RuleIndex:
+    """The rules of a rule base by the symptoms and diseases they read."""
+
+    def __init__(self, specs: Sequence[RuleSpec]):
+        self.specs = specs
+        self.diseases_by_symptom: Dict[str, set] = {}
+        self.by_disease: Dict[str, List[RuleSpec]] = {}
+        for spec in specs:
+            self.by_disease.setdefault(spec.disease, []).append(spec)
+            for symptom in spec.symptoms:
+                self.diseases_by_symptom.setdefault(symptom, set()).add(spec.disease)
+
+    def firings(self, symptom: str, answers: Dict[str, float]) -> List[Tuple[str, str, float]]:
+        """(rule, disease, CF) of the rules an answer re-ran that concluded."""
+        fired = []
+        for disease in sorted(self.diseases_by_symptom.get(symptom, ())):
+            for spec in self.by_disease[disease]:
+                if pattern_complete(spec, answers):
+                    cf = evaluate_rule(spec, answers)
+                    if cf is not None:
+                        fired.append((spec.name, disease, round(cf, 6)))
+        return fired
+
+
+class AuditLog:
+    """
+    Buffers session events and appends them to rotating compressed files.
+
+    Args:
+        directory: Where the audit files are written (created if missing)
+        fsync: One of FSYNC_POLICIES
+        capacity: Events the ring buffer holds
+        flush_interval: Seconds between flushes
+        max_file_bytes: Size at which a new file is started
+    """
+
+    def __init__(self, directory: str, fsync: str = DEFAULT_FSYNC,
+                 capacity: int = DEFAULT_CAPACITY, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}. "
+                             f"Valid policies are: {', '.join(FSYNC_POLICIES)}")
+        if capacity < 2:
+            raise ValueError(f'The audit buffer needs at least 2 events, got {capacity}')
+        self.directory = directory
+        self.fsync = fsync
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self._ring: List = [None] * capacity
+        self._head = 0  # Oldest event
+        self._size = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._flush_requested = threading.Event()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._indexes: Dict[int, _RuleIndex] = {}
+        self._fd: Optional[int] = None
+        self._file_bytes = 0
+        self._files = 0
+        self._synced = 0.0
+        self.path: Optional[str] = None
+        self.events = 0
+        self.batches = 0
+        self.bytes_written = 0
+        self.stalls = 0
+        self.flush_seconds = 0.0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='audit-flush', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Flush everything recorded and close the current file."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._closing = True
+        self._flush_requested.set()
+        self._thread.join()
+        self._thread = None
+        self._close_file()
+
+    # Recording (request loop)
+
+    def record(self, session_id: str, event: str, **fields):
+        """Buffer an event; ``fields`` must be JSON-serializable."""
+        with self._lock:
+            while self._size == self.capacity:
+                self.stalls += 1
+                self._flush_requested.set()
+                self._not_full.wait()
+            self._seq += 1
+            self._ring[(self._head + self._size) % self.capacity] = (
+                self._seq, time.time(), session_id, event, fields)
+            self._size += 1
+            if self._size * 2 >= self.capacity:
+                self._flush_requested.set()
+
+    def answer(self, session_id: str, symptom: str, certainty: float,
+               answers: Iterable[Tuple[str, float]], specs: Sequence[RuleSpec], edit: bool = False):
+        """
+        Buffer an answer. ``answers`` are the session's answers after it and
+        ``specs`` the rules the session runs; the rules it fired are worked
+        out when the event is written.
+        """
+        self.record(session_id, 'answer', symptom=symptom, certainty=certainty, edit=edit,
+                    _answers=dict(answers), _specs=specs)
+
+    # Writing (flush thread)
+
+    def _run(self):
+        while True:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            with self._lock:
+                closing = self._closing
+            self.flush()
+            if closing:
+                break
+
+    def _drain(self) -> List:
+        with self._lock:
+            batch = [self._ring[(self._head + i) % self.capacity] for i in range(self._size)]
+            for i in range(self._size):
+                self._ring[(self._head + i) % self.capacity] = None
+            self._head = (self._head + self._size) % self.capacity
+            self._size = 0
+            self._not_full.notify_all()
+        return batch
+
+    def _rule_index(self, specs: Sequence[RuleSpec]) -> _RuleIndex:
+        index = self._indexes.get(id(specs))
+        if index is None or index.specs is not specs:
+            index = self._indexes[id(specs)] = _RuleIndex(specs)
+        return index
+
+    def _lines(self, batch) -> List[str]:
+        lines = []
+        for position, (seq, when, session_id, event, fields) in enumerate(batch, 1):
+            if position % YIELD_EVERY == 0:
+                time.sleep(0)
+            base = {'seq': seq, 'time': round(when, 6), 'session': session_id}
+            answers = fields.pop('_answers', None)
+            specs = fields.pop('_specs', None)
+            lines.append(json.dumps(dict(base, event=event, **fields)))
+            if specs is not None:
+                for rule, disease, cf in self._rule_index(specs).firings(fields['symptom'], answers):
+                    lines.append(json.dumps(dict(base, event='rule', rule=rule,
+                                                 disease=disease, cf=cf)))
+        return lines
+
+    def flush(self):
+        """Write out the buffered events (called by the flush thread)."""
+        batch = self._drain()
+        if not batch:
+            return
+        started = time.perf_counter()
+        lines = self._lines(batch)
+        data = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'), compresslevel=6)
+        time.sleep(0)
+        if self._fd is None or self._file_bytes + len(data) > self.max_file_bytes:
+            self._open_file()
+        os.write(self._fd, data)
+        self._file_bytes += len(data)
+        now = time.monotonic()
+        if self.fsync == 'always' or (self.fsync == 'interval'
+                                      and now - self._synced >= FSYNC_INTERVAL):
+            os.fsync(self._fd)
+            self._synced = now
+        self.events += len(batch)
+        self.batches += 1
+        self.bytes_written += len(data)
+        self.flush_seconds += time.perf_counter() - started
+
+    def _open_file(self):
+        self._close_file()
+        self._files += 1
+        name = (f"audit-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+                f"-{self._files:04d}.jsonl.gz")
+        self.path = os.path.join(self.directory, name)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o640)
+        self._file_bytes = os.fstat(self._fd).st_size
+
+    def _close_file(self):
+        if self._fd is not None:
+            if self.fsync != 'never':
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            buffered = self._size
+        return {
+            'path': self.path,
+            'fsync': self.fsync,
+            'events': self.events,
+            'buffered': buffered,
+            'batches': self.batches,
+            'files': self._files,
+            'bytes_written': self.bytes_written,
+            'stalls': self.stalls,
+            'flush_ms': round(self.flush_seconds * 1000, 3),
+        }
+
+
+def audit_files(paths: Iterable[str]) -> List[str]:
+    """The audit files at the given paths (directories are searched), oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, FILE_PATTERN))))
+        else:
+            files.append(path)
+    return files
+
+
+def _batches(f, block_size: int = 1 << 20) -> Iterator[bytes]:
+    """The decompressed gzip members of a file, up to the last complete one."""
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = b''
+    output = []
+    while True:
+        data = pending or f.read(block_size)
+        pending = b''
+        if not data:
+            return  # A member without its end was being written
+        try:
+            output.append(decompressor.decompress(data))
+        except zlib.error:
+            return
+        if decompressor.eof:
+            yield b''.join(output)
+            output = []
+            pending = decompressor.unused_data
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+
+def read_audit(paths: Iterable[str]) -> Iterator[Dict]:
+    """
+    Stream the events of audit files in order.
+
+    A file that ends in an incomplete batch (the writer died mid-write)
+    is read up to its last complete one.
+    """
+    for path in audit_files(paths):
+        with open(path, 'rb') as f:
+            for batch in _batches(f):
+                for line in batch.decode('utf-8').splitlines():
+                    yield json.loads(line)
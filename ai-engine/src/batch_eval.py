@@ -0,0 +1,100 @@
+"""
+Batched evaluation of the rule set with NumPy.
+
+Evaluates every rule over many answer sets at once instead of building an
+experta engine per answer set. Rules come from ``rules/specs.py``; each
+answer set is a row of a matrix with one column per answered symptom.
+The CF algebra is the array versions in ``cf_utils``.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cf_utils import (
+    apply_rule_confidence_array, combine_cf_and_array, combine_cf_or_array
+)
+from .rules.specs import RULE_SPECS, RuleSpec, pattern_complete, rank_diagnoses
+
+
+class BatchEvaluator:
+    """
+    Evaluates the rule set for a batch of certainty vectors over the same
+    answered symptoms.
+
+    Mirrors ``diagnose`` (and therefore the experta engine driven by
+    ``main.py``) row by row: every rule whose patterns are complete for the
+    answered symptoms is evaluated and each disease keeps its highest CF.
+
+    Args:
+        symptoms: The answered symptoms, one column each
+        specs: The rules to evaluate (default: the built-in rule base)
+    """
+
+    def __init__(self, symptoms: Sequence[str], specs: Sequence[RuleSpec] = RULE_SPECS):
+        self.symptoms = list(symptoms)
+        # A symptom answered more than once counts with its latest answer
+        self.columns = {symptom: index for index, symptom in enumerate(self.symptoms)}
+        self.diseases = list(dict.fromkeys(spec.disease for spec in specs))
+        self.disease_index = {d: i for i, d in enumerate(self.diseases)}
+        self.rules = [spec for spec in specs if pattern_complete(spec, self.columns)]
+
+    def _column(self, X: np.ndarray, symptom: str) -> np.ndarray:
+        index = self.columns.get(symptom)
+        if index is None:
+            return np.zeros(X.shape[0])
+        return X[:, index]
+
+    def complete(self, spec: RuleSpec, answered: np.ndarray) -> np.ndarray:
+        """Rows of ``answered`` where every pattern group of a rule has an answer."""
+        complete = np.ones(answered.shape[0], dtype=bool)
+        for group, _ in spec.gates:
+            columns = [self.columns[s] for s in group if s in self.columns]
+            complete &= answered[:, columns].any(axis=1)
+        return complete
+
+    def evaluate(self, X: np.ndarray, answered: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Evaluate the rule set for every row of ``X``.
+
+        Args:
+            X: Array of shape (rows, len(symptoms)) of answer certainties
+            answered: Optional boolean array of the same shape marking the
+                symptoms each row actually answered, for rows that answered
+                different symptoms. A rule then only runs on the rows where
+                its patterns are complete, and unanswered symptoms read 0.0.
+                By default every row answered every symptom.
+
+        Returns:
+            Array of shape (rows, len(self.diseases)) of disease CFs; 0.0
+            means no rule concluded the disease (a concluded CF is always > 0)
+        """
+        X = np.asarray(X, dtype=float)
+        if answered is not None:
+            answered = np.asarray(answered, dtype=bool)
+            X = np.where(answered, X, 0.0)
+        rows = X.shape[0]
+        result = np.zeros((rows, len(self.diseases)))
+        for spec in self.rules:
+            if answered is None:
+                passed = np.ones(rows, dtype=bool)
+            else:
+                passed = self.complete(spec, answered)
+            evidence = np.ones(rows)
+            for group, threshold in spec.gates:
+                group_cf = self._column(X, group[0])
+                for symptom in group[1:]:
+                    group_cf = combine_cf_or_array(group_cf, self._column(X, symptom))
+                passed &= group_cf >= threshold
+                evidence = combine_cf_and_array(evidence, group_cf)
+            for symptom, bound in spec.exclusions:
+                passed &= self._column(X, symptom) < bound
+            final_cf = np.where(passed, apply_rule_confidence_array(evidence, spec.rule_cf), 0.0)
+            column = self.disease_index[spec.disease]
+            result[:, column] = combine_cf_or_array(result[:, column], final_cf)
+        return result
+
+    def ranked(self, row: np.ndarray) -> List[Tuple[str, float]]:
+        """Turn one row of ``evaluate`` into a ranking like get_diagnosis_results()."""
+        items = [(d, float(cf)) for d, cf in zip(self.diseases, row) if cf > 0.0]
+        return rank_diagnoses(dict(items))
@@ -0,0 +1,427 @@
+"""
+Calibration of rule CFs and gate thresholds against labeled outcomes.
+
+The rule reliabilities (0.85, 0.75, ...) and gate thresholds of the rule
+base were set by hand. Given answer sets labeled with the diagnosis a
+follow-up visit confirmed, ``RuleCalibrator`` fits them so that the disease
+CFs the rules produce behave like probabilities of the confirmed outcome
+(lower Brier score), and ``calibrate`` turns the result into a new
+knowledge base artifact (``calibrate_rules.py``).
+
+Fitting is coordinate descent with an exact line search on a grid: each
+update takes one parameter (a rule's CF or one of its gate thresholds),
+evaluates every grid value for it at once as a (grid, rows) array, and
+keeps the value with the lowest loss. Only the rule being updated changes,
+so an update reads just the rows where that rule's patterns are complete
+and its exclusions pass, against the CF the disease gets from its other
+rules. The gate CFs and evidence of every rule are computed once up front;
+an update over 10^5 rows takes a few milliseconds.
+
+Labeled data format: a CSV file with one column per symptom (an empty cell
+is a symptom that was not asked) and a ``diagnosis`` column, or JSON lines
+of ``{"answers": {"fever": 0.9, ...}, "diagnosis": "influenza"}``. An empty
+or null diagnosis, or one the knowledge base does not know, is an outcome
+none of its diseases should be concluded for.
+"""
+
+import csv
+import json
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batch_eval import BatchEvaluator
+from .cf_utils import combine_cf_multiple_and_array, combine_cf_multiple_or_array
+from .rules.specs import RULE_SPECS, RuleSpec
+
+
+# Values tried for a rule CF (0.05 ... 1.0) and for a gate threshold (0.05 ... 0.95)
+DEFAULT_CF_GRID = tuple(round(i * 0.05, 2) for i in range(1, 21))
+DEFAULT_THRESHOLD_GRID = tuple(round(i * 0.05, 2) for i in range(1, 20))
+
+# Bins of the reliability table (top CF against how often it was right)
+RELIABILITY_BINS = 10
+
+
+class LabeledData(NamedTuple):
+    """
+    Answer sets with their confirmed outcomes.
+
+    Attributes:
+        symptoms: The symptom of each column
+        X: Array of shape (rows, len(symptoms)) of answer certainties, 0.0
+            where a symptom was not answered
+        answered: Boolean array of the same shape marking answered symptoms
+        outcomes: Array of the confirmed diagnosis of each row ('' for none)
+    """
+    symptoms: Tuple[str, ...]
+    X: np.ndarray
+    answered: np.ndarray
+    outcomes: np.ndarray
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def take(self, rows) -> 'LabeledData':
+        return LabeledData(self.symptoms, self.X[rows], self.answered[rows], self.outcomes[rows])
+
+    def split(self, holdout: float, seed: int = 0) -> Tuple['LabeledData', 'LabeledData']:
+        """Shuffle the rows and split off a fraction of them for validation."""
+        order = np.random.default_rng(seed).permutation(len(self))
+        cut = len(self) - int(round(len(self) * holdout))
+        return self.take(order[:cut]), self.take(order[cut:])
+
+
+def _certainty(value, where: str) -> float:
+    try:
+        certainty = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{where}: certainty {value!r} is not a number')
+    if not 0.0 <= certainty <= 1.0:
+        raise ValueError(f'{where}: certainty {certainty} is not in [0.0, 1.0]')
+    return certainty
+
+
+def _labeled_rows(path: str):
+    """(answers dict, diagnosis) per row of a CSV or JSON lines file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            if 'diagnosis' not in (reader.fieldnames or ()):
+                raise ValueError(f'{path}: no diagnosis column')
+            for line, row in enumerate(reader, 2):
+                diagnosis = row.pop('diagnosis') or ''
+                yield {symptom: _certainty(value, f'{path}:{line} {symptom}')
+                       for symptom, value in row.items() if value not in ('', None)}, diagnosis
+            return
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'{path}:{line}: invalid JSON: {e}')
+            answers = record.get('answers') if isinstance(record, dict) else None
+            if isinstance(answers, list):
+                answers = dict(answers)
+            if not isinstance(answers, dict):
+                raise ValueError(f'{path}:{line}: answers must be an object')
+            yield ({symptom: _certainty(value, f'{path}:{line} {symptom}')
+                    for symptom, value in answers.items()},
+                   record.get('diagnosis') or '')
+
+
+def load_labeled(path: str) -> LabeledData:
+    """
+    Load labeled outcomes (see the module docstring for the formats).
+
+    Raises:
+        ValueError: If a row is malformed or a certainty is out of range
+        OSError: If the file cannot be read
+    """
+    rows = list(_labeled_rows(path))
+    symptoms = tuple(dict.fromkeys(s for answers, _ in rows for s in answers))
+    columns = {symptom: index for index, symptom in enumerate(symptoms)}
+    X = np.zeros((len(rows), len(symptoms)))
+    answered = np.zeros(X.shape, dtype=bool)
+    for row, (answers, _) in enumerate(rows):
+        for symptom, certainty in answers.items():
+            X[row, columns[symptom]] = certainty
+            answered[row, columns[symptom]] = True
+    outcomes = np.array([diagnosis for _, diagnosis in rows], dtype=str)
+    return LabeledData(symptoms, X, answered, outcomes)
+
+
+def outcome_targets(outcomes: np.ndarray, diseases: Sequence[str]) -> np.ndarray:
+    """One-hot (rows, diseases) matrix of the confirmed outcomes."""
+    outcomes = np.asarray(outcomes)
+    return np.stack([outcomes == disease for disease in diseases], axis=1).reshape(
+        len(outcomes), len(diseases))
+
+
+def outcome_metrics(scores: np.ndarray, outcomes: np.ndarray,
+                    diseases: Sequence[str]) -> Dict:
+    """
+    Accuracy and calibration of disease CFs against confirmed outcomes.
+
+    Args:
+        scores: Array of shape (rows, len(diseases)) of disease CFs
+        outcomes: The confirmed diagnosis of each row ('' for none)
+        diseases: The disease of each column
+
+    Returns:
+        Dict with 'rows'; 'accuracy' (the top diagnosis, or none if no
+        disease was concluded, is the outcome); 'brier' (mean squared
+        difference between each disease CF and whether it was the
+        outcome); 'undiagnosed' (fraction of rows with no diagnosis);
+        'ece' (expected calibration error of the top CF) and
+        'reliability', the table it is computed from: per CF bin, how many
+        top diagnoses fell in it, their mean CF and how often they were right
+    """
+    targets = outcome_targets(outcomes, diseases)
+    rows = len(scores)
+    labels = np.where(targets.any(axis=1), targets.argmax(axis=1), -1)
+    top = scores.argmax(axis=1) if len(diseases) else np.zeros(rows, dtype=int)
+    confidence = scores[np.arange(rows), top] if len(diseases) else np.zeros(rows)
+    predicted = np.where(confidence > 0.0, top, -1)
+    correct = predicted == labels
+
+    diagnosed = predicted >= 0
+    bins = np.minimum((confidence[diagnosed] * RELIABILITY_BINS).astype(int),
+                      RELIABILITY_BINS - 1)
+    reliability, ece = [], 0.0
+    for b in range(RELIABILITY_BINS):
+        in_bin = bins == b
+        count = int(in_bin.sum())
+        if not count:
+            continue
+        mean_cf = float(confidence[diagnosed][in_bin].mean())
+        rate = float(correct[diagnosed][in_bin].mean())
+        ece += count / diagnosed.sum() * abs(rate - mean_cf)
+        reliability.append({'cf': [b / RELIABILITY_BINS, (b + 1) / RELIABILITY_BINS],
+                            'rows': count, 'mean_cf': round(mean_cf, 6),
+                            'accuracy': round(rate, 6)})
+
+    def mean(values):
+        return round(float(values.mean()), 6) if values.size else 0.0
+
+    return {
+        'rows': rows,
+        'accuracy': mean(correct),
+        'brier': mean((scores - targets) ** 2),
+        'undiagnosed': mean(~diagnosed),
+        'ece': round(ece, 6),
+        'reliability': reliability,
+    }
+
+
+class RuleCalibrator:
+    """
+    Fits rule CFs and gate thresholds to labeled outcomes.
+
+    Exclusion bounds, saliences and the rules' symptoms are left as they
+    are. ``outputs`` holds every rule's CF on every row for the current
+    parameters (0.0 where it did not fire), and ``scores()`` combines them
+    per disease exactly as ``BatchEvaluator.evaluate`` does.
+
+    Args:
+        data: The labeled rows to fit
+        specs: The rules to start from (default: the built-in rule base)
+    """
+
+    def __init__(self, data: LabeledData, specs: Sequence[RuleSpec] = RULE_SPECS):
+        self.specs = tuple(specs)
+        evaluator = BatchEvaluator(data.symptoms, self.specs)
+        self.diseases = evaluator.diseases
+        self.targets = outcome_targets(data.outcomes, self.diseases)
+        self.rule_cf = np.array([spec.rule_cf for spec in self.specs])
+        self.thresholds = [np.array([t for _, t in spec.gates]) for spec in self.specs]
+        self._disease = [evaluator.disease_index[spec.disease] for spec in self.specs]
+        self._rules_of = [[r for r, d in enumerate(self._disease) if d == disease]
+                          for disease in range(len(self.diseases))]
+
+        X = np.where(data.answered, data.X, 0.0)
+        rows = X.shape[0]
+        # Per rule: the rows where it can fire whatever its parameters (its
+        # patterns are complete and its exclusions pass), and on those rows
+        # the CF of each gate group and the evidence CF (their AND)
+        self._rows: List[np.ndarray] = []
+        self._groups: List[np.ndarray] = []
+        self._evidence: List[np.ndarray] = []
+        for spec in self.specs:
+            candidate = evaluator.complete(spec, data.answered)
+            for symptom, bound in spec.exclusions:
+                candidate &= evaluator._column(X, symptom) < bound
+            index = np.flatnonzero(candidate)
+            groups = np.stack([
+                combine_cf_multiple_or_array(np.stack(
+                    [evaluator._column(X, s)[index] for s in group]), axis=0)
+                for group, _ in spec.gates])
+            self._rows.append(index)
+            self._groups.append(groups)
+            self._evidence.append(combine_cf_multiple_and_array(groups, axis=0))
+
+        self.outputs = np.zeros((len(self.specs), rows))
+        for r in range(len(self.specs)):
+            self.outputs[r, self._rows[r]] = self._output(r)
+
+    def _passed(self, r: int, skip: Optional[int] = None) -> np.ndarray:
+        """Rows (of the rule's rows) where every gate but ``skip`` passes."""
+        passed = np.ones(len(self._rows[r]), dtype=bool)
+        for g, threshold in enumerate(self.thresholds[r]):
+            if g != skip:
+                passed &= self._groups[r][g] >= threshold
+        return passed
+
+    def _output(self, r: int) -> np.ndarray:
+        return np.where(self._passed(r), self._evidence[r] * self.rule_cf[r], 0.0)
+
+    def scores(self) -> np.ndarray:
+        """Array of shape (rows, diseases) of disease CFs."""
+        return np.stack([self.outputs[rules].max(axis=0) if rules
+                         else np.zeros(self.outputs.shape[1])
+                         for rules in self._rules_of], axis=1)
+
+    def loss(self) -> float:
+        """Brier score of the current parameters."""
+        return float(((self.scores() - self.targets) ** 2).mean())
+
+    def _line_search(self, r: int, candidates: np.ndarray) -> Optional[int]:
+        """
+        Pick the best of candidate outputs (grid, rule rows) for rule ``r``.
+
+        Returns:
+            The index of the candidate that lowers the loss most, or None
+            if none lowers it
+        """
+        rows = self._rows[r]
+        disease = self._disease[r]
+        others = [o for o in self._rules_of[disease] if o != r]
+        other_cf = self.outputs[others][:, rows].max(axis=0) if others else np.zeros(len(rows))
+        target = self.targets[rows, disease]
+        current = ((np.maximum(other_cf, self.outputs[r, rows]) - target) ** 2).sum()
+        losses = ((np.maximum(other_cf, candidates) - target) ** 2).sum(axis=1)
+        best = int(losses.argmin())
+        return best if losses[best] < current - 1e-12 else None
+
+    def update_rule_cf(self, r: int, grid: Sequence[float] = DEFAULT_CF_GRID) -> bool:
+        """Set rule ``r``'s CF to its best grid value. Returns whether it changed."""
+        if not len(self._rows[r]):
+            return False
+        grid = np.asarray(grid, dtype=float)
+        evidence = np.where(self._passed(r), self._evidence[r], 0.0)
+        best = self._line_search(r, grid[:, None] * evidence)
+        if best is None:
+            return False
+        self.rule_cf[r] = grid[best]
+        self.outputs[r, self._rows[r]] = self._output(r)
+        return True
+
+    def update_threshold(self, r: int, g: int,
+                         grid: Sequence[float] = DEFAULT_THRESHOLD_GRID) -> bool:
+        """Set gate ``g`` of rule ``r`` to its best grid value. Returns whether it changed."""
+        if not len(self._rows[r]):
+            return False
+        grid = np.asarray(grid, dtype=float)
+        fired = self._evidence[r] * self.rule_cf[r]
+        passed = self._passed(r, skip=g) & (self._groups[r][g] >= grid[:, None])
+        best = self._line_search(r, np.where(passed, fired, 0.0))
+        if best is None:
+            return False
+        self.thresholds[r][g] = grid[best]
+        self.outputs[r, self._rows[r]] = self._output(r)
+        return True
+
+    def fit(self, sweeps: int = 10, cf_grid: Sequence[float] = DEFAULT_CF_GRID,
+            threshold_grid: Sequence[float] = DEFAULT_THRESHOLD_GRID,
+            tolerance: float = 1e-7) -> Dict:
+        """
+        Run sweeps of coordinate descent until the loss stops improving.
+
+        Each sweep updates every rule's CF and then its gate thresholds, in
+        rule base order. The loss never increases.
+
+        Returns:
+            Dict with the 'loss' before fitting and after each sweep, the
+            number of 'updates' tried and 'changes' kept, and 'update_ms',
+            the mean time of an update
+        """
+        losses = [self.loss()]
+        updates = changes = 0
+        elapsed = 0.0
+        for _ in range(sweeps):
+            start = time.perf_counter()
+            for r in range(len(self.specs)):
+                changes += self.update_rule_cf(r, cf_grid)
+                for g in range(len(self.thresholds[r])):
+                    changes += self.update_threshold(r, g, threshold_grid)
+                updates += 1 + len(self.thresholds[r])
+            elapsed += time.perf_counter() - start
+            losses.append(self.loss())
+            if losses[-2] - losses[-1] < tolerance:
+                break
+        return {
+            'loss': [round(loss, 6) for loss in losses],
+            'updates': updates,
+            'changes': changes,
+            'update_ms': round(elapsed * 1000 / max(updates, 1), 3),
+        }
+
+    def fitted_specs(self) -> Tuple[RuleSpec, ...]:
+        """The rules with the fitted CFs and thresholds."""
+        return tuple(
+            spec._replace(
+                rule_cf=round(float(self.rule_cf[r]), 6),
+                gates=tuple((group, round(float(threshold), 6)) for (group, _), threshold
+                            in zip(spec.gates, self.thresholds[r])))
+            for r, spec in enumerate(self.specs))
+
+
+def _changes(before: Sequence[RuleSpec], after: Sequence[RuleSpec]) -> List[Dict]:
+    changes = []
+    for old, new in zip(before, after):
+        if old == new:
+            continue
+        change = {'rule': old.name}
+        if old.rule_cf != new.rule_cf:
+            change['rule_cf'] = [old.rule_cf, new.rule_cf]
+        gates = [{'symptoms': list(group), 'threshold': [t_old, t_new]}
+                 for (group, t_old), (_, t_new) in zip(old.gates, new.gates) if t_old != t_new]
+        if gates:
+            change['gates'] = gates
+        changes.append(change)
+    return changes
+
+
+def calibrate(data: LabeledData, knowledge_base, holdout: float = 0.2, seed: int = 0,
+              sweeps: int = 10, cf_grid: Sequence[float] = DEFAULT_CF_GRID,
+              threshold_grid: Sequence[float] = DEFAULT_THRESHOLD_GRID):
+    """
+    Fit a knowledge base's rules to labeled outcomes.
+
+    Args:
+        data: The labeled rows
+        knowledge_base: The KnowledgeBase to start from
+        holdout: Fraction of the rows kept out of fitting to validate on
+        seed: Seed of the fit/holdout split
+        sweeps: Maximum number of coordinate descent sweeps
+
+    Returns:
+        (calibrated KnowledgeBase, report) where the report holds the
+        metrics ('outcome_metrics') of both versions on the fit and holdout
+        rows, the fit history and the changed rules
+    """
+    from .knowledge_base import KnowledgeBase
+
+    fit_data, holdout_data = data.split(holdout, seed)
+    calibrator = RuleCalibrator(fit_data, knowledge_base.specs)
+    before_fit = calibrator.scores()
+    history = calibrator.fit(sweeps, cf_grid, threshold_grid)
+    specs = calibrator.fitted_specs()
+    calibrated = KnowledgeBase(specs, knowledge_base.question_templates,
+                               knowledge_base.disease_info, knowledge_base.symptom_priorities,
+                               knowledge_base.rule_applicability,
+                               knowledge_base.question_applicability)
+
+    def holdout_metrics(rule_specs):
+        evaluator = BatchEvaluator(holdout_data.symptoms, rule_specs)
+        scores = evaluator.evaluate(holdout_data.X, holdout_data.answered)
+        return outcome_metrics(scores, holdout_data.outcomes, evaluator.diseases)
+
+    known = calibrator.diseases
+    return calibrated, {
+        'knowledge_base': {'from': knowledge_base.version, 'to': calibrated.version},
+        'rows': {'fit': len(fit_data), 'holdout': len(holdout_data),
+                 'no_known_outcome': int((~np.isin(data.outcomes, list(known))).sum())},
+        'before': {
+            'fit': outcome_metrics(before_fit, fit_data.outcomes, calibrator.diseases),
+            'holdout': holdout_metrics(knowledge_base.specs),
+        },
+        'after': {
+            'fit': outcome_metrics(calibrator.scores(), fit_data.outcomes, calibrator.diseases),
+            'holdout': holdout_metrics(specs),
+        },
+        'history': history,
+        'changes': _changes(knowledge_base.specs, specs),
+    }
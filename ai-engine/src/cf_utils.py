@@ -4,6 +4,8 @@ This module provides functions for combining and calculating certainty factors
 in the medical diagnosis expert system.
 """
 
+import numpy as np
+
 
 def combine_cf_and(cf1, cf2):
     """
@@ -225,3 +227,311 @@ def calculate_weighted_average_cf(cf_list, weights=None):
         raise ValueError("Weights must sum to 1.0")
     
     return sum(cf * weight for cf, weight in zip(cf_list, weights))
+
+
+# ============================================================================
+# Array versions
+# ============================================================================
+#
+# The functions below take NumPy arrays (or anything np.asarray accepts),
+# broadcast their arguments like NumPy operators and compute the same values
+# as the scalar functions above, element by element. The reductions fold an
+# axis the way the scalar functions fold their arguments. BatchEvaluator
+# (batch scoring, sensitivity and uncertainty analysis) is built on them.
+
+# Lower bounds of the categories of get_cf_category, and the categories
+CF_CATEGORY_THRESHOLDS = (0.3, 0.5, 0.7, 0.9)
+CF_CATEGORIES = ("Very Low", "Low", "Moderate", "High", "Very High")
+
+
+def _empty_along(cfs, axis):
+    """0.0 for every position of an array reduced along an empty axis."""
+    return np.zeros(np.delete(cfs.shape, axis % cfs.ndim))
+
+
+def combine_cf_and_array(cf1, cf2):
+    """
+    Array version of combine_cf_and: the element-wise minimum.
+    Used when ALL conditions must be true.
+    
+    Args:
+        cf1 (array_like): First certainty factors (0.0 to 1.0)
+        cf2 (array_like): Second certainty factors (0.0 to 1.0), broadcast
+            against ``cf1``
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, in the broadcast shape of
+        the arguments. Values are not clipped: out-of-range inputs pass
+        through as in combine_cf_and, and NaN propagates
+        
+    Example:
+        >>> combine_cf_and_array([0.8, 0.3], 0.6)
+        array([0.6, 0.3])
+    """
+    return np.minimum(cf1, cf2)
+
+
+def combine_cf_or_array(cf1, cf2):
+    """
+    Array version of combine_cf_or: the element-wise maximum.
+    Used when ANY condition being true is sufficient.
+    
+    Args:
+        cf1 (array_like): First certainty factors (0.0 to 1.0)
+        cf2 (array_like): Second certainty factors (0.0 to 1.0), broadcast
+            against ``cf1``
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, in the broadcast shape of
+        the arguments. Values are not clipped, and NaN propagates
+        
+    Example:
+        >>> combine_cf_or_array([0.8, 0.3], 0.6)
+        array([0.8, 0.6])
+    """
+    return np.maximum(cf1, cf2)
+
+
+def combine_cf_multiple_and_array(cfs, axis=-1):
+    """
+    Array version of combine_cf_multiple_and: the minimum along ``axis``.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0), the ones to combine
+            laid out along ``axis``
+        axis (int): The axis to combine
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, shaped like ``cfs`` without
+        ``axis``; 0.0 where the axis is empty, like the scalar version
+        without arguments. Values are not clipped
+        
+    Example:
+        >>> combine_cf_multiple_and_array([[0.8, 0.6, 0.9], [0.5, 0.7, 0.4]])
+        array([0.6, 0.4])
+    """
+    cfs = np.asarray(cfs, dtype=float)
+    return np.amin(cfs, axis=axis) if cfs.shape[axis] else _empty_along(cfs, axis)
+
+
+def combine_cf_multiple_or_array(cfs, axis=-1):
+    """
+    Array version of combine_cf_multiple_or: the maximum along ``axis``.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0), the ones to combine
+            laid out along ``axis``
+        axis (int): The axis to combine
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, shaped like ``cfs`` without
+        ``axis``; 0.0 where the axis is empty. Values are not clipped
+        
+    Example:
+        >>> combine_cf_multiple_or_array([[0.8, 0.6, 0.9], [0.5, 0.7, 0.4]])
+        array([0.9, 0.7])
+    """
+    cfs = np.asarray(cfs, dtype=float)
+    return np.amax(cfs, axis=axis) if cfs.shape[axis] else _empty_along(cfs, axis)
+
+
+def apply_rule_confidence_array(evidence_cf, rule_cf):
+    """
+    Array version of apply_rule_confidence: the element-wise product
+    Evidence CF × Rule Reliability CF.
+    
+    Args:
+        evidence_cf (array_like): Certainty factors from evidence (0.0 to 1.0)
+        rule_cf (array_like): Reliability of the rules (0.0 to 1.0), broadcast
+            against ``evidence_cf`` (e.g. one per rule along the last axis)
+        
+    Returns:
+        numpy.ndarray: Final certainty factors, in the broadcast shape of the
+        arguments. In [0.0, 1.0] when both are; not clipped otherwise
+        
+    Example:
+        >>> apply_rule_confidence_array([0.8, 0.5], [0.9, 0.5])
+        array([0.72, 0.25])
+    """
+    return np.multiply(evidence_cf, rule_cf)
+
+
+def combine_parallel_evidence_array(cf1, cf2):
+    """
+    Array version of combine_parallel_evidence:
+    CF1 + CF2 - (CF1 × CF2), element by element.
+    
+    Args:
+        cf1 (array_like): First certainty factors (0.0 to 1.0)
+        cf2 (array_like): Second certainty factors (0.0 to 1.0), broadcast
+            against ``cf1``
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors (float), in the broadcast
+        shape of the arguments. In [0.0, 1.0] when both are; not clipped
+        otherwise
+        
+    Example:
+        >>> combine_parallel_evidence_array([0.6, 0.5], 0.7)
+        array([0.88, 0.85])
+    """
+    cf1 = np.asarray(cf1, dtype=float)
+    cf2 = np.asarray(cf2, dtype=float)
+    return cf1 + cf2 - cf1 * cf2
+
+
+def fold_parallel_evidence(cfs, axis=-1):
+    """
+    Combine all the parallel evidence along ``axis``.
+    
+    Folding combine_parallel_evidence over a list gives
+    ``1 - (1 - CF1) × (1 - CF2) × ...``, which is computed in one product.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0), the independent
+            pieces of evidence laid out along ``axis``
+        axis (int): The axis to combine
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, shaped like ``cfs`` without
+        ``axis``; 0.0 (no evidence) where the axis is empty. In [0.0, 1.0]
+        when the inputs are; not clipped otherwise
+        
+    Example:
+        >>> fold_parallel_evidence([[0.6, 0.7, 0.5]])
+        array([0.94])
+    """
+    cfs = np.asarray(cfs, dtype=float)
+    return 1.0 - np.prod(1.0 - cfs, axis=axis)
+
+
+def combine_conflicting_evidence_array(cf_positive, cf_negative, axis=None):
+    """
+    Array version of combine_conflicting_evidence:
+    (CF_pos - CF_neg) / (1 - min(|CF_pos|, |CF_neg|)), element by element.
+    
+    With ``axis``, the supporting and the contradicting evidence along it
+    are each first folded as parallel evidence (fold_parallel_evidence),
+    then combined.
+    
+    Args:
+        cf_positive (array_like): Certainty factors supporting the hypothesis
+        cf_negative (array_like): Certainty factors contradicting it,
+            broadcast against ``cf_positive`` (after folding, with ``axis``)
+        axis (int): Optional axis along which to fold each side first
+        
+    Returns:
+        numpy.ndarray: Combined certainty factors, in the broadcast shape of
+        the arguments (without ``axis``). 0.0 where the two are equal or the
+        denominator is zero; between -1.0 and 1.0 for inputs in [0.0, 1.0],
+        and not clipped
+        
+    Example:
+        >>> combine_conflicting_evidence_array([0.8, 0.5], 0.3).round(3)
+        array([0.714, 0.286])
+    """
+    cf_positive = np.asarray(cf_positive, dtype=float)
+    cf_negative = np.asarray(cf_negative, dtype=float)
+    if axis is not None:
+        cf_positive = fold_parallel_evidence(cf_positive, axis)
+        cf_negative = fold_parallel_evidence(cf_negative, axis)
+    cf_positive, cf_negative = np.broadcast_arrays(cf_positive, cf_negative)
+    denominator = 1 - np.minimum(np.abs(cf_positive), np.abs(cf_negative))
+    defined = (cf_positive != cf_negative) & (denominator != 0)
+    return np.divide(cf_positive - cf_negative, denominator,
+                     out=np.zeros(cf_positive.shape), where=defined)
+
+
+def normalize_cf_array(cfs):
+    """
+    Array version of normalize_cf: clip every certainty factor to
+    [0.0, 1.0].
+    
+    Args:
+        cfs (array_like): Certainty factors to normalize
+        
+    Returns:
+        numpy.ndarray: Normalized certainty factors, shaped like ``cfs``
+        (NaN stays NaN)
+        
+    Example:
+        >>> normalize_cf_array([1.5, -0.2, 0.4])
+        array([1. , 0. , 0.4])
+    """
+    return np.clip(cfs, 0.0, 1.0)
+
+
+def get_cf_category_index(cfs):
+    """
+    Categorize certainty factors as indexes into CF_CATEGORIES, with the
+    thresholds of get_cf_category.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0)
+        
+    Returns:
+        numpy.ndarray: Category indexes (0 'Very Low' to 4 'Very High'),
+        shaped like ``cfs``. Values below 0.0 and NaN count as 'Very Low',
+        values above 1.0 as 'Very High'
+        
+    Example:
+        >>> get_cf_category_index([0.85, 0.2, 0.95])
+        array([3, 0, 4])
+    """
+    cfs = np.asarray(cfs, dtype=float)
+    return (cfs[..., np.newaxis] >= np.asarray(CF_CATEGORY_THRESHOLDS)).sum(axis=-1)
+
+
+def get_cf_category_array(cfs):
+    """
+    Array version of get_cf_category.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0)
+        
+    Returns:
+        numpy.ndarray: The category of each CF (strings), shaped like ``cfs``;
+        out-of-range values and NaN as in get_cf_category_index
+        
+    Example:
+        >>> get_cf_category_array([0.85, 0.2])
+        array(['High', 'Very Low'], dtype='<U9')
+    """
+    return np.asarray(CF_CATEGORIES)[get_cf_category_index(cfs)]
+
+
+def calculate_weighted_average_cf_array(cfs, weights=None, axis=-1):
+    """
+    Array version of calculate_weighted_average_cf, along ``axis``.
+    
+    Args:
+        cfs (array_like): Certainty factors (0.0 to 1.0), the ones to average
+            laid out along ``axis``
+        weights (array_like): Optional 1-D weights, one per position along
+            ``axis`` (must sum to 1.0); equal weights if None
+        axis (int): The axis to average over
+        
+    Returns:
+        numpy.ndarray: The averages, shaped like ``cfs`` without ``axis``
+        (0.0 where the axis is empty). In [0.0, 1.0] when the inputs are;
+        not clipped otherwise
+        
+    Raises:
+        ValueError: If the weights do not match the axis or do not sum to 1.0
+        
+    Example:
+        >>> calculate_weighted_average_cf_array([[0.8, 0.6, 0.9]], [0.5, 0.3, 0.2])
+        array([0.76])
+    """
+    cfs = np.asarray(cfs, dtype=float)
+    if not cfs.shape[axis]:
+        return _empty_along(cfs, axis)
+    if weights is None:
+        # Equal weights
+        return np.mean(cfs, axis=axis)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (cfs.shape[axis],):
+        raise ValueError("cf_list and weights must have the same length")
+    if abs(weights.sum() - 1.0) > 0.001:
+        raise ValueError("Weights must sum to 1.0")
+    return np.tensordot(np.moveaxis(cfs, axis, -1), weights, axes=1)
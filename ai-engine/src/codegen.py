@@ -0,0 +1,252 @@
+"""
+Code generation for the rule base.
+
+Every rule body reads its symptoms through ``_get_symptom_cf`` (a scan of
+working memory per lookup), checks its thresholds and OR-combines the
+result into a diagnosis. ``generate_rules_module`` turns the rule specs
+(``rules/specs.py``) into one Python module with a function per disease in
+which every rule is straight-line code over local variables, read once
+from a list of symptom certainties indexed by ``SYMPTOMS``.
+
+Identifiers in the generated code are positional (``s3`` for the fourth
+symptom of ``SYMPTOMS``, ``g0`` for a disease's first OR group,
+``_diagnose_2`` for the third disease); symptom, disease and rule names
+only appear in string literals, so any name a knowledge base gives is
+safe to compile and none can shadow another or the generated locals.
+
+The generated source is written to a cache directory under a name derived
+from ``rule_base_hash`` and imported from there, so it is only regenerated
+when the rules (or this generator) change.
+
+Generated module interface:
+
+- ``RULE_BASE_HASH``: Hash of the rules it was generated from
+- ``SYMPTOMS`` / ``SYMPTOM_INDEX``: Symptom order of the certainty list
+- ``MISSING``: Value of unanswered symptoms in the list
+- ``DISEASE_FUNCTIONS``: Disease -> function(cf) returning
+  ``(certainty, rank)``, where rank is the position of the first passing
+  rule in salience order (the order the engine fires them), or
+  ``(MISSING, None)`` if no rule passes
+- ``symptom_array(certainties)`` and ``diagnose(certainties)``
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import weakref
+from typing import Dict, List, Sequence, Tuple
+
+from .rules.specs import RULE_SPECS, RuleSpec
+
+
+# Bump when the generated code changes, so cached modules are regenerated
+CODEGEN_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.rule_cache'
+)
+
+# Certainty of an unanswered symptom in the generated code. It fails every
+# gate (a group needs a declared symptom to match the rule's patterns) and
+# passes every exclusion with a positive bound, like an unknown symptom (0.0)
+# in the rule bodies.
+MISSING = -1.0
+
+# Modules stay loaded while something (an engine, a knowledge base) uses
+# them, so the code of retired knowledge base versions can be freed
+_loaded_modules: 'weakref.WeakValueDictionary[str, object]' = weakref.WeakValueDictionary()
+
+
+def rule_base_hash(specs: Sequence[RuleSpec] = RULE_SPECS) -> str:
+    """Hash of the rule definitions and the generator version."""
+    payload = json.dumps([CODEGEN_VERSION, [list(spec) for spec in specs]])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class _Names:
+    """Identifiers of one disease function: symptoms by position, OR groups by number."""
+
+    def __init__(self, symptom_index: Dict[str, int], groups: Sequence[Tuple[str, ...]]):
+        self.symptom_index = symptom_index
+        self.groups = {group: f'g{number}' for number, group in enumerate(groups)}
+
+    def symptom(self, symptom: str) -> str:
+        return f's{self.symptom_index[symptom]}'
+
+    def group(self, group: Sequence[str]) -> str:
+        if len(group) == 1:
+            return self.symptom(group[0])
+        return self.groups[tuple(group)]
+
+
+def _gate_condition(names: _Names, group: Sequence[str], threshold: float) -> str:
+    # A group can only pass with a declared symptom, so a non-positive
+    # threshold still has to reject MISSING
+    return f'{names.group(group)} >= {max(threshold, 0.0)!r}'
+
+
+def _exclusion_condition(names: _Names, symptom: str, bound: float) -> str:
+    # An unknown symptom counts as 0.0, which never satisfies a bound <= 0
+    if bound <= 0.0:
+        return 'False'
+    return f'{names.symptom(symptom)} < {bound!r}'
+
+
+def _rule_lines(names: _Names, spec: RuleSpec, rank: int) -> List[str]:
+    conditions = [_gate_condition(names, group, threshold) for group, threshold in spec.gates]
+    conditions += [_exclusion_condition(names, s, bound) for s, bound in spec.exclusions]
+    if len(spec.gates) == 1:
+        evidence = names.group(spec.gates[0][0])
+    else:
+        evidence = f"min({', '.join(names.group(group) for group, _ in spec.gates)})"
+    return [
+        f'    # {spec.name!r}',
+        f"    if {' and '.join(conditions) or 'True'}:",
+        f'        final = {evidence} * {spec.rule_cf!r}',
+        f'        if rank is None:',
+        f'            best, rank = final, {rank}',
+        f'        elif final > best:',
+        f'            best = final',
+    ]
+
+
+def generate_rules_module(specs: Sequence[RuleSpec] = RULE_SPECS) -> str:
+    """
+    Generate the source of the specialized rules module.
+
+    Args:
+        specs: Rules to compile
+
+    Returns:
+        Python source code
+    """
+    symptoms = list(dict.fromkeys(s for spec in specs for s in spec.symptoms))
+    symptom_index = {symptom: index for index, symptom in enumerate(symptoms)}
+    # The engine fires rules by salience; ties keep rule base order
+    fire_order = sorted(specs, key=lambda spec: -spec.salience)
+    rank = {spec.name: index for index, spec in enumerate(fire_order)}
+    by_disease: Dict[str, List[RuleSpec]] = {}
+    for spec in fire_order:
+        by_disease.setdefault(spec.disease, []).append(spec)
+
+    lines = [
+        '"""Rule base compiled by src/codegen.py. Generated code; do not edit."""',
+        '',
+        f'RULE_BASE_HASH = {rule_base_hash(specs)!r}',
+        f'MISSING = {MISSING!r}',
+        f'SYMPTOMS = {tuple(symptoms)!r}',
+        'SYMPTOM_INDEX = {symptom: index for index, symptom in enumerate(SYMPTOMS)}',
+    ]
+    functions = {}
+    for number, (disease, rules) in enumerate(by_disease.items()):
+        name = f'_diagnose_{number}'
+        functions[disease] = name
+        used = list(dict.fromkeys(s for spec in rules for s in spec.symptoms))
+        # OR'd groups are combined once and shared by the rules using them
+        groups = list(dict.fromkeys(tuple(g) for spec in rules for g, _ in spec.gates
+                                    if len(g) > 1))
+        names = _Names(symptom_index, groups)
+        lines += ['', '', f'def {name}(cf):', f'    # {disease!r}']
+        lines += [f'    {names.symptom(s)} = cf[{symptom_index[s]}]' for s in used]
+        lines += [f"    {names.group(g)} = max({', '.join(names.symptom(s) for s in g)})"
+                  for g in groups]
+        lines += ['    best, rank = MISSING, None']
+        for spec in rules:
+            lines += _rule_lines(names, spec, rank[spec.name])
+        lines += ['    return best, rank']
+
+    lines += [
+        '',
+        '',
+        'DISEASE_FUNCTIONS = {',
+        *[f'    {disease!r}: {name},' for disease, name in functions.items()],
+        '}',
+        '',
+        '',
+        'def symptom_array(certainties):',
+        '    """Symptom certainties as the list the disease functions read."""',
+        '    cf = [MISSING] * len(SYMPTOMS)',
+        '    for symptom, certainty in certainties.items():',
+        '        index = SYMPTOM_INDEX.get(symptom)',
+        '        if index is not None:',
+        '            cf[index] = certainty',
+        '    return cf',
+        '',
+        '',
+        'def diagnose(certainties):',
+        '    """Diagnoses for a symptom -> certainty mapping, like rules.specs.diagnose."""',
+        '    cf = symptom_array(certainties)',
+        '    results = []',
+        '    for disease, function in DISEASE_FUNCTIONS.items():',
+        '        best, rank = function(cf)',
+        '        if rank is not None:',
+        '            results.append((rank, disease, best))',
+        '    return {disease: best for _, disease, best in sorted(results)}',
+        '',
+    ]
+    return '\n'.join(lines)
+
+
+def _import_module(path: str, name: str):
+    module_spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+
+def load_compiled_rules(specs: Sequence[RuleSpec] = RULE_SPECS,
+                        cache_dir: str = DEFAULT_CACHE_DIR):
+    """
+    Load the compiled rules module, generating it if it is not cached.
+
+    The module is cached on disk as ``rules_<hash>.py`` in ``cache_dir`` and
+    in memory for as long as it is referenced. A cached file that cannot be
+    imported or was generated from other rules is regenerated.
+
+    Args:
+        specs: Rules to compile
+        cache_dir: Directory for generated modules
+
+    Returns:
+        The imported module
+
+    Raises:
+        ValueError: If the rules cannot be compiled
+        OSError: If the generated module cannot be written
+    """
+    digest = rule_base_hash(specs)
+    key = os.path.join(os.path.abspath(cache_dir), digest)
+    module = _loaded_modules.get(key)
+    if module is not None:
+        return module
+
+    path = os.path.join(cache_dir, f'rules_{digest}.py')
+    name = f'_compiled_rules_{digest}'
+    module = None
+    if os.path.exists(path):
+        try:
+            module = _import_module(path, name)
+        except Exception:
+            module = None
+        if getattr(module, 'RULE_BASE_HASH', None) != digest:
+            module = None
+
+    if module is None:
+        try:
+            source = generate_rules_module(specs)
+            compile(source, path, 'exec')
+        except Exception as e:
+            raise ValueError(f'Cannot compile the rules: {e}') from e
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        os.replace(temp_path, path)
+        try:
+            module = _import_module(path, name)
+        except Exception as e:
+            raise ValueError(f'Cannot import the compiled rules: {e}') from e
+
+    _loaded_modules[key] = module
+    return module
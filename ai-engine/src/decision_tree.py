@@ -0,0 +1,454 @@
+"""
+Decision-tree precompilation of the question flow.
+
+When answers are restricted to a fixed set of certainty levels (for example
+the No / Unsure / Yes quick responses), the questions asked and the diagnoses
+reached are a deterministic function of the previous answers. This module
+enumerates that flow offline into a DAG whose nodes store the current
+diagnosis ranking and the next question, and serves sessions by walking it.
+
+States that cannot lead to different questions or diagnoses are merged, so
+the result is a DAG rather than a full tree. Two states are equivalent when
+they have asked the same questions, hold the same diagnoses, agree on what
+the rules that can no longer change contribute, and their answers are
+indistinguishable to every other rule.
+"""
+
+import hashlib
+import json
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .facts import QUESTION_TEMPLATES, DISEASE_INFO
+from .question_engine import QuestionEngine, format_question
+from .rules.specs import RULE_SPECS, diagnose, evaluate_rule, rank_diagnoses
+
+
+# Certainties sent by the quick-response buttons: No / Unsure / Yes
+DEFAULT_LEVELS = (0.0, 0.5, 1.0)
+
+FORMAT_VERSION = 3  # 3: ties ranked by disease name
+
+# Tolerance when matching an answer against a quantization level
+LEVEL_TOLERANCE = 1e-9
+
+NO_CHILD = -1
+
+
+def knowledge_fingerprint() -> str:
+    """
+    Hash everything the question flow depends on.
+
+    A compiled tree is only valid for the rules, question templates and
+    symptom priorities it was compiled from.
+    """
+    content = repr((
+        RULE_SPECS,
+        sorted(QUESTION_TEMPLATES.items()),
+        sorted((d, info.get('common_symptoms')) for d, info in DISEASE_INFO.items()),
+        sorted(QuestionEngine().symptom_priorities.items()),
+    ))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+def _settled(spec, answers: Dict[str, float]) -> bool:
+    """A rule is settled once every symptom it reads has been answered."""
+    return all(s in answers for s in spec.symptoms)
+
+
+def _answer_classes(answers: Dict[str, float]) -> Tuple:
+    """
+    Reduce the answers to what rules that are not settled can observe.
+
+    Diagnoses are recomputed from the current answers, so a rule's result
+    can only change until every symptom it reads is answered. For the other
+    rules an answer matters through the exclusion bounds it passes and, if it
+    reaches any gate threshold, its exact value (which can become the rule's
+    evidence CF). Below every threshold the exact value is irrelevant, even
+    inside an OR group.
+    """
+    gate_min: Dict[str, float] = {}
+    bounds: Dict[str, set] = {}
+    for spec in RULE_SPECS:
+        if _settled(spec, answers):
+            continue
+        for group, threshold in spec.gates:
+            for symptom in group:
+                gate_min[symptom] = min(gate_min.get(symptom, threshold), threshold)
+        for symptom, bound in spec.exclusions:
+            bounds.setdefault(symptom, set()).add(bound)
+
+    classes = []
+    for symptom in sorted(answers):
+        if symptom not in gate_min and symptom not in bounds:
+            continue
+        value = answers[symptom]
+        exact = value if value >= gate_min.get(symptom, float('inf')) else None
+        passed = tuple(value < b for b in sorted(bounds.get(symptom, ())))
+        classes.append((symptom, exact, passed))
+    return tuple(classes)
+
+
+def _settled_results(answers: Dict[str, float]) -> Tuple:
+    """Best CF per disease over the settled rules, which no later answer changes."""
+    results: Dict[str, float] = {}
+    for spec in RULE_SPECS:
+        if _settled(spec, answers):
+            final_cf = evaluate_rule(spec, answers)
+            if final_cf is not None:
+                results[spec.disease] = max(results.get(spec.disease, final_cf), final_cf)
+    return tuple(sorted(results.items()))
+
+
+def _state_key(answers: Dict[str, float], diagnoses: Dict[str, float]) -> Tuple:
+    return (frozenset(answers), tuple(sorted(diagnoses.items())),
+            _settled_results(answers), _answer_classes(answers))
+
+
+class DecisionTree:
+    """
+    A compiled question flow.
+
+    Node 0 is the state at the start of a session. Every node stores the
+    next question to ask (None once the engine would give its diagnosis),
+    the diagnosis ranking at that point, and one child per certainty level.
+    Children beyond the compiled depth are ``NO_CHILD``.
+    """
+
+    def __init__(self, levels: Sequence[float], questions: List[Optional[str]],
+                 diagnoses: List[List[Tuple[str, float]]], children: List[List[int]],
+                 fingerprint: str, stats: Optional[Dict] = None):
+        self.levels = tuple(levels)
+        self.questions = questions
+        self.diagnoses = diagnoses
+        self.children = children
+        self.fingerprint = fingerprint
+        self.stats = stats or {}
+
+    root = 0
+
+    def level_index(self, certainty: float) -> Optional[int]:
+        """Get the index of the level matching a certainty, if any."""
+        for index, level in enumerate(self.levels):
+            if abs(level - certainty) <= LEVEL_TOLERANCE:
+                return index
+        return None
+
+    def question(self, node: int) -> Optional[Dict[str, str]]:
+        """Get the question dictionary stored at a node."""
+        symptom = self.questions[node]
+        return format_question(symptom) if symptom is not None else None
+
+    def diagnosis(self, node: int) -> List[Tuple[str, float]]:
+        """Get the diagnosis ranking stored at a node."""
+        return list(self.diagnoses[node])
+
+    def child(self, node: int, symptom: str, certainty: float) -> Optional[int]:
+        """
+        Follow an answer from a node.
+
+        Returns:
+            The child node, or None if the answer is not the question asked
+            at this node, is off the quantization grid, or is beyond the
+            compiled depth
+        """
+        if self.questions[node] != symptom:
+            return None
+        index = self.level_index(certainty)
+        if index is None:
+            return None
+        child = self.children[node][index]
+        return child if child != NO_CHILD else None
+
+    def walk(self, answers: Iterable[Tuple[str, float]]) -> Tuple[int, int]:
+        """
+        Walk a sequence of answers from the root.
+
+        Returns:
+            Tuple of (last node reached, number of answers served by the tree)
+        """
+        node, served = self.root, 0
+        for symptom, certainty in answers:
+            child = self.child(node, symptom, certainty)
+            if child is None:
+                break
+            node, served = child, served + 1
+        return node, served
+
+    def size(self) -> Dict[str, int]:
+        """Report node, edge and frontier counts."""
+        edges = sum(1 for row in self.children for c in row if c != NO_CHILD)
+        frontier = sum(1 for q, row in zip(self.questions, self.children)
+                       if q is not None and all(c == NO_CHILD for c in row))
+        return {'nodes': len(self.questions), 'edges': edges, 'frontier': frontier}
+
+    def coverage(self, sessions: Iterable[Sequence[Tuple[str, float]]]) -> Dict[str, float]:
+        """
+        Measure how much of a set of real sessions the tree can serve.
+
+        Args:
+            sessions: Answer sequences, each a list of (symptom, certainty)
+
+        Returns:
+            Dict with session and answer counts and the covered shares
+        """
+        total_sessions = covered_sessions = total_answers = served_answers = 0
+        for answers in sessions:
+            answers = list(answers)
+            _, served = self.walk(answers)
+            total_sessions += 1
+            total_answers += len(answers)
+            served_answers += served
+            if served == len(answers):
+                covered_sessions += 1
+        return {
+            'sessions': total_sessions,
+            'covered_sessions': covered_sessions,
+            'session_coverage': covered_sessions / total_sessions if total_sessions else 0.0,
+            'answers': total_answers,
+            'served_answers': served_answers,
+            'answer_coverage': served_answers / total_answers if total_answers else 0.0,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'format': FORMAT_VERSION,
+            'fingerprint': self.fingerprint,
+            'levels': list(self.levels),
+            'stats': self.stats,
+            'nodes': [
+                [question, [list(item) for item in ranking], children]
+                for question, ranking, children
+                in zip(self.questions, self.diagnoses, self.children)
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DecisionTree':
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported decision tree format: {data.get('format')}")
+        nodes = data['nodes']
+        return cls(
+            levels=data['levels'],
+            questions=[node[0] for node in nodes],
+            diagnoses=[[tuple(item) for item in node[1]] for node in nodes],
+            children=[node[2] for node in nodes],
+            fingerprint=data['fingerprint'],
+            stats=data.get('stats'),
+        )
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str, check_fingerprint: bool = True) -> 'DecisionTree':
+        """
+        Load a compiled tree.
+
+        Raises:
+            ValueError: If the tree was compiled from a different knowledge base
+        """
+        with open(path) as f:
+            tree = cls.from_dict(json.load(f))
+        if check_fingerprint and tree.fingerprint != knowledge_fingerprint():
+            raise ValueError(
+                f'Decision tree {path} was compiled from a different knowledge base; '
+                'recompile it with compile_decision_tree.py'
+            )
+        return tree
+
+
+def compile_question_flow(levels: Sequence[float] = DEFAULT_LEVELS,
+                          max_depth: Optional[int] = None) -> DecisionTree:
+    """
+    Enumerate the question flow into a decision DAG.
+
+    Follows exactly what ``main.py`` does per answer: record the answer,
+    declare the symptom, run the rules, then either ask the next question or
+    stop.
+
+    Args:
+        levels: Certainty levels an answer can take
+        max_depth: Stop expanding after this many answers (None = no limit);
+            sessions that go deeper fall back to live inference
+
+    Returns:
+        The compiled DecisionTree
+    """
+    question_engine = QuestionEngine()
+    questions: List[Optional[str]] = []
+    rankings: List[List[Tuple[str, float]]] = []
+    children: List[List[int]] = []
+    node_ids: Dict[Tuple, int] = {}
+    queue = deque()
+    merged = 0
+
+    def add_node(answers, diagnoses, question):
+        questions.append(question)
+        rankings.append(rank_diagnoses(diagnoses))
+        children.append([NO_CHILD] * len(levels))
+        node = len(questions) - 1
+        if question is not None and (max_depth is None or len(answers) < max_depth):
+            queue.append((node, answers, diagnoses))
+        return node
+
+    add_node({}, {}, question_engine.get_initial_question()['symptom'])
+
+    while queue:
+        node, answers, diagnoses = queue.popleft()
+        symptom = questions[node]
+        for index, level in enumerate(levels):
+            next_answers = dict(answers)
+            next_answers[symptom] = level
+            next_diagnoses = diagnose(next_answers)
+
+            key = _state_key(next_answers, next_diagnoses)
+            child = node_ids.get(key)
+            if child is None:
+                question_engine.asked_symptoms = set(next_answers)
+                next_question = None
+                if question_engine.should_continue_asking(next_diagnoses):
+                    q = question_engine.get_next_question(next_diagnoses)
+                    next_question = q['symptom'] if q else None
+                child = add_node(next_answers, next_diagnoses, next_question)
+                node_ids[key] = child
+            else:
+                merged += 1
+            children[node][index] = child
+
+    tree = DecisionTree(levels, questions, rankings, children, knowledge_fingerprint())
+    tree.stats = dict(tree.size(), merged_states=merged, max_depth=max_depth)
+    return tree
+
+
+class DecisionTreeSession:
+    """
+    Serves a diagnosis session from a compiled DecisionTree.
+
+    Exposes the subset of the MedicalDiagnosisEngine interface used by
+    ``main.py``. Answers that leave the tree (off-grid certainties,
+    unexpected symptoms, edits, or sessions deeper than the compiled depth)
+    switch the session to a live engine, which is brought up to date by
+    replaying the answers given so far.
+    """
+
+    # Trees are compiled from the built-in knowledge base
+    knowledge_base = None
+
+    def __init__(self, tree: DecisionTree, engine_factory=None):
+        self.tree = tree
+        self._engine_factory = engine_factory
+        self.engine = None
+        self.node = tree.root
+        self.path: List[int] = []  # Node before each answer, for undo
+        self.answers: List[Tuple[str, float]] = []
+        self.tree_steps = 0
+        self.fallback_steps = 0
+
+    @property
+    def on_tree(self) -> bool:
+        return self.engine is None
+
+    def _start_engine(self):
+        if self._engine_factory is None:
+            from .engine import MedicalDiagnosisEngine
+            self._engine_factory = MedicalDiagnosisEngine
+        self.engine = self._engine_factory()
+        self.engine.reset_session()
+        for answered, answered_certainty in self.answers:
+            self.engine.answer(answered, answered_certainty)
+
+    def _take_tree_step(self, symptom, certainty) -> bool:
+        child = self.tree.child(self.node, symptom, certainty)
+        if child is None:
+            return False
+        self.path.append(self.node)
+        self.node = child
+        self.answers.append((symptom, certainty))
+        self.tree_steps += 1
+        return True
+
+    def reset_session(self):
+        self.engine = None
+        self.node = self.tree.root
+        self.path = []
+        self.answers = []
+
+    def reset(self):
+        self.reset_session()
+
+    def get_initial_question(self):
+        return self.tree.question(self.tree.root)
+
+    def record_answer(self, symptom, certainty):
+        if not self.on_tree:
+            self.engine.record_answer(symptom, certainty)
+
+    def add_symptom(self, symptom_name, certainty):
+        if self.on_tree:
+            if self._take_tree_step(symptom_name, certainty):
+                return
+            self._start_engine()
+            # main.py records an answer before adding it; while on the tree
+            # that was a no-op, so record the current answer now.
+            self.engine.record_answer(symptom_name, certainty)
+        self.answers.append((symptom_name, certainty))
+        self.fallback_steps += 1
+        self.engine.add_symptom(symptom_name, certainty)
+
+    def run(self):
+        if not self.on_tree:
+            self.engine.run()
+
+    def answer(self, symptom, certainty):
+        if self.on_tree:
+            if self._take_tree_step(symptom, certainty):
+                return
+            self._start_engine()
+        self.answers.append((symptom, certainty))
+        self.fallback_steps += 1
+        self.engine.answer(symptom, certainty)
+
+    def edit_answer(self, symptom, certainty):
+        if symptom not in dict(self.answers):
+            raise KeyError(symptom)
+        # The tree only follows first answers; edits are served live
+        if self.on_tree:
+            self._start_engine()
+        self.answers.append((symptom, certainty))
+        self.fallback_steps += 1
+        self.engine.edit_answer(symptom, certainty)
+
+    def undo(self):
+        if not self.on_tree:
+            checkpoint = self.engine.undo()
+            if checkpoint is not None:
+                self.answers.pop()
+            return checkpoint
+        if not self.answers:
+            return None
+        from .engine import Checkpoint
+        symptom, certainty = self.answers.pop()
+        self.node = self.path.pop()
+        return Checkpoint(symptom, certainty, None, ())
+
+    def should_continue_asking(self):
+        if not self.on_tree:
+            return self.engine.should_continue_asking()
+        return self.tree.questions[self.node] is not None
+
+    def get_next_question(self):
+        if not self.on_tree:
+            return self.engine.get_next_question()
+        return self.tree.question(self.node)
+
+    def get_answers(self):
+        if not self.on_tree:
+            return self.engine.get_answers()
+        return list(self.answers)
+
+    def get_diagnosis_results(self):
+        if not self.on_tree:
+            return self.engine.get_diagnosis_results()
+        return self.tree.diagnosis(self.node)
@@ -0,0 +1,209 @@
+"""
+Live diagnostics for a running engine process.
+
+``SamplingProfiler`` samples the stack of one thread (the one serving the
+protocol) at a fixed interval, for a limited time, and aggregates the
+samples as collapsed stacks: one line per
+distinct stack, frames root first separated by ``;``, followed by the
+sample count. That is the input format of flame graph tools such as
+``flamegraph.pl`` and speedscope.
+
+``memory_report`` summarizes what an engine holds (facts, answers,
+checkpoints) and, when tracemalloc is tracing, the top allocation sites.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .facts import Symptom
+
+
+MAX_PROFILE_SECONDS = 300
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler:
+    """
+    Samples a thread's stack every ``interval`` seconds for ``duration`` seconds.
+
+    When the sampled thread is the main thread and the platform has
+    ``signal.setitimer``, samples are taken by a SIGPROF handler on a CPU
+    time interval timer: the handler runs in the sampled thread between
+    bytecodes, so samples are unbiased and a thread waiting for input is
+    not sampled at all. Otherwise a background thread samples the stack
+    with ``sys._current_frames()``; it can only do so when the sampled
+    thread releases the GIL, so samples lean towards I/O. In that mode a
+    sample whose innermost frame is in ``idle_functions`` (e.g. the loop
+    blocked reading stdin) is counted as idle and not kept as a stack.
+    """
+
+    def __init__(self, thread_id: int, duration: float, interval: float = 0.005,
+                 output: Optional[str] = None, idle_functions=()):
+        self.thread_id = thread_id
+        self.duration = duration
+        self.interval = interval
+        self.output = output
+        self.idle_functions = set(idle_functions)
+        self.mode = ('signal' if hasattr(signal, 'setitimer')
+                     and thread_id == threading.main_thread().ident else 'thread')
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.started = None
+        self.elapsed = None
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._closed = False  # No more samples once the results are final
+        self._lock = threading.Lock()
+        self._previous_handler = None
+
+    @property
+    def running(self) -> bool:
+        return self.started is not None and not self._finished.is_set()
+
+    def start(self):
+        """Start sampling (from the sampled thread in signal mode)."""
+        self.started = time.perf_counter()
+        if self.mode == 'signal':
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            target = self._wait
+        else:
+            target = self._poll
+        threading.Thread(target=target, name='sampling-profiler', daemon=True).start()
+
+    def stop(self):
+        """Stop sampling early and wait until the samples are final."""
+        self._stop.set()
+        self._finished.wait()
+        if self._previous_handler is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._previous_handler = None
+
+    def _record(self, frame):
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def _on_signal(self, signum, frame):
+        # Never block in the handler: while _finish holds the lock (or a
+        # signal arrives after it), the sample is dropped
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if not self._closed:
+                self.samples += 1
+                self._record(frame)
+        finally:
+            self._lock.release()
+
+    def _wait(self):
+        self._stop.wait(self.duration)
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        self._finish()
+
+    def _poll(self):
+        deadline = self.started + self.duration
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples += 1
+                if _frame_label(frame) in self.idle_functions:
+                    self.idle_samples += 1
+                else:
+                    self._record(frame)
+            if time.perf_counter() >= deadline:
+                break
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._closed = True
+            self.elapsed = time.perf_counter() - self.started
+            if self.output:
+                with open(self.output, 'w', encoding='utf-8') as f:
+                    f.writelines(line + '\n' for line in self.collapsed())
+        self._finished.set()
+
+    def collapsed(self) -> List[str]:
+        """The samples as collapsed stack lines, most frequent first."""
+        # dict() copies in one step, so a sample cannot land mid-iteration
+        stacks = Counter(dict(self.stacks)).most_common()
+        return [f"{';'.join(stack)} {count}" for stack, count in stacks]
+
+    def summary(self) -> Dict:
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        return {
+            'running': self.running,
+            'mode': self.mode,
+            'duration': self.duration,
+            'elapsed': round(elapsed, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'idle_samples': self.idle_samples,
+            'output': self.output,
+        }
+
+
+def engine_counts(engine) -> Dict:
+    """Facts and session state held by an engine (or a DecisionTreeSession)."""
+    live = getattr(engine, 'engine', engine)  # a tree session's live engine, if any
+    facts = getattr(live, 'facts', None) or {}
+    return {
+        'facts': len(facts),
+        'symptom_facts': sum(1 for fact in facts.values() if isinstance(fact, Symptom)),
+        'answers': len(engine.get_answers()),
+        'diagnoses': len(getattr(live, 'diagnoses', None) or {}),
+        'checkpoints': len(getattr(live, 'history', None) or ()),
+    }
+
+
+def top_allocations(limit: int = 10) -> List[Dict]:
+    """Top allocation sites by size, if tracemalloc is tracing."""
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    return [
+        {
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def memory_report(engine, top: int = 10) -> Dict:
+    """
+    Report what an engine holds and where memory is allocated.
+
+    Returns:
+        Dict with 'tracing' (whether tracemalloc is on), 'traced_kb' and
+        'peak_kb' (memory traced since tracing started), 'top' allocation
+        sites, and the engine's fact and session 'counts' (empty if engine
+        is None)
+    """
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        'tracing': tracing,
+        'traced_kb': round(current / 1024, 1),
+        'peak_kb': round(peak / 1024, 1),
+        'top': top_allocations(top),
+        'counts': engine_counts(engine) if engine is not None else {},
+    }
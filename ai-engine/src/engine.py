@@ -3,25 +3,65 @@ Main inference engine for the medical diagnosis expert system.
 This module contains the core logic for the expert system using Experta.
 """
 
+import heapq
+from typing import NamedTuple, Optional, Tuple
+
 # Import compatibility patch for Python 3.12+
 from . import compat
 
 from experta import KnowledgeEngine, Rule, AND, OR, NOT
+from .lite_engine import LiteKnowledgeEngine
 from .facts import Symptom, Diagnosis, Question, PatientInfo
 from .rules import (
     InfluenzaRules, Covid19Rules, CommonColdRules,
     StrepThroatRules, PneumoniaRules, BronchitisRules
 )
-from .question_engine import QuestionEngine
+from .question_engine import QuestionEngine, RELEVANCE_THRESHOLD
+from .explain import ExplanationTrace
+from .knowledge_base import builtin_knowledge_base
+from .rules.specs import (
+    RULE_SPECS, RULE_SPECS_BY_NAME, RULES_BY_SYMPTOM, pattern_complete, rank_diagnoses
+)
+
+
+class Checkpoint(NamedTuple):
+    """
+    What one answer changed, recorded so that it can be undone.
+    
+    Only the state the answer touched is stored; everything else is shared
+    with the checkpoints before it.
+    
+    Attributes:
+        symptom: The symptom answered
+        certainty: The new answer
+        previous: The earlier answer to the symptom, or None if this was the
+            first one
+        diagnoses: (disease, certainty before the answer) for every diagnosis
+            the answer changed; None for diagnoses it added
+        skipped_bounds: The top-k skip bookkeeping before the answer (only
+            with ``top_k``)
+        traces: (disease, explanation record before the answer) for every
+            record the answer replaced (only with ``trace``)
+        order: The diseases in ``diagnoses`` order before the answer, if
+            the answer changed it (ties rank in that order); None otherwise
+    """
+    symptom: str
+    certainty: float
+    previous: Optional[float]
+    diagnoses: Tuple[Tuple[str, Optional[float]], ...]
+    skipped_bounds: Optional[dict] = None
+    traces: Optional[tuple] = None
+    order: Optional[Tuple[str, ...]] = None
 
 
-class MedicalDiagnosisEngine(
+class DiagnosisEngineBase(
     InfluenzaRules, Covid19Rules, CommonColdRules,
-    StrepThroatRules, PneumoniaRules, BronchitisRules,
-    KnowledgeEngine
+    StrepThroatRules, PneumoniaRules, BronchitisRules
 ):
     """
-    The main expert system engine for medical diagnosis.
+    The expert system engine for medical diagnosis, independent of the
+    forward-chaining engine underneath (see ``MedicalDiagnosisEngine`` and
+    ``LiteDiagnosisEngine``).
     Uses forward chaining with certainty factors to diagnose respiratory illnesses.
     
     Inherits diagnostic rules from:
@@ -31,41 +71,374 @@ class MedicalDiagnosisEngine(
     - StrepThroatRules: Rules for diagnosing strep throat
     - PneumoniaRules: Rules for diagnosing pneumonia
     - BronchitisRules: Rules for diagnosing bronchitis
+    
+    With ``top_k`` set, the engine only keeps the top ``top_k`` diagnoses
+    exact and skips rule bodies that cannot change them (see ``run``). With
+    an execution ``plan`` from ``rule_analysis.analyze_rules``, stronger
+    rules fire first and dominated or subsumed rules are skipped once they
+    can no longer change a diagnosis. With ``compiled_rules`` (a module from
+    ``codegen.load_compiled_rules``), diseases are recomputed by the
+    generated code instead of the rule bodies.
+    
+    With a ``knowledge_base`` (``knowledge_base.KnowledgeBase``), the
+    engine runs that version of the rules and question tables instead of
+    the built-in ones: its rules are always evaluated by the code generated
+    from its specs, and the rule bodies never fire.
+    
+    With ``trace``, the engine keeps an explanation of each diagnosis (the
+    rules behind its CF, see ``explain.py``), returned by ``explain``.
+    
+    ``set_patient`` narrows a session to the rules and questions that apply
+    to the patient (see ``patient_context.py``).
     """
     
-    def __init__(self):
+    def __init__(self, top_k=None, plan=None, compiled_rules=None, knowledge_base=None,
+                 trace=False):
         super().__init__()
         self.diagnoses = {}  # Store diagnosis results with certainty factors
         self.questions_asked = []  # Track which questions have been asked
         self.next_question = None  # The next question to ask the user
-        self.question_engine = QuestionEngine()  # Question-asking engine
+        self.knowledge_base = knowledge_base  # KnowledgeBase in use (None = built-in)
+        if knowledge_base is not None:
+            compiled_rules = knowledge_base.compiled_rules
+            self.rule_specs = knowledge_base.specs
+            self._rules_by_symptom = knowledge_base.rules_by_symptom
+            self.question_engine = QuestionEngine(knowledge_base.question_templates,
+                                                  knowledge_base.disease_info,
+                                                  knowledge_base.symptom_priorities,
+                                                  knowledge_base.question_index)
+        else:
+            self.rule_specs = RULE_SPECS
+            self._rules_by_symptom = RULES_BY_SYMPTOM
+            self.question_engine = QuestionEngine()  # Question-asking engine
+        self.top_k = top_k  # Only rank the top k diagnoses (None = all)
+        self.plan = plan  # ExecutionPlan used to order and skip rules
+        self.compiled_rules = compiled_rules  # Generated rules module (None = rule bodies)
+        self.rule_stats = {'fired': 0, 'skipped': 0}
+        self._evaluated_answers = {}  # Symptom certainties as of the last run()
+        self._skipped_bounds = {}  # Disease -> highest CF bound of a rule skipped for top k
+        self._rules_by_name = {rule.__name__: rule for rule in self.get_rules()}
+        self._skipped_rules = set()  # Rules skipped by the current run()
+        self.history = []  # Checkpoints of the answers given, for undo
+        # Explanations of the diagnoses (None = not traced)
+        self.trace = ExplanationTrace(self.rule_specs) if trace else None
+        self.patient = None  # The session's patient (None = no context)
+        self.context = None  # ContextProfile of the patient's bucket
+        self._all_rules = (self.rule_specs, self._rules_by_symptom, self.compiled_rules)
         
     def reset_session(self):
         """Reset the engine for a new diagnosis session."""
         self.reset()
+        if self.context is not None:
+            self._use_rules(*self._all_rules)
+            self.context = None
+        self.patient = None
         self.diagnoses = {}
         self.questions_asked = []
         self.next_question = None
         self.question_engine.reset()
+        self.rule_stats = {'fired': 0, 'skipped': 0}
+        self._evaluated_answers = {}
+        self._skipped_bounds = {}
+        self.history = []
+        if self.trace is not None:
+            self.trace.clear()
+    
+    def set_patient(self, patient):
+        """
+        Tailor the session to a patient (after reset_session).
+        
+        Declares the PatientInfo fact and narrows the session to the rules
+        and questions of the patient's context bucket: rules that do not
+        apply are never evaluated, ranked or explained, and questions that
+        do not apply are never asked. The bucket's rule subset, symptom
+        index, question pool and generated code are built once per bucket
+        and shared by its sessions.
+        
+        Args:
+            patient (dict): From ``patient_context.parse_patient``
+        
+        Returns:
+            ContextProfile: The patient's bucket
+        """
+        knowledge_base = self.knowledge_base or builtin_knowledge_base()
+        profile = knowledge_base.contexts.profile(patient)
+        self.declare(PatientInfo(**patient))
+        self.patient = patient
+        self.context = profile
+        if profile.specs is self._all_rules[0]:
+            self._use_rules(*self._all_rules)
+        else:
+            compiled_rules = profile.compiled_rules if self.compiled_rules is not None else None
+            self._use_rules(profile.specs, profile.rules_by_symptom, compiled_rules)
+        self.question_engine.question_pool = profile.question_pool
+        return profile
+    
+    def _use_rules(self, specs, rules_by_symptom, compiled_rules):
+        self.rule_specs = specs
+        self._rules_by_symptom = rules_by_symptom
+        self.compiled_rules = compiled_rules
+        if self.trace is not None:
+            self.trace.use(specs)
     
     def add_symptom(self, symptom_name, certainty):
         """
-        Add a symptom to the knowledge base.
+        Add a symptom to the knowledge base, or update it if already answered.
+        
+        Working memory holds one Symptom fact per symptom: answering a
+        symptom again modifies its fact instead of declaring another one.
+        The diagnoses that depend on the symptom are recomputed on the next
+        run().
         
         Args:
             symptom_name (str): Name of the symptom
             certainty (float): Certainty factor (0.0 to 1.0)
         """
-        self.declare(Symptom(name=symptom_name, certainty=certainty))
+        fact = self._symptom_fact(symptom_name)
+        if fact is None:
+            self.declare(Symptom(name=symptom_name, certainty=certainty))
+        elif fact.get('certainty') != certainty:
+            self.modify(fact, certainty=certainty)
+    
+    def diagnose(self, answers):
+        """
+        Diagnose a complete set of answers in one inference pass.
+
+        Starts from a clean session and declares every answer before a single
+        run(), without the question bookkeeping of ``answer`` (asked
+        questions, checkpoints). Diseases tied on certainty rank by name, so
+        the result does not depend on the order of the answers.
+
+        Args:
+            answers: (symptom_name, certainty) pairs
+
+        Returns:
+            list: (disease_name, certainty) tuples, as get_diagnosis_results()
+        """
+        self.reset_session()
+        for symptom, certainty in answers:
+            self.add_symptom(symptom, certainty)
+        self.run()
+        return self.get_diagnosis_results()
+
+    def get_answers(self):
+        """
+        Get the symptom answers the rules are working from.
+        
+        Returns:
+            list: (symptom_name, certainty) tuples in declaration order. If a
+            symptom was declared more than once (``declare`` rather than
+            ``add_symptom``), the first declaration is the one the rules
+            read, so only that one is returned.
+        """
+        answers = {}
+        for fact in self.facts.values():
+            if isinstance(fact, Symptom):
+                answers.setdefault(fact.get('name'), fact.get('certainty', 0.0))
+        return list(answers.items())
     
     def get_diagnosis_results(self):
         """
         Get the current diagnosis results sorted by certainty.
         
+        Ties are broken by disease name, so the ranking does not depend on
+        the order in which diseases were recomputed.
+        
+        Returns:
+            list: List of tuples (disease_name, certainty_factor) sorted by certainty,
+            limited to the top ``top_k`` when set
+        """
+        return rank_diagnoses(self.diagnoses, self.top_k)
+    
+    def run(self, steps=float('inf')):
+        """
+        Bring the diagnoses up to date with the current symptoms.
+        
+        Diagnoses depend only on the current answers, not on the order they
+        were given in: whenever a symptom is answered or its answer changes,
+        every disease with a rule that reads it (as evidence or as an
+        exclusion) is recomputed from scratch by re-running its rules whose
+        patterns are complete. Rule activations from experta are part of that
+        set, so the work per answer is bounded by the rules reading the
+        changed symptoms.
+        
+        Each rule gets the upper bound of the CF it could produce from the
+        current symptoms. Rules fire by salience by default. With ``top_k``
+        they fire in order of that bound (then salience), and a rule is
+        skipped when the bound does not exceed the disease's CF, cannot reach
+        the top k, or cross the relevance threshold used for question
+        selection (nor, since the top k is then already above it, the 0.8
+        stopping threshold). With a plan they fire in plan order and a rule
+        is skipped when the bound does not exceed the disease's CF or a rule
+        that dominates it has already run.
+        
+        Rule bodies only read symptoms and update ``diagnoses``, so firing
+        them in a different order does not change what they compute.
+        
+        With ``compiled_rules`` the affected diseases are computed by the
+        generated code in one call each and nothing is skipped; ``steps``
+        then only limits rules the generated module does not cover.
+        
+        With ``trace``, the explanations of the recomputed diseases are
+        replaced.
+        """
+        activated = self._take_activations()
+        answers = dict(self.get_answers())
+        changed = {
+            symptom for symptom in answers.keys() | self._evaluated_answers.keys()
+            if answers.get(symptom) != self._evaluated_answers.get(symptom)
+        }
+        self._evaluated_answers = answers
+        affected = {spec.disease for symptom in changed
+                    for spec in self._rules_by_symptom.get(symptom, ())}
+        recomputed = set(affected)
+        self._skipped_rules = set()
+        
+        self.running = True
+        if self.compiled_rules is not None:
+            self._run_compiled(affected, answers)
+            # Rules without a spec are not part of the generated module; a
+            # knowledge base has no rules outside its specs
+            if self.knowledge_base is None:
+                uncovered = [rule for rule in activated
+                             if rule.__name__ not in RULE_SPECS_BY_NAME]
+                self._fire_rules(uncovered, answers, steps)
+        else:
+            steps = self._fire_rules(self._rules_for(affected, answers, activated), answers, steps)
+            if self.top_k is not None:
+                # Recomputed diseases can drop, lowering the bar that rules were
+                # skipped against; re-run the diseases those skips may now matter to.
+                unsafe = self._unsafe_skips()
+                while unsafe and steps > 0 and self.running:
+                    recomputed |= unsafe
+                    steps = self._fire_rules(self._rules_for(unsafe, answers), answers, steps)
+                    unsafe = self._unsafe_skips()
+        self.running = False
+        if self.trace is not None and recomputed:
+            self.trace.record(recomputed, answers, self._skipped_rules)
+    
+    def _run_compiled(self, diseases, answers):
+        """
+        Recompute diseases with the generated rules module.
+        
+        Diseases are re-inserted in the order their first passing rule would
+        fire, as they are when the rule bodies run.
+        """
+        certainties = self.compiled_rules.symptom_array(answers)
+        functions = self.compiled_rules.DISEASE_FUNCTIONS
+        results = []
+        for disease in diseases:
+            self.diagnoses.pop(disease, None)
+            certainty, rank = functions[disease](certainties)
+            if rank is not None:
+                results.append((rank, disease, certainty))
+        for _, disease, certainty in sorted(results):
+            self.diagnoses[disease] = certainty
+    
+    def _rules_for(self, diseases, answers, activated=()):
+        """
+        Clear the given diagnoses and collect the rules that recompute them.
+        
         Returns:
-            list: List of tuples (disease_name, certainty_factor) sorted by certainty
+            list: Every rule of ``diseases`` whose patterns are complete, in
+            rule base order (so every backend fires them alike), then
+            any other activated rules
         """
-        return sorted(self.diagnoses.items(), key=lambda x: x[1], reverse=True)
+        for disease in diseases:
+            self.diagnoses.pop(disease, None)
+            self._skipped_bounds.pop(disease, None)
+        rules = {
+            spec.name: self._rules_by_name[spec.name] for spec in self.rule_specs
+            if spec.disease in diseases and pattern_complete(spec, answers)
+        }
+        inactive = self.context.inactive if self.context is not None else ()
+        for rule in activated:
+            if rule.__name__ not in inactive:
+                rules.setdefault(rule.__name__, rule)
+        return list(rules.values())
+    
+    def _fire_rules(self, rules, certainties, steps):
+        """
+        Fire rules in order, skipping those that cannot change the outcome.
+        
+        Returns:
+            The number of steps left
+        """
+        evaluated = set()
+        for bound, rule in self._order_rules(rules, certainties):
+            if steps <= 0 or not self.running:
+                break
+            steps -= 1
+            if self._can_skip_rule(rule.__name__, bound, evaluated):
+                self.rule_stats['skipped'] += 1
+                self._skipped_rules.add(rule.__name__)
+                continue
+            evaluated.add(rule.__name__)
+            self._skipped_rules.discard(rule.__name__)
+            self.rule_stats['fired'] += 1
+            rule._wrapped(self)  # the rule body; no rule has bound variables
+        return steps
+    
+    def _order_rules(self, rules, certainties):
+        """Pair rules with their CF upper bound, in firing order."""
+        scored = [(self._rule_upper_bound(rule, certainties), rule) for rule in rules]
+        if self.top_k is not None:
+            return sorted(
+                scored,
+                key=lambda item: (float('inf') if item[0] is None else item[0],
+                                  item[1].salience),
+                reverse=True
+            )
+        if self.plan is not None:
+            return sorted(scored, key=lambda item: self.plan.rank(item[1].__name__))
+        return sorted(scored, key=lambda item: item[1].salience, reverse=True)
+    
+    @staticmethod
+    def _rule_upper_bound(rule, certainties):
+        """
+        Highest CF a rule can produce from the current symptoms.
+        
+        Returns None for rules without a spec; those are never skipped.
+        """
+        spec = RULE_SPECS_BY_NAME.get(rule.__name__)
+        if spec is None:
+            return None
+        evidence_cf = min(
+            max(certainties.get(s, 0.0) for s in group) for group, _ in spec.gates
+        )
+        return evidence_cf * spec.rule_cf
+    
+    def _kth_certainty(self):
+        """Certainty of the k-th diagnosis, or 0.0 with fewer than k diagnoses."""
+        leaders = heapq.nlargest(self.top_k, self.diagnoses.values())
+        return leaders[-1] if len(leaders) == self.top_k else 0.0
+    
+    def _can_skip_rule(self, name, bound, evaluated):
+        """Check whether firing a rule could change the outcome."""
+        if bound is None or (self.top_k is None and self.plan is None):
+            return False
+        if self.plan is not None and any(
+                rule in evaluated for rule in self.plan.dominators.get(name, ())):
+            return True
+        disease = RULE_SPECS_BY_NAME[name].disease
+        current = self.diagnoses.get(disease, 0.0)
+        if bound <= current:
+            return True
+        if self.top_k is None:
+            return False
+        leaders = rank_diagnoses(self.diagnoses, self.top_k)
+        if len(leaders) < self.top_k or any(d == disease for d, _ in leaders):
+            return False
+        relevance_unchanged = bound <= RELEVANCE_THRESHOLD or current > RELEVANCE_THRESHOLD
+        if bound < leaders[-1][1] and relevance_unchanged:
+            self._skipped_bounds[disease] = max(self._skipped_bounds.get(disease, 0.0), bound)
+            return True
+        return False
+    
+    def _unsafe_skips(self):
+        """Diseases with a skipped rule that could now reach the top k."""
+        kth = self._kth_certainty()
+        return {d for d, bound in self._skipped_bounds.items() if bound >= kth}
     
     def combine_certainty_and(self, cf1, cf2):
         """
@@ -124,6 +497,33 @@ class MedicalDiagnosisEngine(
         else:
             self.diagnoses[disease] = certainty
     
+    def explain(self, disease=None):
+        """
+        Explain how diagnoses got their certainty (needs ``trace``).
+        
+        Args:
+            disease (str): The disease to explain, diagnosed or not; None
+                for every diagnosis
+        
+        Returns:
+            list: {'disease', 'certainty', 'rules'} dicts, in rank order
+            without ``disease``. 'rules' lists the disease's rules whose
+            patterns are complete, in salience order, with their gates
+            (symptom, certainty, threshold, passed), exclusions, outcome
+            and, for rules that fired, the evidence CF, rule CF, final CF
+            and whether it was kept as the disease's CF.
+        
+        Raises:
+            RuntimeError: If the engine was created without ``trace``
+        """
+        if self.trace is None:
+            raise RuntimeError('The engine was created without trace=True')
+        diseases = [disease] if disease is not None else [d for d, _ in self.get_diagnosis_results()]
+        return [
+            {'disease': d, 'certainty': self.diagnoses.get(d, 0.0), 'rules': self.trace.explain(d)}
+            for d in diseases
+        ]
+    
     def get_next_question(self):
         """
         Get the next question to ask the user based on current diagnosis state.
@@ -151,7 +551,112 @@ class MedicalDiagnosisEngine(
             certainty (float): The certainty factor (0.0 to 1.0)
         """
         self.question_engine.mark_question_asked(symptom, certainty)
-        self.questions_asked.append(symptom)
+        if symptom not in self.questions_asked:
+            self.questions_asked.append(symptom)
+    
+    def answer(self, symptom, certainty):
+        """
+        Record an answer, update the diagnoses and checkpoint the change.
+        
+        Equivalent to ``record_answer`` + ``add_symptom`` + ``run``, but the
+        step can be reverted with ``undo``.
+        
+        Args:
+            symptom (str): The symptom that was asked about
+            certainty (float): The certainty factor (0.0 to 1.0)
+        """
+        previous = self._symptom_certainty(symptom)
+        before = dict(self.diagnoses)
+        skipped_bounds = dict(self._skipped_bounds) if self.top_k is not None else None
+        traces_before = dict(self.trace.records) if self.trace is not None else None
+        
+        self.record_answer(symptom, certainty)
+        self.add_symptom(symptom, certainty)
+        self.run()
+        
+        changed = tuple(
+            (disease, before.get(disease))
+            for disease in before.keys() | self.diagnoses.keys()
+            if before.get(disease) != self.diagnoses.get(disease)
+        )
+        order = tuple(before)
+        if order == tuple(self.diagnoses):
+            order = None
+        traces = None
+        if self.trace is not None:
+            traces = tuple((disease, traces_before.get(disease))
+                           for disease, record in self.trace.records.items()
+                           if traces_before.get(disease) is not record)
+        self.history.append(
+            Checkpoint(symptom, certainty, previous, changed, skipped_bounds, traces, order))
+    
+    def edit_answer(self, symptom, certainty):
+        """
+        Change the answer to a symptom that was already answered.
+        
+        Only the diagnoses that depend on the symptom are recomputed, and the
+        edit can be reverted with ``undo`` like any other answer.
+        
+        Raises:
+            KeyError: If the symptom has not been answered
+        """
+        if self._symptom_certainty(symptom) is None:
+            raise KeyError(symptom)
+        self.answer(symptom, certainty)
+    
+    def undo(self):
+        """
+        Revert the most recent answer (or edit).
+        
+        Restores the symptom's fact, the asked questions and the diagnoses
+        the answer changed, without re-running any rule.
+        
+        Returns:
+            Checkpoint: The answer that was undone, or None if there is none
+        """
+        if not self.history:
+            return None
+        checkpoint = self.history.pop()
+        symptom = checkpoint.symptom
+        
+        fact = self._symptom_fact(symptom)
+        if checkpoint.previous is None:
+            self.retract(fact)
+            self._evaluated_answers.pop(symptom, None)
+            self.question_engine.unmark_question_asked(symptom)
+            self.questions_asked.remove(symptom)
+        else:
+            self.modify(fact, certainty=checkpoint.previous)
+            self._evaluated_answers[symptom] = checkpoint.previous
+        
+        # The restored diagnoses already reflect the restored fact, so the
+        # activations it caused have nothing left to do.
+        self._take_activations()
+        
+        for disease, certainty in checkpoint.diagnoses:
+            if certainty is None:
+                self.diagnoses.pop(disease, None)
+            else:
+                self.diagnoses[disease] = certainty
+        if checkpoint.order is not None:
+            restored = [(disease, self.diagnoses[disease]) for disease in checkpoint.order]
+            self.diagnoses.clear()
+            self.diagnoses.update(restored)
+        if checkpoint.skipped_bounds is not None:
+            self._skipped_bounds = dict(checkpoint.skipped_bounds)
+        if checkpoint.traces is not None:
+            self.trace.restore(checkpoint.traces)
+        return checkpoint
+    
+    def _symptom_fact(self, symptom):
+        for fact in self.facts.values():
+            if isinstance(fact, Symptom) and fact.get('name') == symptom:
+                return fact
+        return None
+    
+    def _symptom_certainty(self, symptom):
+        fact = self._symptom_fact(symptom)
+        return fact.get('certainty') if fact is not None else None
     
     def should_continue_asking(self):
         """
@@ -163,4 +668,44 @@ class MedicalDiagnosisEngine(
         return self.question_engine.should_continue_asking(self.diagnoses)
 
 
+class MedicalDiagnosisEngine(DiagnosisEngineBase, KnowledgeEngine):
+    """The diagnosis engine on experta's Rete-based KnowledgeEngine."""
+    
+    def _take_activations(self):
+        """Return and clear the rules on experta's agenda."""
+        added, removed = self.get_activations()
+        self.strategy.update_agenda(self.agenda, added, removed)
+        rules = [activation.rule for activation in self.agenda.activations]
+        self.agenda.activations = []
+        return rules
+
+
+class LiteDiagnosisEngine(DiagnosisEngineBase, LiteKnowledgeEngine):
+    """The diagnosis engine on the in-repo LiteKnowledgeEngine (no Rete network)."""
 
+
+# Forward-chaining engines the diagnosis engine can run on
+ENGINE_BACKENDS = {
+    'experta': MedicalDiagnosisEngine,
+    'lite': LiteDiagnosisEngine,
+}
+
+
+def create_engine(backend='experta', **options):
+    """
+    Create a diagnosis engine on the given backend.
+    
+    Args:
+        backend (str): A key of ENGINE_BACKENDS
+        **options: Passed to the engine (top_k, plan, compiled_rules,
+            knowledge_base, trace)
+    
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend not in ENGINE_BACKENDS:
+        raise ValueError(
+            f"Unknown engine backend: {backend}. "
+            f"Valid backends are: {', '.join(ENGINE_BACKENDS)}"
+        )
+    return ENGINE_BACKENDS[backend](**options)
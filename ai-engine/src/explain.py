@@ -0,0 +1,210 @@
+"""
+Explanation traces: why each disease has the certainty it has.
+
+With ``trace=True`` an engine keeps, for every disease it has evaluated,
+the rules that produced its current CF. Each ``run()`` replaces the
+records of the diseases it recomputes (the ones reading a changed
+symptom), so the trace always explains the current diagnoses; ``undo``
+restores the records of the answer it takes back.
+
+A disease's record is one ``array('i')`` holding, for each of its rules
+whose patterns are complete, in firing (salience) order:
+
+    rule id, outcome, evidence CF, final CF, kept,
+    number of gates, number of exclusions,
+    (symptom id, CF) per gate, (symptom id, CF) per exclusion
+
+Rule and symptom ids index ``RuleTable.specs`` and ``RuleTable.symptoms``;
+CFs are stored in millionths. A gate's symptom is the one of its group with the
+highest CF (the one ``max`` picked), and ``kept`` says whether
+``update_diagnosis`` raised the disease to the rule's CF. A typical disease
+takes a few hundred bytes.
+
+Records are made from the rule specs, which mirror the rule bodies
+(``test_rule_specs.py``), so the trace reads the same on every engine path
+(rule bodies, generated code, a loaded knowledge base). Rules the engine
+skipped (``top_k``, an execution plan) are recorded as skipped rather than
+evaluated.
+
+``DiagnosisEngineBase.explain`` decodes the records (the ``explain``
+action of ``main.py``).
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .rules.specs import RuleSpec
+
+
+# Outcomes of a rule evaluation
+FIRED = 0  # Every gate and exclusion passed; the rule CF was applied
+GATE_FAILED = 1  # A gate's evidence was below its threshold
+EXCLUDED = 2  # An excluded symptom reached its bound
+SKIPPED = 3  # Not evaluated: it could not change the outcome (top_k, plan)
+
+OUTCOMES = ('fired', 'gate_failed', 'excluded', 'skipped')
+
+# CFs are stored as integers in these units
+CF_SCALE = 1_000_000
+
+_HEADER = 7
+
+
+class RuleTable:
+    """Integer ids for the rules and symptoms of a rule base."""
+
+    def __init__(self, specs: Sequence[RuleSpec]):
+        self.specs = tuple(specs)
+        self.symptoms = tuple(dict.fromkeys(s for spec in self.specs for s in spec.symptoms))
+        ids = {symptom: index for index, symptom in enumerate(self.symptoms)}
+        # Disease -> (rule id, spec, gates, exclusions) by salience, where a
+        # gate is (((symptom, id), ...), threshold) and an exclusion
+        # (symptom, id, bound)
+        self.by_disease: Dict[str, List[Tuple]] = {}
+        order = sorted(range(len(self.specs)), key=lambda i: -self.specs[i].salience)
+        for rule_id in order:
+            spec = self.specs[rule_id]
+            self.by_disease.setdefault(spec.disease, []).append((
+                rule_id, spec,
+                tuple((tuple((s, ids[s]) for s in group), threshold)
+                      for group, threshold in spec.gates),
+                tuple((s, ids[s], bound) for s, bound in spec.exclusions),
+            ))
+
+
+_tables: Dict[int, RuleTable] = {}
+
+
+def rule_table(specs: Sequence[RuleSpec]) -> RuleTable:
+    """The RuleTable of a rule base (built once per specs tuple)."""
+    table = _tables.get(id(specs))
+    if table is None or (table.specs is not specs and table.specs != tuple(specs)):
+        table = _tables[id(specs)] = RuleTable(specs)
+    return table
+
+
+def _record(table: RuleTable, disease: str, answers: Dict[str, float],
+            skipped: Iterable[str]) -> array:
+    out = array('i')
+    best = None
+    for rule_id, spec, gates, exclusions in table.by_disease.get(disease, ()):
+        outcome, evidence = FIRED, 1.0
+        pairs = []
+        for group, threshold in gates:
+            # The declared symptom the group's max picked
+            if len(group) == 1:
+                symptom, symptom_id = group[0]
+                cf = answers.get(symptom)
+            else:
+                cf, symptom_id = max((answers.get(s, -1.0), i) for s, i in group)
+                if cf < 0.0:
+                    cf = None
+            if cf is None:
+                break  # The rule's patterns are not complete: it cannot run
+            pairs += (symptom_id, round(cf * CF_SCALE))
+            if cf < evidence:
+                evidence = cf
+            if cf < threshold:
+                outcome = GATE_FAILED
+        else:
+            if spec.name in skipped:
+                out.extend((rule_id, SKIPPED, 0, 0, 0, 0, 0))
+                continue
+            for symptom, symptom_id, bound in exclusions:
+                cf = answers.get(symptom, 0.0)
+                pairs += (symptom_id, round(cf * CF_SCALE))
+                if cf >= bound and outcome == FIRED:
+                    outcome = EXCLUDED
+            final, kept = 0.0, 0
+            if outcome == FIRED:
+                final = evidence * spec.rule_cf
+                kept = int(best is None or final > best)
+                if kept:
+                    best = final
+            out.extend((rule_id, outcome, round(evidence * CF_SCALE), round(final * CF_SCALE),
+                        kept, len(gates), len(exclusions)))
+            out.extend(pairs)
+    return out
+
+
+class ExplanationTrace:
+    """
+    The explanation records of one session.
+
+    Args:
+        specs: The rules the engine runs
+    """
+
+    def __init__(self, specs: Sequence[RuleSpec]):
+        self.table = rule_table(specs)
+        self.records: Dict[str, array] = {}  # Disease -> record array
+
+    def clear(self):
+        self.records = {}
+
+    def use(self, specs: Sequence[RuleSpec]):
+        """Trace another rule set (a patient context's), from a cleared trace."""
+        self.table = rule_table(specs)
+
+    def record(self, diseases: Iterable[str], answers: Dict[str, float],
+               skipped: Iterable[str] = ()) -> Tuple[Tuple[str, Optional[array]], ...]:
+        """
+        Replace the records of recomputed diseases.
+
+        Returns:
+            (disease, previous record or None) per disease, for undo
+        """
+        previous = []
+        for disease in diseases:
+            previous.append((disease, self.records.get(disease)))
+            self.records[disease] = _record(self.table, disease, answers, skipped)
+        return tuple(previous)
+
+    def restore(self, previous: Iterable[Tuple[str, Optional[array]]]):
+        """Put back records returned by ``record``."""
+        for disease, record in previous:
+            if record is None:
+                self.records.pop(disease, None)
+            else:
+                self.records[disease] = record
+
+    def nbytes(self) -> int:
+        """Bytes held by the record arrays."""
+        return sum(len(record) * record.itemsize for record in self.records.values())
+
+    def _pairs(self, record: array, position: int, count: int):
+        for offset in range(position, position + 2 * count, 2):
+            yield self.table.symptoms[record[offset]], record[offset + 1] / CF_SCALE
+
+    def explain(self, disease: str) -> List[Dict]:
+        """Decode the record of a disease (empty if none of its rules could run)."""
+        record = self.records.get(disease)
+        if record is None:
+            return []
+        rules = []
+        position = 0
+        while position < len(record):
+            rule_id, outcome, evidence, final, kept, gates, exclusions = (
+                record[position:position + _HEADER])
+            position += _HEADER
+            spec = self.table.specs[rule_id]
+            entry = {'rule': spec.name, 'outcome': OUTCOMES[outcome]}
+            if outcome != SKIPPED:
+                entry['gates'] = [
+                    {'symptom': symptom, 'certainty': cf, 'threshold': threshold,
+                     'passed': cf >= threshold}
+                    for (_, threshold), (symptom, cf) in zip(
+                        spec.gates, self._pairs(record, position, gates))]
+                position += 2 * gates
+                if exclusions:
+                    entry['exclusions'] = [
+                        {'symptom': symptom, 'certainty': cf, 'bound': bound,
+                         'passed': cf < bound}
+                        for (_, bound), (symptom, cf) in zip(
+                            spec.exclusions, self._pairs(record, position, exclusions))]
+                    position += 2 * exclusions
+            if outcome == FIRED:
+                entry.update(evidence_cf=evidence / CF_SCALE, rule_cf=spec.rule_cf,
+                             final_cf=final / CF_SCALE, kept=bool(kept))
+            rules.append(entry)
+        return rules
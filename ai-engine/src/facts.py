@@ -125,6 +125,16 @@ DISEASE_PNEUMONIA = 'pneumonia'
 DISEASE_BRONCHITIS = 'bronchitis'
 
 
+# ============================================================================
+# Existing Conditions (PatientInfo.existing_conditions)
+# ============================================================================
+
+CONDITION_ASTHMA = 'asthma'
+CONDITION_COPD = 'copd'
+CONDITION_ALLERGIC_RHINITIS = 'allergic_rhinitis'
+CONDITION_ANOSMIA = 'anosmia'  # Loss of smell from before the illness
+
+
 # ============================================================================
 # Certainty Factor Thresholds
 # ============================================================================
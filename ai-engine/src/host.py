@@ -0,0 +1,369 @@
+"""
+Long-running host for many diagnosis sessions in one process.
+
+``main.py --host`` serves any number of concurrent sessions, each with its
+own engine, addressed by the ``session_id`` returned by ``start``. The
+shared structures (rule classes, compiled rules, the question flow) are
+built once at start-up.
+
+A host keeps many sessions' facts and Rete nodes alive, and the cyclic
+garbage collector walks all of them on every full collection, which
+shows up as latency spikes. The host therefore:
+
+- builds the shared structures (and a warm-up session) and then calls
+  ``gc.freeze()``, which moves everything allocated so far to a permanent
+  generation the collector never walks. In a forking server, freezing
+  before fork also keeps those pages shared copy-on-write, since
+  collections no longer write to their object headers.
+- raises the collection thresholds (``DEFAULT_GC_THRESHOLDS``) so young
+  collections run less often than every 700 allocations, which a single
+  answer can exceed.
+- keeps the engines of ended sessions (up to ``DEFAULT_POOL_SIZE``) and
+  resets them for new sessions. Building an experta engine allocates a
+  whole Rete network, and a dropped engine is cyclic garbage that only
+  a collection frees, so reusing engines removes most of the churn the
+  collector would otherwise have to clean up.
+- records the count and duration of every collection per generation
+  (``GCMonitor``), reported by the ``metrics`` action.
+
+The knowledge base can be swapped while sessions are running
+(``swap``, behind the ``reload_kb`` action). Every session stays on the
+version it started on; new sessions get the new one. A swap builds and
+exercises an engine of the new version before switching, so the first
+session on it does not pay the cold start, and drops the pooled engines
+of the old one. An old version is retired when its last session ends:
+its engines are not pooled, so nothing references them any more. The
+new version's structures are not frozen, since a second ``gc.freeze()``
+would also freeze the live sessions, and the collector could then never
+free their engines.
+
+Sessions that go idle expire (``session_ttls``): every request to a
+session pushes its deadline to the time-to-live of that action (say, a
+short one after ``start`` and a longer one after an answer), and a
+hierarchical timing wheel (``src/timing_wheel.py``) files the deadlines,
+so ``expire()`` costs O(expired) rather than a scan of every session.
+The caller can snapshot an expiring session first (``src/session_snapshots.py``).
+"""
+
+import gc
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .timing_wheel import TimingWheel
+
+
+# gen0 allocations before a young collection; young collections per gen1
+# collection; gen1 collections per full collection
+DEFAULT_GC_THRESHOLDS = (50000, 20, 100)
+
+# Engines of ended sessions kept for reuse
+DEFAULT_POOL_SIZE = 64
+
+# Recent pauses kept for the percentiles
+PAUSE_WINDOW = 4096
+
+# Seconds an idle session lives, the idle timeout of the backend's own
+# session manager; the wheel's tick is at most a tenth of the shortest TTL
+DEFAULT_SESSION_TTL = 300.0
+DEFAULT_TTL_TICK = 1.0
+
+# Ages of ended sessions kept for the percentiles
+AGE_WINDOW = 4096
+
+
+def parse_gc_thresholds(value: str) -> Tuple[int, ...]:
+    """Parse 'G0,G1,G2' (1 to 3 non-negative integers) for gc.set_threshold."""
+    try:
+        thresholds = tuple(int(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError(f'GC thresholds must be integers, got {value!r}')
+    if not 1 <= len(thresholds) <= 3 or min(thresholds) < 0:
+        raise ValueError(f'GC thresholds must be 1 to 3 non-negative integers, got {value!r}')
+    return thresholds
+
+
+def parse_session_ttls(value: str, actions=None) -> Dict[str, float]:
+    """
+    Parse 'SECONDS,ACTION=SECONDS,...' into {'default': ..., action: ...}.
+
+    The bare number is the TTL of every action not named (default
+    ``DEFAULT_SESSION_TTL``); 0 means that sessions never expire after it.
+    """
+    ttls = {'default': DEFAULT_SESSION_TTL}
+    for part in value.split(','):
+        action, _, seconds = part.strip().rpartition('=')
+        try:
+            ttl = float(seconds)
+        except ValueError:
+            raise ValueError(f'Session TTL must be seconds, got {part!r}')
+        if not 0 <= ttl < float('inf'):
+            raise ValueError(f'Session TTL must be a non-negative number of seconds, got {part!r}')
+        if action and actions is not None and action not in actions:
+            raise ValueError(f"Unknown action in session TTL: {action!r} "
+                             f"(valid actions: {', '.join(sorted(actions))})")
+        ttls[action or 'default'] = ttl
+    return ttls
+
+
+def ttl_tick(ttls: Dict[str, float]) -> float:
+    """The wheel's tick for these TTLs: sessions expire at most 10% late."""
+    shortest = min((ttl for ttl in ttls.values() if ttl > 0), default=DEFAULT_TTL_TICK)
+    return min(DEFAULT_TTL_TICK, shortest / 10)
+
+
+def _percentiles(values) -> Dict:
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'count': len(values), 'p50': round(float(p50), 3), 'p90': round(float(p90), 3),
+            'p99': round(float(p99), 3), 'max': round(float(values.max()), 3)}
+
+
+class GCMonitor:
+    """Counts and times the collections of the cyclic garbage collector."""
+
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.collected = [0, 0, 0]
+        self.total_ms = [0.0, 0.0, 0.0]
+        self.max_ms = [0.0, 0.0, 0.0]
+        self.recent = deque(maxlen=PAUSE_WINDOW)
+        self._started = None
+        self.installed = False
+
+    def install(self):
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+
+    def uninstall(self):
+        if self.installed:
+            gc.callbacks.remove(self._callback)
+            self.installed = False
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            pause_ms = (time.perf_counter() - self._started) * 1000
+            generation = info['generation']
+            self.collections[generation] += 1
+            self.collected[generation] += info['collected']
+            self.total_ms[generation] += pause_ms
+            self.max_ms[generation] = max(self.max_ms[generation], pause_ms)
+            self.recent.append(pause_ms)
+            self._started = None
+
+    def report(self) -> Dict:
+        """Pause counts and durations (ms) per generation, and percentiles of recent pauses."""
+        recent = np.asarray(self.recent, dtype=float)
+        p50, p99 = np.percentile(recent, [50, 99]) if len(recent) else (0.0, 0.0)
+        return {
+            'thresholds': list(gc.get_threshold()),
+            'frozen_objects': gc.get_freeze_count(),
+            'generations': [
+                {
+                    'generation': generation,
+                    'collections': self.collections[generation],
+                    'collected': self.collected[generation],
+                    'total_ms': round(self.total_ms[generation], 3),
+                    'max_ms': round(self.max_ms[generation], 3),
+                }
+                for generation in range(3)
+            ],
+            'pause_p50_ms': round(float(p50), 3),
+            'pause_p99_ms': round(float(p99), 3),
+        }
+
+
+class EngineHost:
+    """
+    Sessions of one process, each with its own engine.
+
+    Args:
+        engine_factory: Builds the engine for a new session
+        gc_thresholds: Passed to gc.set_threshold, or None to keep Python's
+        freeze: Whether ``prepare()`` calls gc.freeze()
+        pool_size: Engines of ended sessions kept for reuse (0 to build
+            every session's engine anew)
+        version: Knowledge base version the factory's engines run
+        session_ttls: Idle seconds after each action (see
+            ``parse_session_ttls``) before a session expires, or None for
+            sessions that never expire
+        clock: Monotonic time in seconds, for the TTLs
+    """
+
+    def __init__(self, engine_factory: Callable, gc_thresholds: Optional[Tuple[int, ...]] = DEFAULT_GC_THRESHOLDS,
+                 freeze: bool = True, pool_size: int = DEFAULT_POOL_SIZE,
+                 version: Optional[str] = None, session_ttls: Optional[Dict[str, float]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.engine_factory = engine_factory
+        self.version = version
+        self.gc_thresholds = gc_thresholds
+        self.freeze = freeze
+        self.pool_size = pool_size
+        self.sessions: Dict[str, object] = {}
+        self.session_versions: Dict[str, Optional[str]] = {}
+        self.version_sessions: Dict[Optional[str], int] = {}  # Active sessions per version
+        self.swaps = 0
+        self.retired = 0
+        self.pool: List = []
+        self.opened = 0
+        self.closed = 0
+        self.reused = 0
+        self.gc_monitor = GCMonitor()
+        self.clock = clock
+        self.session_opened: Dict[str, float] = {}
+        self.ended_ages = deque(maxlen=AGE_WINDOW)
+        self.session_ttls = session_ttls
+        self.wheel = None
+        if session_ttls and max(session_ttls.values()) > 0:
+            self.wheel = TimingWheel(ttl_tick(session_ttls), start=clock())
+        self.expired = 0
+        self.expire_seconds = 0.0
+
+    def prepare(self):
+        """
+        Build and exercise one engine so everything shared is allocated,
+        then freeze it out of the collector's reach and tune the thresholds.
+        """
+        self._warm_engine(self.engine_factory)
+        gc.collect()
+        if self.freeze:
+            gc.freeze()
+        if self.gc_thresholds is not None:
+            gc.set_threshold(*self.gc_thresholds)
+        self.gc_monitor.install()
+
+    @staticmethod
+    def _warm_engine(engine_factory: Callable):
+        engine = engine_factory()
+        engine.reset_session()
+        engine.get_initial_question()
+        return engine
+
+    def swap(self, engine_factory: Callable, version: Optional[str]):
+        """
+        Serve new sessions from ``engine_factory`` (engines of knowledge base
+        ``version``). Sessions already open keep their engines.
+        """
+        engine = self._warm_engine(engine_factory)  # Before switching: a bad version fails here
+        previous = self.version
+        self.engine_factory = engine_factory
+        self.version = version
+        self.pool = [engine] if self.pool_size > 0 else []
+        self.swaps += 1
+        if previous != version and not self.version_sessions.get(previous):
+            self.version_sessions.pop(previous, None)
+            self.retired += 1
+
+    def open_session(self, session_id: Optional[str] = None):
+        """
+        Create a session (under a new id, or ``session_id`` to bring one
+        back); returns (session_id, engine). The engine may be a pooled
+        one, so call its reset_session() before use.
+        """
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        if self.pool:
+            engine = self.pool.pop()
+            self.reused += 1
+        else:
+            engine = self.engine_factory()
+        self.sessions[session_id] = engine
+        self.session_versions[session_id] = self.version
+        self.version_sessions[self.version] = self.version_sessions.get(self.version, 0) + 1
+        self.session_opened[session_id] = self.clock()
+        self.opened += 1
+        self.touch(session_id, 'start')
+        return session_id, engine
+
+    def touch(self, session_id: str, action: str):
+        """A session served ``action``: it now expires that action's TTL from now."""
+        if self.wheel is None or session_id not in self.sessions:
+            return
+        ttl = self.session_ttls.get(action, self.session_ttls['default'])
+        if ttl > 0:
+            self.wheel.schedule(session_id, self.clock() + ttl)
+        else:
+            self.wheel.cancel(session_id)
+
+    def expire(self, on_expire: Optional[Callable] = None) -> List[str]:
+        """
+        End the sessions whose TTL has passed, calling ``on_expire(session_id,
+        engine)`` for each before its engine is released. Returns their ids.
+        """
+        if self.wheel is None:
+            return []
+        started = time.perf_counter()
+        expired = self.wheel.advance(self.clock())
+        for session_id in expired:
+            if on_expire is not None:
+                on_expire(session_id, self.sessions[session_id])
+            self.close_session(session_id)
+        self.expired += len(expired)
+        self.expire_seconds += time.perf_counter() - started
+        return expired
+
+    def get(self, session_id):
+        """The engine of a session, or None if there is no such session."""
+        if not isinstance(session_id, str):
+            return None
+        return self.sessions.get(session_id)
+
+    def close_session(self, session_id) -> bool:
+        """End a session. Returns False if there was no such session."""
+        engine = self.sessions.pop(session_id, None) if isinstance(session_id, str) else None
+        if engine is None:
+            return False
+        if self.wheel is not None:
+            self.wheel.cancel(session_id)
+        self.ended_ages.append(self.clock() - self.session_opened.pop(session_id))
+        version = self.session_versions.pop(session_id)
+        self.version_sessions[version] -= 1
+        if version != self.version:
+            # An old version's engine is never reused
+            if not self.version_sessions[version]:
+                del self.version_sessions[version]
+                self.retired += 1
+        elif len(self.pool) < self.pool_size:
+            self.pool.append(engine)
+        self.closed += 1
+        return True
+
+    def metrics(self) -> Dict:
+        now = self.clock()
+        metrics = {
+            'sessions': {
+                'active': len(self.sessions),
+                'opened': self.opened,
+                'closed': self.closed,
+                'reused': self.reused,
+                'pooled': len(self.pool),
+            },
+            'session_age_s': {
+                'active': _percentiles([now - opened for opened in self.session_opened.values()]),
+                'ended': _percentiles(self.ended_ages),
+            },
+            'knowledge_base': {
+                'version': self.version,
+                'sessions_by_version': {str(version): count for version, count
+                                        in self.version_sessions.items() if count},
+                'swaps': self.swaps,
+                'retired': self.retired,
+            },
+            'gc': self.gc_monitor.report(),
+        }
+        if self.wheel is not None:
+            metrics['expiry'] = dict(
+                self.wheel.stats(),
+                ttls_s=dict(self.session_ttls),
+                expired=self.expired,
+                expire_ms=round(self.expire_seconds * 1000, 3),
+            )
+        return metrics
@@ -0,0 +1,298 @@
+"""
+The knowledge base as a versioned, loadable artifact.
+
+Everything the engine knows about diseases is normally Python: the rule
+bodies in ``rules/`` (mirrored by ``RULE_SPECS``), and ``QUESTION_TEMPLATES``,
+``DISEASE_INFO`` and the symptom priorities of the question flow. A
+``KnowledgeBase`` holds the same knowledge as data, so it can be exported
+to a JSON artifact (``export_knowledge_base.py``), edited (a rule CF or
+threshold, a question's wording) and loaded by a running ``main.py`` with
+``--kb`` or the ``reload_kb`` action, without restarting it.
+
+An artifact's ``version`` is the hash of its content, so two processes
+with the same version run the same knowledge base. Engines built on a
+knowledge base evaluate its rules with code generated from its specs
+(``codegen.load_compiled_rules``); the rule bodies only run for the
+built-in rules.
+
+Artifact format::
+
+    {
+        "format": 1,
+        "version": "<hash of the rest>",
+        "rules": [{"name": ..., "disease": ..., "salience": 10, "rule_cf": 0.9,
+                   "gates": [[["fever"], 0.6], [["cough", "dry_cough"], 0.5]],
+                   "exclusions": [["runny_nose", 0.5]]}, ...],
+        "question_templates": {"fever": "Do you have a fever?", ...},
+        "disease_info": {"influenza": {"name": ..., "common_symptoms": [...]}, ...},
+        "symptom_priorities": {"fever": 7, ...},
+        "applicability": {"rules": {"strep_throat_mild": {"min_age": 3}, ...},
+                          "questions": {"loss_of_smell": {...}, ...}}
+    }
+
+``applicability`` holds the patient context conditions of rules and
+questions (see ``patient_context.py``); an artifact without conditions may
+leave it out.
+
+The version may be left out of a hand-edited artifact; it is computed on
+load. A version that does not match the content is refused.
+"""
+
+import copy
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+from .facts import DISEASE_INFO, QUESTION_TEMPLATES
+from .patient_context import (
+    QUESTION_APPLICABILITY, RULE_APPLICABILITY, PatientContexts, validate_condition
+)
+from .question_engine import SYMPTOM_PRIORITIES, QuestionIndex
+from .rules.specs import RULE_SPECS, RuleSpec, _index_by_symptom
+
+
+# Bump when the artifact layout changes
+FORMAT_VERSION = 1
+
+
+def _spec_to_dict(spec: RuleSpec) -> Dict:
+    return {
+        'name': spec.name,
+        'disease': spec.disease,
+        'salience': spec.salience,
+        'rule_cf': spec.rule_cf,
+        'gates': [[list(group), threshold] for group, threshold in spec.gates],
+        'exclusions': [[symptom, bound] for symptom, bound in spec.exclusions],
+    }
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_certainty(value) -> bool:
+    return _is_number(value) and 0.0 <= value <= 1.0
+
+
+def _spec_from_dict(entry, position: int) -> RuleSpec:
+    """Validate one rule of an artifact."""
+    def invalid(reason):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        return ValueError(f'Rule {position} ({name or "unnamed"}): {reason}')
+
+    if not isinstance(entry, dict):
+        raise invalid('must be an object')
+    for field in ('name', 'disease'):
+        if not isinstance(entry.get(field), str) or not entry[field]:
+            raise invalid(f'{field} must be a non-empty string')
+    if not isinstance(entry.get('salience'), int) or isinstance(entry['salience'], bool):
+        raise invalid('salience must be an integer')
+    if not _is_certainty(entry.get('rule_cf')) or entry['rule_cf'] == 0.0:
+        raise invalid('rule_cf must be a number in (0.0, 1.0]')
+    gates = entry.get('gates')
+    if not isinstance(gates, list) or not gates:
+        raise invalid('gates must be a non-empty list')
+    for gate in gates:
+        if (not isinstance(gate, list) or len(gate) != 2 or not isinstance(gate[0], list)
+                or not gate[0] or not all(isinstance(s, str) and s for s in gate[0])
+                or not _is_certainty(gate[1])):
+            raise invalid('each gate must be [[symptom, ...], threshold in [0.0, 1.0]]')
+    exclusions = entry.get('exclusions', [])
+    if not isinstance(exclusions, list):
+        raise invalid('exclusions must be a list')
+    for exclusion in exclusions:
+        if (not isinstance(exclusion, list) or len(exclusion) != 2
+                or not isinstance(exclusion[0], str) or not _is_certainty(exclusion[1])):
+            raise invalid('each exclusion must be [symptom, bound in [0.0, 1.0]]')
+    return RuleSpec(
+        name=entry['name'],
+        disease=entry['disease'],
+        salience=entry['salience'],
+        rule_cf=entry['rule_cf'],
+        gates=tuple((tuple(group), threshold) for group, threshold in gates),
+        exclusions=tuple((symptom, bound) for symptom, bound in exclusions),
+    )
+
+
+class KnowledgeBase:
+    """
+    Rules and question-flow tables of one knowledge base version.
+
+    Args:
+        specs: The rules, in rule base order
+        question_templates: Symptom -> question text
+        disease_info: Disease -> info dict ('common_symptoms' steers the
+            question flow; the rest is descriptive)
+        symptom_priorities: Symptom -> priority of asking about it
+        rule_applicability: Rule name -> patient context condition
+        question_applicability: Symptom -> patient context condition
+
+    Raises:
+        ValueError: If two rules share a name, a rule's disease has no
+            disease_info or a condition names an unknown rule
+    """
+
+    def __init__(self, specs: Sequence[RuleSpec], question_templates: Dict[str, str],
+                 disease_info: Dict[str, Dict], symptom_priorities: Dict[str, float],
+                 rule_applicability: Optional[Dict[str, Dict]] = None,
+                 question_applicability: Optional[Dict[str, Dict]] = None):
+        self.specs: Tuple[RuleSpec, ...] = tuple(specs)
+        self.question_templates = dict(question_templates)
+        self.disease_info = copy.deepcopy(dict(disease_info))
+        self.symptom_priorities = dict(symptom_priorities)
+        self.rule_applicability = copy.deepcopy(dict(rule_applicability or {}))
+        self.question_applicability = copy.deepcopy(dict(question_applicability or {}))
+        self.specs_by_name = {spec.name: spec for spec in self.specs}
+        if len(self.specs_by_name) != len(self.specs):
+            raise ValueError('Rule names must be unique')
+        missing = sorted({spec.disease for spec in self.specs} - self.disease_info.keys())
+        if missing:
+            raise ValueError(f'No disease_info for: {", ".join(missing)}')
+        unknown = sorted(self.rule_applicability.keys() - self.specs_by_name.keys())
+        if unknown:
+            raise ValueError(f'Applicability given for unknown rules: {", ".join(unknown)}')
+        self.rules_by_symptom = _index_by_symptom(self.specs)
+        self.version = self._content_hash()
+        self._compiled_rules = None
+        self._contexts = None
+        self._question_index = None
+
+    def _content(self) -> Dict:
+        content = {
+            'rules': [_spec_to_dict(spec) for spec in self.specs],
+            'question_templates': self.question_templates,
+            'disease_info': self.disease_info,
+            'symptom_priorities': self.symptom_priorities,
+        }
+        if self.rule_applicability or self.question_applicability:
+            content['applicability'] = {'rules': self.rule_applicability,
+                                        'questions': self.question_applicability}
+        return content
+
+    def _content_hash(self) -> str:
+        payload = json.dumps([FORMAT_VERSION, self._content()], sort_keys=True,
+                             separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def compiled_rules(self):
+        """The generated rules module of this version (built on first use)."""
+        if self._compiled_rules is None:
+            from .codegen import load_compiled_rules
+            self._compiled_rules = load_compiled_rules(self.specs)
+        return self._compiled_rules
+
+    @property
+    def contexts(self) -> PatientContexts:
+        """The patient context buckets of this version and their cached profiles."""
+        if self._contexts is None:
+            self._contexts = PatientContexts(
+                self.specs, self.rules_by_symptom, self.question_templates,
+                self.rule_applicability, self.question_applicability)
+        return self._contexts
+
+    @property
+    def question_index(self) -> QuestionIndex:
+        """The symptom bit positions of this version's question flow (built on first use)."""
+        if self._question_index is None:
+            self._question_index = QuestionIndex(self.question_templates, self.disease_info,
+                                                 self.symptom_priorities)
+        return self._question_index
+
+    def summary(self) -> Dict:
+        return {
+            'version': self.version,
+            'rules': len(self.specs),
+            'diseases': len({spec.disease for spec in self.specs}),
+            'questions': len(self.question_templates),
+        }
+
+    def to_dict(self) -> Dict:
+        """The artifact form (a copy: editing it leaves this version unchanged)."""
+        return dict(format=FORMAT_VERSION, version=self.version, **copy.deepcopy(self._content()))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'KnowledgeBase':
+        """
+        Build a knowledge base from its artifact form.
+
+        Raises:
+            ValueError: If the artifact is malformed, or its version does
+                not match its content
+        """
+        if not isinstance(data, dict):
+            raise ValueError('A knowledge base artifact must be a JSON object')
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge base format: {data.get('format')}")
+        rules = data.get('rules')
+        if not isinstance(rules, list) or not rules:
+            raise ValueError('rules must be a non-empty list')
+        tables = {
+            'question_templates': lambda v: isinstance(v, str),
+            'disease_info': lambda v: (isinstance(v, dict) and isinstance(
+                v.get('common_symptoms', []), list)),
+            'symptom_priorities': _is_number,
+        }
+        for field, check in tables.items():
+            table = data.get(field)
+            if not isinstance(table, dict) or not all(check(v) for v in table.values()):
+                raise ValueError(f'{field} is missing or has an invalid entry')
+        applicability = data.get('applicability', {})
+        if not isinstance(applicability, dict) or not set(applicability) <= {'rules', 'questions'}:
+            raise ValueError('applicability must be an object with rules and questions')
+        tables = []
+        for field in ('rules', 'questions'):
+            table = applicability.get(field, {})
+            if not isinstance(table, dict):
+                raise ValueError(f'applicability.{field} must be an object')
+            tables.append({name: validate_condition(condition, f'applicability.{field}.{name}')
+                           for name, condition in table.items()})
+        knowledge_base = cls(
+            [_spec_from_dict(entry, position) for position, entry in enumerate(rules)],
+            data['question_templates'], data['disease_info'], data['symptom_priorities'],
+            *tables,
+        )
+        version = data.get('version')
+        if version is not None and version != knowledge_base.version:
+            raise ValueError(
+                f'Knowledge base version {version} does not match its content '
+                f'({knowledge_base.version}); re-stamp it with export_knowledge_base.py --stamp'
+            )
+        return knowledge_base
+
+    def save(self, path: str):
+        """Write the artifact (atomically: readers never see half a file)."""
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
+            f.write('\n')
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'KnowledgeBase':
+        """
+        Load an artifact.
+
+        Raises:
+            ValueError: If it is not a valid knowledge base artifact
+            OSError: If it cannot be read
+        """
+        with open(path, encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'{path} is not valid JSON: {e}')
+        return cls.from_dict(data)
+
+
+_builtin: Optional[KnowledgeBase] = None
+
+
+def builtin_knowledge_base() -> KnowledgeBase:
+    """The knowledge base defined by the Python modules."""
+    global _builtin
+    if _builtin is None:
+        _builtin = KnowledgeBase(RULE_SPECS, QUESTION_TEMPLATES, DISEASE_INFO, SYMPTOM_PRIORITIES,
+                                 RULE_APPLICABILITY, QUESTION_APPLICABILITY)
+    return _builtin
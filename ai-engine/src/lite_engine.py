@@ -0,0 +1,190 @@
+"""
+Minimal forward-chaining engine for the diagnosis rules.
+
+The rule mixins only use a small part of experta: ``Fact`` subclasses,
+``@Rule`` patterns made of facts with literal field values (optionally
+grouped with ``OR``), ``salience``, and ``declare`` / ``modify`` /
+``retract`` / ``reset`` / ``run``. ``LiteKnowledgeEngine`` implements just
+that, without a Rete network: each pattern is indexed by the fact class and
+``name`` it requires, and a rule is activated when a matching fact is
+declared and every one of its patterns has a match.
+
+The ``@Rule`` decorators and ``Fact`` classes are still experta's, so the
+mixins work unchanged with either engine.
+"""
+
+from typing import Dict, List, Tuple
+
+from . import compat
+
+from experta import Fact, Rule, OR
+from experta.fact import InitialFact
+
+
+class _Pattern:
+    """A fact pattern with literal field values, e.g. ``Symptom(name='fever')``."""
+
+    __slots__ = ('fact_class', 'fields', 'matches')
+
+    def __init__(self, pattern: Fact):
+        self.fact_class = type(pattern)
+        self.fields = tuple(
+            (key, value) for key, value in pattern.items() if not Fact.is_special(key)
+        )
+        self.matches = 0  # Facts in working memory matching the pattern
+
+    @property
+    def index_key(self):
+        return (self.fact_class, dict(self.fields).get('name'))
+
+    def match(self, fact: Fact) -> bool:
+        return isinstance(fact, self.fact_class) and all(
+            key in fact and fact[key] == value for key, value in self.fields
+        )
+
+
+class _CompiledRule:
+    """A rule as a list of pattern groups; a group matches if any of its patterns does."""
+
+    __slots__ = ('rule', 'groups')
+
+    def __init__(self, rule: Rule, groups: List[Tuple[_Pattern, ...]]):
+        self.rule = rule
+        self.groups = groups
+
+    def complete(self) -> bool:
+        return all(any(p.matches for p in group) for group in self.groups)
+
+
+def _compile(rule: Rule, patterns: Dict[Tuple, _Pattern]) -> _CompiledRule:
+    groups = []
+    for element in rule:
+        alternatives = element if isinstance(element, OR) else (element,)
+        group = []
+        for alternative in alternatives:
+            if not isinstance(alternative, Fact) or alternative.has_field_constraints():
+                raise TypeError(
+                    f'LiteKnowledgeEngine only supports fact patterns with literal '
+                    f'values and OR; rule {rule.__name__} uses {alternative!r}'
+                )
+            pattern = _Pattern(alternative)
+            # Rules requiring the same fact share one pattern (and its count)
+            group.append(patterns.setdefault((pattern.fact_class, pattern.fields), pattern))
+        groups.append(tuple(group))
+    return _CompiledRule(rule, groups)
+
+
+class LiteKnowledgeEngine:
+    """
+    Drop-in replacement for the subset of ``experta.KnowledgeEngine`` used
+    by the diagnosis engine.
+
+    Activations are kept as the set of rules that became complete (or saw a
+    new matching fact) since the last run; ``run`` fires them once each in
+    salience order. Rule bodies are called without bound variables.
+    """
+
+    def __init__(self):
+        self._patterns: Dict[Tuple, _Pattern] = {}
+        self._rules = [_compile(rule, self._patterns) for rule in self.get_rules()]
+        self._index: Dict[Tuple, List[Tuple[_Pattern, List[_CompiledRule]]]] = {}
+        for pattern in self._patterns.values():
+            users = [r for r in self._rules if any(pattern in g for g in r.groups)]
+            self._index.setdefault(pattern.index_key, []).append((pattern, users))
+        self.facts: Dict[int, Fact] = {}
+        self._fact_keys: Dict[Tuple, int] = {}
+        self._next_id = 0
+        self._activations: Dict[str, _CompiledRule] = {}
+        self.running = False
+
+    def get_rules(self) -> List[Rule]:
+        """Return the rules defined on the engine class and its mixins."""
+        rules, seen = [], set()
+        for klass in type(self).__mro__:
+            for name, value in vars(klass).items():
+                if isinstance(value, Rule) and name not in seen:
+                    seen.add(name)
+                    rules.append(value)
+        return rules
+
+    def reset(self):
+        """Clear working memory and pending activations, and declare ``InitialFact``."""
+        for pattern in self._patterns.values():
+            pattern.matches = 0
+        self.facts = {}
+        self._fact_keys = {}
+        self._next_id = 0
+        self._activations = {rule.rule.__name__: rule for rule in self._rules
+                             if not rule.groups}
+        self.declare(InitialFact())
+
+    @staticmethod
+    def _fact_key(fact: Fact) -> Tuple:
+        return (type(fact), frozenset((k, v) for k, v in fact.items() if not Fact.is_special(k)))
+
+    def _candidates(self, fact: Fact):
+        name = fact.get('name')
+        for klass in type(fact).__mro__:
+            yield from self._index.get((klass, name), ())
+            if name is not None:
+                yield from self._index.get((klass, None), ())
+
+    def declare(self, *facts: Fact) -> Fact:
+        """Add facts to working memory; identical facts are only stored once."""
+        last = None
+        for fact in facts:
+            key = self._fact_key(fact)
+            if key in self._fact_keys:
+                last = self.facts[self._fact_keys[key]]
+                continue
+            fact.validate()
+            fact.__factid__ = self._next_id
+            self.facts[self._next_id] = fact
+            self._fact_keys[key] = self._next_id
+            self._next_id += 1
+            for pattern, users in self._candidates(fact):
+                if pattern.match(fact):
+                    pattern.matches += 1
+                    for rule in users:
+                        if rule.complete():
+                            self._activations[rule.rule.__name__] = rule
+            last = fact
+        return last
+
+    def retract(self, fact: Fact):
+        """Remove a fact (or fact id) from working memory."""
+        fact_id = fact if isinstance(fact, int) else fact.__factid__
+        fact = self.facts.pop(fact_id)
+        del self._fact_keys[self._fact_key(fact)]
+        for pattern, users in self._candidates(fact):
+            if pattern.match(fact):
+                pattern.matches -= 1
+                for rule in users:
+                    if not rule.complete():
+                        self._activations.pop(rule.rule.__name__, None)
+
+    def modify(self, fact: Fact, **changes) -> Fact:
+        """Replace a fact by a copy with some fields changed."""
+        self.retract(fact)
+        new_fact = fact.copy()
+        new_fact.update(changes)
+        return self.declare(new_fact)
+
+    def _take_activations(self) -> List[Rule]:
+        """Return and clear the rules activated since the last call."""
+        rules = [compiled.rule for compiled in self._activations.values()]
+        self._activations = {}
+        return rules
+
+    def run(self, steps=float('inf')):
+        """Fire the pending activations in salience order."""
+        self.running = True
+        for rule in sorted(self._take_activations(), key=lambda r: r.salience, reverse=True):
+            if steps <= 0 or not self.running:
+                break
+            steps -= 1
+            rule._wrapped(self)
+        self.running = False
+
+    def halt(self):
+        self.running = False
@@ -0,0 +1,90 @@
+"""
+Stateless one-shot diagnosis of a complete answer set.
+
+Clients that already have the whole questionnaire send every answer in one
+``diagnose`` request (or run ``main.py --oneshot``) instead of walking the
+interactive flow. The result depends only on the answers, the rule base and
+the engine options, so it is identified by ``diagnosis_key`` and any worker
+can serve it from a cache: the process's own ``DiagnosisCache``, and
+with ``--shared-cache`` the ``SharedResultCache`` of all workers on the
+host (``shared_cache.py``).
+
+Certainties are quantized to ``CERTAINTY_QUANTUM`` before hashing and
+before inference, so answers that differ only by float noise (0.3 vs
+0.30000000000000004) share a key and get the same result.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .codegen import rule_base_hash
+
+
+DEFAULT_CACHE_SIZE = 1024
+
+CERTAINTY_QUANTUM = 1e-6
+
+# Part of every key, so results of another rule base never match
+RULE_BASE_HASH = rule_base_hash()
+
+
+def quantize_answers(answers: Iterable[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """Round certainties to CERTAINTY_QUANTUM (0.9 stays exactly 0.9)."""
+    steps = round(1 / CERTAINTY_QUANTUM)
+    return [(symptom, round(float(certainty) * steps) / steps) for symptom, certainty in answers]
+
+
+def diagnosis_key(answers: Iterable[Tuple[str, float]], variant: str = '') -> str:
+    """
+    Hash an answer set for caching.
+
+    The key covers the quantized answers (in any order; ints and floats of
+    equal value hash the same), the rule base and ``variant``, which should
+    name any engine option that changes results (e.g. top-k).
+    """
+    canonical = sorted(quantize_answers(answers))
+    content = json.dumps([RULE_BASE_HASH, variant, canonical], separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+
+def diagnose_answers(engine, answers: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """
+    Diagnose an answer set in one inference pass, without any question
+    selection.
+
+    Returns:
+        The ranked (disease, certainty) list
+    """
+    return engine.diagnose(answers)
+
+
+class DiagnosisCache:
+    """Least recently used ``diagnose_answers`` results by ``diagnosis_key``."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, List]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[List]:
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def put(self, key: str, results: List):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,267 @@
+"""
+Patient context: which rules and questions apply to a patient.
+
+A session can start with the patient's age, gender and existing
+conditions (the ``PatientInfo`` fact). Some rules and questions do not
+apply to every patient: strep throat is rare under three and not tested
+for, wheezing in an asthmatic is explained by the asthma, a patient who
+had lost their sense of smell before cannot report losing it. Such rules
+and questions carry an applicability condition, a dict of:
+
+    min_age             applies from this age on
+    max_age             applies below this age
+    genders             applies to these genders only
+    with_conditions     applies if the patient has one of these conditions
+    without_conditions  applies if the patient has none of these conditions
+
+What the patient did not say does not prune anything: a condition on age
+holds when the age is unknown.
+
+Patients are grouped into context buckets: the age band between the
+``min_age`` / ``max_age`` bounds that appear in any condition, the gender if
+a condition names it, and the existing conditions that some condition
+mentions. Every patient of a bucket gets the same rules and questions, so
+``PatientContexts`` builds a ``ContextProfile`` (the active rules, their
+symptom index, the question pool and, on first use, their generated code)
+once per bucket and caches it. A profile that prunes nothing shares the
+knowledge base's own structures.
+"""
+
+from bisect import bisect_right
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .facts import (
+    CONDITION_ALLERGIC_RHINITIS, CONDITION_ANOSMIA, CONDITION_ASTHMA, CONDITION_COPD,
+    SYMPTOM_LOSS_OF_SMELL, SYMPTOM_LOSS_OF_TASTE,
+)
+from .rules.specs import RuleSpec, _index_by_symptom
+
+
+# Applicability conditions of the built-in rules, by rule name
+RULE_APPLICABILITY: Dict[str, Dict] = {
+    # Group A strep is rare under three, and throat cultures are not done
+    'strep_throat_classic': {'min_age': 3},
+    'strep_throat_moderate': {'min_age': 3},
+    'strep_throat_mild': {'min_age': 3},
+    # The chronic condition explains the wheezing
+    'bronchitis_with_wheezing': {'without_conditions': [CONDITION_ASTHMA, CONDITION_COPD]},
+    # Allergies explain a runny nose with sneezing
+    'common_cold_nasal': {'without_conditions': [CONDITION_ALLERGIC_RHINITIS]},
+    'covid19_taste_smell_only': {'without_conditions': [CONDITION_ANOSMIA]},
+}
+
+# Applicability conditions of the built-in questions, by symptom. A young
+# child cannot tell us about taste and smell.
+QUESTION_APPLICABILITY: Dict[str, Dict] = {
+    SYMPTOM_LOSS_OF_TASTE: {'min_age': 3, 'without_conditions': [CONDITION_ANOSMIA]},
+    SYMPTOM_LOSS_OF_SMELL: {'min_age': 3, 'without_conditions': [CONDITION_ANOSMIA]},
+}
+
+# Oldest age accepted for a patient
+MAX_AGE = 150
+
+CONDITION_FIELDS = ('min_age', 'max_age', 'genders', 'with_conditions', 'without_conditions')
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_condition(condition, where: str) -> Dict:
+    """
+    Check an applicability condition.
+
+    Raises:
+        ValueError: If it is not a dict of the fields above
+    """
+    if not isinstance(condition, dict):
+        raise ValueError(f'{where}: an applicability condition must be an object')
+    for field, value in condition.items():
+        if field in ('min_age', 'max_age'):
+            if not _is_number(value) or value < 0:
+                raise ValueError(f'{where}: {field} must be a non-negative number')
+        elif field in ('genders', 'with_conditions', 'without_conditions'):
+            if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value):
+                raise ValueError(f'{where}: {field} must be a list of strings')
+        else:
+            raise ValueError(f"{where}: unknown condition field {field!r} "
+                             f"(valid fields: {', '.join(CONDITION_FIELDS)})")
+    return condition
+
+
+def parse_patient(data) -> Dict:
+    """
+    Validate and normalize the patient of a start request.
+
+    Args:
+        data: {'age': 35, 'gender': 'male', 'existing_conditions': ['asthma']},
+            every field optional
+
+    Returns:
+        The patient with gender and conditions lowercased and the
+        conditions as a sorted tuple
+
+    Raises:
+        ValueError: If a field is missing its expected type
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Patient must be an object with age, gender and existing_conditions')
+    unknown = sorted(set(data) - {'age', 'gender', 'existing_conditions'})
+    if unknown:
+        raise ValueError(f"Unknown patient field: {', '.join(unknown)}")
+    patient = {}
+    age = data.get('age')
+    if age is not None:
+        if not _is_number(age) or not 0 <= age <= MAX_AGE:
+            raise ValueError(f'Age must be a number between 0 and {MAX_AGE}, got {age}')
+        patient['age'] = age
+    gender = data.get('gender')
+    if gender is not None:
+        if not isinstance(gender, str) or not gender.strip():
+            raise ValueError(f'Gender must be a non-empty string, got {gender!r}')
+        patient['gender'] = gender.strip().lower()
+    conditions = data.get('existing_conditions')
+    if conditions is not None:
+        if not isinstance(conditions, list) or not all(isinstance(c, str) for c in conditions):
+            raise ValueError('Existing conditions must be a list of strings')
+        patient['existing_conditions'] = tuple(sorted({c.strip().lower() for c in conditions}))
+    return patient
+
+
+def applies(condition: Optional[Dict], age: Optional[float], gender: Optional[str],
+            conditions: FrozenSet[str]) -> bool:
+    """Whether an applicability condition holds (unknown age or gender never fail it)."""
+    if not condition:
+        return True
+    if age is not None:
+        if age < condition.get('min_age', age) or age >= condition.get('max_age', float('inf')):
+            return False
+    if gender is not None and 'genders' in condition and gender not in condition['genders']:
+        return False
+    if 'with_conditions' in condition and conditions.isdisjoint(condition['with_conditions']):
+        return False
+    return conditions.isdisjoint(condition.get('without_conditions', ()))
+
+
+class ContextProfile:
+    """
+    The rules and questions of one context bucket.
+
+    Attributes:
+        key: The bucket, (age band, gender, conditions)
+        specs: The rules that apply, in rule base order
+        inactive: Names of the rules that do not apply
+        rules_by_symptom: Symptom -> the applying rules that read it
+        question_pool: Symptoms that may be asked, or None for all of them
+    """
+
+    def __init__(self, key: Tuple, specs: Tuple[RuleSpec, ...], inactive: FrozenSet[str],
+                 rules_by_symptom: Dict, question_pool: Optional[FrozenSet[str]]):
+        self.key = key
+        self.specs = specs
+        self.inactive = inactive
+        self.rules_by_symptom = rules_by_symptom
+        self.question_pool = question_pool
+        self._compiled_rules = None
+
+    @property
+    def compiled_rules(self):
+        """The generated rules module of the applying rules (built on first use)."""
+        if self._compiled_rules is None:
+            from .codegen import load_compiled_rules
+            self._compiled_rules = load_compiled_rules(self.specs)
+        return self._compiled_rules
+
+    def describe(self) -> Dict:
+        age_band, gender, conditions = self.key
+        return {
+            'bucket': [age_band, gender, sorted(conditions)],
+            'rules': len(self.specs),
+            'pruned_rules': sorted(self.inactive),
+            'questions': None if self.question_pool is None else len(self.question_pool),
+        }
+
+
+class PatientContexts:
+    """
+    Context buckets of a knowledge base and their cached profiles.
+
+    Args:
+        specs: The knowledge base's rules
+        rules_by_symptom: Its symptom -> rules index
+        question_templates: Its questions, by symptom
+        rule_applicability: Rule name -> applicability condition
+        question_applicability: Symptom -> applicability condition
+    """
+
+    def __init__(self, specs: Sequence[RuleSpec], rules_by_symptom: Dict,
+                 question_templates: Dict[str, str], rule_applicability: Dict[str, Dict],
+                 question_applicability: Dict[str, Dict]):
+        self.specs = tuple(specs)
+        self.rules_by_symptom = rules_by_symptom
+        self.question_templates = question_templates
+        self.rule_applicability = rule_applicability
+        self.question_applicability = question_applicability
+        conditions = list(rule_applicability.values()) + list(question_applicability.values())
+        self.age_bounds: List[float] = sorted({c[f] for c in conditions
+                                               for f in ('min_age', 'max_age') if f in c})
+        self.genders = frozenset(g for c in conditions for g in c.get('genders', ()))
+        self.conditions = frozenset(
+            name for c in conditions
+            for name in c.get('with_conditions', []) + c.get('without_conditions', []))
+        self.profiles: Dict[Tuple, ContextProfile] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, patient: Dict) -> Tuple:
+        """The context bucket of a patient from ``parse_patient``."""
+        age = patient.get('age')
+        age_band = None if age is None else bisect_right(self.age_bounds, age)
+        gender = patient.get('gender')
+        if not self.genders:
+            gender = None  # No condition looks at it
+        elif gender is not None and gender not in self.genders:
+            gender = ''  # Named by no condition: fails every genders list
+        conditions = self.conditions.intersection(patient.get('existing_conditions', ()))
+        return age_band, gender, frozenset(conditions)
+
+    def profile(self, patient: Dict) -> ContextProfile:
+        """The (cached) profile of a patient's bucket."""
+        key = self.bucket(patient)
+        profile = self.profiles.get(key)
+        if profile is not None:
+            self.hits += 1
+            return profile
+        self.misses += 1
+        profile = self.profiles[key] = self._build(key)
+        return profile
+
+    def _build(self, key: Tuple) -> ContextProfile:
+        age_band, gender, conditions = key
+        # Every age of a band compares the same with every bound, so the
+        # band's lowest age stands for it
+        age = None
+        if age_band is not None:
+            age = self.age_bounds[age_band - 1] if age_band else float('-inf')
+
+        specs = tuple(spec for spec in self.specs if applies(
+            self.rule_applicability.get(spec.name), age, gender, conditions))
+        if len(specs) == len(self.specs):
+            specs, inactive, rules_by_symptom = self.specs, frozenset(), self.rules_by_symptom
+        else:
+            inactive = frozenset(spec.name for spec in self.specs) - {s.name for s in specs}
+            rules_by_symptom = _index_by_symptom(specs)
+
+        # Questions that apply, less those only pruned rules would read
+        # (questions no rule reads stay, as they are without a context)
+        unread = self.rules_by_symptom.keys() - rules_by_symptom.keys()
+        pool = frozenset(
+            symptom for symptom in self.question_templates
+            if symptom not in unread and applies(
+                self.question_applicability.get(symptom), age, gender, conditions))
+        if len(pool) == len(self.question_templates):
+            pool = None
+        return ContextProfile(key, specs, inactive, rules_by_symptom, pool)
+
+    def stats(self) -> Dict:
+        return {'buckets': len(self.profiles), 'hits': self.hits, 'misses': self.misses}
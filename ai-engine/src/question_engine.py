@@ -1,9 +1,15 @@
 """
 Question-asking engine for the medical diagnosis expert system.
 Implements goal-driven question generation and dynamic question selection.
+
+The symptoms a knowledge base can ask about are numbered once, in a
+``QuestionIndex``, best question first, and each disease carries the mask
+of its common symptoms. A session keeps the questions it has asked as an
+int bitmask, so choosing the next question is a few ORs and AND-NOTs of
+masks and taking the lowest bit that is left.
 """
 
-from typing import List, Dict, Optional, Set, Tuple
+from typing import Dict, FrozenSet, Iterable, Optional, Set
 from .facts import (
     QUESTION_TEMPLATES, DISEASE_INFO,
     SYMPTOM_FEVER, SYMPTOM_FATIGUE, SYMPTOM_BODY_ACHES, SYMPTOM_HEADACHE,
@@ -18,64 +24,257 @@ from .facts import (
 )
 
 
+# Diseases above this certainty steer question selection
+RELEVANCE_THRESHOLD = 0.3
+
+# A diagnosis above this certainty ends the session (after min_questions)
+CONFIDENT_DIAGNOSIS_CF = 0.8
+
+
+# How much asking about a symptom is worth, from its diagnostic value.
+# Higher priority = more important for diagnosis (1-10).
+SYMPTOM_PRIORITIES = {
+    # High priority - distinctive symptoms
+    SYMPTOM_LOSS_OF_TASTE: 10,  # Very specific to COVID-19
+    SYMPTOM_LOSS_OF_SMELL: 10,  # Very specific to COVID-19
+    SYMPTOM_CHEST_PAIN: 9,  # Important for pneumonia
+    SYMPTOM_SHORTNESS_OF_BREATH: 9,  # Critical respiratory symptom
+    SYMPTOM_SWOLLEN_LYMPH_NODES: 8,  # Important for strep throat
+    SYMPTOM_DIFFICULTY_SWALLOWING: 8,  # Important for strep throat
+
+    # Medium-high priority - common but informative
+    SYMPTOM_FEVER: 7,  # Very common, helps narrow down
+    SYMPTOM_DRY_COUGH: 7,  # Helps distinguish COVID from others
+    SYMPTOM_PRODUCTIVE_COUGH: 7,  # Helps identify bacterial infections
+    SYMPTOM_BODY_ACHES: 6,  # Common in flu
+    SYMPTOM_SORE_THROAT: 6,  # Important for several conditions
+
+    # Medium priority - helpful but less specific
+    SYMPTOM_COUGH: 5,  # Very common, less specific
+    SYMPTOM_FATIGUE: 5,  # Common in many conditions
+    SYMPTOM_RUNNY_NOSE: 5,  # Helps identify cold
+    SYMPTOM_SNEEZING: 5,  # Helps identify cold
+    SYMPTOM_HEADACHE: 4,  # Common but less specific
+
+    # Lower priority - supporting symptoms
+    SYMPTOM_CHEST_DISCOMFORT: 4,
+    SYMPTOM_MUCUS_PRODUCTION: 4,
+}
+
+
+def format_question(symptom: str,
+                    templates: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Build the question dictionary for a symptom.
+    
+    Args:
+        symptom: The symptom to ask about
+        templates: Question texts by symptom (default: QUESTION_TEMPLATES)
+        
+    Returns:
+        Dictionary with 'symptom' and 'text' keys
+    """
+    templates = QUESTION_TEMPLATES if templates is None else templates
+    question_text = templates.get(
+        symptom, 
+        f"Do you have {symptom.replace('_', ' ')}?"
+    )
+    return {
+        'symptom': symptom,
+        'text': question_text
+    }
+
+
+def information_gain(symptom: str, disease_info: Dict[str, Dict],
+                     symptom_priorities: Dict[str, float]) -> float:
+    """
+    Calculate the information gain of asking about a symptom.
+    This helps determine which question would be most informative.
+    
+    Args:
+        symptom: The symptom to evaluate
+        disease_info: Disease -> info dict with 'common_symptoms'
+        symptom_priorities: Symptom -> priority of asking about it
+        
+    Returns:
+        Information gain score (higher = more informative)
+    """
+    # Base priority from symptom importance
+    base_priority = symptom_priorities.get(symptom, 3)
+    
+    # Count how many diseases are associated with this symptom
+    diseases_with_symptom = 0
+    for disease, info in disease_info.items():
+        if symptom in info.get('common_symptoms', []):
+            diseases_with_symptom += 1
+    
+    # Symptoms that appear in some but not all diseases are more informative
+    # Ideal is 50% of diseases (maximum discrimination)
+    total_diseases = len(disease_info)
+    discrimination_score = 1.0 - abs(diseases_with_symptom / total_diseases - 0.5) * 2
+    
+    # Combine base priority with discrimination score
+    return base_priority * (0.7 + 0.3 * discrimination_score)
+
+
+class QuestionIndex:
+    """
+    Bit positions of the askable symptoms of one set of question-flow tables.
+    
+    Symptoms (those with a question text or in a disease's common
+    symptoms) are numbered by information gain, highest first, ties by
+    name, so the lowest bit of a mask of candidates is the best question.
+    Built once per knowledge base and shared by all its sessions.
+    
+    Args:
+        question_templates: Symptom -> question text
+        disease_info: Disease -> info dict with 'common_symptoms'
+        symptom_priorities: Symptom -> priority of asking about it
+    """
+    
+    def __init__(self, question_templates: Dict[str, str], disease_info: Dict[str, Dict],
+                 symptom_priorities: Dict[str, float]):
+        symptoms = set(question_templates)
+        for info in disease_info.values():
+            symptoms.update(info.get('common_symptoms', []))
+        gains = {symptom: information_gain(symptom, disease_info, symptom_priorities)
+                 for symptom in symptoms}
+        self.symptoms = tuple(sorted(symptoms, key=lambda symptom: (-gains[symptom], symptom)))
+        self.scores = tuple(gains[symptom] for symptom in self.symptoms)
+        self.bits = {symptom: bit for bit, symptom in enumerate(self.symptoms)}
+        self.disease_masks = {disease: self.mask(info.get('common_symptoms', []))
+                              for disease, info in disease_info.items()}
+        self.disease_symptoms = 0  # Symptoms of any disease
+        for mask in self.disease_masks.values():
+            self.disease_symptoms |= mask
+        self.templated = self.mask(question_templates)
+        self.all = (1 << len(self.symptoms)) - 1
+        self._pool_masks: Dict[FrozenSet[str], int] = {}
+    
+    def mask(self, symptoms: Iterable[str]) -> int:
+        """The mask of some symptoms (those not in the index are left out)."""
+        mask = 0
+        for symptom in symptoms:
+            bit = self.bits.get(symptom)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+    
+    def pool_mask(self, pool: Optional[FrozenSet[str]]) -> int:
+        """The mask of a patient context's question pool (None = all), cached per pool."""
+        if pool is None:
+            return self.all
+        mask = self._pool_masks.get(pool)
+        if mask is None:
+            mask = self._pool_masks[pool] = self.mask(pool)
+        return mask
+    
+    def relevant(self, diagnoses: Dict[str, float]) -> int:
+        """
+        The mask of symptoms relevant to the current diagnoses: those of
+        diseases above RELEVANCE_THRESHOLD, or of every disease if there is
+        no diagnosis yet.
+        """
+        if not diagnoses:
+            return self.disease_symptoms
+        relevant = 0
+        for disease, certainty in diagnoses.items():
+            if certainty > RELEVANCE_THRESHOLD:
+                relevant |= self.disease_masks.get(disease, 0)
+        return relevant
+    
+    def symptoms_of(self, mask: int) -> Set[str]:
+        symptoms = set()
+        while mask:
+            low = mask & -mask
+            symptoms.add(self.symptoms[low.bit_length() - 1])
+            mask ^= low
+        return symptoms
+
+
+_default_index: Optional[QuestionIndex] = None
+
+
+def default_question_index() -> QuestionIndex:
+    """The index of the tables in ``facts.py`` and this module."""
+    global _default_index
+    if _default_index is None:
+        _default_index = QuestionIndex(QUESTION_TEMPLATES, DISEASE_INFO, SYMPTOM_PRIORITIES)
+    return _default_index
+
+
 class QuestionEngine:
     """
     Manages the question-asking process for the diagnosis system.
     Uses a goal-driven approach to select the most informative questions.
+    
+    The question texts, disease info and symptom priorities default to the
+    tables in ``facts.py`` and this module; a ``KnowledgeBase`` passes its own
+    along with their shared ``QuestionIndex``. A patient context limits the
+    questions to its ``question_pool``.
+    
+    A session's state is the mask of the questions asked, and the mask of
+    its question pool. Symptoms outside the index (never asked by the
+    engine, but answered all the same) are counted in a set of their own.
     """
     
-    def __init__(self):
+    def __init__(self, question_templates: Optional[Dict[str, str]] = None,
+                 disease_info: Optional[Dict[str, Dict]] = None,
+                 symptom_priorities: Optional[Dict[str, float]] = None,
+                 index: Optional[QuestionIndex] = None):
         """Initialize the question engine."""
-        self.asked_symptoms: Set[str] = set()
-        self.answered_symptoms: Dict[str, float] = {}  # symptom -> certainty
-        self.symptom_priorities = self._initialize_symptom_priorities()
+        self.question_templates = (QUESTION_TEMPLATES if question_templates is None
+                                   else question_templates)
+        self.disease_info = DISEASE_INFO if disease_info is None else disease_info
+        self.symptom_priorities = (SYMPTOM_PRIORITIES if symptom_priorities is None
+                                   else symptom_priorities)
+        if index is None:
+            if question_templates is None and disease_info is None and symptom_priorities is None:
+                index = default_question_index()
+            else:
+                index = QuestionIndex(self.question_templates, self.disease_info,
+                                      self.symptom_priorities)
+        self.index = index
+        self.asked = 0  # Mask of the asked symptoms
+        self.unindexed: Optional[Set[str]] = None  # Asked symptoms outside the index
+        self.pool = index.all  # Mask of the askable symptoms
+        self._question_pool: Optional[FrozenSet[str]] = None
         
     def reset(self):
         """Reset the question engine for a new session."""
-        self.asked_symptoms.clear()
-        self.answered_symptoms.clear()
+        self.asked = 0
+        self.unindexed = None
+        self.question_pool = None
     
-    def _initialize_symptom_priorities(self) -> Dict[str, int]:
-        """
-        Initialize symptom priorities based on their diagnostic value.
-        Higher priority = more important for diagnosis.
-        
-        Returns:
-            Dict mapping symptom names to priority values (1-10)
-        """
-        return {
-            # High priority - distinctive symptoms
-            SYMPTOM_LOSS_OF_TASTE: 10,  # Very specific to COVID-19
-            SYMPTOM_LOSS_OF_SMELL: 10,  # Very specific to COVID-19
-            SYMPTOM_CHEST_PAIN: 9,  # Important for pneumonia
-            SYMPTOM_SHORTNESS_OF_BREATH: 9,  # Critical respiratory symptom
-            SYMPTOM_SWOLLEN_LYMPH_NODES: 8,  # Important for strep throat
-            SYMPTOM_DIFFICULTY_SWALLOWING: 8,  # Important for strep throat
-            
-            # Medium-high priority - common but informative
-            SYMPTOM_FEVER: 7,  # Very common, helps narrow down
-            SYMPTOM_DRY_COUGH: 7,  # Helps distinguish COVID from others
-            SYMPTOM_PRODUCTIVE_COUGH: 7,  # Helps identify bacterial infections
-            SYMPTOM_BODY_ACHES: 6,  # Common in flu
-            SYMPTOM_SORE_THROAT: 6,  # Important for several conditions
-            
-            # Medium priority - helpful but less specific
-            SYMPTOM_COUGH: 5,  # Very common, less specific
-            SYMPTOM_FATIGUE: 5,  # Common in many conditions
-            SYMPTOM_RUNNY_NOSE: 5,  # Helps identify cold
-            SYMPTOM_SNEEZING: 5,  # Helps identify cold
-            SYMPTOM_HEADACHE: 4,  # Common but less specific
-            
-            # Lower priority - supporting symptoms
-            SYMPTOM_CHEST_DISCOMFORT: 4,
-            SYMPTOM_MUCUS_PRODUCTION: 4,
-        }
+    @property
+    def question_pool(self) -> Optional[FrozenSet[str]]:
+        """Askable symptoms (None = all)."""
+        return self._question_pool
+    
+    @question_pool.setter
+    def question_pool(self, pool: Optional[FrozenSet[str]]):
+        self._question_pool = pool
+        self.pool = self.index.pool_mask(pool)
+    
+    @property
+    def asked_symptoms(self) -> Set[str]:
+        """The symptoms asked so far (a new set)."""
+        asked = self.index.symptoms_of(self.asked)
+        if self.unindexed:
+            asked |= self.unindexed
+        return asked
+    
+    @asked_symptoms.setter
+    def asked_symptoms(self, symptoms: Iterable[str]):
+        self.asked = 0
+        self.unindexed = None
+        for symptom in symptoms:
+            self._mark(symptom)
     
     def _calculate_information_gain(self, symptom: str, 
                                    current_diagnoses: Dict[str, float]) -> float:
         """
         Calculate the information gain of asking about a symptom.
-        This helps determine which question would be most informative.
         
         Args:
             symptom: The symptom to evaluate
@@ -84,24 +283,7 @@ class QuestionEngine:
         Returns:
             Information gain score (higher = more informative)
         """
-        # Base priority from symptom importance
-        base_priority = self.symptom_priorities.get(symptom, 3)
-        
-        # Count how many diseases are associated with this symptom
-        diseases_with_symptom = 0
-        for disease, info in DISEASE_INFO.items():
-            if symptom in info.get('common_symptoms', []):
-                diseases_with_symptom += 1
-        
-        # Symptoms that appear in some but not all diseases are more informative
-        # Ideal is 50% of diseases (maximum discrimination)
-        total_diseases = len(DISEASE_INFO)
-        discrimination_score = 1.0 - abs(diseases_with_symptom / total_diseases - 0.5) * 2
-        
-        # Combine base priority with discrimination score
-        information_gain = base_priority * (0.7 + 0.3 * discrimination_score)
-        
-        return information_gain
+        return information_gain(symptom, self.disease_info, self.symptom_priorities)
     
     def _get_relevant_symptoms_for_diagnoses(self, 
                                             diagnoses: Dict[str, float]) -> Set[str]:
@@ -114,20 +296,7 @@ class QuestionEngine:
         Returns:
             Set of relevant symptom names
         """
-        relevant_symptoms = set()
-        
-        # If we have no diagnoses yet, consider all diseases
-        if not diagnoses:
-            for disease_info in DISEASE_INFO.values():
-                relevant_symptoms.update(disease_info.get('common_symptoms', []))
-        else:
-            # Focus on symptoms for top diagnoses (certainty > 0.3)
-            for disease, certainty in diagnoses.items():
-                if certainty > 0.3:
-                    disease_info = DISEASE_INFO.get(disease, {})
-                    relevant_symptoms.update(disease_info.get('common_symptoms', []))
-        
-        return relevant_symptoms
+        return self.index.symptoms_of(self.index.relevant(diagnoses))
     
     def get_next_question(self, 
                          current_diagnoses: Dict[str, float]) -> Optional[Dict[str, str]]:
@@ -140,43 +309,26 @@ class QuestionEngine:
         Returns:
             Dictionary with 'symptom' and 'text' keys, or None if no more questions
         """
-        # Get symptoms relevant to current diagnoses
-        relevant_symptoms = self._get_relevant_symptoms_for_diagnoses(current_diagnoses)
-        
-        # Filter out already asked symptoms
-        unasked_symptoms = relevant_symptoms - self.asked_symptoms
+        index = self.index
+        askable = self.pool & ~self.asked
         
-        # If no relevant symptoms left, ask from remaining high-priority symptoms
-        if not unasked_symptoms:
-            all_symptoms = set(QUESTION_TEMPLATES.keys())
-            unasked_symptoms = all_symptoms - self.asked_symptoms
+        # Symptoms relevant to current diagnoses, not asked yet (and in the
+        # patient's pool); if there are none, any remaining templated symptom
+        candidates = index.relevant(current_diagnoses) & askable
+        if not candidates:
+            candidates = index.templated & askable
         
         # If all questions asked, return None
-        if not unasked_symptoms:
+        if not candidates:
             return None
         
-        # Calculate information gain for each unasked symptom
-        symptom_scores: List[Tuple[str, float]] = []
-        for symptom in unasked_symptoms:
-            score = self._calculate_information_gain(symptom, current_diagnoses)
-            symptom_scores.append((symptom, score))
-        
-        # Sort by score (highest first)
-        symptom_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Select the top symptom
-        next_symptom = symptom_scores[0][0]
-        
-        # Get the question text
-        question_text = QUESTION_TEMPLATES.get(
-            next_symptom, 
-            f"Do you have {next_symptom.replace('_', ' ')}?"
-        )
-        
-        return {
-            'symptom': next_symptom,
-            'text': question_text
-        }
+        # Symptoms are numbered best first: take the lowest bit
+        bit = (candidates & -candidates).bit_length() - 1
+        return self.format_question(index.symptoms[bit])
+    
+    def format_question(self, symptom: str) -> Dict[str, str]:
+        """Build the question dictionary for a symptom from this engine's templates."""
+        return format_question(symptom, self.question_templates)
     
     def mark_question_asked(self, symptom: str, certainty: float):
         """
@@ -184,10 +336,31 @@ class QuestionEngine:
         
         Args:
             symptom: The symptom that was asked about
-            certainty: The certainty factor of the answer (0.0 to 1.0)
+            certainty: The certainty factor of the answer (0.0 to 1.0); the
+                engine keeps the answers, so only the question is recorded
         """
-        self.asked_symptoms.add(symptom)
-        self.answered_symptoms[symptom] = certainty
+        self._mark(symptom)
+    
+    def _mark(self, symptom: str):
+        bit = self.index.bits.get(symptom)
+        if bit is not None:
+            self.asked |= 1 << bit
+        elif self.unindexed is None:
+            self.unindexed = {symptom}
+        else:
+            self.unindexed.add(symptom)
+    
+    def unmark_question_asked(self, symptom: str):
+        """Forget that a question was asked (when its answer is undone)."""
+        bit = self.index.bits.get(symptom)
+        if bit is not None:
+            self.asked &= ~(1 << bit)
+        elif self.unindexed:
+            self.unindexed.discard(symptom)
+    
+    @property
+    def questions_asked(self) -> int:
+        return self.asked.bit_count() + (len(self.unindexed) if self.unindexed else 0)
     
     def should_continue_asking(self, 
                               current_diagnoses: Dict[str, float],
@@ -204,7 +377,7 @@ class QuestionEngine:
         Returns:
             True if should continue asking, False if ready to diagnose
         """
-        questions_asked = len(self.asked_symptoms)
+        questions_asked = self.questions_asked
         
         # Always ask at least min_questions
         if questions_asked < min_questions:
@@ -217,7 +390,7 @@ class QuestionEngine:
         # If we have a high-confidence diagnosis (>0.8), we can stop
         if current_diagnoses:
             max_certainty = max(current_diagnoses.values())
-            if max_certainty > 0.8 and questions_asked >= min_questions:
+            if max_certainty > CONFIDENT_DIAGNOSIS_CF and questions_asked >= min_questions:
                 return False
         
         # If we have no clear diagnosis and haven't hit max, continue
@@ -232,7 +405,6 @@ class QuestionEngine:
             Dictionary with 'symptom' and 'text' keys
         """
         # Start with fever as it's a key symptom for many conditions
-        return {
-            'symptom': SYMPTOM_FEVER,
-            'text': QUESTION_TEMPLATES[SYMPTOM_FEVER]
-        }
+        if self.question_pool is not None and SYMPTOM_FEVER not in self.question_pool:
+            return self.get_next_question({})
+        return self.format_question(SYMPTOM_FEVER)
@@ -0,0 +1,152 @@
+"""
+Static analysis of the rule base.
+
+Compares the rules of each disease (from ``rules/specs.py``) to find:
+
+- Dominance: rule A dominates rule B if, for any symptom certainties, B
+  passing implies A passes with at least B's CF. Because ``update_diagnosis``
+  keeps the maximum, B never changes a result once A has been evaluated on
+  the same symptoms.
+- Subsumption: every evidence group of B is also an evidence group of A
+  (same or fewer symptoms) and A has the higher rule CF. B can still win
+  (its evidence is a minimum over fewer groups), but once A has produced a
+  CF at least as high as B could reach, B is redundant.
+
+The result is an ``ExecutionPlan`` the engine uses to order rules (stronger
+rules first) and skip the ones that can no longer change a diagnosis.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+from .rules.specs import RULE_SPECS, RuleSpec
+
+
+def _gate_implied(gate, gates) -> bool:
+    """Check whether ``gate`` passes whenever all of ``gates`` pass."""
+    group, threshold = gate
+    return any(
+        set(other_group) <= set(group) and other_threshold >= threshold
+        for other_group, other_threshold in gates
+    )
+
+
+def _exclusion_implied(exclusion, exclusions) -> bool:
+    """Check whether ``exclusion`` holds whenever all of ``exclusions`` hold."""
+    symptom, bound = exclusion
+    return any(s == symptom and b <= bound for s, b in exclusions)
+
+
+def dominates(a: RuleSpec, b: RuleSpec) -> bool:
+    """
+    Check whether rule ``a`` dominates rule ``b``.
+
+    Sufficient condition: every gate of ``a`` is implied by a gate of ``b``
+    (a group of ``b`` inside the group of ``a``, at a threshold at least as
+    high), every exclusion of ``a`` is implied by an exclusion of ``b``, and
+    ``a`` has at least ``b``'s rule CF. Each group of ``a`` then has at least
+    the CF of a group of ``b``, so ``a``'s evidence is at least ``b``'s.
+    """
+    if a.name == b.name or a.disease != b.disease or a.rule_cf < b.rule_cf:
+        return False
+    return (all(_gate_implied(gate, b.gates) for gate in a.gates)
+            and all(_exclusion_implied(e, b.exclusions) for e in a.exclusions))
+
+
+def subsumes(a: RuleSpec, b: RuleSpec) -> bool:
+    """Check whether every evidence group of ``b`` is also a group of ``a``, at a lower rule CF."""
+    if a.name == b.name or a.disease != b.disease or a.rule_cf <= b.rule_cf:
+        return False
+    a_groups = {frozenset(group) for group, _ in a.gates}
+    return all(frozenset(group) in a_groups for group, _ in b.gates)
+
+
+class ExecutionPlan:
+    """
+    Rule ordering and skip information derived from the rule base.
+
+    Attributes:
+        order: Rule names, dominating and subsuming rules before the rules
+            they cover (rule CF, then salience, descending)
+        dominators: Rule name -> names of the rules that dominate it
+        subsumers: Rule name -> names of the rules that subsume it
+    """
+
+    def __init__(self, order: Sequence[str],
+                 dominators: Dict[str, Tuple[str, ...]],
+                 subsumers: Dict[str, Tuple[str, ...]]):
+        self.order = tuple(order)
+        self.dominators = dominators
+        self.subsumers = subsumers
+        self._rank = {name: index for index, name in enumerate(self.order)}
+
+    def rank(self, name: str) -> int:
+        """Position of a rule in the plan (rules outside the plan come first)."""
+        return self._rank.get(name, -1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'order': list(self.order),
+            'dominators': {name: list(rules) for name, rules in self.dominators.items()},
+            'subsumers': {name: list(rules) for name, rules in self.subsumers.items()},
+        }
+
+
+def analyze_rules(specs: Sequence[RuleSpec] = RULE_SPECS) -> ExecutionPlan:
+    """
+    Find dominance and subsumption between rules of the same disease.
+
+    Args:
+        specs: Rules to analyze
+
+    Returns:
+        The execution plan for these rules
+    """
+    dominators: Dict[str, Tuple[str, ...]] = {}
+    subsumers: Dict[str, Tuple[str, ...]] = {}
+    for b in specs:
+        over_b = [a.name for a in specs if dominates(a, b)]
+        if over_b:
+            dominators[b.name] = tuple(over_b)
+        covering_b = [a.name for a in specs if subsumes(a, b) and a.name not in over_b]
+        if covering_b:
+            subsumers[b.name] = tuple(covering_b)
+
+    order = [spec.name for spec in sorted(specs, key=lambda s: (-s.rule_cf, -s.salience))]
+    return ExecutionPlan(order, dominators, subsumers)
+
+
+def _describe(spec: RuleSpec) -> str:
+    gates = ', '.join(
+        f"{'|'.join(group)}>={threshold}" for group, threshold in spec.gates
+    )
+    exclusions = ''.join(f", {s}<{bound}" for s, bound in spec.exclusions)
+    return f"{spec.name} (CF {spec.rule_cf}: {gates}{exclusions})"
+
+
+def redundancy_report(plan: ExecutionPlan, specs: Sequence[RuleSpec] = RULE_SPECS) -> str:
+    """
+    Describe the redundancy found by ``analyze_rules`` in plain text.
+
+    Args:
+        plan: Plan returned by ``analyze_rules(specs)``
+        specs: The analyzed rules
+    """
+    by_name = {spec.name: spec for spec in specs}
+    lines: List[str] = [f"Analyzed {len(specs)} rules", '']
+
+    lines.append(f"Dominated rules ({len(plan.dominators)}): never change a diagnosis "
+                 "once a dominating rule has run on the same symptoms")
+    for name, rules in plan.dominators.items():
+        lines.append(f"  {_describe(by_name[name])}")
+        lines.extend(f"    dominated by {_describe(by_name[r])}" for r in rules)
+    lines.append('')
+
+    lines.append(f"Subsumed rules ({len(plan.subsumers)}): evidence covered by a stronger "
+                 "rule; skipped once that rule reaches their maximum CF")
+    for name, rules in plan.subsumers.items():
+        lines.append(f"  {_describe(by_name[name])}")
+        lines.extend(f"    subsumed by {_describe(by_name[r])}" for r in rules)
+    lines.append('')
+
+    lines.append("Execution order: " + ', '.join(plan.order))
+    return '\n'.join(lines)
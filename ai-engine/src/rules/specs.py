@@ -0,0 +1,279 @@
+"""
+Declarative description of the diagnostic rules.
+
+The rule mixins in ``viral_rules.py`` and ``bacterial_rules.py`` express each
+rule as an experta ``@Rule`` with an imperative body. Offline tooling (the
+decision-tree compiler, batch evaluators, static analysis) needs the same
+knowledge as plain data, so this module mirrors every rule body as a
+``RuleSpec``. ``test_rule_specs.py`` checks the two representations agree.
+
+Each rule body follows the same shape:
+
+    1. Read the certainty of every symptom it mentions (0.0 if unknown).
+    2. Check each gate: an evidence group (one symptom, or several OR'd with
+       ``max``) must reach a minimum certainty.
+    3. Check each exclusion: a symptom must stay strictly below a bound.
+    4. Evidence CF = ``min`` over the gate groups, final CF = evidence × rule CF.
+    5. OR-combine the final CF into the disease with ``update_diagnosis``.
+"""
+
+import heapq
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from ..facts import (
+    SYMPTOM_FEVER, SYMPTOM_FATIGUE, SYMPTOM_BODY_ACHES, SYMPTOM_HEADACHE,
+    SYMPTOM_CHILLS, SYMPTOM_COUGH, SYMPTOM_DRY_COUGH, SYMPTOM_PRODUCTIVE_COUGH,
+    SYMPTOM_SORE_THROAT, SYMPTOM_RUNNY_NOSE, SYMPTOM_STUFFY_NOSE, SYMPTOM_SNEEZING,
+    SYMPTOM_SHORTNESS_OF_BREATH, SYMPTOM_CHEST_PAIN, SYMPTOM_CHEST_DISCOMFORT,
+    SYMPTOM_WHEEZING, SYMPTOM_LOSS_OF_TASTE, SYMPTOM_LOSS_OF_SMELL,
+    SYMPTOM_SWOLLEN_LYMPH_NODES, SYMPTOM_DIFFICULTY_SWALLOWING,
+    SYMPTOM_MUCUS_PRODUCTION,
+    DISEASE_INFLUENZA, DISEASE_COVID19, DISEASE_COMMON_COLD,
+    DISEASE_STREP_THROAT, DISEASE_PNEUMONIA, DISEASE_BRONCHITIS
+)
+
+
+class RuleSpec(NamedTuple):
+    """
+    Data form of a single diagnostic rule.
+
+    Attributes:
+        name: Name of the rule method on the mixin (e.g. 'influenza_classic')
+        disease: Disease the rule concludes
+        salience: experta salience of the rule
+        rule_cf: Reliability of the rule itself
+        gates: Tuple of (symptom group, minimum certainty). A group with more
+            than one symptom is OR'd (``max``); every group is also a pattern
+            of the ``@Rule``, so the rule is activated only once each group
+            has at least one declared symptom.
+        exclusions: Tuple of (symptom, bound); the symptom's certainty must be
+            strictly below the bound. Exclusions are read by the rule body but
+            are not part of the ``@Rule`` patterns.
+    """
+    name: str
+    disease: str
+    salience: int
+    rule_cf: float
+    gates: Tuple[Tuple[Tuple[str, ...], float], ...]
+    exclusions: Tuple[Tuple[str, float], ...] = ()
+
+    @property
+    def pattern_symptoms(self) -> Tuple[str, ...]:
+        """All symptoms that appear in the rule's patterns."""
+        return tuple(s for group, _ in self.gates for s in group)
+
+    @property
+    def symptoms(self) -> Tuple[str, ...]:
+        """All symptoms read by the rule body (patterns and exclusions)."""
+        return self.pattern_symptoms + tuple(s for s, _ in self.exclusions)
+
+
+def _g(*symptoms, at):
+    """Shorthand for a gate: ``_g(SYMPTOM_FEVER, at=0.6)``."""
+    return (tuple(symptoms), at)
+
+
+RULE_SPECS: Tuple[RuleSpec, ...] = (
+    # Influenza
+    RuleSpec('influenza_classic', DISEASE_INFLUENZA, 100, 0.85, (
+        _g(SYMPTOM_FEVER, at=0.6), _g(SYMPTOM_BODY_ACHES, at=0.6),
+        _g(SYMPTOM_FATIGUE, at=0.5), _g(SYMPTOM_COUGH, at=0.4))),
+    RuleSpec('influenza_with_chills', DISEASE_INFLUENZA, 90, 0.75, (
+        _g(SYMPTOM_FEVER, at=0.6), _g(SYMPTOM_HEADACHE, at=0.5),
+        _g(SYMPTOM_CHILLS, at=0.5), _g(SYMPTOM_BODY_ACHES, at=0.5))),
+    RuleSpec('influenza_moderate', DISEASE_INFLUENZA, 70, 0.65, (
+        _g(SYMPTOM_FEVER, at=0.5), _g(SYMPTOM_FATIGUE, at=0.6),
+        _g(SYMPTOM_COUGH, at=0.5))),
+
+    # COVID-19
+    RuleSpec('covid19_classic', DISEASE_COVID19, 110, 0.90, (
+        _g(SYMPTOM_LOSS_OF_TASTE, SYMPTOM_LOSS_OF_SMELL, at=0.6),
+        _g(SYMPTOM_FEVER, at=0.5), _g(SYMPTOM_DRY_COUGH, at=0.5))),
+    RuleSpec('covid19_respiratory', DISEASE_COVID19, 95, 0.75, (
+        _g(SYMPTOM_FEVER, at=0.6), _g(SYMPTOM_DRY_COUGH, at=0.6),
+        _g(SYMPTOM_FATIGUE, at=0.5), _g(SYMPTOM_SHORTNESS_OF_BREATH, at=0.4))),
+    RuleSpec('covid19_mild', DISEASE_COVID19, 75, 0.60, (
+        _g(SYMPTOM_FEVER, at=0.5), _g(SYMPTOM_DRY_COUGH, at=0.5),
+        _g(SYMPTOM_FATIGUE, at=0.5))),
+    RuleSpec('covid19_taste_smell_only', DISEASE_COVID19, 85, 0.70, (
+        _g(SYMPTOM_LOSS_OF_TASTE, SYMPTOM_LOSS_OF_SMELL, at=0.7),)),
+
+    # Common cold
+    RuleSpec('common_cold_classic', DISEASE_COMMON_COLD, 90, 0.80, (
+        _g(SYMPTOM_RUNNY_NOSE, at=0.6), _g(SYMPTOM_SNEEZING, at=0.5),
+        _g(SYMPTOM_SORE_THROAT, at=0.4)),
+        exclusions=((SYMPTOM_FEVER, 0.7),)),
+    RuleSpec('common_cold_nasal', DISEASE_COMMON_COLD, 85, 0.75, (
+        _g(SYMPTOM_RUNNY_NOSE, SYMPTOM_STUFFY_NOSE, at=0.6),
+        _g(SYMPTOM_SNEEZING, at=0.5), _g(SYMPTOM_COUGH, at=0.3))),
+    RuleSpec('common_cold_mild', DISEASE_COMMON_COLD, 70, 0.65, (
+        _g(SYMPTOM_SORE_THROAT, at=0.5), _g(SYMPTOM_RUNNY_NOSE, at=0.5))),
+    RuleSpec('common_cold_with_cough', DISEASE_COMMON_COLD, 75, 0.70, (
+        _g(SYMPTOM_RUNNY_NOSE, at=0.5), _g(SYMPTOM_COUGH, at=0.5),
+        _g(SYMPTOM_SORE_THROAT, at=0.4)),
+        exclusions=((SYMPTOM_FEVER, 0.7),)),
+
+    # Strep throat
+    RuleSpec('strep_throat_classic', DISEASE_STREP_THROAT, 105, 0.85, (
+        _g(SYMPTOM_SORE_THROAT, at=0.7), _g(SYMPTOM_FEVER, at=0.6),
+        _g(SYMPTOM_SWOLLEN_LYMPH_NODES, at=0.5),
+        _g(SYMPTOM_DIFFICULTY_SWALLOWING, at=0.5)),
+        exclusions=((SYMPTOM_RUNNY_NOSE, 0.4), (SYMPTOM_SNEEZING, 0.4))),
+    RuleSpec('strep_throat_moderate', DISEASE_STREP_THROAT, 95, 0.75, (
+        _g(SYMPTOM_SORE_THROAT, at=0.7), _g(SYMPTOM_FEVER, at=0.5),
+        _g(SYMPTOM_SWOLLEN_LYMPH_NODES, at=0.5)),
+        exclusions=((SYMPTOM_COUGH, 0.3),)),
+    RuleSpec('strep_throat_mild', DISEASE_STREP_THROAT, 80, 0.65, (
+        _g(SYMPTOM_SORE_THROAT, at=0.8), _g(SYMPTOM_DIFFICULTY_SWALLOWING, at=0.6)),
+        exclusions=((SYMPTOM_RUNNY_NOSE, 0.3), (SYMPTOM_COUGH, 0.3))),
+
+    # Pneumonia
+    RuleSpec('pneumonia_classic', DISEASE_PNEUMONIA, 115, 0.90, (
+        _g(SYMPTOM_FEVER, at=0.7), _g(SYMPTOM_CHEST_PAIN, at=0.6),
+        _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.6),
+        _g(SYMPTOM_SHORTNESS_OF_BREATH, at=0.5))),
+    RuleSpec('pneumonia_respiratory', DISEASE_PNEUMONIA, 100, 0.80, (
+        _g(SYMPTOM_FEVER, at=0.7), _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.6),
+        _g(SYMPTOM_SHORTNESS_OF_BREATH, at=0.6))),
+    RuleSpec('pneumonia_with_chest_pain', DISEASE_PNEUMONIA, 90, 0.75, (
+        _g(SYMPTOM_CHEST_PAIN, at=0.7), _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.5),
+        _g(SYMPTOM_FEVER, at=0.6))),
+    RuleSpec('pneumonia_moderate', DISEASE_PNEUMONIA, 85, 0.70, (
+        _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.6),
+        _g(SYMPTOM_SHORTNESS_OF_BREATH, at=0.5), _g(SYMPTOM_FATIGUE, at=0.5))),
+
+    # Bronchitis
+    RuleSpec('bronchitis_classic', DISEASE_BRONCHITIS, 95, 0.80, (
+        _g(SYMPTOM_COUGH, at=0.7), _g(SYMPTOM_CHEST_DISCOMFORT, at=0.5),
+        _g(SYMPTOM_MUCUS_PRODUCTION, at=0.6)),
+        exclusions=((SYMPTOM_FEVER, 0.7),)),
+    RuleSpec('bronchitis_with_fatigue', DISEASE_BRONCHITIS, 90, 0.75, (
+        _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.7), _g(SYMPTOM_CHEST_DISCOMFORT, at=0.5),
+        _g(SYMPTOM_FATIGUE, at=0.5))),
+    RuleSpec('bronchitis_cough_mucus', DISEASE_BRONCHITIS, 80, 0.70, (
+        _g(SYMPTOM_COUGH, at=0.7), _g(SYMPTOM_MUCUS_PRODUCTION, at=0.6)),
+        exclusions=((SYMPTOM_FEVER, 0.7),)),
+    RuleSpec('bronchitis_with_wheezing', DISEASE_BRONCHITIS, 85, 0.70, (
+        _g(SYMPTOM_PRODUCTIVE_COUGH, at=0.6), _g(SYMPTOM_WHEEZING, at=0.5))),
+    RuleSpec('bronchitis_mild', DISEASE_BRONCHITIS, 70, 0.65, (
+        _g(SYMPTOM_COUGH, at=0.7), _g(SYMPTOM_CHEST_DISCOMFORT, at=0.5))),
+)
+
+RULE_SPECS_BY_NAME: Dict[str, RuleSpec] = {spec.name: spec for spec in RULE_SPECS}
+
+
+def _index_by_pattern_symptom(specs) -> Dict[str, Tuple[RuleSpec, ...]]:
+    index: Dict[str, List[RuleSpec]] = {}
+    for spec in specs:
+        for symptom in dict.fromkeys(spec.pattern_symptoms):
+            index.setdefault(symptom, []).append(spec)
+    return {symptom: tuple(rules) for symptom, rules in index.items()}
+
+
+# Rules that experta activates when a given symptom is declared
+RULES_BY_PATTERN_SYMPTOM = _index_by_pattern_symptom(RULE_SPECS)
+
+
+def _index_by_symptom(specs) -> Dict[str, Tuple[RuleSpec, ...]]:
+    index: Dict[str, List[RuleSpec]] = {}
+    for spec in specs:
+        for symptom in dict.fromkeys(spec.symptoms):
+            index.setdefault(symptom, []).append(spec)
+    return {symptom: tuple(rules) for symptom, rules in index.items()}
+
+
+# Rules whose result depends on a given symptom (gates and exclusions)
+RULES_BY_SYMPTOM = _index_by_symptom(RULE_SPECS)
+
+
+def evaluate_rule(spec: RuleSpec, certainties: Dict[str, float]) -> Optional[float]:
+    """
+    Evaluate a rule body against a symptom -> certainty mapping.
+
+    Args:
+        spec: The rule to evaluate
+        certainties: Known symptom certainties (unknown symptoms count as 0.0)
+
+    Returns:
+        The rule's final CF, or None if a gate or exclusion failed
+    """
+    evidence_cf = 1.0
+    for group, threshold in spec.gates:
+        group_cf = max(certainties.get(s, 0.0) for s in group)
+        if group_cf < threshold:
+            return None
+        evidence_cf = min(evidence_cf, group_cf)
+    for symptom, bound in spec.exclusions:
+        if certainties.get(symptom, 0.0) >= bound:
+            return None
+    return evidence_cf * spec.rule_cf
+
+
+def pattern_complete(spec: RuleSpec, answered) -> bool:
+    """Check whether every pattern group has at least one declared symptom."""
+    return all(any(s in answered for s in group) for group, _ in spec.gates)
+
+
+def diagnose(certainties: Dict[str, float],
+             specs: Sequence[RuleSpec] = RULE_SPECS) -> Dict[str, float]:
+    """
+    Compute the diagnoses for a set of answers.
+
+    Every rule whose patterns are complete is evaluated against the answers
+    and each disease keeps its highest CF, as the engine does.
+
+    Args:
+        certainties: Answered symptom -> certainty
+        specs: The rules to evaluate (default: the built-in rule base)
+
+    Returns:
+        Dict mapping disease names to certainty factors
+    """
+    diagnoses: Dict[str, float] = {}
+    for spec in specs:
+        if not pattern_complete(spec, certainties):
+            continue
+        final_cf = evaluate_rule(spec, certainties)
+        if final_cf is not None:
+            diagnoses[spec.disease] = max(diagnoses.get(spec.disease, final_cf), final_cf)
+    return diagnoses
+
+
+def _rank_key(item: Tuple[str, float]) -> Tuple[float, str]:
+    return -item[1], item[0]
+
+
+def rank_diagnoses(diagnoses: Dict[str, float],
+                   top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    Rank diagnoses by certainty, highest first, as get_diagnosis_results() does.
+
+    Ties are broken by disease name, so the ranking depends only on the
+    certainties and not on the order the diseases were (re)computed in.
+
+    Args:
+        diagnoses: Disease name -> certainty factor
+        top_k: Keep only the first ``top_k`` (default: all)
+
+    Returns:
+        List of (disease_name, certainty_factor) tuples
+    """
+    if top_k is not None:
+        return heapq.nsmallest(top_k, diagnoses.items(), key=_rank_key)
+    return sorted(diagnoses.items(), key=_rank_key)
+
+
+def replay_diagnoses(answers) -> Dict[str, float]:
+    """
+    Reproduce the diagnoses of a session answered one symptom at a time.
+
+    The engine recomputes every disease that depends on a symptom whenever
+    that symptom is answered or re-answered, so the result depends only on
+    the latest answer for each symptom, not on the order of the answers.
+
+    Args:
+        answers: Iterable of (symptom, certainty) in the order they were given
+
+    Returns:
+        Dict mapping disease names to certainty factors
+    """
+    return diagnose(dict(answers))
@@ -0,0 +1,79 @@
+"""
+What-if (sensitivity) analysis of a diagnosis session.
+
+For each answered symptom, re-ranks the diagnoses as if that answer had been
+given with each certainty of a grid, all other answers unchanged. Every
+variation is one row of a single BatchEvaluator pass over the rule set.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batch_eval import BatchEvaluator
+from .rules.specs import RULE_SPECS, RuleSpec
+
+
+# Certainties tried for each answer: 0.0, 0.1, ..., 1.0
+DEFAULT_GRID = tuple(i / 10 for i in range(11))
+
+
+def analyze_sensitivity(answers: Sequence[Tuple[str, float]],
+                        grid: Sequence[float] = DEFAULT_GRID,
+                        symptoms: Optional[Sequence[str]] = None,
+                        specs: Sequence[RuleSpec] = RULE_SPECS) -> Dict:
+    """
+    Compute how the diagnosis ranking changes with each answer.
+
+    Args:
+        answers: The session's answers as (symptom, certainty), in the order
+            they were given
+        grid: Alternative certainties to try for each answer
+        symptoms: Only vary these answered symptoms (default: all of them)
+        specs: The rules to evaluate (default: the built-in rule base)
+
+    Returns:
+        Dict with the 'baseline' ranking and, under 'symptoms', one entry per
+        varied symptom holding its 'answered' certainty, the ranking at each
+        grid point ('variations') and whether the top diagnosis ever changes
+        ('top_changes'). Rankings are lists of (disease, certainty).
+    """
+    evaluator = BatchEvaluator([symptom for symptom, _ in answers], specs)
+    baseline_row = np.array([certainty for _, certainty in answers], dtype=float)
+
+    varied = [
+        (column, symptom) for symptom, column in evaluator.columns.items()
+        if symptoms is None or symptom in symptoms
+    ]
+    grid = list(grid)
+
+    # Row 0 is the session as answered; then one block of len(grid) rows per
+    # varied symptom with that symptom's column swept over the grid.
+    X = np.tile(baseline_row, (1 + len(varied) * len(grid), 1))
+    for block, (column, _) in enumerate(varied):
+        start = 1 + block * len(grid)
+        X[start:start + len(grid), column] = grid
+    results = evaluator.evaluate(X)
+
+    baseline = evaluator.ranked(results[0])
+    baseline_top = baseline[0][0] if baseline else None
+
+    entries: List[Dict] = []
+    for block, (column, symptom) in enumerate(varied):
+        start = 1 + block * len(grid)
+        variations = []
+        for offset, certainty in enumerate(grid):
+            ranking = evaluator.ranked(results[start + offset])
+            variations.append({
+                'certainty': certainty,
+                'diagnosis': ranking,
+                'top': ranking[0][0] if ranking else None,
+            })
+        entries.append({
+            'symptom': symptom,
+            'answered': float(baseline_row[column]),
+            'variations': variations,
+            'top_changes': any(v['top'] != baseline_top for v in variations),
+        })
+
+    return {'baseline': baseline, 'grid': grid, 'symptoms': entries}
@@ -0,0 +1,104 @@
+"""
+Snapshots of expired host sessions.
+
+With ``main.py --host --session-snapshots DIR``, a session that expires is
+written to ``DIR/<session_id>.json`` before its engine is released:
+
+    {"session_id": "...", "knowledge_base": "66c1f1fd7d6dfc5a",
+     "patient": {"age": 40}, "answers": [["fever", 0.9], ...],
+     "age_s": 312.4, "expired_at": 1760000000.12}
+
+Diagnoses depend only on the answers (and the patient's context), so
+that is the whole session. The next request to the session finds no
+engine, loads the snapshot and replays the answers into a new one, and
+the session carries on under the same id on the current knowledge base.
+Files are written to a temporary name and renamed, so a snapshot is
+either complete or absent; a restored (or ended) session's file is
+removed. Nothing removes the snapshots of sessions that never come back.
+"""
+
+import json
+import os
+import re
+import time
+from typing import Dict, Optional
+
+
+# Session ids are the host's uuid4().hex: nothing else becomes a path
+SESSION_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def snapshot_record(session_id: str, engine, version: Optional[str], age: float) -> Dict:
+    """What a session's snapshot holds."""
+    return {
+        'session_id': session_id,
+        'knowledge_base': version,
+        'patient': getattr(engine, 'patient', None),
+        'answers': [[symptom, certainty] for symptom, certainty in engine.get_answers()],
+        'age_s': round(age, 3),
+        'expired_at': round(time.time(), 3),
+    }
+
+
+class SessionSnapshots:
+    """
+    A directory of session snapshots.
+
+    Args:
+        directory: Where the snapshots are kept (created if missing)
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.saved = 0
+        self.restored = 0
+        self.discarded = 0
+
+    def path(self, session_id) -> Optional[str]:
+        """The snapshot path of a session id, or None if it is not one the host gives."""
+        if not isinstance(session_id, str) or not SESSION_ID.fullmatch(session_id):
+            return None
+        return os.path.join(self.directory, f'{session_id}.json')
+
+    def save(self, record: Dict):
+        path = self.path(record['session_id'])
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(temporary, path)
+        self.saved += 1
+
+    def load(self, session_id) -> Optional[Dict]:
+        """A session's snapshot, or None if it has none."""
+        path = self.path(session_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def discard(self, session_id, restored: bool = False) -> bool:
+        """Remove a session's snapshot. Returns False if it had none."""
+        path = self.path(session_id)
+        if path is None:
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        if restored:
+            self.restored += 1
+        else:
+            self.discarded += 1
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            'directory': self.directory,
+            'saved': self.saved,
+            'restored': self.restored,
+            'discarded': self.discarded,
+        }
@@ -0,0 +1,223 @@
+"""
+Shadow evaluation of a candidate knowledge base on live sessions.
+
+With ``main.py --host --shadow-kb PATH``, every answer given in a sampled
+session is also diagnosed with the candidate knowledge base, and the
+answers where the candidate disagrees with the diagnosis the session got
+(a different top diagnosis, or a disease's CF moved by at least
+``min_delta``) are appended to a JSON Lines divergence log:
+
+    {"time": 1760000000.12, "session_id": "...", "version": "...",
+     "candidate": "...", "answers": [["fever", 0.9], ...],
+     "top": {"primary": ["influenza", 0.51], "candidate": ["covid19", 0.48]},
+     "top_changed": true, "deltas": {"influenza": -0.21}, "max_delta": 0.21}
+
+Diagnoses depend only on the current answers, so the candidate needs no
+session of its own: its generated rules are run over the session's
+answers (those of the session's patient context, if it has one). That
+happens on a worker thread, off the response path; the
+request loop only copies the answers and diagnoses of sampled sessions
+into a bounded queue. Its cost to primary latency is bounded by:
+
+- sampling: a fixed fraction of sessions (by session id) is shadowed
+- shedding: when the queue is full the work is dropped, not waited for
+- a CPU cap: the worker sleeps after each evaluation so that it holds the
+  interpreter for at most ``max_cpu`` of the time, and gives it up after
+  every evaluation, so the request loop never waits on more than one.
+
+``stats()`` (in the host's ``metrics``) reports what was sampled, dropped,
+evaluated and divergent, and the time spent on the request loop.
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .knowledge_base import KnowledgeBase
+from .rules.specs import rank_diagnoses
+
+
+# Fraction of sessions shadowed
+DEFAULT_SAMPLE = 0.1
+
+# Evaluations waiting for the worker; more are dropped
+DEFAULT_QUEUE_SIZE = 1000
+
+# Largest share of the time the worker runs
+DEFAULT_MAX_CPU = 0.25
+
+# Smallest CF change logged as a divergence (any change by default)
+DEFAULT_MIN_DELTA = 1e-9
+
+
+def rank(diagnoses: Dict[str, float]) -> List[Tuple[str, float]]:
+    """Rank diagnoses like the engine (ties by disease name)."""
+    return rank_diagnoses(diagnoses)
+
+
+class ShadowEvaluator:
+    """
+    Compares a candidate knowledge base against live sessions on a worker thread.
+
+    Args:
+        candidate: The knowledge base under evaluation
+        log_path: Divergence log (JSON Lines, appended to)
+        sample: Fraction of sessions shadowed (0.0 to 1.0)
+        queue_size: Evaluations that can wait for the worker
+        max_cpu: Largest share of the time the worker runs (0.0 to 1.0]
+        min_delta: Smallest CF change logged as a divergence
+    """
+
+    def __init__(self, candidate: KnowledgeBase, log_path: str, sample: float = DEFAULT_SAMPLE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, max_cpu: float = DEFAULT_MAX_CPU,
+                 min_delta: float = DEFAULT_MIN_DELTA):
+        if not 0.0 <= sample <= 1.0:
+            raise ValueError(f'Shadow sample must be between 0.0 and 1.0, got {sample}')
+        if not 0.0 < max_cpu <= 1.0:
+            raise ValueError(f'Shadow max CPU must be in (0.0, 1.0], got {max_cpu}')
+        self.candidate = candidate
+        self.log_path = log_path
+        self.sample = sample
+        self.max_cpu = max_cpu
+        self.min_delta = min_delta
+        self._functions = candidate.compiled_rules
+        self._threshold = int(sample * 0x100000000)  # Of the session id's first 32 bits
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._log = None
+        self.submitted = 0
+        self.dropped = 0
+        self.evaluated = 0
+        self.diverged = 0
+        self.top_changed = 0
+        self.primary_seconds = 0.0  # Spent on the request loop
+        self.worker_seconds = 0.0
+
+    def start(self):
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._work, name='shadow-evaluator', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Finish the queued evaluations and close the log."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._log.close()
+
+    def sampled(self, session_id: str) -> bool:
+        """Whether a session is shadowed (the same answer for its whole life)."""
+        return int(session_id[:8], 16) < self._threshold
+
+    def submit(self, session_id: str, engine, version: Optional[str] = None) -> bool:
+        """
+        Queue a session's current answers and diagnoses for comparison.
+
+        Returns:
+            False if the session is not sampled or the work was dropped
+        """
+        if not self.sampled(session_id):
+            return False
+        started = time.perf_counter()
+        item = (session_id, version, engine.get_answers(), dict(engine.diagnoses),
+                getattr(engine, 'patient', None))
+        try:
+            self._queue.put_nowait(item)
+            self.submitted += 1
+            queued = True
+        except queue.Full:
+            self.dropped += 1
+            queued = False
+        self.primary_seconds += time.perf_counter() - started
+        return queued
+
+    def compare(self, answers: Sequence[Tuple[str, float]],
+                diagnoses: Dict[str, float], patient: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Diagnose the answers with the candidate and compare.
+
+        Args:
+            answers: The session's answers
+            diagnoses: The diagnoses the session got
+            patient: The session's patient; the candidate then runs the
+                rules of the patient's context
+
+        Returns:
+            The divergence (top diagnoses, CF deltas), or None if the
+            candidate agrees
+        """
+        functions = self._functions
+        if patient is not None:
+            functions = self.candidate.contexts.profile(patient).compiled_rules
+        candidate = functions.diagnose(dict(answers))
+        deltas = {
+            disease: candidate.get(disease, 0.0) - diagnoses.get(disease, 0.0)
+            for disease in diagnoses.keys() | candidate.keys()
+        }
+        deltas = {disease: round(delta, 6) for disease, delta in deltas.items()
+                  if abs(delta) >= self.min_delta}
+        primary_top = rank(diagnoses)[:1]
+        candidate_top = rank(candidate)[:1]
+        top_changed = ([d for d, _ in primary_top] != [d for d, _ in candidate_top])
+        if not deltas and not top_changed:
+            return None
+        return {
+            'top': {
+                'primary': list(primary_top[0]) if primary_top else None,
+                'candidate': list(candidate_top[0]) if candidate_top else None,
+            },
+            'top_changed': top_changed,
+            'deltas': dict(sorted(deltas.items())),
+            'max_delta': max((abs(delta) for delta in deltas.values()), default=0.0),
+        }
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            started = time.perf_counter()
+            session_id, version, answers, diagnoses, patient = item
+            divergence = self.compare(answers, diagnoses, patient)
+            self.evaluated += 1
+            if divergence is not None:
+                self.diverged += 1
+                self.top_changed += divergence['top_changed']
+                record = {
+                    'time': round(time.time(), 3),
+                    'session_id': session_id,
+                    'version': version,
+                    'candidate': self.candidate.version,
+                    'answers': [list(answer) for answer in answers],
+                }
+                record.update(divergence)
+                self._log.write(json.dumps(record) + '\n')
+            if self._queue.empty():
+                self._log.flush()
+            elapsed = time.perf_counter() - started
+            self.worker_seconds += elapsed
+            # Give up the interpreter, and stay away long enough to keep
+            # to the CPU share
+            time.sleep(elapsed * (1.0 - self.max_cpu) / self.max_cpu)
+        self._log.flush()
+
+    def stats(self) -> Dict:
+        attempts = self.submitted + self.dropped
+        return {
+            'candidate': self.candidate.version,
+            'sample': self.sample,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize(),
+            'evaluated': self.evaluated,
+            'diverged': self.diverged,
+            'top_changed': self.top_changed,
+            'primary_ms': round(self.primary_seconds * 1000, 3),
+            'primary_us_per_answer': round(self.primary_seconds * 1e6 / attempts, 2)
+                                     if attempts else 0.0,
+            'worker_ms': round(self.worker_seconds * 1000, 3),
+        }
@@ -0,0 +1,318 @@
+"""
+Diagnosis result cache shared by the engine processes of a host.
+
+Each engine process has its own ``DiagnosisCache``, which only hits on
+repeats sent to the same worker. ``SharedResultCache`` keeps results in a
+named ``multiprocessing.shared_memory`` segment that every worker on the
+host attaches to (``main.py --shared-cache NAME``), so a result computed by
+one worker serves all of them.
+
+The segment is a fixed-size open-addressing table keyed by
+``diagnosis_key`` (the hash of the quantized answer set, rule base and
+options). A key's slots are the ``PROBE_LENGTH`` slots from
+``key % slots`` on; when all are taken by other keys, one of them is
+evicted. Each slot stores the ranked diseases with their CFs, as indexes
+into the sorted diseases of the knowledge base that computed it
+(``CacheSchema``). Keys name the knowledge base version whenever one is
+loaded (``--kb`` or ``reload_kb``), so every process reading a slot
+indexes it with the same tables. A slot holds up to ``max_diseases``
+diseases, fixed when the segment is created; a result with more is not
+stored, and counted as ``skipped``.
+
+Reads take no lock. Every slot has a version counter that a writer makes
+odd before changing the slot and even again afterwards (a seqlock); a
+reader copies the slot between two reads of the version and treats a
+changed or odd version as a miss. Writers, which only run after computing
+a result, serialize on an ``flock`` of a lock file next to the segment.
+Hit, miss, skip and eviction counters live in the segment header; hits,
+misses and skips are updated without the lock, so they are approximate
+when workers update them at the same instant.
+
+The segment outlives the processes using it (until ``unlink`` or a
+reboot); ``cache_stats.py`` reports on it and removes it.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+
+DEFAULT_SLOTS = 65536
+DEFAULT_MAX_DISEASES = 16
+MAX_DISEASES = 255  # Disease indexes are stored in a byte
+
+# Slots tried per key before evicting
+PROBE_LENGTH = 8
+
+LAYOUT_VERSION = 3
+MAGIC = 0x3145484341435844  # b'DXCACHE1', little-endian
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('layout', '<u8'),
+    ('schema', '<u8'),
+    ('slots', '<u8'),
+    ('hits', '<u8'),
+    ('misses', '<u8'),
+    ('inserts', '<u8'),
+    ('evictions', '<u8'),
+    ('max_diseases', '<u8'),
+    ('skipped', '<u8'),
+], align=True)
+
+HEADER_SIZE = 128
+
+
+def _slot_dtype(max_diseases: int) -> np.dtype:
+    return np.dtype([
+        ('version', '<u8'),  # 0: empty, odd: being written
+        ('key', '<u8', (2,)),
+        ('count', 'u1'),
+        ('order', 'u1', (max_diseases,)),  # Disease indexes, best first
+        ('cf', '<f8', (max_diseases,)),
+    ], align=True)
+
+
+def _schema_hash(slot_dtype: np.dtype) -> int:
+    """Identifies the slot layout."""
+    content = repr((LAYOUT_VERSION, HEADER_DTYPE.descr, slot_dtype.descr))
+    return int.from_bytes(hashlib.sha256(content.encode('utf-8')).digest()[:8], 'little')
+
+
+class CacheSchema:
+    """
+    What the indexes stored in a slot mean for one knowledge base: its
+    diseases, sorted.
+    """
+
+    def __init__(self, diseases):
+        self.diseases = tuple(sorted(diseases))
+        self.disease_index = {disease: i for i, disease in enumerate(self.diseases)}
+
+
+_schemas: Dict[str, CacheSchema] = {}
+
+
+def cache_schema(knowledge_base=None) -> CacheSchema:
+    """The schema of a knowledge base (default: the built-in one), by version."""
+    if knowledge_base is None:
+        from .knowledge_base import builtin_knowledge_base
+        knowledge_base = builtin_knowledge_base()
+    schema = _schemas.get(knowledge_base.version)
+    if schema is None:
+        schema = _schemas[knowledge_base.version] = CacheSchema(
+            {spec.disease for spec in knowledge_base.specs})
+    return schema
+
+
+def _key_words(key: str) -> Tuple[int, int]:
+    """The 128-bit hex key as two 64-bit words."""
+    value = int(key[:32], 16)
+    return value >> 64, value & 0xFFFFFFFFFFFFFFFF
+
+
+def _untrack(segment: shared_memory.SharedMemory):
+    # Python's resource tracker unlinks segments when the process that
+    # opened them exits; this one is meant to outlive its users
+    try:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+def shared_cache_exists(name: str) -> bool:
+    """Whether a shared memory segment with this name exists."""
+    try:
+        segment = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return False
+    _untrack(segment)
+    segment.close()
+    return True
+
+
+class SharedResultCache:
+    """
+    A named shared-memory table of diagnosis results.
+
+    Args:
+        name: Segment name; processes using the same name share the cache
+        slots: Table size, used when the segment is created (an existing
+            segment keeps its size)
+        max_diseases: Diseases a slot holds, used when the segment is
+            created (an existing segment keeps its own)
+        knowledge_base: The knowledge base whose results are stored and
+            read (default: the built-in one); see ``use``
+    """
+
+    def __init__(self, name: str, slots: int = DEFAULT_SLOTS,
+                 max_diseases: int = DEFAULT_MAX_DISEASES, knowledge_base=None):
+        if slots < PROBE_LENGTH:
+            raise ValueError(f'A shared cache needs at least {PROBE_LENGTH} slots, got {slots}')
+        if not 1 <= max_diseases <= MAX_DISEASES:
+            raise ValueError(f'Max diseases must be between 1 and {MAX_DISEASES}, '
+                             f'got {max_diseases}')
+        self.name = name
+        self.use(knowledge_base)
+        size = HEADER_SIZE + slots * _slot_dtype(max_diseases).itemsize
+        try:
+            self._segment = shared_memory.SharedMemory(name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            self._segment = shared_memory.SharedMemory(name)
+            created = False
+        _untrack(self._segment)
+        self._header = np.ndarray((), HEADER_DTYPE, buffer=self._segment.buf)
+        if created:
+            self._header['layout'] = LAYOUT_VERSION
+            self._header['schema'] = _schema_hash(_slot_dtype(max_diseases))
+            self._header['slots'] = slots
+            self._header['max_diseases'] = max_diseases
+            self._header['magic'] = MAGIC  # last: the segment is ready
+        else:
+            self._check_header()
+        self.slots = int(self._header['slots'])
+        self.max_diseases = int(self._header['max_diseases'])
+        slot_dtype = _slot_dtype(self.max_diseases)
+        table = np.ndarray((self.slots,), slot_dtype, buffer=self._segment.buf, offset=HEADER_SIZE)
+        self._version = table['version']
+        self._key = table['key']
+        self._count = table['count']
+        self._order = table['order']
+        self._cf = table['cf']
+        self._lock_path = os.path.join(tempfile.gettempdir(), f'{name}.diagnosis-cache.lock')
+        self._lock_file = open(self._lock_path, 'a') if fcntl is not None else None
+
+    def _check_header(self):
+        deadline = time.monotonic() + 1.0
+        while self._header['magic'] != MAGIC and time.monotonic() < deadline:
+            time.sleep(0.001)  # The creator is still setting it up
+        if self._header['magic'] != MAGIC:
+            raise ValueError(f'Shared memory segment {self.name} is not a diagnosis cache')
+        max_diseases = int(self._header['max_diseases'])
+        if (self._header['layout'] != LAYOUT_VERSION or not 1 <= max_diseases <= MAX_DISEASES
+                or self._header['schema'] != _schema_hash(_slot_dtype(max_diseases))):
+            raise ValueError(f'Shared diagnosis cache {self.name} was created with another '
+                             'layout; unlink it (cache_stats.py --unlink)')
+        slot_size = _slot_dtype(max_diseases).itemsize
+        if self._segment.size < HEADER_SIZE + int(self._header['slots']) * slot_size:
+            raise ValueError(f'Shared diagnosis cache {self.name} is truncated')
+
+    def use(self, knowledge_base=None):
+        """Store and read the results of ``knowledge_base`` (after reload_kb)."""
+        self.schema = cache_schema(knowledge_base)
+
+    def _probe(self, low: int) -> List[int]:
+        start = low % self.slots
+        return [(start + i) % self.slots for i in range(PROBE_LENGTH)]
+
+    def get(self, key: str) -> Optional[List[Tuple[str, float]]]:
+        """
+        Look up a result without locking.
+
+        Returns:
+            The ranked (disease, certainty) list, or None on a miss
+        """
+        high, low = _key_words(key)
+        for slot in self._probe(low):
+            version = int(self._version[slot])
+            if version == 0 or version & 1:
+                continue
+            stored = self._key[slot]
+            if int(stored[0]) != high or int(stored[1]) != low:
+                continue
+            count = int(self._count[slot])
+            order = self._order[slot][:count].tolist()
+            cf = self._cf[slot][:count].tolist()
+            if int(self._version[slot]) != version:
+                break  # Rewritten while we read it
+            self._header['hits'] += 1
+            diseases = self.schema.diseases
+            return [(diseases[d], certainty) for d, certainty in zip(order, cf)]
+        self._header['misses'] += 1
+        return None
+
+    def put(self, key: str, results: List[Tuple[str, float]]) -> bool:
+        """
+        Store a result. Returns False if it cannot be stored (more diseases
+        than a slot holds, or a disease the knowledge base in use does not
+        have), which is counted as ``skipped``.
+        """
+        schema = self.schema
+        if (len(results) > self.max_diseases
+                or any(disease not in schema.disease_index for disease, _ in results)):
+            self._header['skipped'] += 1
+            return False
+        high, low = _key_words(key)
+        probe = self._probe(low)
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            slot = next((s for s in probe if self._version[s] != 0
+                         and int(self._key[s][0]) == high and int(self._key[s][1]) == low), None)
+            if slot is None:
+                slot = next((s for s in probe if self._version[s] == 0), None)
+            if slot is None:
+                slot = probe[high % PROBE_LENGTH]
+                self._header['evictions'] += 1
+            version = int(self._version[slot])
+            self._version[slot] = version + 1
+            self._key[slot] = (high, low)
+            self._count[slot] = len(results)
+            self._order[slot][:len(results)] = [schema.disease_index[d] for d, _ in results]
+            self._cf[slot][:len(results)] = [certainty for _, certainty in results]
+            self._version[slot] = version + 2
+            self._header['inserts'] += 1
+        finally:
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        return True
+
+    def stats(self) -> Dict:
+        """Occupancy, hit rate, skip and eviction counts (shared by all processes)."""
+        occupied = int(np.count_nonzero(self._version))
+        hits, misses = int(self._header['hits']), int(self._header['misses'])
+        lookups = hits + misses
+        return {
+            'name': self.name,
+            'slots': self.slots,
+            'occupied': occupied,
+            'occupancy': round(occupied / self.slots, 4),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'inserts': int(self._header['inserts']),
+            'evictions': int(self._header['evictions']),
+            'skipped': int(self._header['skipped']),
+            'max_diseases': self.max_diseases,
+        }
+
+    def close(self):
+        """Detach this process (the segment stays)."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        del self._header, self._version, self._key
+        del self._count, self._order, self._cf
+        self._segment.close()
+
+    def unlink(self):
+        """Remove the segment (processes attached keep their mapping)."""
+        # SharedMemory.unlink() also unregisters it from the resource tracker
+        resource_tracker.register(self._segment._name, 'shared_memory')
+        self._segment.unlink()
+        try:
+            os.remove(self._lock_path)
+        except OSError:
+            pass
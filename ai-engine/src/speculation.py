@@ -0,0 +1,189 @@
+"""
+Speculative answers for the engine host.
+
+Once a session has been asked a question, the client takes seconds to
+answer it, and the answer is nearly always one of a few certainties: the
+quick responses (yes 1.0, unsure 0.5, no 0.0) or the slider left at its
+starting 50%. With ``main.py --host --speculate``, the host spends its
+idle time working out the response to each of those answers in advance,
+so when the ``add_symptom`` that comes matches one, the response is
+written at once and the answer is applied to the session afterwards.
+
+A branch is computed on the session's own engine, by answering, building
+the response and undoing the answer (engines are not thread-safe, so
+this runs on the request loop rather than a worker thread). The loop
+computes one branch at a time and only while no request is waiting, so a
+request that arrives waits for one branch at most. A session's branches
+are dropped (cancelled) as soon as the session changes any other way, it
+ends or expires; there are at most as many as there are certainties per
+session, for at most ``max_sessions`` sessions, the oldest dropped first.
+
+``stats()`` (in the host's ``metrics``) reports the hits, the misses and
+the hit rate, and what was computed, cancelled or never used.
+"""
+
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# The quick responses, yes, unsure (and the slider's start) and no
+DEFAULT_CERTAINTIES = (1.0, 0.5, 0.0)
+MAX_CERTAINTIES = 8
+
+DEFAULT_MAX_SESSIONS = 1000
+
+# Recent branch compute times kept for the percentiles
+COMPUTE_WINDOW = 4096
+
+
+def parse_certainties(value: str) -> tuple:
+    """
+    Parse ``--speculate`` certainties, e.g. ``1,0.5,0``.
+
+    Raises:
+        ValueError: If a certainty is not a number from 0.0 to 1.0, or there
+            are more than MAX_CERTAINTIES
+    """
+    certainties = []
+    for part in value.split(','):
+        try:
+            certainty = float(part)
+        except ValueError:
+            raise ValueError(f'Not a certainty: {part!r}') from None
+        if not 0.0 <= certainty <= 1.0:
+            raise ValueError(f'Certainties must be between 0.0 and 1.0, got {part}')
+        if certainty not in certainties:
+            certainties.append(certainty)
+    if len(certainties) > MAX_CERTAINTIES:
+        raise ValueError(f'At most {MAX_CERTAINTIES} certainties can be speculated on')
+    return tuple(certainties)
+
+
+class _Branches:
+    """The speculated responses to a session's pending question."""
+
+    __slots__ = ('symptom', 'remaining', 'responses')
+
+    def __init__(self, symptom: str, certainties: Sequence[float]):
+        self.symptom = symptom
+        self.remaining: List[float] = list(certainties)
+        self.responses: Dict[float, Dict] = {}
+
+
+class Speculator:
+    """
+    Responses to the likely answers of the sessions' pending questions.
+
+    Args:
+        compute: ``compute(engine, symptom, certainty)`` returns the
+            response to the answer, leaving the engine as it was
+        certainties: The answers speculated on
+        max_sessions: Sessions with branches at a time (the oldest are
+            dropped)
+    """
+
+    def __init__(self, compute: Callable, certainties: Sequence[float] = DEFAULT_CERTAINTIES,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.compute = compute
+        self.certainties = tuple(certainties)
+        self.max_sessions = max_sessions
+        self.sessions: 'OrderedDict[str, _Branches]' = OrderedDict()
+        # Sessions with branches left to compute, oldest question first
+        self._work: 'OrderedDict[str, None]' = OrderedDict()
+        self.computed = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0  # Branches dropped before they were computed
+        self.unused = 0  # Computed branches that were not the answer
+        self.errors = 0
+        self.compute_times = deque(maxlen=COMPUTE_WINDOW)
+
+    def expect(self, session_id: str, symptom: Optional[str]):
+        """A session was asked about ``symptom`` (None: nothing to speculate on)."""
+        self.cancel(session_id)
+        if symptom is None or not self.certainties:
+            return
+        self.sessions[session_id] = _Branches(symptom, self.certainties)
+        self._work[session_id] = None
+        while len(self.sessions) > self.max_sessions:
+            self._drop(next(iter(self.sessions)))
+
+    def cancel(self, session_id: str):
+        """Drop a session's branches: it changed, ended or expired."""
+        if session_id in self.sessions:
+            self._drop(session_id)
+
+    def _drop(self, session_id: str):
+        branches = self.sessions.pop(session_id)
+        self._work.pop(session_id, None)
+        self.cancelled += len(branches.remaining)
+        self.unused += len(branches.responses)
+
+    def take(self, session_id: str, symptom: str, certainty: float) -> Optional[Dict]:
+        """
+        The speculated response to an answer, or None (a miss). Either way
+        the session's branches are used up.
+        """
+        branches = self.sessions.pop(session_id, None)
+        if branches is None:
+            return None
+        self._work.pop(session_id, None)
+        response = branches.responses.pop(certainty, None) if branches.symptom == symptom else None
+        self.cancelled += len(branches.remaining)
+        self.unused += len(branches.responses)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def run(self, engine_of: Callable, busy: Callable[[], bool]) -> int:
+        """
+        Compute branches, one at a time, until there are none left or
+        ``busy()``. ``engine_of(session_id)`` is the session's engine, or
+        None. Returns the number computed.
+        """
+        computed = 0
+        while self._work and not busy():
+            session_id = next(iter(self._work))
+            branches = self.sessions[session_id]
+            engine = engine_of(session_id)
+            if engine is None:
+                self.cancel(session_id)
+                continue
+            certainty = branches.remaining.pop(0)
+            started = time.perf_counter()
+            try:
+                branches.responses[certainty] = self.compute(engine, branches.symptom, certainty)
+            except Exception:
+                self.errors += 1
+                self.cancel(session_id)
+                continue
+            self.compute_times.append(time.perf_counter() - started)
+            computed += 1
+            if not branches.remaining:
+                del self._work[session_id]
+        self.computed += computed
+        return computed
+
+    def stats(self) -> Dict:
+        answered = self.hits + self.misses
+        times = np.asarray(self.compute_times, dtype=float) * 1000
+        p50, p99 = np.percentile(times, [50, 99]) if len(times) else (0.0, 0.0)
+        return {
+            'certainties': list(self.certainties),
+            'sessions': len(self.sessions),
+            'branches': sum(len(branches.responses) for branches in self.sessions.values()),
+            'computed': self.computed,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / answered, 4) if answered else None,
+            'cancelled': self.cancelled,
+            'unused': self.unused,
+            'errors': self.errors,
+            'compute_p50_ms': round(float(p50), 3),
+            'compute_p99_ms': round(float(p99), 3),
+        }
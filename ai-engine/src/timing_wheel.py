@@ -0,0 +1,155 @@
+"""
+Hierarchical timing wheel: deadlines that expire in O(expired) work.
+
+Time is counted in ticks. Level 0 has one slot per tick for the next
+``SLOTS`` ticks; each higher level has ``SLOTS`` slots that each cover a
+whole turn of the level below. A deadline is filed at the lowest level
+whose range reaches it, by the bits of its tick (the level is that of the
+highest bit group where the deadline and the current tick differ).
+Advancing to a tick looks at one level 0 slot, and at the turn of a
+level moves the entries of that level's next slot down to the levels
+below ("cascading"), where they are filed again. Every entry is cascaded
+at most once per level, and scheduling or cancelling one is a set
+operation, so the work to expire entries does not grow with the number
+of entries that are still waiting. Ticks where no slot holds anything
+are skipped over, so a long advance costs no more than a short one.
+
+Deadlines further than the top level's range wait in an overflow set,
+filed again whenever the top level turns.
+"""
+
+import math
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+# Slots per level (a power of two), and levels
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+LEVELS = 4
+
+OVERFLOW = -1
+
+
+class TimingWheel:
+    """
+    Deadlines of keys, expired as the wheel advances.
+
+    Args:
+        tick: Seconds per tick; deadlines expire up to one tick late, never early
+        start: The time of tick 0 (same clock as the deadlines)
+    """
+
+    def __init__(self, tick: float = 1.0, start: float = 0.0):
+        if not tick > 0:
+            raise ValueError(f'Tick must be positive, got {tick}')
+        self.tick = tick
+        self.start = start
+        self.now_tick = 0
+        self.levels: List[List[Set[Hashable]]] = [[set() for _ in range(SLOTS)]
+                                                  for _ in range(LEVELS)]
+        self.overflow: Set[Hashable] = set()
+        self.entries: Dict[Hashable, Tuple[int, int, int]] = {}  # Key -> (tick, level, slot)
+        self.cascaded = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def deadline(self, key) -> Optional[float]:
+        """When a key expires at the latest (the end of its tick), or None."""
+        entry = self.entries.get(key)
+        return None if entry is None else self.start + entry[0] * self.tick
+
+    def schedule(self, key, deadline: float):
+        """Expire ``key`` at ``deadline``, replacing its earlier deadline."""
+        self.cancel(key)
+        # The first tick boundary at or after the deadline, and never the
+        # current tick, which has been expired already
+        tick = max(math.ceil((deadline - self.start) / self.tick), self.now_tick + 1)
+        self._file(key, tick)
+
+    def cancel(self, key) -> bool:
+        """Forget a key's deadline. Returns False if it had none."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        _, level, slot = entry
+        (self.overflow if level == OVERFLOW else self.levels[level][slot]).discard(key)
+        return True
+
+    def _file(self, key, tick: int):
+        differ = tick ^ self.now_tick
+        level = (differ.bit_length() - 1) // SLOT_BITS if differ else 0
+        if level >= LEVELS:
+            self.overflow.add(key)
+            self.entries[key] = (tick, OVERFLOW, 0)
+            return
+        slot = (tick >> (level * SLOT_BITS)) & (SLOTS - 1)
+        self.levels[level][slot].add(key)
+        self.entries[key] = (tick, level, slot)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move to time ``now``; returns the keys whose deadlines passed, earliest first."""
+        target = math.floor((now - self.start) / self.tick)
+        expired = []
+        if not self.entries:
+            self.now_tick = max(self.now_tick, target)
+            return expired
+        while self.now_tick < target:
+            tick = self._next_event()
+            if tick is None or tick > target:
+                self.now_tick = target
+                break
+            self.now_tick = tick
+            if not tick & (SLOTS - 1):
+                # A level turned: bring the next slot of each level that
+                # did down, from the top
+                levels = (tick & -tick).bit_length() - 1
+                top = min(levels // SLOT_BITS, LEVELS)
+                if top == LEVELS:
+                    self._refile(self.overflow)
+                for level in range(min(top, LEVELS - 1), 0, -1):
+                    self._refile(self.levels[level][(tick >> (level * SLOT_BITS)) & (SLOTS - 1)])
+            slot = self.levels[0][tick & (SLOTS - 1)]
+            if slot:
+                for key in slot:
+                    del self.entries[key]
+                expired.extend(slot)
+                slot.clear()
+            if not self.entries:
+                self.now_tick = max(self.now_tick, target)
+                break
+        return expired
+
+    def _next_event(self) -> Optional[int]:
+        """The next tick where a slot expires or cascades, or None."""
+        for level in range(LEVELS):
+            shift = level * SLOT_BITS
+            slots = self.levels[level]
+            for index in range(((self.now_tick >> shift) & (SLOTS - 1)) + 1, SLOTS):
+                if slots[index]:
+                    # Within this level's turn, so before any event of a
+                    # higher level
+                    turn = shift + SLOT_BITS
+                    return ((self.now_tick >> turn) << turn) | (index << shift)
+        if self.overflow:
+            top = LEVELS * SLOT_BITS
+            return ((self.now_tick >> top) + 1) << top
+        return None
+
+    def _refile(self, keys: Set[Hashable]):
+        moving = list(keys)
+        keys.clear()
+        for key in moving:
+            self._file(key, self.entries[key][0])
+        self.cascaded += len(moving)
+
+    def stats(self) -> Dict:
+        return {
+            'tick_s': self.tick,
+            'scheduled': len(self.entries),
+            'cascaded': self.cascaded,
+            'overflow': len(self.overflow),
+        }
@@ -0,0 +1,218 @@
+"""
+Record and replay traffic of the stdin/stdout protocol.
+
+``main.py --record PATH`` appends every inbound command and outbound
+response to a JSON Lines file, one record per line:
+
+    {"recording": "...", "seq": 3, "direction": "in", "time": 1760000000.12,
+     "line": "{\\"action\\": \\"add_symptom\\", ...}"}
+    {"recording": "...", "seq": 3, "direction": "out", "time": 1760000000.13,
+     "latency_ms": 0.84, "line": "{\\"status\\": \\"success\\", ...}"}
+
+Each main.py process is one recording (one engine, any number of
+sessions). The file is opened in append mode and every record is flushed,
+so several processes can record to the same file.
+
+``replay_recording`` re-drives a recording against an engine process
+(any command speaking the protocol), with the original timing, scaled
+timing or as fast as possible, and checks each response against the
+recorded one. ``replay_traffic.py`` is the command-line front end.
+"""
+
+import json
+import os
+import subprocess
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+TIMING_MODES = ('original', 'accelerated', 'max')
+
+
+class TrafficRecorder:
+    """Appends the commands and responses of one main.py process to a file."""
+
+    def __init__(self, path: str):
+        self.recording = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.seq = 0
+        self._file = open(path, 'a', encoding='utf-8')
+        self._received = None
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def inbound(self, line: str):
+        """Record a command as it is read."""
+        self.seq += 1
+        self._received = time.perf_counter()
+        self._write({'recording': self.recording, 'seq': self.seq, 'direction': 'in',
+                     'time': time.time(), 'line': line.rstrip('\n')})
+
+    def outbound(self, line: str):
+        """Record the response to the last command."""
+        latency_ms = (time.perf_counter() - self._received) * 1000
+        self._write({'recording': self.recording, 'seq': self.seq, 'direction': 'out',
+                     'time': time.time(), 'latency_ms': round(latency_ms, 3),
+                     'line': line})
+
+    def close(self):
+        self._file.close()
+
+
+class Exchange(NamedTuple):
+    """One recorded command and its response."""
+    seq: int
+    time: float  # When the command was received (epoch seconds)
+    request: str
+    response: Optional[str]  # None if the process stopped before answering
+    latency_ms: Optional[float]
+
+
+def load_recordings(path: str) -> Dict[str, List[Exchange]]:
+    """
+    Read a traffic file.
+
+    Returns:
+        Recording id -> its exchanges in order. Lines that are not valid
+        records (e.g. a line cut short by a crash) are skipped.
+    """
+    requests: Dict[str, Dict[int, Dict]] = {}
+    responses: Dict[str, Dict[int, Dict]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                target = requests if record['direction'] == 'in' else responses
+                target.setdefault(record['recording'], {})[record['seq']] = record
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    recordings = {}
+    for recording, inbound in requests.items():
+        outbound = responses.get(recording, {})
+        recordings[recording] = [
+            Exchange(seq, record['time'], record['line'],
+                     outbound.get(seq, {}).get('line'),
+                     outbound.get(seq, {}).get('latency_ms'))
+            for seq, record in sorted(inbound.items())
+        ]
+    return recordings
+
+
+def _action(request: str) -> str:
+    try:
+        action = json.loads(request).get('action')
+    except (ValueError, AttributeError):
+        return '(invalid)'
+    return action if isinstance(action, str) else '(none)'
+
+
+def _same_response(recorded: Optional[str], replayed: str) -> bool:
+    if recorded is None:
+        return True
+    try:
+        return json.loads(recorded) == json.loads(replayed)
+    except ValueError:
+        return recorded == replayed
+
+
+def replay_recording(exchanges: Sequence[Exchange], command: Sequence[str],
+                     timing: str = 'max', speed: float = 10.0,
+                     cwd: Optional[str] = None) -> List[Dict]:
+    """
+    Re-drive one recording against a fresh engine process.
+
+    Args:
+        exchanges: The recording, from ``load_recordings``
+        command: Command starting the engine (e.g. ``python main.py --engine lite``)
+        timing: 'original' keeps the recorded gaps between commands,
+            'accelerated' divides them by ``speed``, 'max' sends each
+            command as soon as the previous response arrives
+        speed: Speed-up factor for 'accelerated' timing
+        cwd: Working directory for the engine process
+
+    Returns:
+        One dict per exchange with 'seq', 'action', 'latency_ms' (as
+        replayed), 'recorded_latency_ms', 'match', the replayed 'response',
+        'sent_s' (when the command was sent, in seconds after the first
+        response) and 'cold' (true for the first command, whose latency
+        includes starting the engine process)
+    """
+    if timing not in TIMING_MODES:
+        raise ValueError(f"Unknown timing mode: {timing}. "
+                         f"Valid modes are: {', '.join(TIMING_MODES)}")
+    scale = {'original': 1.0, 'accelerated': 1.0 / speed, 'max': 0.0}[timing]
+
+    process = subprocess.Popen(list(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               text=True, bufsize=1, cwd=cwd)
+    results = []
+    try:
+        # Gaps are counted from the first response, so the engine's start-up
+        # does not eat into them
+        start = None
+        first = exchanges[0].time if exchanges else 0.0
+        for index, exchange in enumerate(exchanges):
+            if start is not None:
+                delay = start + (exchange.time - first) * scale - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            process.stdin.write(exchange.request + '\n')
+            process.stdin.flush()
+            response = process.stdout.readline()
+            latency_ms = (time.perf_counter() - sent) * 1000
+            if not response:
+                raise RuntimeError(f'Engine exited before answering command {exchange.seq}')
+            if start is None:
+                start = time.perf_counter()
+            results.append({
+                'seq': exchange.seq,
+                'action': _action(exchange.request),
+                'latency_ms': latency_ms,
+                'recorded_latency_ms': exchange.latency_ms,
+                'match': _same_response(exchange.response, response.rstrip('\n')),
+                'response': response.rstrip('\n'),
+                'sent_s': sent - start if index else 0.0,
+                'cold': index == 0,
+            })
+    finally:
+        process.stdin.close()
+        process.wait()
+    return results
+
+
+def _distribution(latencies: Sequence[float]) -> Dict:
+    values = np.asarray(latencies, dtype=float)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'count': len(values), 'mean': float(values.mean()), 'p50': float(p50),
+            'p90': float(p90), 'p99': float(p99), 'max': float(values.max())}
+
+
+def latency_report(results: Sequence[Dict]) -> Dict:
+    """
+    Summarize replay results.
+
+    Returns:
+        Dict with the number of 'exchanges' and 'mismatches', and latency
+        distributions (count, mean, p50, p90, p99, max in ms): 'overall' and
+        'by_action' for warm commands, 'startup' for the first command of
+        each replay, and 'recorded' for the latencies in the recording
+    """
+    warm = [r for r in results if not r.get('cold')]
+    cold = [r['latency_ms'] for r in results if r.get('cold')]
+    recorded = [r['recorded_latency_ms'] for r in results if r['recorded_latency_ms'] is not None]
+    by_action: Dict[str, List[float]] = {}
+    for r in warm:
+        by_action.setdefault(r['action'], []).append(r['latency_ms'])
+    return {
+        'exchanges': len(results),
+        'mismatches': sum(1 for r in results if not r['match']),
+        'overall': _distribution([r['latency_ms'] for r in warm]) if warm else None,
+        'by_action': {action: _distribution(v) for action, v in sorted(by_action.items())},
+        'startup': _distribution(cold) if cold else None,
+        'recorded': _distribution(recorded) if recorded else None,
+    }
@@ -0,0 +1,133 @@
+"""
+Monte Carlo confidence bands for a diagnosis.
+
+Patient-reported certainties are noisy (the slider in the frontend has 100
+steps and no two patients use it the same way). ``analyze_uncertainty``
+perturbs the answered certainties with a noise model, evaluates every
+sample in one BatchEvaluator pass over the rule set, and summarizes each
+disease's CF distribution as percentiles together with the probability that
+it ranks first.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batch_eval import BatchEvaluator
+from .cf_utils import normalize_cf_array
+from .rules.specs import RULE_SPECS, RuleSpec
+
+
+DEFAULT_SAMPLES = 2000
+DEFAULT_SCALE = 0.1
+DEFAULT_PERCENTILES = (5, 50, 95)
+MAX_SAMPLES = 20000
+
+
+def _gaussian(rng, X, scale):
+    return X + rng.normal(0.0, scale, X.shape)
+
+
+def _uniform(rng, X, scale):
+    return X + rng.uniform(-scale, scale, X.shape)
+
+
+# Noise model name -> function(rng, X, scale) returning the perturbed X.
+# Perturbed certainties are clipped to [0, 1].
+NOISE_MODELS = {
+    'gaussian': _gaussian,
+    'uniform': _uniform,
+}
+
+
+def sample_answers(answers: Sequence[Tuple[str, float]], samples: int,
+                   noise: str = 'gaussian', scale: float = DEFAULT_SCALE,
+                   rng: Optional[np.random.Generator] = None,
+                   specs: Sequence[RuleSpec] = RULE_SPECS) -> Tuple[BatchEvaluator, np.ndarray]:
+    """
+    Draw perturbed copies of a session's answers.
+
+    Returns:
+        The BatchEvaluator for the answered symptoms and an array of shape
+        (samples, answered symptoms) of certainties
+    """
+    if noise not in NOISE_MODELS:
+        raise ValueError(f"Unknown noise model: {noise}. "
+                         f"Valid models are: {', '.join(NOISE_MODELS)}")
+    rng = rng if rng is not None else np.random.default_rng()
+    evaluator = BatchEvaluator([symptom for symptom, _ in answers], specs)
+    # Latest answer per symptom, in the evaluator's column order
+    baseline = np.zeros(len(evaluator.symptoms))
+    for symptom, certainty in answers:
+        baseline[evaluator.columns[symptom]] = certainty
+    X = np.tile(baseline, (samples, 1))
+    X = normalize_cf_array(NOISE_MODELS[noise](rng, X, scale))
+    return evaluator, X
+
+
+def analyze_uncertainty(answers: Sequence[Tuple[str, float]],
+                        samples: int = DEFAULT_SAMPLES,
+                        noise: str = 'gaussian',
+                        scale: float = DEFAULT_SCALE,
+                        percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                        seed: Optional[int] = None,
+                        specs: Sequence[RuleSpec] = RULE_SPECS) -> Dict:
+    """
+    Estimate how stable the diagnoses are under noise in the answers.
+
+    Args:
+        answers: The session's answers as (symptom, certainty)
+        samples: Number of perturbed answer sets to evaluate
+        noise: Name of a model in NOISE_MODELS
+        scale: Noise scale (standard deviation for 'gaussian', half-width
+            for 'uniform')
+        percentiles: Percentiles of each disease's CF to report (0-100)
+        seed: Seed for reproducible samples
+        specs: The rules to evaluate (default: the built-in rule base)
+
+    Returns:
+        Dict with the 'samples', 'noise', 'scale' and 'percentiles' used,
+        'no_diagnosis' (fraction of samples where no disease is concluded)
+        and 'diseases': one entry per disease concluded in at least one
+        sample, with its CF at each percentile ('bands', 0.0 where it is
+        not concluded), 'p_concluded' and 'p_first' (probability that it
+        ranks first), sorted by p_first then median CF.
+    """
+    if samples < 1:
+        raise ValueError(f"samples must be positive, got {samples}")
+    evaluator, X = sample_answers(answers, samples, noise, scale,
+                                  np.random.default_rng(seed), specs)
+    results = evaluator.evaluate(X)
+    percentiles = list(percentiles)
+
+    concluded = results > 0.0
+    any_concluded = concluded.any(axis=1)
+    # Ties go to the disease listed first in the rule base
+    first = np.argmax(results, axis=1)[any_concluded]
+    p_first = np.bincount(first, minlength=len(evaluator.diseases)) / samples
+    p_concluded = concluded.mean(axis=0)
+    bands = np.percentile(results, percentiles, axis=0)
+    medians = np.median(results, axis=0)
+
+    columns = sorted(
+        (column for column in range(len(evaluator.diseases)) if p_concluded[column] > 0.0),
+        key=lambda column: (p_first[column], medians[column]), reverse=True
+    )
+    diseases: List[Dict] = [
+        {
+            'disease': evaluator.diseases[column],
+            'bands': [float(cf) for cf in bands[:, column]],
+            'p_concluded': float(p_concluded[column]),
+            'p_first': float(p_first[column]),
+        }
+        for column in columns
+    ]
+
+    return {
+        'samples': samples,
+        'noise': noise,
+        'scale': scale,
+        'percentiles': percentiles,
+        'no_diagnosis': float(1.0 - any_concluded.mean()),
+        'diseases': diseases,
+    }
@@ -0,0 +1,201 @@
+"""
+Test script for admission control in the multi-session host.
+Checks the limits on requests in flight and queued per session, the limit
+on concurrent sessions with its retry-after hint, that a burst piped
+into main.py --host is answered in order with the excess shed, and that
+a flood of shed requests does not grow the queue.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.admission import MAX_RETRY_AFTER_MS, MIN_RETRY_AFTER_MS, AdmissionControl
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SYMPTOMS = ['fever', 'cough', 'fatigue', 'body_aches', 'headache', 'sore_throat']
+
+
+def line(action, session_id=None, **fields):
+    command = dict(fields, action=action)
+    if session_id is not None:
+        command['session_id'] = session_id
+    return json.dumps(command) + '\n'
+
+
+def test_limits():
+    """Requests over the in-flight and per-session limits are shed, in order."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Request limits")
+    print("=" * 60)
+
+    admission = AdmissionControl(max_sessions=0, max_session_queue=2, max_in_flight=4)
+    offered = [admission.offer(line('get_diagnosis', 'a')) for _ in range(3)]
+    offered += [admission.offer(line('get_diagnosis', 'b')), admission.offer('not json\n')]
+    offered += [admission.offer(line('metrics')), admission.offer(line('end_session', 'a'))]
+    assert [r.shed for r in offered] == [None, None, 'session_queue', None, None, None, None]
+    assert admission.offer(line('start')).shed == 'in_flight'
+    assert admission.stats()['in_flight'] == 6 and admission.stats()['queue_depth'] == 8
+
+    served = []
+    for request in admission:
+        served.append(request)
+        admission.done(request)
+        if len(served) == len(offered) + 1:
+            break
+    assert served == offered + [served[-1]]
+    stats = admission.stats()
+    assert stats['in_flight'] == 0 and stats['queue_depth'] == 0 and stats['max_queue_depth'] == 8
+    assert stats['shed'] == {'sessions': 0, 'session_queue': 1, 'in_flight': 1}
+    assert stats['admitted'] == 6
+    assert admission.offer(line('get_diagnosis', 'a')).shed is None  # Capacity is back
+
+    # The hint is the backlog's drain time, within bounds
+    admission.service_seconds = 0.002
+    assert admission.retry_after_ms('in_flight') == MIN_RETRY_AFTER_MS
+    admission.in_flight = 100
+    assert admission.retry_after_ms('in_flight') == 200
+    admission.service_seconds = 60.0
+    assert admission.retry_after_ms('in_flight') == MAX_RETRY_AFTER_MS
+    for bad in ({'max_sessions': -1}, {'max_in_flight': 1.5}, {'max_session_queue': True}):
+        try:
+            AdmissionControl(**bad)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError(f'Invalid limit accepted: {bad}')
+    print(f"  {stats}")
+
+
+def test_session_limit():
+    """start beyond --max-sessions is OVERLOADED until a session ends."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Session limit")
+    print("=" * 60)
+
+    process = subprocess.Popen([sys.executable, 'main.py', '--host', '--max-sessions', '2'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                               bufsize=1, cwd=HERE)
+
+    def send(command):
+        process.stdin.write(json.dumps(command) + '\n')
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    try:
+        first, second = send({'action': 'start'}), send({'action': 'start'})
+        rejected = send({'action': 'start'})
+        assert rejected['error_code'] == 'OVERLOADED' and rejected['limit'] == 'sessions'
+        assert rejected['retry_after_ms'] == 1000
+        assert send({'action': 'add_symptom', 'session_id': first['session_id'],
+                     'symptom': 'fever', 'certainty': 0.9})['status'] == 'success'
+
+        send({'action': 'end_session', 'session_id': first['session_id']})
+        third = send({'action': 'start'})
+        assert third['status'] == 'success'
+        send({'action': 'end_session', 'session_id': second['session_id']})
+        assert send({'action': 'start'})['status'] == 'success'
+        # The hint is now the interval between session ends
+        rejected = send({'action': 'start'})
+        assert MIN_RETRY_AFTER_MS <= rejected['retry_after_ms'] < 1000
+
+        metrics = send({'action': 'metrics'})['metrics']
+        assert metrics['sessions']['active'] == 2
+        assert metrics['admission']['shed']['sessions'] == 2
+        assert metrics['admission']['limits']['sessions'] == 2
+    finally:
+        process.stdin.close()
+        process.wait()
+    print(f"  {rejected}")
+
+
+def test_burst():
+    """A burst piped in at once gets one response per request, in order."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Burst")
+    print("=" * 60)
+
+    # Session ids are only known once started: open two sessions, then
+    # send all of their requests at once
+    process = subprocess.Popen(
+        [sys.executable, 'main.py', '--host', '--max-session-queue', '4', '--max-in-flight', '32'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+    try:
+        process.stdin.write(line('start') + line('start'))
+        process.stdin.flush()
+        ids = [json.loads(process.stdout.readline())['session_id'] for _ in range(2)]
+        burst = [line('add_symptom', ids[i % 2], symptom=SYMPTOMS[i % len(SYMPTOMS)],
+                      certainty=0.5) for i in range(400)]
+        burst += [line('get_diagnosis', 'nope'), line('metrics')]
+        process.stdin.write(''.join(burst))
+        process.stdin.close()
+        responses = [json.loads(output) for output in process.stdout]
+    finally:
+        process.wait()
+
+    assert len(responses) == len(burst)
+    assert responses[-2]['error_code'] in ('UNKNOWN_SESSION', 'OVERLOADED')
+    metrics = responses[-1]['metrics']['admission']
+    overloaded = [r for r in responses if r.get('error_code') == 'OVERLOADED']
+    assert all(r['status'] == 'success' for r in responses[:-2]
+               if r.get('error_code') != 'OVERLOADED')
+    assert len(overloaded) == metrics['shed']['session_queue'] + metrics['shed']['in_flight']
+    assert overloaded and metrics['admitted'] + len(overloaded) == len(burst) + 2
+    assert metrics['max_queue_depth'] > 4 and metrics['in_flight'] == 1  # The metrics request
+    print(f"  {len(overloaded)} of {len(burst)} shed: {metrics['shed']}, "
+          f"wait p99 {metrics['wait_p99_ms']} ms")
+
+
+def test_flood_keeps_queue_bounded():
+    """Shed requests share queue entries, so a flood leaves the queue short."""
+    print("\n" + "=" * 60)
+    print("TEST 4: Flood")
+    print("=" * 60)
+
+    admission = AdmissionControl(max_sessions=0, max_session_queue=2, max_in_flight=4)
+    offered = 0
+    for i in range(100000):
+        admission.offer(line('get_diagnosis', 'a' if i % 3 else 'b'))
+        offered += 1
+        assert len(admission._queue) <= 3 * admission.max_in_flight
+    stats = admission.stats()
+    assert stats['in_flight'] == 4 and stats['queue_depth'] == offered
+    assert sum(stats['shed'].values()) == offered - 4
+
+    # Every request is still answered, in order
+    served = []
+    for request in admission:
+        served.append((request.shed, request.count))
+        admission.done(request)
+        if sum(count for _, count in served) == offered:
+            break
+    assert served == [(None, 1)] * 4 + [('in_flight', offered - 4)]
+    assert admission.stats()['queue_depth'] == 0 and admission.pending() is False
+    print(f"  {offered} requests in {len(served)} queue entries")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("ADMISSION CONTROL TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_limits()
+        test_session_limit()
+        test_burst()
+        test_flood_keeps_queue_bounded()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
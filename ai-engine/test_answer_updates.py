@@ -0,0 +1,111 @@
+"""
+Test script for re-answered symptoms.
+Checks that the engine keeps one fact per symptom and that changing an
+answer recomputes the diagnoses that depend on it.
+"""
+
+import random
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES, Symptom
+from src.rules.specs import diagnose
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def answer(engine, symptom, certainty):
+    """Apply one answer the way main.py does."""
+    engine.record_answer(symptom, certainty)
+    engine.add_symptom(symptom, certainty)
+    engine.run()
+
+
+def symptom_facts(engine):
+    return [fact for fact in engine.facts.values() if isinstance(fact, Symptom)]
+
+
+def test_one_fact_per_symptom():
+    """Re-answering a symptom replaces its fact."""
+    print("\n" + "=" * 60)
+    print("TEST 1: One fact per symptom")
+    print("=" * 60)
+
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for certainty in (0.9, 0.2, 0.6, 0.6, 1.0):
+        answer(engine, 'fever', certainty)
+    answer(engine, 'cough', 0.8)
+
+    assert len(symptom_facts(engine)) == 2
+    assert engine.get_answers() == [('fever', 1.0), ('cough', 0.8)]
+    assert engine.questions_asked == ['fever', 'cough']
+    print(f"  Facts: {symptom_facts(engine)}")
+
+
+def test_edit_lowers_diagnosis():
+    """Lowering an answer lowers the diagnoses built on it."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Editing an answer")
+    print("=" * 60)
+
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom in ('fever', 'body_aches', 'fatigue', 'cough'):
+        answer(engine, symptom, 0.9)
+    before = engine.diagnoses['influenza']
+
+    answer(engine, 'fever', 0.3)
+    assert 'influenza' not in engine.diagnoses
+    answer(engine, 'fever', 0.7)
+    after = engine.diagnoses['influenza']
+    assert after < before
+    print(f"  Influenza: {before:.3f} -> removed -> {after:.3f}")
+
+
+def test_edited_sessions_match_final_answers():
+    """A session with edits ends where its final answers lead, at bounded size."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Random edited sessions")
+    print("=" * 60)
+
+    rng = random.Random(30)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    for _ in range(200):
+        engine = MedicalDiagnosisEngine()
+        engine.reset_session()
+        answers = {}
+        for _ in range(rng.randint(1, 40)):
+            symptom = rng.choice(symptoms)
+            certainty = rng.choice(CERTAINTY_CHOICES)
+            answer(engine, symptom, certainty)
+            answers[symptom] = certainty
+            assert engine.diagnoses == diagnose(answers)
+        assert len(symptom_facts(engine)) == len(answers)
+    print("  200 sessions matched")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("ANSWER UPDATE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_one_fact_per_symptom()
+        test_edit_lowers_diagnosis()
+        test_edited_sessions_match_final_answers()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
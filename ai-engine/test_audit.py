@@ -0,0 +1,170 @@
+"""
+Test script for the audit log.
+Checks that buffered events are written in order without gaps when the
+buffer fills up, that files rotate, that a file cut short mid-batch is
+readable up to its last complete batch, and the main.py --audit option.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.audit import AuditLog, audit_files, read_audit
+from src.rules.specs import RULE_SPECS, diagnose, evaluate_rule, pattern_complete
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+
+
+def test_buffer_and_rotation():
+    """A full buffer makes recording wait, not drop; files rotate at their size limit."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Buffering and rotation")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        audit = AuditLog(directory, fsync='always', capacity=8, flush_interval=10.0,
+                         max_file_bytes=400)
+        audit.start()
+        for i in range(200):
+            audit.record(f'session-{i % 3}', 'question', symptom='fever', n=i)
+        audit.close()
+        stats = audit.stats()
+
+        events = list(read_audit([directory]))
+        assert [e['seq'] for e in events] == list(range(1, 201))
+        assert [e['n'] for e in events] == list(range(200))
+        assert stats['events'] == 200 and stats['buffered'] == 0
+        assert stats['stalls'] > 0  # The flush interval alone would have taken 10 seconds
+        files = audit_files([directory])
+        assert len(files) == stats['files'] > 1
+        print(f"  {stats}")
+
+        for bad in ({'fsync': 'sometimes'}, {'capacity': 1}):
+            try:
+                AuditLog(directory, **bad)
+            except ValueError as e:
+                print(f"  {e}")
+            else:
+                raise AssertionError(f'Invalid audit option accepted: {bad}')
+
+
+def test_torn_write():
+    """A batch cut short by a crash is skipped; the batches before it are read."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Torn write")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        audit = AuditLog(directory, flush_interval=10.0)
+        audit.start()
+        for i in range(3):
+            audit.record('session', 'question', symptom='cough', n=i)
+            audit.flush()
+        audit.close()
+        with open(audit.path, 'rb') as f:
+            data = f.read()
+        with open(audit.path, 'ab') as f:
+            f.write(data[:len(data) // 3 - 5])  # Half of a batch's gzip member
+
+        events = list(read_audit([directory]))
+        assert [e['n'] for e in events] == [0, 1, 2]
+        result = subprocess.run([sys.executable, 'read_audit.py', directory, '--check'],
+                                capture_output=True, text=True, cwd=HERE)
+        assert result.returncode == 0, result.stdout
+        print(f"  {result.stdout.strip()}")
+
+
+def test_main_option():
+    """main.py --host --audit records sessions with the rules each answer fired."""
+    print("\n" + "=" * 60)
+    print("TEST 3: --audit")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.Popen(
+            [sys.executable, 'main.py', '--host', '--audit', directory],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+        def send(command):
+            process.stdin.write(json.dumps(command) + '\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        try:
+            session_id = send({'action': 'start'})['session_id']
+            other = send({'action': 'start'})['session_id']
+            for symptom, certainty in FLU:
+                send({'action': 'add_symptom', 'session_id': session_id,
+                      'symptom': symptom, 'certainty': certainty})
+            send({'action': 'add_symptom', 'session_id': other,
+                  'symptom': 'sore_throat', 'certainty': 0.8})
+            send({'action': 'edit_answer', 'session_id': session_id,
+                  'symptom': 'cough', 'certainty': 0.9})
+            send({'action': 'undo', 'session_id': session_id})
+            final = send({'action': 'get_diagnosis', 'session_id': session_id})
+            send({'action': 'end_session', 'session_id': session_id})
+            assert send({'action': 'metrics'})['metrics']['audit']['stalls'] == 0
+        finally:
+            process.stdin.close()
+            process.wait()
+
+        result = subprocess.run(
+            [sys.executable, 'read_audit.py', directory, '--session', session_id],
+            capture_output=True, text=True, check=True, cwd=HERE)
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        kinds = [e['event'] for e in events if e['event'] != 'rule']
+        assert kinds == (['start', 'question'] + ['answer', 'question'] * 4
+                         + ['answer', 'question', 'undo', 'question', 'diagnosis', 'end'])
+
+        # Each answer lists the rules of the diseases it touches that concluded
+        answers, fired = {}, []
+        for event in events:
+            if event['event'] == 'answer':
+                answers[event['symptom']] = event['certainty']
+                fired.append({})
+            elif event['event'] == 'undo':
+                answers[event['symptom']] = event['restored']
+            elif event['event'] == 'rule':
+                fired[-1][event['rule']] = event['cf']
+                spec = next(s for s in RULE_SPECS if s.name == event['rule'])
+                assert pattern_complete(spec, answers)
+                assert event['cf'] == round(evaluate_rule(spec, answers), 6)
+        assert fired[:3] == [{}, {}, {}]
+        assert list(fired[3]) == list(fired[4]) == ['influenza_classic', 'influenza_moderate']
+        assert fired[4]['influenza_classic'] > fired[3]['influenza_classic']  # The edit
+        assert events[-2]['diagnosis'] == [[d['disease'], d['certainty']]
+                                           for d in final['diagnosis']]
+        assert dict(events[-2]['diagnosis']) == diagnose(dict(FLU))
+
+        check = subprocess.run([sys.executable, 'read_audit.py', directory, '--check'],
+                               capture_output=True, text=True, cwd=HERE)
+        assert check.returncode == 0 and '2 sessions' in check.stdout
+        print(f"  {check.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("AUDIT LOG TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_buffer_and_rotation()
+        test_torn_write()
+        test_main_option()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
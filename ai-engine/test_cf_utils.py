@@ -0,0 +1,195 @@
+"""
+Property tests for the array versions of the CF algebra in cf_utils.
+Random arrays (from a seeded NumPy generator, with the category bounds and
+0.0 / 1.0 mixed in) are checked element by element against the scalar
+functions, including broadcasting and reductions along an axis.
+"""
+
+import functools
+import os
+import sys
+
+import numpy as np
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.cf_utils import (
+    CF_CATEGORY_THRESHOLDS,
+    apply_rule_confidence, apply_rule_confidence_array,
+    calculate_weighted_average_cf, calculate_weighted_average_cf_array,
+    combine_cf_and, combine_cf_and_array, combine_cf_multiple_and,
+    combine_cf_multiple_and_array, combine_cf_multiple_or, combine_cf_multiple_or_array,
+    combine_cf_or, combine_cf_or_array, combine_conflicting_evidence,
+    combine_conflicting_evidence_array, combine_parallel_evidence,
+    combine_parallel_evidence_array, fold_parallel_evidence, get_cf_category,
+    get_cf_category_array, normalize_cf, normalize_cf_array,
+)
+
+
+TRIALS = 200
+EDGES = np.array([0.0, 1.0, *CF_CATEGORY_THRESHOLDS])
+
+
+def random_cfs(rng, shape, low=0.0, high=1.0):
+    """Uniform CFs with about a quarter replaced by edge values."""
+    cfs = rng.uniform(low, high, shape)
+    edges = rng.random(shape) < 0.25
+    cfs[edges] = rng.choice(EDGES, edges.sum())
+    return cfs
+
+
+def random_shape(rng, ndim=None):
+    ndim = rng.integers(1, 4) if ndim is None else ndim
+    return tuple(int(n) for n in rng.integers(0, 5, ndim))
+
+
+def broadcastable(rng, shape):
+    """A shape that broadcasts against ``shape`` (some axes 1 or dropped)."""
+    other = tuple(1 if rng.random() < 0.4 else n for n in shape)
+    return other[rng.integers(0, len(other) + 1):]
+
+
+def check_elementwise(array_function, scalar_function, cf1, cf2):
+    result = array_function(cf1, cf2)
+    a, b = np.broadcast_arrays(cf1, cf2)
+    expected = np.vectorize(scalar_function, otypes=[float])(a, b) if a.size else a
+    assert result.shape == a.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+
+def test_elementwise():
+    """Binary functions broadcast and agree with the scalar versions."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Element-wise functions")
+    print("=" * 60)
+
+    rng = np.random.default_rng(44)
+    pairs = [
+        (combine_cf_and_array, combine_cf_and),
+        (combine_cf_or_array, combine_cf_or),
+        (apply_rule_confidence_array, apply_rule_confidence),
+        (combine_parallel_evidence_array, combine_parallel_evidence),
+        (combine_conflicting_evidence_array, combine_conflicting_evidence),
+    ]
+    for _ in range(TRIALS):
+        shape = random_shape(rng)
+        cf1 = random_cfs(rng, shape)
+        cf2 = random_cfs(rng, broadcastable(rng, shape))
+        if rng.random() < 0.3:
+            cf2 = np.broadcast_to(cf2, shape).copy()
+            same = rng.random(shape) < 0.5
+            cf2[same] = cf1[same]  # Equal evidence cancels out
+        for array_function, scalar_function in pairs:
+            check_elementwise(array_function, scalar_function, cf1, cf2)
+            check_elementwise(array_function, scalar_function, cf2, cf1)
+
+    # Out-of-range CFs: clipping, and conflicting evidence at its poles
+    cfs = random_cfs(rng, (50,), -0.5, 1.5)
+    np.testing.assert_array_equal(normalize_cf_array(cfs), [normalize_cf(cf) for cf in cfs])
+    check_elementwise(combine_conflicting_evidence_array, combine_conflicting_evidence,
+                      np.array([1.0, -1.0, 0.9]), np.array([-1.0, 1.0, -1.0]))
+    print(f"  {TRIALS} random shapes x {len(pairs)} functions agree")
+
+
+def test_reductions():
+    """Reductions along any axis fold like the scalar functions."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Reductions")
+    print("=" * 60)
+
+    rng = np.random.default_rng(45)
+    for _ in range(TRIALS):
+        shape = random_shape(rng, rng.integers(1, 4))
+        axis = int(rng.integers(-len(shape), len(shape)))
+        cfs = random_cfs(rng, shape)
+        out_shape = tuple(np.delete(shape, axis % len(shape)))
+        rows = np.moveaxis(cfs, axis, -1).reshape(int(np.prod(out_shape)), shape[axis])
+
+        def expect(function):
+            return np.array([function(row) for row in rows]).reshape(out_shape)
+
+        np.testing.assert_array_equal(combine_cf_multiple_and_array(cfs, axis),
+                                      expect(lambda row: combine_cf_multiple_and(*row)))
+        np.testing.assert_array_equal(combine_cf_multiple_or_array(cfs, axis),
+                                      expect(lambda row: combine_cf_multiple_or(*row)))
+        np.testing.assert_allclose(
+            fold_parallel_evidence(cfs, axis),
+            expect(lambda row: functools.reduce(combine_parallel_evidence, row, 0.0)),
+            rtol=0, atol=1e-12)
+        np.testing.assert_allclose(calculate_weighted_average_cf_array(cfs, axis=axis),
+                                   expect(lambda row: calculate_weighted_average_cf(list(row))),
+                                   rtol=0, atol=1e-12)
+        if shape[axis]:
+            weights = rng.dirichlet(np.ones(shape[axis]))
+            np.testing.assert_allclose(
+                calculate_weighted_average_cf_array(cfs, weights, axis),
+                expect(lambda row: calculate_weighted_average_cf(list(row), list(weights))),
+                rtol=0, atol=1e-12)
+
+            # Supporting and contradicting evidence folded, then combined
+            against = random_cfs(rng, shape)
+            negative_rows = np.moveaxis(against, axis, -1).reshape(rows.shape)
+            folded = np.array([
+                (functools.reduce(combine_parallel_evidence, positive, 0.0),
+                 functools.reduce(combine_parallel_evidence, negative, 0.0))
+                for positive, negative in zip(rows, negative_rows)]).reshape(out_shape + (2,))
+            expected = np.vectorize(combine_conflicting_evidence, otypes=[float])(folded[..., 0], folded[..., 1])
+            # Where both folds reach 1.0 the result hinges on the last bit
+            # of the denominator; compare the well-conditioned positions
+            conditioned = 1 - folded.min(axis=-1) > 1e-6
+            combined = combine_conflicting_evidence_array(cfs, against, axis=axis)
+            np.testing.assert_allclose(combined[conditioned], expected[conditioned],
+                                       rtol=0, atol=1e-9)
+
+    # Invalid weights fail like the scalar version
+    for weights in ([0.5, 0.5], [0.5, 0.3, 0.1]):
+        for function, cfs in ((calculate_weighted_average_cf, [0.8, 0.6, 0.9]),
+                              (calculate_weighted_average_cf_array, np.ones((4, 3)))):
+            try:
+                function(cfs, weights)
+            except ValueError as e:
+                message = str(e)
+            else:
+                raise AssertionError(f'{function.__name__} accepted weights {weights}')
+        print(f"  {weights}: {message}")
+
+
+def test_categories():
+    """Vectorized categorization matches get_cf_category, bounds included."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Categories")
+    print("=" * 60)
+
+    rng = np.random.default_rng(46)
+    cfs = random_cfs(rng, (40, 25), -0.2, 1.2)
+    cfs[0, :3] = [np.nextafter(0.9, 0.0), np.nan, -np.inf]
+    categories = get_cf_category_array(cfs)
+    assert categories.shape == cfs.shape
+    with np.errstate(invalid='ignore'):  # The scalar version compares NaN too
+        expected = np.vectorize(get_cf_category)(cfs)
+    np.testing.assert_array_equal(categories, expected)
+    assert get_cf_category_array(0.7).item() == 'High'
+    counts = {str(c): int(n) for c, n in zip(*np.unique(categories, return_counts=True))}
+    print(f"  {counts}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("CF ALGEBRA TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_elementwise()
+        test_reductions()
+        test_categories()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,160 @@
+"""
+Test script for the decision-tree precompilation of the question flow.
+Walks compiled trees alongside the live engine and checks they agree.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.decision_tree import (
+    DEFAULT_LEVELS, DecisionTree, DecisionTreeSession, compile_question_flow
+)
+
+SESSIONS = 200
+
+
+def live_step(engine, symptom, certainty):
+    """Apply one answer the way main.py does and return the next question."""
+    engine.record_answer(symptom, certainty)
+    engine.add_symptom(symptom, certainty)
+    engine.run()
+    if engine.should_continue_asking():
+        question = engine.get_next_question()
+        return question['symptom'] if question else None
+    return None
+
+
+def test_tree_matches_live_engine():
+    """Random on-grid sessions follow the same path in the tree and the engine."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Tree walk matches live inference")
+    print("=" * 60)
+
+    # Deep enough for sessions that reach tied diagnoses after re-ranking
+    tree = compile_question_flow(max_depth=12)
+    print(f"  Tree size: {tree.size()}")
+
+    rng = random.Random(7)
+    for _ in range(SESSIONS):
+        engine = MedicalDiagnosisEngine()
+        engine.reset_session()
+        node = tree.root
+        symptom = engine.get_initial_question()['symptom']
+        assert tree.questions[node] == symptom
+        while symptom is not None:
+            certainty = rng.choice(DEFAULT_LEVELS)
+            expected_next = live_step(engine, symptom, certainty)
+            node = tree.child(node, symptom, certainty)
+            if node is None:
+                break  # beyond the compiled depth
+            assert tree.questions[node] == expected_next
+            assert tree.diagnosis(node) == engine.get_diagnosis_results()
+            symptom = expected_next
+    print(f"  {SESSIONS} random sessions matched")
+
+
+def test_session_falls_back_off_grid():
+    """An off-grid certainty switches the session to live inference."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Fallback to live inference")
+    print("=" * 60)
+
+    tree = compile_question_flow(max_depth=4)
+    session = DecisionTreeSession(tree)
+    engine = MedicalDiagnosisEngine()
+    session.reset_session()
+    engine.reset_session()
+
+    answers = [('fever', 1.0), ('loss_of_smell', 0.0), ('loss_of_taste', 0.7)]
+    for symptom, certainty in answers:
+        for target in (session, engine):
+            target.record_answer(symptom, certainty)
+            target.add_symptom(symptom, certainty)
+            target.run()
+        assert session.get_diagnosis_results() == engine.get_diagnosis_results()
+        assert session.get_next_question() == engine.get_next_question()
+
+    assert session.tree_steps == 2 and session.fallback_steps == 1
+    print(f"  Served {session.tree_steps} answers from the tree, "
+          f"{session.fallback_steps} from the engine")
+
+
+def test_coverage_and_round_trip():
+    """Saved trees load back identically and report session coverage."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Serialization and coverage")
+    print("=" * 60)
+
+    tree = compile_question_flow(max_depth=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tree.json')
+        tree.save(path)
+        loaded = DecisionTree.load(path)
+    assert loaded.to_dict() == json.loads(json.dumps(tree.to_dict()))
+
+    first = tree.questions[tree.root]
+    second = tree.questions[tree.child(tree.root, first, 1.0)]
+    report = loaded.coverage([
+        [(first, 1.0), (second, 0.0)],
+        [(first, 0.8)],
+    ])
+    assert report['covered_sessions'] == 1
+    assert report['served_answers'] == 2 and report['answers'] == 3
+    print(f"  Coverage report: {report}")
+
+
+def test_main_serves_from_tree():
+    """main.py --decision-tree answers the protocol from the tree."""
+    print("\n" + "=" * 60)
+    print("TEST 4: main.py --decision-tree")
+    print("=" * 60)
+
+    commands = [
+        {'action': 'start'},
+        {'action': 'add_symptom', 'symptom': 'fever', 'certainty': 1.0},
+        {'action': 'get_diagnosis'},
+    ]
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tree.json')
+        compile_question_flow(max_depth=2).save(path)
+        served = subprocess.run([sys.executable, 'main.py', '--decision-tree', path],
+                                input=stdin, capture_output=True, text=True, cwd=here)
+    live = subprocess.run([sys.executable, 'main.py'],
+                          input=stdin, capture_output=True, text=True, cwd=here)
+
+    assert served.stdout.splitlines() == live.stdout.splitlines(), served.stderr
+    for line in served.stdout.splitlines():
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("DECISION TREE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_tree_matches_live_engine()
+        test_session_falls_back_off_grid()
+        test_coverage_and_round_trip()
+        test_main_serves_from_tree()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
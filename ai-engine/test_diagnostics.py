@@ -0,0 +1,169 @@
+"""
+Test script for the profile and memory actions.
+Profiles a burst of sessions in a live main.py process and checks the
+collapsed stacks, the error codes, and the memory report.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.diagnostics import SamplingProfiler
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SESSION = [('fever', 0.9), ('cough', 0.8), ('body_aches', 0.8), ('fatigue', 0.7),
+           ('headache', 0.6), ('chills', 0.6), ('runny_nose', 0.5), ('sneezing', 0.5)]
+
+
+class EngineProcess:
+    """A main.py process driven one command at a time."""
+
+    def __init__(self, *args):
+        self.process = subprocess.Popen([sys.executable, 'main.py', *args],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1, cwd=HERE)
+
+    def send(self, command):
+        self.process.stdin.write(json.dumps(command) + '\n')
+        self.process.stdin.flush()
+        return json.loads(self.process.stdout.readline())
+
+    def run_sessions(self, count):
+        for _ in range(count):
+            self.send({'action': 'start'})
+            for symptom, certainty in SESSION:
+                self.send({'action': 'add_symptom', 'symptom': symptom, 'certainty': certainty})
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def test_profile_live_process():
+    """Samples land in engine code and are written as collapsed stacks."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Profile a live process")
+    print("=" * 60)
+
+    engine = EngineProcess()
+    try:
+        assert engine.send({'action': 'profile', 'collect': True})['error_code'] == 'NO_PROFILE'
+        assert engine.send({'action': 'profile', 'seconds': 0})['error_code'] == 'INVALID_PROFILE_OPTIONS'
+        assert engine.send({'action': 'profile', 'interval_ms': 'fast'})['error_code'] == 'INVALID_PROFILE_OPTIONS'
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'engine.folded')
+            started = engine.send({'action': 'profile', 'seconds': 30, 'interval_ms': 1,
+                                   'output': output})
+            assert started['profile']['running']
+            assert engine.send({'action': 'profile'})['error_code'] == 'PROFILER_BUSY'
+
+            engine.run_sessions(40)
+            result = engine.send({'action': 'profile', 'stop': True})
+            assert not result['profile']['running']
+            assert result['profile']['samples'] > 0
+
+            with open(output) as f:
+                lines = f.read().splitlines()
+            assert lines == result['stacks']
+            counts = [int(line.rsplit(' ', 1)[1]) for line in lines]
+            assert counts == sorted(counts, reverse=True)
+            assert sum(counts) == result['profile']['samples'] - result['profile']['idle_samples']
+            assert all(line.startswith('main.py:<module>;main.py:main') for line in lines)
+            engine_samples = sum(count for line, count in zip(lines, counts)
+                                 if 'engine.py:' in line)
+            assert engine_samples > sum(counts) / 2, lines[:5]
+
+        # A new profile can start once the last one is over
+        assert engine.send({'action': 'profile', 'seconds': 1})['status'] == 'success'
+    finally:
+        engine.close()
+    print(f"  {result['profile']['samples']} samples, {engine_samples} in the engine")
+    print(f"  Hottest: {lines[0]}")
+
+
+def test_thread_sampler():
+    """Sampling another thread from a background thread works too."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Thread sampler")
+    print("=" * 60)
+
+    import threading
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            sum(i * i for i in range(1000))
+
+    worker = threading.Thread(target=busy)
+    worker.start()
+    profiler = SamplingProfiler(worker.ident, duration=0.3, interval=0.002)
+    assert profiler.mode == 'thread'
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    done.set()
+    worker.join()
+    assert profiler.samples > 0 and not profiler.running
+    assert any('test_diagnostics.py:busy' in line for line in profiler.collapsed())
+    print(f"  {profiler.samples} samples")
+
+
+def test_memory_report():
+    """The memory action counts facts and sessions and traces allocations on request."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Memory report")
+    print("=" * 60)
+
+    engine = EngineProcess()
+    try:
+        engine.run_sessions(3)
+        report = engine.send({'action': 'memory'})['memory']
+        assert not report['tracing'] and report['top'] == []
+        counts = report['counts']
+        assert counts['sessions_started'] == 3
+        assert counts['answers'] == counts['checkpoints'] == len(SESSION)
+        assert counts['symptom_facts'] == len(SESSION)
+        assert counts['facts'] > counts['symptom_facts']
+
+        engine.send({'action': 'memory', 'trace': True})
+        engine.run_sessions(2)
+        report = engine.send({'action': 'memory', 'top': 5})['memory']
+        assert report['tracing'] and 0 < len(report['top']) <= 5
+        assert report['traced_kb'] > 0 and report['peak_kb'] >= report['traced_kb']
+        assert report['counts']['sessions_started'] == 5
+
+        assert not engine.send({'action': 'memory', 'trace': False})['memory']['tracing']
+        assert engine.send({'action': 'memory', 'top': -1})['error_code'] == 'INVALID_TOP'
+    finally:
+        engine.close()
+    print(f"  {report['counts']}")
+    print(f"  Top allocation: {report['top'][0]}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("LIVE DIAGNOSTICS TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_profile_live_process()
+        test_thread_sampler()
+        test_memory_report()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
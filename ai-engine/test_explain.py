@@ -0,0 +1,171 @@
+"""
+Test script for explanation traces and the explain action.
+Checks that the trace accounts for every diagnosis on each engine path,
+that undo and edits keep it in step with the answers, and the explain
+action of main.py.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.codegen import load_compiled_rules
+from src.engine import create_engine
+from src.facts import QUESTION_TEMPLATES
+from src.rules.specs import RULE_SPECS, RULE_SPECS_BY_NAME, evaluate_rule, pattern_complete
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+
+
+def check_explanation(engine):
+    """Every rule the trace lists agrees with its spec, and the kept CFs are the diagnoses."""
+    answers = dict(engine.get_answers())
+    diseases = {spec.disease for spec in RULE_SPECS}
+    for entry in engine.explain(None) + [engine.explain(d)[0] for d in diseases]:
+        disease, rules = entry['disease'], entry['rules']
+        expected = [s.name for s in sorted(RULE_SPECS, key=lambda s: -s.salience)
+                    if s.disease == disease and pattern_complete(s, answers)]
+        assert [rule['rule'] for rule in rules] == expected
+        kept = None
+        for rule in rules:
+            if rule['outcome'] == 'skipped':
+                continue
+            final_cf = evaluate_rule(RULE_SPECS_BY_NAME[rule['rule']], answers)
+            assert (rule['outcome'] == 'fired') == (final_cf is not None)
+            assert (rule['outcome'] == 'excluded') == (
+                all(gate['passed'] for gate in rule['gates'])
+                and not all(e['passed'] for e in rule.get('exclusions', [])))
+            if final_cf is not None:
+                assert rule['final_cf'] == round(final_cf, 6)
+                if rule['kept']:
+                    kept = rule['final_cf']
+        if kept is not None:
+            assert round(entry['certainty'], 6) == kept
+        elif engine.top_k is None:
+            assert disease not in engine.diagnoses
+
+
+def test_trace_matches_specs():
+    """On every engine path, the trace explains exactly the current diagnoses."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Trace matches the rule specs")
+    print("=" * 60)
+
+    rng = random.Random(43)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    configurations = {
+        'experta': create_engine('experta', trace=True),
+        'lite': create_engine('lite', trace=True),
+        'compiled': create_engine('lite', compiled_rules=load_compiled_rules(), trace=True),
+        'top_k=2': create_engine('lite', top_k=2, trace=True),
+    }
+    sizes = []
+    for name, engine in configurations.items():
+        for _ in range(40):
+            engine.reset_session()
+            for symptom, certainty in FLU[:rng.randint(0, len(FLU))]:
+                engine.answer(symptom, certainty)
+            for symptom in rng.sample(symptoms, rng.randint(1, 10)):
+                engine.answer(symptom, rng.choice([0.0, 0.3, 0.5, 0.7, 0.9, 1.0]))
+                check_explanation(engine)
+            sizes.append(engine.trace.nbytes())
+    assert max(sizes) < 4096
+    print(f"  trace size: mean {sum(sizes) / len(sizes):.0f} bytes, max {max(sizes)} bytes")
+
+
+def test_undo_and_edit():
+    """Undo puts back the explanation of the answer it takes back."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Undo and edits")
+    print("=" * 60)
+
+    engine = create_engine('lite', trace=True)
+    engine.reset_session()
+    for symptom, certainty in FLU[:3]:
+        engine.answer(symptom, certainty)
+    assert engine.explain() == []
+    assert engine.explain('influenza')[0]['rules'] == []  # No rule has all its patterns yet
+
+    engine.answer('cough', 0.6)
+    before = engine.explain()
+    assert before[0]['disease'] == 'influenza' and before[0]['certainty'] == 0.51
+    engine.edit_answer('cough', 0.45)
+    rules = {r['rule']: r for r in engine.explain('influenza')[0]['rules']}
+    assert rules['influenza_classic']['outcome'] == 'fired'
+    assert rules['influenza_moderate']['outcome'] == 'gate_failed'
+    assert [g['passed'] for g in rules['influenza_moderate']['gates']] == [True, True, False]
+    check_explanation(engine)
+
+    engine.undo()
+    assert engine.explain() == before
+    engine.undo()
+    assert engine.explain() == []
+    engine.reset_session()
+    assert engine.trace.records == {}
+    print(f"  {json.dumps(before[0]['rules'][0])}")
+
+
+def test_explain_action():
+    """main.py answers explain for a session; --no-trace turns it off."""
+    print("\n" + "=" * 60)
+    print("TEST 3: explain action")
+    print("=" * 60)
+
+    process = subprocess.Popen([sys.executable, 'main.py', '--host'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+    def send(command):
+        process.stdin.write(json.dumps(command) + '\n')
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    try:
+        session_id = send({'action': 'start'})['session_id']
+        for symptom, certainty in FLU + [('runny_nose', 0.8), ('sneezing', 0.6)]:
+            send({'action': 'add_symptom', 'session_id': session_id,
+                  'symptom': symptom, 'certainty': certainty})
+        diagnosis = send({'action': 'get_diagnosis', 'session_id': session_id})['diagnosis']
+        explanation = send({'action': 'explain', 'session_id': session_id})['explanation']
+        assert [(e['disease'], e['certainty']) for e in explanation] == [
+            (d['disease'], d['certainty']) for d in diagnosis]
+        one = send({'action': 'explain', 'session_id': session_id, 'disease': 'strep_throat'})
+        assert one['explanation'] == [{'disease': 'strep_throat', 'certainty': 0.0, 'rules': []}]
+        unknown = send({'action': 'explain', 'session_id': session_id, 'disease': 'measles'})
+        assert unknown['error_code'] == 'UNKNOWN_DISEASE'
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    off = subprocess.run([sys.executable, 'main.py', '--no-trace'],
+                         input='{"action": "start"}\n{"action": "explain"}\n',
+                         capture_output=True, text=True, cwd=HERE)
+    assert json.loads(off.stdout.splitlines()[-1])['error_code'] == 'EXPLAIN_UNAVAILABLE'
+    print(f"  {[(e['disease'], len(e['rules'])) for e in explanation]}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("EXPLANATION TRACE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_trace_matches_specs()
+        test_undo_and_edit()
+        test_explain_action()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,160 @@
+"""
+Test script for the multi-session host (main.py --host).
+Checks that interleaved sessions stay independent, that engines of ended
+sessions are reused cleanly, and the GC metrics.
+"""
+
+import gc
+import json
+import os
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import create_engine
+from src.host import EngineHost, GCMonitor, parse_gc_thresholds
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+COLD = [('runny_nose', 0.9), ('sneezing', 0.8), ('sore_throat', 0.6)]
+
+
+def run_main(commands, *args):
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    result = subprocess.run([sys.executable, 'main.py', *args], input=stdin,
+                            capture_output=True, text=True, cwd=HERE)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def single_session(answers):
+    """Responses of one session in a plain main.py process."""
+    commands = [{'action': 'start'}]
+    commands += [{'action': 'add_symptom', 'symptom': s, 'certainty': c} for s, c in answers]
+    commands += [{'action': 'get_diagnosis'}]
+    return run_main(commands)
+
+
+def test_interleaved_sessions():
+    """Sessions interleaved in one host answer like separate processes."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Interleaved sessions")
+    print("=" * 60)
+
+    process = subprocess.Popen([sys.executable, 'main.py', '--host'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+    def send(command):
+        process.stdin.write(json.dumps(command) + '\n')
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    try:
+        flu, cold = send({'action': 'start'}), send({'action': 'start'})
+        ids = {'flu': flu.pop('session_id'), 'cold': cold.pop('session_id')}
+        responses = {'flu': [flu], 'cold': [cold]}
+        for (flu_answer, cold_answer) in zip(FLU, COLD + [None]):
+            for name, answer in (('flu', flu_answer), ('cold', cold_answer)):
+                if answer is not None:
+                    responses[name].append(send({'action': 'add_symptom', 'session_id': ids[name],
+                                                 'symptom': answer[0], 'certainty': answer[1]}))
+        for name in ids:
+            responses[name].append(send({'action': 'get_diagnosis', 'session_id': ids[name]}))
+
+        assert responses['flu'] == single_session(FLU)
+        assert responses['cold'] == single_session(COLD)
+
+        assert send({'action': 'get_diagnosis'})['error_code'] == 'UNKNOWN_SESSION'
+        assert send({'action': 'undo', 'session_id': 'nope'})['error_code'] == 'UNKNOWN_SESSION'
+
+        # An ended session is gone; its engine serves the next session clean
+        assert send({'action': 'end_session', 'session_id': ids['flu']})['status'] == 'success'
+        assert send({'action': 'end_session', 'session_id': ids['flu']})['error_code'] == 'UNKNOWN_SESSION'
+        assert send({'action': 'get_diagnosis', 'session_id': ids['flu']})['error_code'] == 'UNKNOWN_SESSION'
+        reused = send({'action': 'start'})['session_id']
+        assert send({'action': 'get_diagnosis', 'session_id': reused})['diagnosis'] == []
+
+        metrics = send({'action': 'metrics'})['metrics']
+        assert metrics['sessions'] == {'active': 2, 'opened': 3, 'closed': 1,
+                                       'reused': 1, 'pooled': 0}
+        assert metrics['gc']['frozen_objects'] > 0
+        assert len(metrics['gc']['generations']) == 3
+
+        memory = send({'action': 'memory', 'session_id': ids['cold']})['memory']
+        assert memory['counts']['answers'] == len(COLD)
+        assert memory['counts']['sessions_active'] == 2
+    finally:
+        process.stdin.close()
+        process.wait()
+    print(f"  {metrics}")
+
+
+def test_host_actions_need_host():
+    """end_session and metrics are only served with --host."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Host-only actions")
+    print("=" * 60)
+
+    responses = run_main([{'action': 'metrics'}, {'action': 'end_session', 'session_id': 'x'}])
+    assert [r['error_code'] for r in responses] == ['HOST_MODE_ONLY'] * 2
+    print("  HOST_MODE_ONLY returned")
+
+
+def test_gc_monitor_and_thresholds():
+    """Collections are counted and timed; threshold options are validated."""
+    print("\n" + "=" * 60)
+    print("TEST 3: GC monitor")
+    print("=" * 60)
+
+    monitor = GCMonitor()
+    monitor.install()
+    try:
+        gc.collect()
+        gc.collect(0)
+    finally:
+        monitor.uninstall()
+    report = monitor.report()
+    assert report['generations'][2]['collections'] >= 1
+    assert report['generations'][0]['collections'] >= 1
+    assert report['pause_p99_ms'] >= report['pause_p50_ms'] > 0
+
+    assert parse_gc_thresholds('50000,20,100') == (50000, 20, 100)
+    assert parse_gc_thresholds('1000') == (1000,)
+    for bad in ('fast', '1,2,3,4', '-1'):
+        try:
+            parse_gc_thresholds(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+    # The pool keeps at most pool_size engines
+    host = EngineHost(create_engine, gc_thresholds=None, freeze=False, pool_size=1)
+    sessions = [host.open_session()[0] for _ in range(3)]
+    for session_id in sessions:
+        assert host.close_session(session_id)
+    assert len(host.pool) == 1 and not host.sessions
+    print(f"  {report['generations']}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("ENGINE HOST TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_interleaved_sessions()
+        test_host_actions_need_host()
+        test_gc_monitor_and_thresholds()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
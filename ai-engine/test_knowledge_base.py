@@ -0,0 +1,291 @@
+"""
+Test script for the versioned knowledge base artifact and reload_kb.
+Checks that an exported artifact runs like the built-in knowledge base,
+that edits take effect, and that a running host swaps versions while
+sessions already open finish on the version they started on.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import uuid
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import codegen
+from src.engine import create_engine
+from src.facts import QUESTION_TEMPLATES
+from src.host import EngineHost
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+from src.oneshot import diagnosis_key
+from src.rules.specs import diagnose
+from main import load_knowledge_base
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+
+
+def edited_artifact(path):
+    """Export the built-in knowledge base with weaker influenza rules and a reworded question."""
+    data = builtin_knowledge_base().to_dict()
+    for rule in data['rules']:
+        if rule['disease'] == 'influenza':
+            rule['rule_cf'] = 0.5
+    data['question_templates']['fever'] = 'Have you had a temperature?'
+    del data['version']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return KnowledgeBase.load(path)
+
+
+def test_export_round_trip():
+    """An exported artifact is the built-in knowledge base, version and all."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Export round trip")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'kb.json')
+        subprocess.run([sys.executable, 'export_knowledge_base.py', path],
+                       check=True, capture_output=True, cwd=HERE)
+        loaded = KnowledgeBase.load(path)
+        assert loaded.version == builtin_knowledge_base().version
+
+        rng = random.Random(40)
+        symptoms = sorted(QUESTION_TEMPLATES)
+        for backend in ('experta', 'lite'):
+            builtin, artifact = create_engine(backend), create_engine(backend, knowledge_base=loaded)
+            for _ in range(30):
+                for engine in (builtin, artifact):
+                    engine.reset_session()
+                for symptom in rng.sample(symptoms, rng.randint(1, 12)):
+                    certainty = rng.choice([0.0, 0.3, 0.6, 0.8, 1.0])
+                    for engine in (builtin, artifact):
+                        engine.answer(symptom, certainty)
+                    assert artifact.get_diagnosis_results() == builtin.get_diagnosis_results()
+                    assert artifact.get_next_question() == builtin.get_next_question()
+        print(f"  {loaded.summary()}")
+
+
+def test_edits_and_validation():
+    """Edited CFs and questions take effect; bad artifacts are refused."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Edits and validation")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'kb.json')
+        edited = edited_artifact(path)
+        assert edited.version != builtin_knowledge_base().version
+
+        engine = create_engine(knowledge_base=edited)
+        results = engine.diagnose(FLU)
+        assert dict(results) == diagnose(dict(FLU), edited.specs)
+        assert dict(results)['influenza'] < dict(create_engine().diagnose(FLU))['influenza']
+        assert engine.get_initial_question()['text'] == 'Have you had a temperature?'
+
+        # A stale version is refused until re-stamped
+        data = edited.to_dict()
+        data['rules'][0]['rule_cf'] = 0.4
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        try:
+            KnowledgeBase.load(path)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError('Stale version accepted')
+        subprocess.run([sys.executable, 'export_knowledge_base.py', '--stamp', path],
+                       check=True, capture_output=True, cwd=HERE)
+        assert KnowledgeBase.load(path).specs[0].rule_cf == 0.4
+
+        for damage in ({'rule_cf': 1.5}, {'gates': []}, {'disease': 'measles'}):
+            data = builtin_knowledge_base().to_dict()
+            data['rules'][3].update(damage)
+            try:
+                KnowledgeBase.from_dict(dict(data, version=None))
+            except ValueError as e:
+                print(f"  {e}")
+            else:
+                raise AssertionError(f'Invalid rule accepted: {damage}')
+
+
+def test_host_swap():
+    """Pooled engines of an old version are dropped; it retires once drained."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Host version swap")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        edited = edited_artifact(os.path.join(directory, 'kb.json'))
+    host = EngineHost(lambda: create_engine('lite'), gc_thresholds=None, freeze=False,
+                      version='builtin')
+    old_id, old_engine = host.open_session()
+    done_id, _ = host.open_session()
+    host.close_session(done_id)
+    assert len(host.pool) == 1
+
+    host.swap(lambda: create_engine('lite', knowledge_base=edited), edited.version)
+    new_id, new_engine = host.open_session()
+    assert new_engine.knowledge_base is edited
+    assert host.get(old_id) is old_engine and old_engine.knowledge_base is None
+    assert host.metrics()['knowledge_base']['sessions_by_version'] == {
+        'builtin': 1, edited.version: 1}
+
+    host.close_session(old_id)
+    assert not host.pool  # the old engine is not reused
+    host.close_session(new_id)
+    assert host.pool == [new_engine]
+    report = host.metrics()['knowledge_base']
+    assert report == {'version': edited.version, 'sessions_by_version': {},
+                      'swaps': 1, 'retired': 1}
+    print(f"  {report}")
+
+
+def test_reload_kb_action():
+    """reload_kb in a running host: open sessions finish on their version."""
+    print("\n" + "=" * 60)
+    print("TEST 4: reload_kb action")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'kb.json')
+        edited = edited_artifact(path)
+        process = subprocess.Popen([sys.executable, 'main.py', '--host'], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+        def send(command):
+            process.stdin.write(json.dumps(command) + '\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        def flu_diagnosis(session_id):
+            for symptom, certainty in FLU:
+                send({'action': 'add_symptom', 'session_id': session_id,
+                      'symptom': symptom, 'certainty': certainty})
+            response = send({'action': 'get_diagnosis', 'session_id': session_id})
+            return {entry['disease']: entry['certainty'] for entry in response['diagnosis']}
+
+        try:
+            old = send({'action': 'start'})['session_id']
+            bad = send({'action': 'reload_kb', 'path': os.path.join(directory, 'missing.json')})
+            assert bad['error_code'] == 'INVALID_KNOWLEDGE_BASE'
+
+            reload = send({'action': 'reload_kb', 'path': path})
+            assert reload['knowledge_base']['version'] == edited.version
+            assert reload['knowledge_base']['previous'] == builtin_knowledge_base().version
+            assert send({'action': 'reload_kb', 'path': path})['message'] == 'Knowledge base unchanged'
+
+            started = send({'action': 'start'})
+            assert started['next_question']['text'] == 'Have you had a temperature?'
+            new = started['session_id']
+            assert flu_diagnosis(old) == diagnose(dict(FLU))
+            assert flu_diagnosis(new) == diagnose(dict(FLU), edited.specs)
+
+            # diagnose runs the new version, under its own cache key
+            oneshot = send({'action': 'diagnose', 'symptoms': dict(FLU)})
+            assert oneshot['diagnosis'][0]['certainty'] == diagnose(dict(FLU), edited.specs)['influenza']
+            assert oneshot['input_hash'] != diagnosis_key(FLU)
+
+            send({'action': 'end_session', 'session_id': old})
+            metrics = send({'action': 'metrics'})['metrics']['knowledge_base']
+            assert metrics['sessions_by_version'] == {edited.version: 1}
+            assert metrics['retired'] == 1
+        finally:
+            process.stdin.close()
+            process.wait()
+        print(f"  {metrics}")
+
+
+def keyword_artifact(path):
+    """The built-in knowledge base with its fever symptom renamed to a Python keyword."""
+    data = builtin_knowledge_base().to_dict()
+    for rule in data['rules']:
+        for gate in rule['gates']:
+            gate[0] = ['class' if symptom == 'fever' else symptom for symptom in gate[0]]
+        for exclusion in rule['exclusions']:
+            exclusion[0] = 'class' if exclusion[0] == 'fever' else exclusion[0]
+    data['question_templates']['class'] = data['question_templates'].pop('fever')
+    for info in data['disease_info'].values():
+        info['common_symptoms'] = ['class' if symptom == 'fever' else symptom
+                                   for symptom in info['common_symptoms']]
+    # A new version every run, so its rules are not already compiled
+    data['rules'][0]['name'] = f'renamed_{uuid.uuid4().hex[:8]}'
+    del data['version']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def test_any_symptom_names():
+    """A keyword symptom loads, and rules that do not compile are an invalid knowledge base."""
+    print("\n" + "=" * 60)
+    print("TEST 5: Any symptom names")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'kb.json')
+        keyword_artifact(path)
+
+        generate = codegen.generate_rules_module
+        codegen.generate_rules_module = lambda specs: 'def class(): pass\n'
+        try:
+            loaded, error = load_knowledge_base(path)
+        finally:
+            codegen.generate_rules_module = generate
+        assert loaded is None and error['error_code'] == 'INVALID_KNOWLEDGE_BASE'
+        assert 'Cannot compile the rules' in error['message']
+        print(f"  {error['message']}")
+
+        loaded, error = load_knowledge_base(path)
+        assert error is None
+        renamed = [('class', certainty) if symptom == 'fever' else (symptom, certainty)
+                   for symptom, certainty in FLU]
+        assert loaded.compiled_rules.diagnose(dict(renamed)) == diagnose(dict(FLU))
+
+        result = subprocess.run([sys.executable, 'main.py', '--oneshot', '--kb', path],
+                                input=json.dumps({'symptoms': dict(renamed)}),
+                                capture_output=True, text=True, cwd=HERE)
+        assert result.returncode == 0
+        certainties = {entry['disease']: entry['certainty']
+                       for entry in json.loads(result.stdout)['diagnosis']}
+        assert certainties == diagnose(dict(FLU))
+
+        process = subprocess.Popen([sys.executable, 'main.py', '--host'], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+        try:
+            process.stdin.write(json.dumps({'action': 'reload_kb', 'path': path}) + '\n')
+            process.stdin.flush()
+            response = json.loads(process.stdout.readline())
+        finally:
+            process.stdin.close()
+            process.wait()
+        assert response['status'] == 'success'
+        print(f"  {response['knowledge_base']}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("KNOWLEDGE BASE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_export_round_trip()
+        test_edits_and_validation()
+        test_host_swap()
+        test_reload_kb_action()
+        test_any_symptom_names()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,154 @@
+"""
+Test script for the lightweight forward-chaining engine.
+Runs the same sessions on the experta and lite backends and checks that
+everything the protocol can observe is identical.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import LiteDiagnosisEngine, MedicalDiagnosisEngine, create_engine
+from src.facts import QUESTION_TEMPLATES, Symptom
+from src.lite_engine import LiteKnowledgeEngine
+from src.rule_analysis import analyze_rules
+
+from experta import Rule, MATCH
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def state(engine):
+    """Everything the protocol can observe about a session."""
+    return (
+        engine.get_answers(),
+        engine.diagnoses,
+        engine.get_diagnosis_results(),
+        engine.questions_asked,
+        engine.should_continue_asking(),
+        engine.get_next_question(),
+    )
+
+
+def test_sessions_match_experta():
+    """Random sessions with edits and undos agree on both backends."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Random sessions on both backends")
+    print("=" * 60)
+
+    rng = random.Random(32)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    for options in ({}, {'top_k': 2}, {'plan': analyze_rules()}):
+        for _ in range(60):
+            engines = [MedicalDiagnosisEngine(**options), LiteDiagnosisEngine(**options)]
+            for engine in engines:
+                engine.reset_session()
+            for _ in range(rng.randint(1, 20)):
+                symptom = rng.choice(symptoms)
+                certainty = rng.choice(CERTAINTY_CHOICES)
+                undo = rng.random() < 0.15
+                for engine in engines:
+                    engine.answer(symptom, certainty)
+                    if undo:
+                        engine.undo()
+                expected, actual = (state(engine) for engine in engines)
+                assert actual == expected, (actual, expected)
+            assert engines[0].rule_stats == engines[1].rule_stats
+    print("  180 sessions matched")
+
+
+def test_declare_and_run():
+    """Declaring facts directly and calling run works as with experta."""
+    print("\n" + "=" * 60)
+    print("TEST 2: declare / run / reset")
+    print("=" * 60)
+
+    answers = [('fever', 0.9), ('sore_throat', 0.9), ('swollen_lymph_nodes', 0.8)]
+    results = []
+    for backend in ('experta', 'lite'):
+        engine = create_engine(backend)
+        engine.reset()
+        for symptom, certainty in answers:
+            engine.declare(Symptom(name=symptom, certainty=certainty))
+        engine.declare(Symptom(name='fever', certainty=0.9))  # duplicate fact
+        engine.run()
+        results.append((dict(engine.diagnoses), len(engine.facts)))
+    assert results[0] == results[1]
+    assert 'strep_throat' in results[1][0]
+    print(f"  {results[1]}")
+
+    try:
+        create_engine('rete')
+        assert False, "an unknown backend should be rejected"
+    except ValueError:
+        pass
+
+
+def test_unsupported_patterns_rejected():
+    """Rules outside the supported subset fail when the engine is created."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Unsupported patterns")
+    print("=" * 60)
+
+    class BoundRules(LiteKnowledgeEngine):
+        @Rule(Symptom(name=MATCH.name))
+        def any_symptom(self, name):
+            pass
+
+    try:
+        BoundRules()
+        assert False, "variable bindings should be rejected"
+    except TypeError as e:
+        print(f"  {e}")
+
+
+def test_main_engine_option():
+    """main.py --engine lite answers like the default engine."""
+    print("\n" + "=" * 60)
+    print("TEST 4: main.py --engine lite")
+    print("=" * 60)
+
+    commands = [
+        {'action': 'start'},
+        {'action': 'add_symptom', 'symptom': 'fever', 'certainty': 0.9},
+        {'action': 'add_symptom', 'symptom': 'cough', 'certainty': 0.8},
+        {'action': 'undo'},
+        {'action': 'get_diagnosis'},
+    ]
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    here = os.path.dirname(os.path.abspath(__file__))
+    outputs = [
+        subprocess.run([sys.executable, 'main.py', *args], input=stdin,
+                       capture_output=True, text=True, cwd=here).stdout
+        for args in ([], ['--engine', 'lite'])
+    ]
+    assert outputs[0] == outputs[1]
+    print(f"  {len(outputs[1].splitlines())} identical responses")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("LITE ENGINE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_sessions_match_experta()
+        test_declare_and_run()
+        test_unsupported_patterns_rejected()
+        test_main_engine_option()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,146 @@
+"""
+Test script for the stateless diagnose action and main.py --oneshot.
+Checks one-shot results against the rule specs and the interactive flow,
+the input hash, and the result cache.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import ENGINE_BACKENDS, create_engine
+from src.facts import QUESTION_TEMPLATES
+from src.oneshot import DiagnosisCache, diagnosis_key
+from src.rules.specs import replay_diagnoses
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = {'fever': 0.9, 'body_aches': 0.8, 'fatigue': 0.7, 'cough': 0.6}
+
+
+def random_answer_sets(count, seed=38):
+    rng = random.Random(seed)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    return [
+        [(symptom, rng.choice([0.0, 0.3, 0.5, 0.7, 0.8, 0.9, 1.0]))
+         for symptom in rng.sample(symptoms, rng.randint(1, len(symptoms)))]
+        for _ in range(count)
+    ]
+
+
+def run_main(stdin, *args):
+    result = subprocess.run([sys.executable, 'main.py', *args], input=stdin,
+                            capture_output=True, text=True, cwd=HERE)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def test_diagnose_matches_interactive():
+    """One inference pass gives the diagnoses of answering one at a time."""
+    print("\n" + "=" * 60)
+    print("TEST 1: diagnose() against the interactive flow")
+    print("=" * 60)
+
+    engines = {backend: create_engine(backend) for backend in ENGINE_BACKENDS}
+    interactive = create_engine()
+    for answers in random_answer_sets(60):
+        interactive.reset_session()
+        for symptom, certainty in answers:
+            interactive.answer(symptom, certainty)
+        expected = replay_diagnoses(answers)
+
+        shuffled = random.Random(len(answers)).sample(answers, len(answers))
+        results = [engine.diagnose(order) for engine in engines.values()
+                   for order in (answers, shuffled)]
+        assert all(result == results[0] for result in results)
+        assert dict(results[0]) == expected == dict(interactive.get_diagnosis_results())
+        # No question bookkeeping
+        assert all(not engine.history and not engine.questions_asked
+                   and not engine.question_engine.asked_symptoms
+                   for engine in engines.values())
+    print("  60 answer sets matched on both backends, in any answer order")
+
+
+def test_diagnosis_key():
+    """The key ignores answer order and int/float spelling, not values or options."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Input hash")
+    print("=" * 60)
+
+    key = diagnosis_key([('fever', 1), ('cough', 0.5)])
+    assert key == diagnosis_key([('cough', 0.5), ('fever', 1.0)])
+    assert key != diagnosis_key([('fever', 1.0), ('cough', 0.6)])
+    assert key != diagnosis_key([('fever', 1.0), ('cough', 0.5)], 'top_k=1')
+
+    cache = DiagnosisCache(2)
+    cache.put('a', [('x', 0.5)])
+    cache.put('b', [])
+    assert cache.get('a') == [('x', 0.5)]
+    cache.put('c', [])  # evicts b, the least recently used
+    assert cache.get('b') is None and cache.get('c') == []
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'misses': 1}
+    print(f"  {key}")
+
+
+def test_diagnose_action_and_oneshot():
+    """diagnose leaves the interactive session alone; --oneshot answers one request."""
+    print("\n" + "=" * 60)
+    print("TEST 3: diagnose action and --oneshot")
+    print("=" * 60)
+
+    commands = [
+        {'action': 'start'},
+        {'action': 'add_symptom', 'symptom': 'runny_nose', 'certainty': 0.9},
+        {'action': 'diagnose', 'symptoms': FLU},
+        {'action': 'diagnose', 'symptoms': dict(reversed(list(FLU.items())))},
+        {'action': 'diagnose', 'symptoms': {'fever': 'high'}},
+        {'action': 'diagnose', 'symptoms': ['fever']},
+        {'action': 'get_diagnosis'},
+    ]
+    responses = run_main(''.join(json.dumps(c) + '\n' for c in commands))
+    first, again, bad_certainty, bad_symptoms, session = responses[2:]
+    assert first == again
+    assert set(first) == {'status', 'diagnosis', 'input_hash'}
+    assert first['diagnosis'][0]['disease'] == 'influenza'
+    assert first['input_hash'] == diagnosis_key(FLU.items())
+    assert bad_certainty['error_code'] == 'INVALID_CERTAINTY_TYPE'
+    assert bad_symptoms['error_code'] == 'INVALID_SYMPTOMS'
+    assert session['diagnosis'] == run_main(''.join(json.dumps(c) + '\n' for c in
+                                                    commands[:2] + commands[-1:]))[-1]['diagnosis']
+
+    # The backend writes one JSON document, without a newline, and closes stdin
+    oneshot = run_main(json.dumps({'symptoms': FLU}), '--oneshot')
+    assert oneshot == [first]
+    assert run_main('{"action": "start"}', '--oneshot')[0]['error_code'] == 'INVALID_ACTION'
+    assert run_main('not json', '--oneshot')[0]['error_code'] == 'INVALID_JSON'
+
+    # Repeated requests are served from the cache
+    host = run_main(''.join(json.dumps(c) + '\n' for c in commands[2:4] + [{'action': 'metrics'}]),
+                    '--host')
+    assert host[-1]['metrics']['diagnose_cache'] == {'entries': 1, 'hits': 1, 'misses': 1}
+    print(f"  {first}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("ONE-SHOT DIAGNOSIS TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_diagnose_matches_interactive()
+        test_diagnosis_key()
+        test_diagnose_action_and_oneshot()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
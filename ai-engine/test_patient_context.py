@@ -0,0 +1,207 @@
+"""
+Test script for patient context.
+Checks that patients of one context bucket share a cached profile, that a
+session with a patient evaluates, ranks and explains only the rules that
+apply to it on every engine path, that it only asks questions from its
+pool, and the patient field of main.py's start action.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.codegen import load_compiled_rules
+from src.engine import create_engine
+from src.facts import QUESTION_TEMPLATES
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+from src.patient_context import PatientContexts, parse_patient
+from src.rules.specs import RULE_SPECS, diagnose
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STREP = [('sore_throat', 0.9), ('fever', 0.8), ('swollen_lymph_nodes', 0.8),
+         ('difficulty_swallowing', 0.7)]
+
+
+def test_buckets():
+    """Patients of one bucket share a profile; what the patient did not say prunes nothing."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Context buckets")
+    print("=" * 60)
+
+    kb = builtin_knowledge_base()
+    contexts = PatientContexts(kb.specs, kb.rules_by_symptom, kb.question_templates,
+                               kb.rule_applicability, kb.question_applicability)
+    toddler = contexts.profile(parse_patient({'age': 2, 'existing_conditions': ['Asthma']}))
+    assert contexts.profile(parse_patient(
+        {'age': 0.5, 'gender': 'female', 'existing_conditions': ['asthma', 'eczema']})) is toddler
+    assert {spec.name for spec in RULE_SPECS} - {spec.name for spec in toddler.specs} == {
+        'strep_throat_classic', 'strep_throat_moderate', 'strep_throat_mild',
+        'bronchitis_with_wheezing'}
+    # Only pruned rules read wheezing and the strep throat signs; nausea is
+    # read by no rule and stays
+    assert set(QUESTION_TEMPLATES) - toddler.question_pool == {
+        'loss_of_taste', 'loss_of_smell', 'wheezing', 'swollen_lymph_nodes',
+        'difficulty_swallowing'}
+
+    everyone = contexts.profile(parse_patient({}))
+    adult = contexts.profile(parse_patient({'age': 40, 'gender': 'male'}))
+    for profile in (everyone, adult):
+        assert profile.specs is kb.specs and profile.question_pool is None
+    assert contexts.profile(parse_patient({'age': 3})) is adult
+    assert contexts.stats() == {'buckets': 3, 'hits': 2, 'misses': 3}
+
+    for bad in ({'age': -1}, {'age': True}, {'gender': ''}, {'existing_conditions': 'asthma'},
+                {'weight': 80}, ['asthma']):
+        try:
+            parse_patient(bad)
+        except ValueError as e:
+            print(f"  {bad}: {e}")
+        else:
+            raise AssertionError(f'Invalid patient accepted: {bad}')
+    print(f"  {toddler.describe()}")
+
+
+def test_sessions():
+    """A session with a patient runs only its rules on every engine path."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Sessions with a patient")
+    print("=" * 60)
+
+    rng = random.Random(46)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    kb = KnowledgeBase.from_dict(builtin_knowledge_base().to_dict())
+    patients = [{'age': 2}, {'age': 30, 'existing_conditions': ['copd', 'anosmia']},
+                {'existing_conditions': ['allergic_rhinitis']}, {'gender': 'female'}]
+    configurations = {
+        'experta': create_engine('experta', trace=True),
+        'lite': create_engine('lite', trace=True),
+        'compiled': create_engine('lite', compiled_rules=load_compiled_rules(), trace=True),
+        'top_k=2': create_engine('lite', top_k=2, trace=True),
+        'knowledge base': create_engine('lite', knowledge_base=kb, trace=True),
+    }
+    for name, engine in configurations.items():
+        for _ in range(30):
+            engine.reset_session()
+            patient = parse_patient(rng.choice(patients))
+            profile = engine.set_patient(patient)
+            answers = STREP + [(s, rng.choice([0.0, 0.4, 0.8, 1.0]))
+                               for s in rng.sample(symptoms, rng.randint(0, 8))]
+            for symptom, certainty in answers:
+                engine.answer(symptom, certainty)
+                asked = engine.get_next_question()
+                assert asked is None or asked['symptom'] in (profile.question_pool or symptoms)
+            expected = diagnose(dict(answers), profile.specs)
+            results = engine.get_diagnosis_results()
+            if engine.top_k is None:
+                assert dict(results) == expected
+            else:  # Ties at the k-th place may differ by answer order
+                top = sorted(expected.values(), reverse=True)[:2]
+                assert [cf for _, cf in results] == top
+                assert all(expected[d] == cf for d, cf in results)
+            explained = {rule['rule'] for entry in engine.explain(None) for rule in entry['rules']}
+            assert not explained & profile.inactive
+            while engine.undo() is not None:
+                pass
+            assert engine.diagnoses == {}
+
+        # A reset (a pooled engine's next session) is back on every rule
+        engine.reset_session()
+        assert engine.patient is None and engine.question_engine.question_pool is None
+        for symptom, certainty in STREP:
+            engine.answer(symptom, certainty)
+        assert engine.get_diagnosis_results()[0][0] == 'strep_throat'
+        print(f"  {name}: {engine.get_diagnosis_results()[0]}")
+
+    # A two-year-old with the same answers gets no strep throat, and the
+    # patient is in working memory
+    engine = create_engine('experta')
+    engine.reset_session()
+    engine.set_patient(parse_patient({'age': 2}))
+    for symptom, certainty in STREP:
+        engine.answer(symptom, certainty)
+    assert 'strep_throat' not in engine.diagnoses
+    assert [f['age'] for f in engine.facts.values() if type(f).__name__ == 'PatientInfo'] == [2]
+
+
+def test_start_action():
+    """main.py start takes a patient; knowledge base artifacts carry the conditions."""
+    print("\n" + "=" * 60)
+    print("TEST 3: start with a patient")
+    print("=" * 60)
+
+    data = builtin_knowledge_base().to_dict()
+    assert KnowledgeBase.from_dict(data).version == builtin_knowledge_base().version
+    data.pop('version')
+    data['applicability']['questions']['fever'] = {'genders': ['female']}
+    edited = KnowledgeBase.from_dict(data)
+    engine = create_engine('lite', knowledge_base=edited)
+    engine.reset_session()
+    engine.set_patient(parse_patient({'gender': 'male'}))
+    assert engine.get_initial_question()['symptom'] != 'fever'
+    for bad in ({'fever': {'oldest': 3}}, {'fever': {'min_age': '3'}}):
+        data['applicability']['questions'] = bad
+        try:
+            KnowledgeBase.from_dict(data)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError(f'Invalid condition accepted: {bad}')
+
+    process = subprocess.Popen([sys.executable, 'main.py', '--host'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+    def send(command):
+        process.stdin.write(json.dumps(command) + '\n')
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    try:
+        sessions = []
+        for age in (2, 1, 40):
+            started = send({'action': 'start', 'patient': {'age': age}})
+            sessions.append(started['session_id'])
+        assert started['context']['pruned_rules'] == []
+        for session_id in sessions:
+            for symptom, certainty in STREP:
+                send({'action': 'add_symptom', 'session_id': session_id,
+                      'symptom': symptom, 'certainty': certainty})
+        diagnoses = [send({'action': 'get_diagnosis', 'session_id': s})['diagnosis']
+                     for s in sessions]
+        assert diagnoses[0] == diagnoses[1] and diagnoses[2][0]['disease'] == 'strep_throat'
+        assert 'strep_throat' not in [d['disease'] for d in diagnoses[0]]
+        bad = send({'action': 'start', 'patient': {'age': 200}})
+        assert bad['error_code'] == 'INVALID_PATIENT'
+        metrics = send({'action': 'metrics'})['metrics']
+        assert metrics['patient_contexts'] == {'buckets': 2, 'hits': 1, 'misses': 2}
+        assert metrics['sessions']['active'] == 3
+    finally:
+        process.stdin.close()
+        process.wait()
+    print(f"  {diagnoses[0]}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("PATIENT CONTEXT TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_buckets()
+        test_sessions()
+        test_start_action()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -10,9 +10,12 @@ import os
 # Add the parent directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import random
+
 from src.engine import MedicalDiagnosisEngine
-from src.question_engine import QuestionEngine
-from src.facts import DISEASE_INFO
+from src.knowledge_base import builtin_knowledge_base
+from src.question_engine import QuestionEngine, RELEVANCE_THRESHOLD, information_gain
+from src.facts import DISEASE_INFO, QUESTION_TEMPLATES
 
 
 def test_question_engine():
@@ -162,6 +165,66 @@ def test_information_gain():
     print("\n✓ Information gain tests completed\n")
 
 
+def _reference_next_symptom(asked, diagnoses, pool):
+    """The next question by set operations over the tables."""
+    if diagnoses:
+        diseases = [d for d, cf in diagnoses.items() if cf > RELEVANCE_THRESHOLD]
+    else:
+        diseases = list(DISEASE_INFO)
+    relevant = set()
+    for disease in diseases:
+        relevant.update(DISEASE_INFO.get(disease, {}).get('common_symptoms', []))
+    unasked = (relevant - asked) & pool
+    if not unasked:
+        unasked = (set(QUESTION_TEMPLATES) & pool) - asked
+    if not unasked:
+        return None
+    qe = QuestionEngine()
+    return min(unasked, key=lambda s: (-information_gain(s, DISEASE_INFO, qe.symptom_priorities), s))
+
+
+def test_bitset_selection():
+    """Question selection on symptom bitmasks matches the set-based definition."""
+    print("=" * 70)
+    print("Testing Bitset Question Selection")
+    print("=" * 70)
+    
+    rng = random.Random(49)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    qe = QuestionEngine()
+    for _ in range(500):
+        qe.reset()
+        pool = set(symptoms)
+        if rng.random() < 0.3:
+            pool = frozenset(rng.sample(symptoms, rng.randint(0, len(symptoms))))
+            qe.question_pool = pool
+        asked = set(rng.sample(symptoms, rng.randint(0, len(symptoms))))
+        if rng.random() < 0.2:
+            asked.add('hiccups')  # Answered, though never asked by the engine
+        for symptom in asked:
+            qe.mark_question_asked(symptom, 0.5)
+        diagnoses = {d: rng.random() for d in rng.sample(list(DISEASE_INFO), rng.randint(0, 6))}
+        question = qe.get_next_question(diagnoses)
+        assert (question and question['symptom']) == _reference_next_symptom(asked, diagnoses, pool)
+        assert qe.asked_symptoms == asked and qe.questions_asked == len(asked)
+        
+        undone = rng.choice(sorted(asked)) if asked else None
+        if undone is not None:
+            qe.unmark_question_asked(undone)
+            assert qe.asked_symptoms == asked - {undone}
+    
+    # Engines of one knowledge base share its index; a session is a few ints
+    kb = builtin_knowledge_base()
+    first, second = (MedicalDiagnosisEngine(knowledge_base=kb) for _ in range(2))
+    assert first.question_engine.index is second.question_engine.index is kb.question_index
+    assert QuestionEngine().index is QuestionEngine().index
+    assert list(kb.question_index.scores) == sorted(kb.question_index.scores, reverse=True)
+    print(f"   {len(kb.question_index.symptoms)} symptoms indexed, "
+          f"best first: {kb.question_index.symptoms[:3]}")
+    
+    print("\n✓ Bitset question selection tests completed\n")
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 70)
     print("QUESTION-ASKING LOGIC TEST SUITE")
@@ -171,6 +234,7 @@ if __name__ == '__main__':
         test_question_engine()
         test_integrated_engine()
         test_information_gain()
+        test_bitset_selection()
         
         print("=" * 70)
         print("✓ ALL TESTS PASSED")
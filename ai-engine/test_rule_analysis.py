@@ -0,0 +1,111 @@
+"""
+Test script for the static rule analysis and the execution plan.
+Checks the redundancy found in the rule base and that skipping rules by the
+plan leaves every diagnosis unchanged.
+"""
+
+import random
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES
+from src.rules.specs import RULE_SPECS_BY_NAME, RuleSpec
+from src.rule_analysis import analyze_rules, dominates, redundancy_report, subsumes
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def test_finds_subsumed_rules():
+    """influenza_moderate is covered by influenza_classic at a lower CF."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Subsumption in the rule base")
+    print("=" * 60)
+
+    classic = RULE_SPECS_BY_NAME['influenza_classic']
+    moderate = RULE_SPECS_BY_NAME['influenza_moderate']
+    assert subsumes(classic, moderate)
+    assert not subsumes(moderate, classic)
+    assert not dominates(classic, moderate)
+
+    plan = analyze_rules()
+    assert 'influenza_classic' in plan.subsumers['influenza_moderate']
+    assert plan.rank('influenza_classic') < plan.rank('influenza_moderate')
+    report = redundancy_report(plan)
+    assert 'influenza_moderate' in report
+    print(report)
+
+
+def test_dominance():
+    """A weaker-gated rule with at least the same CF dominates."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Dominance")
+    print("=" * 60)
+
+    strict = RuleSpec('strict', 'flu', 50, 0.6, (
+        (('fever',), 0.7), (('cough',), 0.5)), exclusions=(('runny_nose', 0.3),))
+    loose = RuleSpec('loose', 'flu', 40, 0.7, (
+        (('fever', 'chills'), 0.6),), exclusions=(('runny_nose', 0.5),))
+    other = RuleSpec('other', 'cold', 40, 0.9, ((('fever',), 0.1),))
+
+    assert dominates(loose, strict)
+    assert not dominates(strict, loose)
+    assert not dominates(other, strict)  # different disease
+    plan = analyze_rules([strict, loose, other])
+    assert plan.dominators == {'strict': ('loose',)}
+    assert plan.subsumers == {}
+    print(f"  {plan.to_dict()}")
+
+
+def test_plan_keeps_diagnoses():
+    """An engine running the plan reaches the same diagnoses and questions."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Execution plan matches the full engine")
+    print("=" * 60)
+
+    plan = analyze_rules()
+    rng = random.Random(29)
+    fired = skipped = 0
+    for _ in range(300):
+        full = MedicalDiagnosisEngine()
+        planned = MedicalDiagnosisEngine(plan=plan)
+        full.reset_session()
+        planned.reset_session()
+        symptoms = rng.sample(sorted(QUESTION_TEMPLATES), rng.randint(1, 15))
+        for symptom in symptoms:
+            certainty = rng.choice(CERTAINTY_CHOICES)
+            for engine in (full, planned):
+                engine.record_answer(symptom, certainty)
+                engine.add_symptom(symptom, certainty)
+                engine.run()
+            assert planned.diagnoses == full.diagnoses
+            assert planned.get_next_question() == full.get_next_question()
+        fired += planned.rule_stats['fired']
+        skipped += planned.rule_stats['skipped']
+    assert skipped > 0
+    print(f"  300 sessions matched; fired {fired} rule bodies, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("RULE ANALYSIS TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_finds_subsumed_rules()
+        test_dominance()
+        test_plan_keeps_diagnoses()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
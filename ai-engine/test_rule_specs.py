@@ -0,0 +1,104 @@
+"""
+Test script for the declarative rule specs.
+Checks that RULE_SPECS mirror the @Rule mixins exactly, so that offline tools
+built on the specs agree with the experta engine.
+"""
+
+import random
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES
+from src.rules.specs import RULE_SPECS, RULE_SPECS_BY_NAME, replay_diagnoses
+
+
+CERTAINTY_CHOICES = [0.0, 0.2, 0.3, 0.4, 0.5, 0.6, 0.65, 0.7, 0.8, 0.9, 1.0]
+
+
+def run_engine(answers):
+    """Run the experta engine the way main.py does: one answer, one run."""
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom, certainty in answers:
+        engine.record_answer(symptom, certainty)
+        engine.add_symptom(symptom, certainty)
+        engine.run()
+    return engine.diagnoses
+
+
+def random_session(rng, length):
+    symptoms = rng.sample(sorted(QUESTION_TEMPLATES), length)
+    return [(s, rng.choice(CERTAINTY_CHOICES)) for s in symptoms]
+
+
+def test_specs_cover_every_rule():
+    """Every @Rule on the engine has exactly one spec with the same salience."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Specs cover every rule")
+    print("=" * 60)
+
+    engine = MedicalDiagnosisEngine()
+    rules = {rule.__name__: rule for rule in engine.get_rules()}
+    assert set(rules) == set(RULE_SPECS_BY_NAME), set(rules) ^ set(RULE_SPECS_BY_NAME)
+    for name, rule in rules.items():
+        assert rule.salience == RULE_SPECS_BY_NAME[name].salience, name
+    print(f"  {len(RULE_SPECS)} rules matched")
+
+
+def test_replay_matches_engine():
+    """Replaying answers through the specs gives the engine's diagnoses."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Spec replay matches the experta engine")
+    print("=" * 60)
+
+    rng = random.Random(26)
+    sessions = 300
+    for _ in range(sessions):
+        answers = random_session(rng, rng.randint(1, 15))
+        expected = run_engine(answers)
+        actual = replay_diagnoses(answers)
+        assert actual == expected, f"{answers}: {actual} != {expected}"
+    print(f"  {sessions} random sessions matched")
+
+
+def test_replay_ignores_answer_order():
+    """Exclusions apply whether the excluding symptom was answered first or last."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Answer order")
+    print("=" * 60)
+
+    cold = [('runny_nose', 0.9), ('sneezing', 0.8), ('sore_throat', 0.7)]
+    fever_last = cold + [('fever', 0.9)]
+    fever_first = [('fever', 0.9)] + cold
+
+    assert replay_diagnoses(fever_last) == run_engine(fever_last)
+    assert replay_diagnoses(fever_first) == run_engine(fever_first)
+    assert run_engine(fever_last) == run_engine(fever_first)
+    assert run_engine(fever_last)['common_cold'] < run_engine(cold)['common_cold']
+    print(f"  Fever last:  {replay_diagnoses(fever_last)}")
+    print(f"  Fever first: {replay_diagnoses(fever_first)}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("RULE SPEC CONFORMANCE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_specs_cover_every_rule()
+        test_replay_matches_engine()
+        test_replay_ignores_answer_order()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,122 @@
+"""
+Test script for the what-if (sensitivity) analysis.
+Checks the batched evaluation against replaying each variation through a
+fresh engine, and exercises the sensitivity action of main.py.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES
+from src.sensitivity import analyze_sensitivity
+
+
+def replay(answers):
+    """Build a fresh engine and replay every answer, as main.py would."""
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom, certainty in answers:
+        engine.record_answer(symptom, certainty)
+        engine.add_symptom(symptom, certainty)
+        engine.run()
+    return engine.get_diagnosis_results()
+
+
+def test_matches_engine_replay():
+    """Every variation ranks like a full engine replay of that variation."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Batched variations match engine replays")
+    print("=" * 60)
+
+    rng = random.Random(27)
+    grid = [0.0, 0.3, 0.5, 0.7, 1.0]
+    for _ in range(10):
+        symptoms = rng.sample(sorted(QUESTION_TEMPLATES), rng.randint(3, 10))
+        answers = [(s, rng.choice([0.0, 0.4, 0.6, 0.8, 0.9, 1.0])) for s in symptoms]
+        analysis = analyze_sensitivity(answers, grid)
+
+        assert dict(analysis['baseline']) == dict(replay(answers))
+        for entry in analysis['symptoms']:
+            for variation in entry['variations']:
+                varied = [(s, variation['certainty'] if s == entry['symptom'] else c)
+                          for s, c in answers]
+                assert dict(variation['diagnosis']) == dict(replay(varied)), varied
+    print("  10 sessions x every answer x 5 grid points matched")
+
+
+def test_influenza_fever_example():
+    """Lowering fever takes influenza off the top of a classic flu case."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Fever sensitivity for classic influenza")
+    print("=" * 60)
+
+    answers = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+    analysis = analyze_sensitivity(answers, [0.4, 0.9], symptoms=['fever'])
+    fever = analysis['symptoms'][0]
+
+    assert analysis['baseline'][0][0] == 'influenza'
+    assert fever['variations'][0]['top'] is None
+    assert fever['variations'][1]['top'] == 'influenza'
+    assert fever['top_changes']
+    for variation in fever['variations']:
+        print(f"  fever={variation['certainty']}: {variation['diagnosis']}")
+
+
+def test_sensitivity_action():
+    """main.py returns the analysis for the current session."""
+    print("\n" + "=" * 60)
+    print("TEST 3: sensitivity action")
+    print("=" * 60)
+
+    commands = [
+        {'action': 'start'},
+        {'action': 'add_symptom', 'symptom': 'fever', 'certainty': 0.9},
+        {'action': 'add_symptom', 'symptom': 'dry_cough', 'certainty': 0.8},
+        {'action': 'add_symptom', 'symptom': 'loss_of_taste', 'certainty': 0.9},
+        {'action': 'sensitivity', 'grid': [0.0, 0.5, 1.0]},
+        {'action': 'sensitivity', 'grid': [2.0]},
+    ]
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, 'main.py'], input=stdin,
+                            capture_output=True, text=True, cwd=here)
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+
+    analysis = responses[4]
+    assert analysis['status'] == 'success', analysis
+    assert analysis['grid'] == [0.0, 0.5, 1.0]
+    assert [e['symptom'] for e in analysis['sensitivity']] == ['fever', 'dry_cough', 'loss_of_taste']
+    assert analysis['diagnosis'][0]['disease'] == 'covid-19'
+    for entry in analysis['sensitivity']:
+        tops = [v['top'] for v in entry['variations']]
+        print(f"  {entry['symptom']} (answered {entry['answered']}): top by grid point {tops}")
+
+    assert responses[5]['error_code'] == 'INVALID_GRID'
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("SENSITIVITY ANALYSIS TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_matches_engine_replay()
+        test_influenza_fever_example()
+        test_sensitivity_action()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,168 @@
+"""
+Test script for shadow evaluation of a candidate knowledge base.
+Checks the divergences found against the rule specs, session sampling,
+dropping work when the queue is full, and the --shadow-kb host option.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import uuid
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import create_engine
+from src.facts import QUESTION_TEMPLATES
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+from src.rules.specs import diagnose
+from src.shadow import ShadowEvaluator
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+
+
+def weaker_influenza():
+    data = builtin_knowledge_base().to_dict()
+    for rule in data['rules']:
+        if rule['disease'] == 'influenza':
+            rule['rule_cf'] = 0.3
+    del data['version']
+    return KnowledgeBase.from_dict(data)
+
+
+def test_divergences():
+    """Only answers the candidate diagnoses differently are divergent."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Divergences")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, 'shadow.jsonl')
+        same = ShadowEvaluator(KnowledgeBase.from_dict(builtin_knowledge_base().to_dict()), log)
+        weaker = ShadowEvaluator(weaker_influenza(), log)
+
+    rng = random.Random(41)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    engine = create_engine('lite')
+    diverged = 0
+    for _ in range(200):
+        answers = FLU[:rng.randint(0, len(FLU))] + [
+            (s, rng.choice([0.0, 0.4, 0.7, 0.9, 1.0])) for s in rng.sample(symptoms, rng.randint(1, 6))]
+        diagnoses = dict(engine.diagnose(answers))
+        assert same.compare(answers, diagnoses) is None
+        divergence = weaker.compare(answers, diagnoses)
+        expected = diagnose(dict(answers), weaker.candidate.specs)
+        if 'influenza' not in diagnoses:
+            assert divergence is None
+            continue
+        diverged += 1
+        assert divergence['deltas'] == {
+            'influenza': round(expected['influenza'] - diagnoses['influenza'], 6)}
+        top = max(expected.items(), key=lambda x: x[1])
+        assert divergence['top']['candidate'][1] == top[1]
+    print(f"  {diverged} of 200 answer sets diverged")
+
+
+def test_sampling_and_shedding():
+    """Sessions are sampled by id; a full queue drops work instead of waiting."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Sampling and shedding")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        shadow = ShadowEvaluator(weaker_influenza(), os.path.join(directory, 'shadow.jsonl'),
+                                 sample=0.25, queue_size=2)
+        ids = [uuid.uuid4().hex for _ in range(4000)]
+        fraction = sum(map(shadow.sampled, ids)) / len(ids)
+        assert 0.2 < fraction < 0.3
+        assert all(shadow.sampled(i) == shadow.sampled(i) for i in ids[:100])
+
+        engine = create_engine('lite')
+        engine.diagnose(FLU)
+        session = next(i for i in ids if shadow.sampled(i))
+        assert not shadow.submit(next(i for i in ids if not shadow.sampled(i)), engine)
+        queued = [shadow.submit(session, engine) for _ in range(5)]
+        assert queued == [True, True, False, False, False]
+
+        shadow.start()
+        shadow.stop()
+        stats = shadow.stats()
+        assert (stats['submitted'], stats['dropped'], stats['evaluated'], stats['diverged']) == (2, 3, 2, 2)
+        with open(shadow.log_path) as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 2 and records[0]['answers'] == [list(a) for a in FLU]
+    print(f"  sampled {fraction:.3f} of sessions; {stats}")
+
+
+def test_host_option():
+    """main.py --host --shadow-kb logs the divergent answers of sampled sessions."""
+    print("\n" + "=" * 60)
+    print("TEST 3: --shadow-kb")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        candidate = os.path.join(directory, 'kb.json')
+        log = os.path.join(directory, 'shadow.jsonl')
+        weaker_influenza().save(candidate)
+        process = subprocess.Popen(
+            [sys.executable, 'main.py', '--host', '--shadow-kb', candidate,
+             '--shadow-sample', '1', '--shadow-log', log],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, cwd=HERE)
+
+        def send(command):
+            process.stdin.write(json.dumps(command) + '\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        try:
+            session_id = send({'action': 'start'})['session_id']
+            for symptom, certainty in FLU:
+                send({'action': 'add_symptom', 'session_id': session_id,
+                      'symptom': symptom, 'certainty': certainty})
+            send({'action': 'edit_answer', 'session_id': session_id,
+                  'symptom': 'cough', 'certainty': 0.8})
+            stats = send({'action': 'metrics'})['metrics']['shadow']
+            assert stats['submitted'] == 5 and stats['dropped'] == 0
+        finally:
+            process.stdin.close()
+            process.wait()
+
+        with open(log) as f:
+            records = [json.loads(line) for line in f]
+        # Influenza is concluded once body aches, fatigue and cough are in
+        assert [len(r['answers']) for r in records] == [4, 4]
+        assert all(r['session_id'] == session_id and r['top']['primary'][0] == 'influenza'
+                   for r in records)
+        assert records[-1]['deltas']['influenza'] < 0
+        assert records[-1]['version'] == builtin_knowledge_base().version
+
+        error = subprocess.run([sys.executable, 'main.py', '--shadow-kb', candidate],
+                               input='', capture_output=True, text=True, cwd=HERE)
+        assert error.returncode == 2 and '--shadow-kb needs --host' in error.stderr
+    print(f"  {stats}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("SHADOW EVALUATION TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_divergences()
+        test_sampling_and_shedding()
+        test_host_option()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
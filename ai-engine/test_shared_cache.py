@@ -0,0 +1,213 @@
+"""
+Test script for the cross-process shared diagnosis cache.
+Checks that results written by one process are read by another, the
+versioned slots, eviction and the statistics, and that results of a
+loaded knowledge base are shared too.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import create_engine
+from src.knowledge_base import KnowledgeBase, builtin_knowledge_base
+from src.oneshot import diagnose_answers, diagnosis_key, quantize_answers
+from src.shared_cache import PROBE_LENGTH, SharedResultCache, shared_cache_exists
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLU = {'fever': 0.9, 'body_aches': 0.8, 'fatigue': 0.7, 'cough': 0.6}
+
+
+def cache_name():
+    return f'dx-test-{uuid.uuid4().hex[:8]}'
+
+
+def oneshot(name, symptoms, *options):
+    result = subprocess.run([sys.executable, 'main.py', '--oneshot', '--shared-cache', name,
+                             *options],
+                            input=json.dumps({'symptoms': symptoms}),
+                            capture_output=True, text=True, cwd=HERE)
+    return json.loads(result.stdout)
+
+
+def test_shared_between_processes():
+    """A result computed by one worker is served to the others."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Shared between processes")
+    print("=" * 60)
+
+    name = cache_name()
+    try:
+        first = oneshot(name, FLU)
+        # Float noise quantizes to the same key
+        second = oneshot(name, dict(FLU, cough=0.6000000000000001))
+        assert first == second
+
+        cache = SharedResultCache(name)
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['inserts'], stats['occupied']) == (1, 1, 1, 1)
+        assert stats['hit_rate'] == 0.5
+
+        # The stored result is what this process computes
+        answers = quantize_answers(FLU.items())
+        results = cache.get(diagnosis_key(answers))
+        assert results == diagnose_answers(create_engine(), answers)
+        assert [disease for disease, _ in results] == [
+            entry['disease'] for entry in first['diagnosis']]
+
+        # Statistics from the command line
+        output = subprocess.run([sys.executable, 'cache_stats.py', name, '--json'],
+                                capture_output=True, text=True, cwd=HERE).stdout
+        assert json.loads(output)['inserts'] == 1
+        cache.close()
+    finally:
+        subprocess.run([sys.executable, 'cache_stats.py', name, '--unlink'],
+                       capture_output=True, cwd=HERE)
+    assert not shared_cache_exists(name)
+    print(f"  {stats}")
+
+
+def test_versioned_slots_and_eviction():
+    """A slot being written reads as a miss; full probe windows evict."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Versioned slots and eviction")
+    print("=" * 60)
+
+    cache = SharedResultCache(cache_name(), slots=PROBE_LENGTH)
+    try:
+        key = diagnosis_key([('fever', 1.0)])
+        assert cache.put(key, [('influenza', 0.5), ('covid-19', 0.5)])
+        assert cache.get(key) == [('influenza', 0.5), ('covid-19', 0.5)]
+
+        slot = next(s for s in range(cache.slots) if cache._version[s])
+        version = int(cache._version[slot])
+        cache._version[slot] = version + 1  # as a writer mid-update leaves it
+        assert cache.get(key) is None
+        cache._version[slot] = version + 2
+        assert cache.get(key) is not None
+
+        # Overwriting a key reuses its slot
+        assert cache.put(key, [])
+        assert cache.get(key) == []
+        assert cache.stats()['occupied'] == 1
+
+        # Outside the schema, or more diseases than a slot holds: not stored
+        assert not cache.put(key, [('measles', 0.9)])
+        assert not cache.put(key, [('influenza', 0.5)] * (cache.max_diseases + 1))
+        assert cache.stats()['skipped'] == 2
+
+        keys = [diagnosis_key([('fever', i / 100)]) for i in range(3 * PROBE_LENGTH)]
+        for i, other in enumerate(keys):
+            cache.put(other, [('influenza', i / 100)])
+        stats = cache.stats()
+        assert stats['occupied'] == cache.slots
+        assert stats['evictions'] == len(keys) + 1 - cache.slots
+        assert cache.get(keys[-1]) == [('influenza', (len(keys) - 1) / 100)]
+    finally:
+        cache.unlink()
+        cache.close()
+    print(f"  {stats}")
+
+
+def test_layout_check():
+    """A segment that is not a compatible cache is refused."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Layout check")
+    print("=" * 60)
+
+    name = cache_name()
+    cache = SharedResultCache(name, slots=64)
+    try:
+        cache._header['schema'] += 1
+        try:
+            SharedResultCache(name)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError('Incompatible cache accepted')
+    finally:
+        cache.unlink()
+        cache.close()
+
+
+def measles_artifact(path):
+    """The built-in knowledge base with a disease and a symptom of its own added."""
+    data = builtin_knowledge_base().to_dict()
+    data['rules'].append({
+        'name': 'measles_classic', 'disease': 'measles', 'salience': 100, 'rule_cf': 0.9,
+        'gates': [[['fever'], 0.6], [['koplik_spots'], 0.6]], 'exclusions': [],
+    })
+    data['question_templates']['koplik_spots'] = 'Do you have small white spots inside your cheeks?'
+    data['disease_info']['measles'] = {
+        'name': 'Measles', 'category': 'viral', 'description': 'A contagious viral infection',
+        'common_symptoms': ['fever', 'koplik_spots'],
+    }
+    del data['version']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return KnowledgeBase.load(path)
+
+
+def test_loaded_knowledge_base():
+    """Results naming diseases the built-in knowledge base lacks are shared too."""
+    print("\n" + "=" * 60)
+    print("TEST 4: Loaded knowledge base")
+    print("=" * 60)
+
+    name = cache_name()
+    symptoms = {'fever': 0.9, 'koplik_spots': 0.9}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'kb.json')
+        loaded = measles_artifact(path)
+        try:
+            first = oneshot(name, symptoms, '--kb', path)
+            assert first['diagnosis'][0]['disease'] == 'measles'
+            assert first == oneshot(name, symptoms, '--kb', path)
+
+            cache = SharedResultCache(name, knowledge_base=loaded)
+            stats = cache.stats()
+            assert (stats['hits'], stats['inserts'], stats['skipped']) == (1, 1, 0)
+            answers = quantize_answers(symptoms.items())
+            results = cache.get(diagnosis_key(answers, f'kb={loaded.version}'))
+            assert results[0][0] == 'measles'
+
+            # The built-in knowledge base has its own keys, and cannot store measles
+            oneshot(name, symptoms)
+            assert cache.stats()['inserts'] == 2
+            cache.use(None)
+            assert not cache.put(diagnosis_key(answers), [('measles', 0.9)])
+            assert cache.stats()['skipped'] == 1
+            cache.close()
+        finally:
+            subprocess.run([sys.executable, 'cache_stats.py', name, '--unlink'],
+                           capture_output=True, cwd=HERE)
+    print(f"  {stats}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("SHARED CACHE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_shared_between_processes()
+        test_versioned_slots_and_eviction()
+        test_layout_check()
+        test_loaded_knowledge_base()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
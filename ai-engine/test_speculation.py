@@ -0,0 +1,213 @@
+"""
+Test script for speculative answers in the multi-session host.
+Checks the Speculator's bookkeeping (hits, misses, cancelling, bounds and
+giving way to requests), that working out a branch leaves the session's
+engine as it was, and that main.py --host --speculate answers exactly as
+it does without.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import progress_response
+from src.engine import create_engine
+from src.patient_context import parse_patient
+from src.speculation import Speculator, parse_certainties
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_speculator():
+    """Branches are computed while idle, used once, cancelled and bounded."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Speculator")
+    print("=" * 60)
+
+    assert parse_certainties('1,0.5,0,1.0') == (1.0, 0.5, 0.0)
+    for bad in ('yes', '1.5', ','.join(['0.1'] * 2 + [str(i / 10) for i in range(9)])):
+        try:
+            parse_certainties(bad)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError(f'Invalid certainties accepted: {bad}')
+
+    computed = []
+
+    def compute(engine, symptom, certainty):
+        computed.append((engine, symptom, certainty))
+        return {'engine': engine, 'symptom': symptom, 'certainty': certainty}
+
+    engines = {'a': 'engine-a', 'b': 'engine-b', 'c': 'engine-c'}
+    speculation = Speculator(compute, (1.0, 0.5, 0.0), max_sessions=2)
+    speculation.expect('a', 'fever')
+    speculation.expect('b', 'cough')
+
+    # A request waiting stops the work after the branch in progress
+    requests = iter([False, True])
+    assert speculation.run(engines.get, lambda: next(requests)) == 1
+    assert computed == [('engine-a', 'fever', 1.0)]
+    assert speculation.run(engines.get, lambda: False) == 5
+    assert speculation.run(engines.get, lambda: False) == 0
+
+    assert speculation.take('a', 'fever', 0.5)['certainty'] == 0.5
+    assert speculation.take('a', 'fever', 0.5) is None  # Used up, and not a miss
+    assert speculation.take('b', 'cough', 0.7) is None  # Not a likely answer
+    stats = speculation.stats()
+    assert (stats['hits'], stats['misses'], stats['unused'], stats['hit_rate']) == (1, 1, 5, 0.5)
+
+    # The session changed, or ended: its branches go
+    speculation.expect('a', 'headache')
+    speculation.cancel('a')
+    speculation.expect('b', 'fatigue')
+    speculation.expect('b', None)
+    assert not speculation.sessions and speculation.stats()['cancelled'] == 6
+
+    # The oldest sessions are dropped past max_sessions; gone engines too
+    for session_id in 'abc':
+        speculation.expect(session_id, 'fever')
+    assert list(speculation.sessions) == ['b', 'c']
+    del engines['b']
+    assert speculation.run(engines.get, lambda: False) == 3
+    assert list(speculation.sessions) == ['c']
+
+    def failing(engine, symptom, certainty):
+        raise RuntimeError('no')
+
+    speculation.compute = failing
+    speculation.expect('c', 'cough')
+    assert speculation.run(engines.get, lambda: False) == 0
+    assert speculation.stats()['errors'] == 1 and not speculation.sessions
+    print(f"  {speculation.stats()}")
+
+
+def _state(engine):
+    return (
+        sorted(engine.get_answers()),
+        sorted(engine.diagnoses.items()),
+        sorted(engine.question_engine.asked_symptoms),
+        list(engine.questions_asked),
+        len(engine.history),
+        engine.should_continue_asking(),
+        engine.get_next_question(),
+        engine.get_diagnosis_results(),
+    )
+
+
+def test_branch_leaves_engine():
+    """Answering, responding and undoing gives the real response and changes nothing."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Branches leave the engine as it was")
+    print("=" * 60)
+
+    answers = [('fever', 0.9), ('cough', 0.6), ('loss_of_smell', 0.8)]
+    for backend, options, patient in (('experta', {}, None), ('lite', {}, None),
+                                      ('experta', {'top_k': 2}, None),
+                                      ('experta', {}, {'age': 4})):
+        session = create_engine(backend, **options)
+        session.reset_session()
+        if patient is not None:
+            session.set_patient(parse_patient(patient))
+        for symptom, certainty in answers:
+            session.answer(symptom, certainty)
+        before = _state(session)
+        question = session.get_next_question()['symptom']
+
+        for certainty in (1.0, 0.5, 0.0):
+            session.answer(question, certainty)
+            speculated = progress_response(session, 'Symptom recorded')
+            session.undo()
+            assert _state(session) == before
+
+            real = create_engine(backend, **options)
+            real.reset_session()
+            if patient is not None:
+                real.set_patient(parse_patient(patient))
+            for symptom, answered in answers + [(question, certainty)]:
+                real.answer(symptom, answered)
+            assert speculated == progress_response(real, 'Symptom recorded')
+        print(f"  {backend} {options or ''}{patient or ''}: {question} ok")
+
+
+def test_main_speculation():
+    """main.py --host --speculate gives the same responses, and reports its hits."""
+    print("\n" + "=" * 60)
+    print("TEST 3: main.py --host --speculate")
+    print("=" * 60)
+
+    def run(*options):
+        process = subprocess.Popen([sys.executable, 'main.py', '--host', *options],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                   bufsize=1, cwd=HERE)
+
+        def send(command):
+            process.stdin.write(json.dumps(command) + '\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        responses = []
+        try:
+            for number in range(4):
+                response = send({'action': 'start'})
+                session_id = response['session_id']
+                answered = 0
+                while 'next_question' in response:
+                    time.sleep(0.01)  # The user reading the question
+                    symptom = response['next_question']['symptom']
+                    if answered == 2:
+                        # A change of mind drops the pending branches
+                        responses.append(send({'action': 'undo', 'session_id': session_id}))
+                        symptom = responses[-1]['next_question']['symptom']
+                    certainty = (1.0, 0.5, 0.0, 0.65)[(answered + number) % 4]
+                    response = send({'action': 'add_symptom', 'session_id': session_id,
+                                     'symptom': symptom, 'certainty': certainty})
+                    responses.append(response)
+                    answered += 1
+                send({'action': 'end_session', 'session_id': session_id})
+            metrics = send({'action': 'metrics'})['metrics']
+        finally:
+            process.stdin.close()
+            process.wait()
+        return responses, metrics
+
+    plain, _ = run()
+    speculated, metrics = run('--speculate')
+    assert plain == speculated
+    stats = metrics['speculation']
+    assert stats['hits'] > 0 and stats['misses'] > 0 and stats['unused'] > 0
+    assert stats['hits'] + stats['misses'] == sum(
+        1 for response in speculated if response.get('message') != 'Answer undone')
+    assert stats['sessions'] == 0 and stats['errors'] == 0
+
+    result = subprocess.run([sys.executable, 'main.py', '--speculate'], cwd=HERE,
+                            capture_output=True, text=True)
+    assert result.returncode == 2 and '--speculate needs --host' in result.stderr
+    print(f"  {stats}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("SPECULATION TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_speculator()
+        test_branch_leaves_engine()
+        test_main_speculation()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
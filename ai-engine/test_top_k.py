@@ -0,0 +1,122 @@
+"""
+Test script for top-k evaluation.
+Runs the same sessions through a full engine and a top-k engine and checks
+that the top diagnoses, the questions asked and the stopping point agree.
+"""
+
+import random
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def step(engine, symptom, certainty):
+    """Apply one answer the way main.py does."""
+    engine.record_answer(symptom, certainty)
+    engine.add_symptom(symptom, certainty)
+    engine.run()
+    if engine.should_continue_asking():
+        return engine.get_next_question()
+    return None
+
+
+def assert_same_top_k(full, top, k):
+    expected = full.get_diagnosis_results()[:k]
+    actual = top.get_diagnosis_results()
+    assert len(actual) == len(expected), (actual, expected)
+    assert [cf for _, cf in actual] == [cf for _, cf in expected], (actual, expected)
+    for disease, cf in actual:
+        assert full.diagnoses[disease] == cf, (disease, actual, expected)
+
+
+def test_question_flow_matches_full_engine():
+    """Sessions driven by the engine's own questions behave identically."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Question flow matches the full engine")
+    print("=" * 60)
+
+    rng = random.Random(28)
+    for k in (1, 2, 3):
+        for _ in range(100):
+            full = MedicalDiagnosisEngine()
+            top = MedicalDiagnosisEngine(top_k=k)
+            full.reset_session()
+            top.reset_session()
+            question = full.get_initial_question()
+            while question is not None:
+                certainty = rng.choice(CERTAINTY_CHOICES)
+                expected = step(full, question['symptom'], certainty)
+                assert step(top, question['symptom'], certainty) == expected
+                assert_same_top_k(full, top, k)
+                question = expected
+        print(f"  k={k}: 100 sessions matched")
+
+
+def test_random_answers_match_full_engine():
+    """Arbitrary answer orders give the same top k and the same next question."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Random answer orders")
+    print("=" * 60)
+
+    rng = random.Random(280)
+    fired = skipped = 0
+    for _ in range(300):
+        k = rng.randint(1, 3)
+        full = MedicalDiagnosisEngine()
+        top = MedicalDiagnosisEngine(top_k=k)
+        full.reset_session()
+        top.reset_session()
+        symptoms = rng.sample(sorted(QUESTION_TEMPLATES), rng.randint(1, 15))
+        for symptom in symptoms:
+            certainty = rng.choice(CERTAINTY_CHOICES)
+            assert step(top, symptom, certainty) == step(full, symptom, certainty)
+            assert top.should_continue_asking() == full.should_continue_asking()
+            assert_same_top_k(full, top, k)
+        fired += top.rule_stats['fired']
+        skipped += top.rule_stats['skipped']
+    assert skipped > 0
+    print(f"  300 sessions matched; fired {fired} rule bodies, skipped {skipped}")
+
+
+def test_default_engine_is_unchanged():
+    """Without top_k no rule is skipped and all diagnoses are ranked."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Default mode")
+    print("=" * 60)
+
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom in ('runny_nose', 'sneezing', 'sore_throat', 'cough'):
+        step(engine, symptom, 0.9)
+    assert engine.rule_stats['skipped'] == 0
+    assert len(engine.get_diagnosis_results()) == len(engine.diagnoses)
+    print(f"  {engine.get_diagnosis_results()}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("TOP-K EVALUATION TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_question_flow_matches_full_engine()
+        test_random_answers_match_full_engine()
+        test_default_engine_is_unchanged()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
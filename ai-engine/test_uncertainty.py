@@ -0,0 +1,132 @@
+"""
+Test script for Monte Carlo uncertainty bands.
+Checks the batched samples against the rule specs, the summary statistics,
+the latency budget, and the uncertainty option of get_diagnosis.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.facts import QUESTION_TEMPLATES
+from src.rules.specs import diagnose
+from src.uncertainty import analyze_uncertainty, sample_answers
+
+
+FLU = [('fever', 0.9), ('body_aches', 0.8), ('fatigue', 0.7), ('cough', 0.6)]
+
+
+def test_samples_match_specs():
+    """Every sampled row evaluates like diagnose() on that row."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Sampled rows match the rule specs")
+    print("=" * 60)
+
+    answers = FLU + [('dry_cough', 0.6), ('loss_of_taste', 0.6), ('runny_nose', 0.5),
+                     ('sneezing', 0.5), ('sore_throat', 0.5)]
+    for noise in ('gaussian', 'uniform'):
+        evaluator, X = sample_answers(answers, 300, noise, 0.2, np.random.default_rng(34))
+        assert X.min() >= 0.0 and X.max() <= 1.0
+        results = evaluator.evaluate(X)
+        for row, result in zip(X, results):
+            certainties = dict(zip(evaluator.symptoms, row))
+            assert dict(evaluator.ranked(result)) == diagnose(certainties)
+    print("  600 samples matched")
+
+
+def test_bands_and_rank_probabilities():
+    """Without noise the bands collapse; near a threshold the diagnosis is fragile."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Bands and P(first)")
+    print("=" * 60)
+
+    exact = analyze_uncertainty(FLU, samples=50, scale=0.0)
+    assert exact['diseases'] == [{
+        'disease': 'influenza', 'bands': [diagnose(dict(FLU))['influenza']] * 3,
+        'p_concluded': 1.0, 'p_first': 1.0,
+    }]
+
+    # Loss of taste right at covid19_taste_smell_only's 0.7 threshold:
+    # about half the samples drop the diagnosis
+    fragile = analyze_uncertainty([('loss_of_taste', 0.7)], samples=4000, seed=1)
+    covid = fragile['diseases'][0]
+    assert covid['disease'] == 'covid-19'
+    assert 0.4 < covid['p_concluded'] < 0.6
+    assert abs(fragile['no_diagnosis'] + covid['p_first'] - 1.0) < 1e-9
+    assert covid['bands'][0] == 0.0 < covid['bands'][-1]
+
+    # Same seed, same result
+    assert analyze_uncertainty(FLU, seed=7) == analyze_uncertainty(FLU, seed=7)
+    print(f"  Fragile COVID-19: {covid}")
+
+
+def test_latency_budget():
+    """Thousands of samples over a full session stay within tens of ms."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Latency")
+    print("=" * 60)
+
+    answers = [(symptom, 0.6) for symptom in sorted(QUESTION_TEMPLATES)]
+    analyze_uncertainty(answers, samples=2000)
+    start = time.perf_counter()
+    for _ in range(10):
+        analyze_uncertainty(answers, samples=2000)
+    elapsed = (time.perf_counter() - start) * 100
+    assert elapsed < 50, elapsed
+    print(f"  {len(answers)} answers x 2000 samples: {elapsed:.1f} ms")
+
+
+def test_get_diagnosis_uncertainty_option():
+    """get_diagnosis returns bands on request and rejects bad options."""
+    print("\n" + "=" * 60)
+    print("TEST 4: get_diagnosis with uncertainty")
+    print("=" * 60)
+
+    commands = [{'action': 'start'}]
+    commands += [{'action': 'add_symptom', 'symptom': s, 'certainty': c} for s, c in FLU]
+    commands += [
+        {'action': 'get_diagnosis', 'uncertainty': {'samples': 500, 'seed': 1}},
+        {'action': 'get_diagnosis', 'uncertainty': {'noise': 'cauchy'}},
+        {'action': 'get_diagnosis'},
+    ]
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, 'main.py'], input=stdin,
+                            capture_output=True, text=True, cwd=here)
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+
+    bands = responses[-3]['uncertainty']
+    assert bands['samples'] == 500
+    assert bands['diseases'][0]['disease'] == 'influenza'
+    assert responses[-2]['error_code'] == 'INVALID_UNCERTAINTY'
+    assert 'uncertainty' not in responses[-1]
+    print(f"  {bands}")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("UNCERTAINTY TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_samples_match_specs()
+        test_bands_and_rank_probabilities()
+        test_latency_budget()
+        test_get_diagnosis_uncertainty_option()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,219 @@
+"""
+Test script for undoing and editing answers.
+Checks that rolling back checkpoints restores exactly the state a fresh
+session reaches with the remaining answers.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.engine import MedicalDiagnosisEngine
+from src.facts import QUESTION_TEMPLATES
+from src.decision_tree import DecisionTreeSession, compile_question_flow
+
+
+CERTAINTY_CHOICES = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def state(engine):
+    """Everything the protocol can observe about a session."""
+    return (
+        dict(engine.get_answers()),
+        engine.diagnoses,
+        sorted(engine.question_engine.asked_symptoms),
+        engine.should_continue_asking(),
+        engine.get_next_question(),
+    )
+
+
+def fresh_state(answers, **options):
+    engine = MedicalDiagnosisEngine(**options)
+    engine.reset_session()
+    for symptom, certainty in answers:
+        engine.answer(symptom, certainty)
+    return state(engine)
+
+
+def live_results(answers):
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom, certainty in answers:
+        engine.answer(symptom, certainty)
+    return engine.get_diagnosis_results()
+
+
+def test_undo_restores_earlier_steps():
+    """Undoing back through a session passes through every earlier state."""
+    print("\n" + "=" * 60)
+    print("TEST 1: Undo through random sessions")
+    print("=" * 60)
+
+    rng = random.Random(31)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    for options in ({}, {'top_k': 2}):
+        for _ in range(60):
+            engine = MedicalDiagnosisEngine(**options)
+            engine.reset_session()
+            answers = []
+            for _ in range(rng.randint(1, 12)):
+                # Mostly new answers, sometimes a re-answer
+                symptom = rng.choice([s for s, _ in answers] if answers and rng.random() < 0.3
+                                     else symptoms)
+                certainty = rng.choice(CERTAINTY_CHOICES)
+                engine.answer(symptom, certainty)
+                answers.append((symptom, certainty))
+                # New work after an undo must still land in the right state
+                if rng.random() < 0.2:
+                    engine.undo()
+                    answers.pop()
+                assert state(engine) == fresh_state(answers, **options)
+
+            while answers:
+                checkpoint = engine.undo()
+                assert (checkpoint.symptom, checkpoint.certainty) == answers.pop()
+                assert state(engine) == fresh_state(answers, **options)
+            assert engine.undo() is None
+    print("  120 sessions rolled back")
+
+
+def test_undo_keeps_ranking_order():
+    """Undo restores the order of tied diagnoses, not just their certainties."""
+    print("\n" + "=" * 60)
+    print("TEST 2: Undo keeps the ranking of ties")
+    print("=" * 60)
+
+    rng = random.Random(131)
+    symptoms = sorted(QUESTION_TEMPLATES)
+    tied = reordered = 0
+    for options in ({}, {'top_k': 2}):
+        for _ in range(60):
+            engine = MedicalDiagnosisEngine(**options)
+            engine.reset_session()
+            for _ in range(rng.randint(1, 10)):
+                # Yes/no answers give many equal certainties
+                engine.answer(rng.choice(symptoms), rng.choice([0.0, 1.0]))
+            before = (list(engine.diagnoses.items()), engine.get_diagnosis_results())
+            certainties = [certainty for _, certainty in before[0]]
+            tied += len(set(certainties)) < len(certainties)
+            for symptom in rng.sample(symptoms, 4):
+                engine.answer(symptom, rng.choice(CERTAINTY_CHOICES))
+                reordered += engine.history[-1].order is not None
+                engine.undo()
+                assert (list(engine.diagnoses.items()), engine.get_diagnosis_results()) == before
+    assert tied and reordered
+    print(f"  {tied} sessions with ties, {reordered} answers that reordered the diagnoses")
+
+
+def test_edit_answer():
+    """Editing recomputes the dependent diagnoses and can be undone."""
+    print("\n" + "=" * 60)
+    print("TEST 3: Edit an answer")
+    print("=" * 60)
+
+    answers = [('fever', 0.9), ('body_aches', 0.9), ('fatigue', 0.8), ('cough', 0.7)]
+    engine = MedicalDiagnosisEngine()
+    engine.reset_session()
+    for symptom, certainty in answers:
+        engine.answer(symptom, certainty)
+    before = state(engine)
+
+    engine.edit_answer('fever', 0.2)
+    edited = [('fever', 0.2)] + answers[1:]
+    assert state(engine) == fresh_state(edited)
+    assert 'influenza' not in engine.diagnoses
+
+    engine.undo()
+    assert state(engine) == before
+
+    try:
+        engine.edit_answer('wheezing', 0.5)
+        assert False, "editing an unanswered symptom should fail"
+    except KeyError:
+        pass
+    print(f"  Diagnoses after undoing the edit: {engine.diagnoses}")
+
+
+def test_tree_session_undo():
+    """A decision-tree session walks back up the tree, and edits go live."""
+    print("\n" + "=" * 60)
+    print("TEST 4: Undo on a decision-tree session")
+    print("=" * 60)
+
+    session = DecisionTreeSession(compile_question_flow(max_depth=4))
+    session.reset_session()
+    session.answer('fever', 1.0)
+    second = session.get_next_question()['symptom']
+    session.answer(second, 0.0)
+    assert session.on_tree
+
+    session.undo()
+    assert session.get_next_question()['symptom'] == second
+    session.edit_answer('fever', 0.5)
+    assert not session.on_tree
+    assert session.get_diagnosis_results() == live_results([('fever', 0.5)])
+    session.undo()
+    assert session.get_answers() == [('fever', 1.0)]
+    print(f"  Tree steps {session.tree_steps}, live steps {session.fallback_steps}")
+
+
+def test_main_undo_and_edit():
+    """main.py exposes undo and edit_answer."""
+    print("\n" + "=" * 60)
+    print("TEST 5: undo and edit_answer actions")
+    print("=" * 60)
+
+    commands = [
+        {'action': 'start'},
+        {'action': 'undo'},
+        {'action': 'add_symptom', 'symptom': 'fever', 'certainty': 0.9},
+        {'action': 'add_symptom', 'symptom': 'cough', 'certainty': 0.8},
+        {'action': 'edit_answer', 'symptom': 'fever', 'certainty': 0.4},
+        {'action': 'edit_answer', 'symptom': 'wheezing', 'certainty': 0.4},
+        {'action': 'undo', 'steps': 2},
+        {'action': 'undo', 'steps': 0},
+    ]
+    stdin = ''.join(json.dumps(c) + '\n' for c in commands)
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, 'main.py'], input=stdin,
+                            capture_output=True, text=True, cwd=here)
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+    for response in responses:
+        print(f"  {response}")
+
+    assert responses[1]['error_code'] == 'NOTHING_TO_UNDO'
+    assert responses[4]['message'] == 'Answer updated'
+    assert responses[5]['error_code'] == 'NOT_ANSWERED'
+    assert responses[6]['undone'] == [
+        {'symptom': 'fever', 'certainty': 0.4}, {'symptom': 'cough', 'certainty': 0.8}
+    ]
+    assert responses[6]['next_question']['symptom'] == 'cough'
+    assert responses[7]['error_code'] == 'INVALID_STEPS'
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 60)
+    print("UNDO / EDIT TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_undo_restores_earlier_steps()
+        test_undo_keeps_ranking_order()
+        test_edit_answer()
+        test_tree_session_undo()
+        test_main_undo_and_edit()
+
+        print("\n" + "=" * 60)
+        print("ALL TESTS COMPLETED SUCCESSFULLY!")
+        print("=" * 60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)